@@ -41,6 +41,10 @@ from .utility.cmdline import (
     convert_session_options
     )
 from .probe.pydapaccess import DAPAccess
+from .probe.shared_probe import SharedProbe
+from .probe.shared_probe_server import SharedProbeServer
+from .probe.remote_probe import DEFAULT_PORT as DEFAULT_REMOTE_PROBE_PORT
+from .probe.remote_probe_server import RemoteProbeServer
 from .tools.lists import ListGenerator
 from .tools.pyocd import PyOCDCommander
 from .flash import loader
@@ -70,6 +74,8 @@ DEFAULT_CMD_LOG_LEVEL = {
     'commander':    logging.WARNING,
     'cmd':          logging.WARNING,
     'pack':         logging.INFO,
+    'daemon':       logging.INFO,
+    'server':       logging.INFO,
     }
 
 ## @brief Valid erase mode options.
@@ -178,6 +184,27 @@ class PyOCDTool(object):
         subparsers.add_parser('cmd', parents=[commonOptions, connectOptions, commandOptions],
             help="Alias for 'commander'.")
 
+        # Create *daemon* subcommand parser.
+        daemonParser = subparsers.add_parser('daemon', parents=[commonOptions],
+            help="Keep a debug probe open and share it with other pyocd processes.")
+        daemonParser.add_argument("-u", "--uid", dest="unique_id",
+            help="Choose a probe by its unique ID or a substring thereof.")
+        daemonParser.add_argument("-W", "--no-wait", action="store_true",
+            help="Do not wait for a probe to be connected if none are available.")
+
+        # Create *server* subcommand parser.
+        serverParser = subparsers.add_parser('server', parents=[commonOptions],
+            help="Share a debug probe with pyocd on other hosts over TCP/IP.")
+        serverParser.add_argument("-u", "--uid", dest="unique_id",
+            help="Choose a probe by its unique ID or a substring thereof.")
+        serverParser.add_argument("-W", "--no-wait", action="store_true",
+            help="Do not wait for a probe to be connected if none are available.")
+        serverParser.add_argument("-p", "--port", dest="port_number", type=int,
+            default=DEFAULT_REMOTE_PROBE_PORT,
+            help="Set the port number that the server will open (default %d)." % DEFAULT_REMOTE_PROBE_PORT)
+        serverParser.add_argument("--allow-remote", dest="serve_local_only", default=True, action="store_false",
+            help="Allow remote TCP/IP connections (default is no).")
+
         # Create *erase* subcommand parser.
         eraseParser = subparsers.add_parser('erase', parents=[commonOptions, connectOptions],
             help="Erase entire device flash or specified sectors.",
@@ -212,6 +239,8 @@ class PyOCDTool(object):
             help="File format. Default is to use the file's extension.")
         flashParser.add_argument("--skip", metavar="BYTES", default=0, type=int_base_0,
             help="Skip programming the first N bytes. This can only be used with binary files.")
+        flashParser.add_argument("--previous", metavar="PATH",
+            help="Image that was previously programmed. Only pages that differ from it are programmed.")
         flashParser.add_argument("file", metavar="PATH",
             help="File to program into flash.")
         
@@ -241,6 +270,12 @@ class PyOCDTool(object):
             help="Allow single stepping to step into interrupts.")
         gdbserverOptions.add_argument("-c", "--command", dest="commands", metavar="CMD", action='append', nargs='+',
             help="Run command (OpenOCD compatibility).")
+        gdbserverOptions.add_argument("--async", dest="async_server", default=False, action="store_true",
+            help="Serve all cores from a single asyncio event loop instead of two threads per core. "
+                "Requires Python 3.")
+        gdbserverOptions.add_argument("--all-probes", dest="all_probes", default=False, action="store_true",
+            help="Serve every connected probe, or every probe matching --uid, from one process. "
+                "Ports are assigned consecutively from the base port. Implies --async.")
         subparsers.add_parser('gdbserver', parents=[commonOptions, connectOptions, gdbserverOptions],
             help="Run the gdb remote server(s).")
         subparsers.add_parser('gdb', parents=[commonOptions, connectOptions, gdbserverOptions],
@@ -453,6 +488,37 @@ class PyOCDTool(object):
             assert False
         print(json.dumps(obj, indent=4))
     
+    def _choose_probe_to_share(self):
+        """! @brief Choose the probe for the 'daemon' and 'server' subcommands."""
+        probe = ConnectHelper.choose_probe(blocking=(not self._args.no_wait),
+                                            unique_id=self._args.unique_id)
+        if probe is None:
+            sys.exit(1)
+        if isinstance(probe, SharedProbe):
+            LOG.error("Probe %s is already shared by another pyocd process", probe.unique_id)
+            sys.exit(1)
+        return probe
+    
+    def _run_probe_server(self, server):
+        """! @brief Run a probe server until it exits or the user presses Control-C."""
+        server.open()
+        try:
+            server.start()
+            while server.is_alive():
+                server.join(timeout=0.5)
+        finally:
+            server.stop()
+    
+    def do_daemon(self):
+        """! @brief Handle 'daemon' subcommand."""
+        self._run_probe_server(SharedProbeServer(self._choose_probe_to_share()))
+    
+    def do_server(self):
+        """! @brief Handle 'server' subcommand."""
+        self._run_probe_server(RemoteProbeServer(self._choose_probe_to_share(),
+                                                port=self._args.port_number,
+                                                serve_local_only=self._args.serve_local_only))
+    
     def do_flash(self):
         """! @brief Handle 'flash' subcommand."""
         self._increase_logging(["pyocd.flash.loader"])
@@ -477,7 +543,8 @@ class PyOCDTool(object):
             programmer.program(self._args.file,
                                 base_address=self._args.base_address,
                                 skip=self._args.skip,
-                                file_format=self._args.format)
+                                file_format=self._args.format,
+                                previous=self._args.previous)
     
     def do_erase(self):
         """! @brief Handle 'erase' subcommand."""
@@ -554,6 +621,10 @@ class PyOCDTool(object):
                 'vector_catch' : self._args.vector_catch,
                 })
             
+            if self._args.async_server or self._args.all_probes:
+                self._run_async_gdbserver(sessionOptions)
+                return
+
             session = ConnectHelper.session_with_chosen_probe(
                 blocking=(not self._args.no_wait),
                 project_dir=self._args.project_dir,
@@ -585,6 +656,63 @@ class PyOCDTool(object):
                 gdb.stop()
             raise
     
+    def _run_async_gdbserver(self, sessionOptions):
+        """! @brief Serve gdb for one or more probes with AsyncGDBServer."""
+        if sys.version_info[0] < 3:
+            LOG.error("The asyncio gdbserver requires Python 3")
+            return
+        from .gdbserver.async_server import AsyncGDBServer
+
+        session_args = dict(
+            project_dir=self._args.project_dir,
+            user_script=self._args.script,
+            config_file=self._args.config,
+            no_config=self._args.no_config,
+            pack=self._args.pack,
+            target_override=self._args.target_override,
+            frequency=self._args.frequency,
+            options=sessionOptions)
+        if self._args.all_probes:
+            sessions = ConnectHelper.get_sessions_for_all_connected_probes(
+                blocking=(not self._args.no_wait),
+                unique_id=self._args.unique_id,
+                **session_args)
+        else:
+            session = ConnectHelper.session_with_chosen_probe(
+                blocking=(not self._args.no_wait),
+                unique_id=self._args.unique_id,
+                auto_open=False,
+                **session_args)
+            sessions = [session] if (session is not None) else []
+        if not sessions:
+            LOG.error("No probe selected.")
+            return
+
+        server = AsyncGDBServer(server_listening_callback=self.server_listening)
+        open_sessions = []
+        try:
+            gdb_port = sessionOptions['gdbserver_port']
+            telnet_port = sessionOptions['telnet_port']
+            for session in sessions:
+                # Give each session its own range of ports, one per core.
+                session.options['gdbserver_port'] = gdb_port
+                session.options['telnet_port'] = telnet_port
+                open_sessions.append(session)
+                session.open()
+                if self._args.elf:
+                    session.board.target.elf = os.path.expanduser(self._args.elf)
+                server.add_session(session)
+                core_count = len(session.board.target.cores)
+                if gdb_port != 0:
+                    gdb_port += core_count
+                if telnet_port != 0:
+                    telnet_port += core_count
+            server.run()
+        finally:
+            server.close()
+            for session in open_sessions:
+                session.close()
+
     def do_commander(self):
         """! @brief Handle 'commander' subcommand."""
         # Flatten commands list then extract primary command and its arguments.
@@ -680,6 +808,8 @@ class PyOCDTool(object):
         'commander':    do_commander,
         'cmd':          do_commander,
         'pack':         do_pack,
+        'daemon':       do_daemon,
+        'server':       do_server,
         }
 
 def main():
@@ -19,6 +19,8 @@ from .memory_map import MemoryType
 from . import exceptions
 from ..flash.loader import FlashEraser
 from ..coresight import (dap, cortex_m, cortex_m_v8m, rom_table)
+from ..coresight.clock_tuner import ClockTuner
+from ..coresight.discovery_cache import DiscoveryCache
 from ..debug.svd.loader import (SVDFile, SVDLoader)
 from ..debug.context import DebugContext
 from ..debug.cache import CachingDebugContext
@@ -142,11 +144,14 @@ class CoreSightTarget(Target, GraphNode):
             ('power_up',            self.dp.power_up_debug),
             ('find_aps',            self.dp.find_aps),
             ('create_aps',          self.dp.create_aps),
+            ('load_discovery_cache', self.load_discovery_cache),
             ('init_ap_roms',        self.dp.init_ap_roms),
             ('create_cores',        self.create_cores),
             ('create_components',   self.create_components),
+            ('save_discovery_cache', self.save_discovery_cache),
             ('check_for_cores',     self.check_for_cores),
             ('halt_on_connect',     self.perform_halt_on_connect),
+            ('tune_clock',          self.tune_clock),
             ('post_connect',        self.post_connect),
             ('notify',              lambda : self.session.notify(Target.EVENT_POST_CONNECT, self))
             )
@@ -199,6 +204,16 @@ class CoreSightTarget(Target, GraphNode):
                     LOG.warning("Could not halt core #%d: %s", core.core_number, err,
                         exc_info=self.session.log_tracebacks)
     
+    def tune_clock(self):
+        """! @brief Select the fastest reliable SWD/JTAG frequency if enabled.
+        
+        This init task runs the ClockTuner when the `clock_tune` option is set. It comes after
+        halt on connect so that RAM can be used for the test pattern.
+        """
+        if not self.session.options.get('clock_tune'):
+            return
+        ClockTuner(self).tune()
+    
     def post_connect(self):
         """! @brief Handle cleaning up some of the connect modes.
         
@@ -288,6 +303,20 @@ class CoreSightTarget(Target, GraphNode):
         for ap in [x for x in self.dp.aps.values() if x.has_rom_table]:
             ap.rom_table.for_each(action, filter)
 
+    def load_discovery_cache(self):
+        """! @brief Init task: set up the discovery cache if it is enabled.
+        
+        This must come after the APs are created, since the cache is keyed by the AP IDRs.
+        """
+        self.dp.discovery_cache = DiscoveryCache.for_target(self)
+        if (self.dp.discovery_cache is not None) and not self.dp.discovery_cache.is_empty:
+            LOG.debug("Using discovery cache %s", self.dp.discovery_cache.path)
+    
+    def save_discovery_cache(self):
+        """! @brief Init task: write any newly discovered values to the discovery cache."""
+        if self.dp.discovery_cache is not None:
+            self.dp.discovery_cache.save()
+    
     def check_for_cores(self):
         """! @brief Init task: verify that at least one core was discovered."""
         if not len(self.cores):
@@ -342,6 +371,27 @@ class CoreSightTarget(Target, GraphNode):
     def read_memory_block32(self, addr, size):
         return self.selected_core.read_memory_block32(addr, size)
 
+    def write_memory_bytes(self, addr, data):
+        return self.selected_core.write_memory_bytes(addr, data)
+
+    def read_memory_bytes(self, addr, size):
+        return self.selected_core.read_memory_bytes(addr, size)
+
+    def write_memory_block32_bytes(self, addr, data):
+        return self.selected_core.write_memory_block32_bytes(addr, data)
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self.selected_core.read_memory_block32_bytes(addr, size)
+
+    def read_memory_tolerant(self, addr, size, fault_map=None, fill=0):
+        return self.selected_core.read_memory_tolerant(addr, size, fault_map, fill)
+
+    def read_memory_async(self, addr, transfer_size=32):
+        return self.selected_core.read_memory_async(addr, transfer_size)
+
+    def read_memory_block32_async(self, addr, size):
+        return self.selected_core.read_memory_block32_async(addr, size)
+
     def read_core_register(self, id):
         return self.selected_core.read_core_register(id)
 
@@ -390,6 +440,9 @@ class CoreSightTarget(Target, GraphNode):
 
     def get_state(self):
         return self.selected_core.get_state()
+    
+    def wait_for_halt(self, timeout):
+        return self.selected_core.wait_for_halt(timeout)
         
     def get_security_state(self):
         return self.selected_core.get_security_state()
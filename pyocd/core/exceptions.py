@@ -54,6 +54,10 @@ class TransferTimeoutError(TransferError):
     """! @brief An SWD or JTAG timeout occurred"""
     pass
 
+class TransferCancelledError(Error):
+    """! @brief The result of a deferred transfer was requested after it was cancelled"""
+    pass
+
 class TransferFaultError(TransferError):
     """! @brief An SWD Fault occurred"""
     def __init__(self, faultAddress=None, length=None):
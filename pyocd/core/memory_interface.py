@@ -14,7 +14,61 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from . import exceptions
 from ..utility import conversion
+from ..utility.future import TransferFuture
+import bisect
+import six
+
+class MemoryFaultMap(object):
+    """! @brief Set of address ranges known to fault when accessed.
+    
+    The ranges are kept sorted and merged, and are half-open `[start, end)`. A fault map is filled
+    in by MemoryInterface.read_memory_tolerant(), and lets later tolerant reads skip the faulting
+    ranges without accessing the target.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(list(zip(self._starts, self._ends)))
+
+    def add(self, start, end):
+        """! @brief Record that the range `[start, end)` faults.
+        
+        The range is merged with any overlapping or adjacent ranges.
+        """
+        if start >= end:
+            return
+        # Find the ranges that overlap or touch the new range.
+        first = bisect.bisect_left(self._ends, start)
+        last = bisect.bisect_right(self._starts, end)
+        if first < last:
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+
+    def find(self, start, end):
+        """! @brief Return the known faulting ranges within `[start, end)`.
+        @return List of (start, end) tuples, clipped to the requested range.
+        """
+        result = []
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            result.append((max(start, self._starts[i]), min(end, self._ends[i])))
+            i += 1
+        return result
+
+    def clear(self):
+        """! @brief Forget all faulting ranges."""
+        self._starts = []
+        self._ends = []
 
 class MemoryInterface(object):
     """! @brief Interface for memory access."""
@@ -39,6 +93,27 @@ class MemoryInterface(object):
         """! @brief Read an aligned block of 32-bit words."""
         raise NotImplementedError()
   
+    def read_memory_async(self, addr, transfer_size=32):
+        """! @brief Queue a read of a memory location.
+        
+        Many reads can be queued before waiting for any of them, so they are all completed by the
+        same flush of the probe's queue. Use gather() from pyocd.utility.future to wait for
+        several reads.
+        
+        @return TransferFuture for the value.
+        """
+        return TransferFuture(self.read_memory(addr, transfer_size, now=False))
+
+    def read_memory_block32_async(self, addr, size):
+        """! @brief Queue a read of an aligned block of 32-bit words.
+        
+        The default implementation performs the read immediately and returns a completed future.
+        Subclasses that can queue block reads should override it.
+        
+        @return TransferFuture for the list of word values.
+        """
+        return TransferFuture.call(self.read_memory_block32, addr, size)
+
     def write32(self, addr, value):
         """! @brief Shorthand to write a 32-bit word."""
         self.write_memory(addr, value, 32)
@@ -63,82 +138,182 @@ class MemoryInterface(object):
         """! @brief Shorthand to read a byte."""
         return self.read_memory(addr, 8, now)
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_block32_bytes(self, addr, size):
+        """! @brief Read an aligned block of 32-bit words.
+        
+        This is the buffer based variant of read_memory_block32(). The default implementation
+        is built on read_memory_block32(); subclasses that can produce the raw bytes directly
+        should override it.
+        
+        @param self
+        @param addr Word aligned start address.
+        @param size Number of words to read.
+        @return A bytearray of length _size_ * 4 containing the words in little endian order.
+        """
+        return conversion.u32le_list_to_bytes(self.read_memory_block32(addr, size))
+
+    def write_memory_block32_bytes(self, addr, data):
+        """! @brief Write an aligned block of 32-bit words.
+        
+        This is the buffer based variant of write_memory_block32(). The default implementation
+        is built on write_memory_block32(); subclasses that can consume the raw bytes directly
+        should override it.
+        
+        @param self
+        @param addr Word aligned start address.
+        @param data Object supporting the buffer protocol (bytes, bytearray, memoryview) whose
+            length is a multiple of 4. The words are in little endian order. The buffer is not
+            used after this method returns, even if the write is deferred.
+        """
+        self.write_memory_block32(addr, conversion.bytes_to_u32le_list(data))
+
+    def read_memory_bytes(self, addr, size):
         """! @brief Read a block of unaligned bytes in memory.
-        @return an array of byte values
+        @return A bytearray containing the data.
         """
-        res = []
+        res = bytearray(size)
+        idx = 0
 
         # try to read 8bits data
         if (size > 0) and (addr & 0x01):
-            mem = self.read8(addr)
-            res.append(mem)
+            res[idx] = self.read8(addr)
             size -= 1
             addr += 1
+            idx += 1
 
         # try to read 16bits data
         if (size > 1) and (addr & 0x02):
             mem = self.read16(addr)
-            res.append(mem & 0xff)
-            res.append((mem >> 8) & 0xff)
+            res[idx] = mem & 0xff
+            res[idx + 1] = (mem >> 8) & 0xff
             size -= 2
             addr += 2
+            idx += 2
 
         # try to read aligned block of 32bits
         if (size >= 4):
-            mem = self.read_memory_block32(addr, size // 4)
-            res += conversion.u32le_list_to_byte_list(mem)
-            size -= 4*len(mem)
-            addr += 4*len(mem)
+            n = size & ~0x03
+            res[idx:idx + n] = self.read_memory_block32_bytes(addr, n // 4)
+            size -= n
+            addr += n
+            idx += n
 
         if (size > 1):
             mem = self.read16(addr)
-            res.append(mem & 0xff)
-            res.append((mem >> 8) & 0xff)
+            res[idx] = mem & 0xff
+            res[idx + 1] = (mem >> 8) & 0xff
             size -= 2
             addr += 2
+            idx += 2
 
         if (size > 0):
-            mem = self.read8(addr)
-            res.append(mem)
+            res[idx] = self.read8(addr)
 
         return res
 
-    def write_memory_block8(self, addr, data):
-        """! @brief Write a block of unaligned bytes in memory."""
+    def write_memory_bytes(self, addr, data):
+        """! @brief Write a block of unaligned bytes in memory.
+        
+        @param self
+        @param addr Start address.
+        @param data Object supporting the buffer protocol, such as bytes, bytearray, or memoryview.
+            The data is not copied for the aligned portion of the write.
+        """
+        data = memoryview(data)
         size = len(data)
         idx = 0
 
         #try to write 8 bits data
         if (size > 0) and (addr & 0x01):
-            self.write8(addr, data[idx])
+            self.write8(addr, six.indexbytes(data, idx))
             size -= 1
             addr += 1
             idx += 1
 
         # try to write 16 bits data
         if (size > 1) and (addr & 0x02):
-            self.write16(addr, data[idx] | (data[idx+1] << 8))
+            self.write16(addr, six.indexbytes(data, idx) | (six.indexbytes(data, idx + 1) << 8))
             size -= 2
             addr += 2
             idx += 2
 
         # write aligned block of 32 bits
         if (size >= 4):
-            data32 = conversion.byte_list_to_u32le_list(data[idx:idx + (size & ~0x03)])
-            self.write_memory_block32(addr, data32)
-            addr += size & ~0x03
-            idx += size & ~0x03
-            size -= size & ~0x03
+            n = size & ~0x03
+            self.write_memory_block32_bytes(addr, data[idx:idx + n])
+            addr += n
+            idx += n
+            size -= n
 
         # try to write 16 bits data
         if (size > 1):
-            self.write16(addr, data[idx] | (data[idx+1] << 8))
+            self.write16(addr, six.indexbytes(data, idx) | (six.indexbytes(data, idx + 1) << 8))
             size -= 2
             addr += 2
             idx += 2
 
         #try to write 8 bits data
         if (size > 0):
-            self.write8(addr, data[idx])
+            self.write8(addr, six.indexbytes(data, idx))
 
+    def read_memory_block8(self, addr, size):
+        """! @brief Read a block of unaligned bytes in memory.
+        @return an array of byte values
+        """
+        return list(self.read_memory_bytes(addr, size))
+
+    def write_memory_block8(self, addr, data):
+        """! @brief Write a block of unaligned bytes in memory."""
+        self.write_memory_bytes(addr, bytearray(data))
+
+    def read_memory_tolerant(self, addr, size, fault_map=None, fill=0):
+        """! @brief Read a block of unaligned bytes, recovering the data around faulting addresses.
+        
+        The block is first read as a whole. If the read faults, the range is split in two and each
+        half is read separately, repeating until the faulting words are isolated. Bytes that could
+        not be read are set to _fill_ in the returned data.
+        
+        @param self
+        @param addr Start address.
+        @param size Number of bytes to read.
+        @param fault_map Optional MemoryFaultMap. Ranges already in the map are not read, and new
+            faulting ranges are added to it.
+        @param fill Value of the bytes that could not be read.
+        @return Tuple of a bytearray of length _size_, and a sorted list of (start, end) tuples for
+            the faulting address ranges.
+        """
+        data = bytearray([fill]) * size
+        faults = MemoryFaultMap()
+        end = addr + size
+        known = fault_map.find(addr, end) if (fault_map is not None) else []
+        
+        # Read the gaps between known faulting ranges.
+        start = addr
+        for fault_start, fault_end in known + [(end, end)]:
+            if start < fault_start:
+                self._read_bisect(start, fault_start, data, addr, faults)
+            faults.add(fault_start, fault_end)
+            start = fault_end
+        
+        if fault_map is not None:
+            for fault_start, fault_end in faults:
+                fault_map.add(fault_start, fault_end)
+        return data, list(faults)
+
+    def _read_bisect(self, start, end, data, base, faults):
+        """! @brief Read `[start, end)` into _data_, bisecting the range on faults."""
+        try:
+            data[start - base:end - base] = self.read_memory_bytes(start, end - start)
+            return
+        except exceptions.TransferFaultError:
+            pass
+        
+        # Split on a word boundary. If the range is within a single word, then it is the fault.
+        mid = ((start + end) // 2) & ~0x3
+        if mid <= start:
+            mid = (start + 4) & ~0x3
+        if mid >= end:
+            faults.add(start, end)
+            return
+        self._read_bisect(start, mid, data, base, faults)
+        self._read_bisect(mid, end, data, base, faults)
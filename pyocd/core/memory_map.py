@@ -134,8 +134,8 @@ class MemoryRegion(MemoryRangeBase):
     - `is_cacheable`: Determines whether data should be cached from this region. True for most
         memory types, except DEVICE.
     - `invalidate_cache_on_run`: Whether to invalidate any cached data from the region whenever the
-        target resumes execution or steps. Usually true, though this can be false for regions such
-        as memory-mapped OTP or configuration flash.
+        target resumes execution or steps. True for most memory types, except FLASH and ROM. Cached
+        flash contents are instead invalidated when flash is programmed or erased.
     - `is_testable`: Whether pyOCD should consider the region in its functional tests.
     - `is_external`: If true, the region is backed by an external memory device such as SDRAM or QSPI.
     
@@ -274,6 +274,7 @@ class RomRegion(MemoryRegion):
     DEFAULT_ATTRS = MemoryRegion.DEFAULT_ATTRS.copy()
     DEFAULT_ATTRS.update({
         'access': 'rx', # ROM is by definition not writable.
+        'invalidate_cache_on_run': False,
         })
 
     def __init__(self, start=0, end=0, length=None, **attrs):
@@ -321,6 +322,7 @@ class FlashRegion(MemoryRegion):
         'erase_sector_weight': DefaultFlashWeights.ERASE_SECTOR_WEIGHT,
         'program_page_weight': DefaultFlashWeights.PROGRAM_PAGE_WEIGHT,
         'erased_byte_value': 0xff,
+        'invalidate_cache_on_run': False,
         'access': 'rx', # By default flash is not writable.
         'are_erased_sectors_readable': True,
         })
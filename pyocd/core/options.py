@@ -27,6 +27,15 @@ OPTIONS_INFO = {
     'chip_erase': OptionInfo('chip_erase', str, "sector",
         "Whether to perform a chip erase or sector erases when programming flash. The value must be"
         " one of \"auto\", \"sector\", or \"chip\"."),
+    'clock_tune': OptionInfo('clock_tune', bool, False,
+        "Whether to select the fastest reliable SWD/JTAG frequency when connecting, by stepping "
+        "up the clock from the frequency option while running a test pattern. The result is cached "
+        "for later sessions with the same probe and target. Default is False."),
+    'clock_tune.cache_file': OptionInfo('clock_tune.cache_file', str, None,
+        "Path of the file in which tuned frequencies are cached. Default is "
+        "'~/.pyocd/clock_tune.json'."),
+    'clock_tune.max_frequency': OptionInfo('clock_tune.max_frequency', int, 24000000,
+        "Highest SWD/JTAG frequency in Hertz tried by clock tuning. Default is 24 MHz."),
     'config_file': OptionInfo('config_file', str, None,
         "Path to custom config file."),
     'connect_mode': OptionInfo('connect_mode', str, "halt",
@@ -41,11 +50,25 @@ OPTIONS_INFO = {
         "Log details of loaded .FLM flash algos."),
     'debug.traceback': OptionInfo('debug.traceback', bool, True,
         "Print tracebacks for exceptions."),
+    'discovery_cache': OptionInfo('discovery_cache', bool, False,
+        "Whether to keep an on-disk cache of the CoreSight ID registers read during discovery for "
+        "each board, so that later connects can rebuild the component graph without reading them "
+        "again. Default is False."),
+    'discovery_cache.dir': OptionInfo('discovery_cache.dir', str, None,
+        "Directory in which the discovery cache files are stored. Default is "
+        "'~/.pyocd/discovery_cache'."),
     'enable_multicore_debug': OptionInfo('enable_multicore', bool, False,
         "Whether to put pyOCD into multicore debug mode."),
     'fast_program': OptionInfo('fast_program', bool, False,
         "Setting this option to True will use CRC checks of existing flash sector contents to "
         "determine whether pages need to be programmed."),
+    'flash_crc_cache': OptionInfo('flash_crc_cache', bool, False,
+        "Whether to keep an on-disk cache of the CRC32 of flash pages programmed through each debug "
+        "probe. When enabled, smart flash skips pages that are unchanged since they were last "
+        "programmed after checking a few sampled pages against the target. Default is False."),
+    'flash_crc_cache.dir': OptionInfo('flash_crc_cache.dir', str, None,
+        "Directory in which the flash CRC cache files are stored. Default is "
+        "'~/.pyocd/flash_crc_cache'."),
     'frequency': OptionInfo('frequency', int, 1000000,
         "SWD/JTAG frequency in Hertz."),
     'hide_programming_progress': OptionInfo('hide_programming_progress', bool, False,
@@ -55,6 +78,13 @@ OPTIONS_INFO = {
         "written with new data. Default is True."),
     'logging': OptionInfo('logging', (str, dict), None,
         "Logging configuration dictionary, or path to YAML file containing logging configuration."),
+    'memcache.line_size': OptionInfo('memcache.line_size', int, 256,
+        "Size in bytes of each line of the memory cache. Must be a power of two. Default is 256."),
+    'memcache.max_size': OptionInfo('memcache.max_size', int, 64 * 1024,
+        "Maximum number of bytes held in the memory cache. Default is 64 kB."),
+    'memcache.write_back': OptionInfo('memcache.write_back', bool, False,
+        "Whether writes to RAM are held in the memory cache and written to the target on flush, "
+        "instead of being written through immediately. Default is False."),
     'no_config': OptionInfo('no_config', bool, False,
         "Do not use default config file."),
     'pack': OptionInfo('pack', (str, list), None,
@@ -63,6 +93,9 @@ OPTIONS_INFO = {
     'project_dir': OptionInfo('project_dir', str, None,
         "Path to the session's project directory. Defaults to the working directory when the pyocd "
         "tool was executed."),
+    'remote_probe.compression': OptionInfo('remote_probe.compression', bool, True,
+        "Whether large messages exchanged with a remote probe server are compressed. Default is "
+        "True."),
     'reset_type': OptionInfo('reset_type', str, 'default',
         "Which type of reset to use by default ('default', 'hw', 'sw', 'sw_sysresetreq', "
         "'sw_vectreset', 'sw_emulated'). The default is 'sw'."),
@@ -102,6 +135,10 @@ OPTIONS_INFO = {
         "localhost."),
     'step_into_interrupt': OptionInfo('step_into_interrupt', bool, False,
         "Enable interrupts when performing step operations."),
+    'stream_flash': OptionInfo('stream_flash', bool, True,
+        "Whether to program flash sectors while gdb is still sending the data for a load, rather "
+        "than after all data has been received. Only applies when the chip_erase option is "
+        "\"sector\"."),
     'swv_clock': OptionInfo('swv_clock', int, 1000000,
         "Frequency in Hertz of the SWO baud rate. Default is 1 MHz."),
     'swv_system_clock': OptionInfo('swv_system_clock', int, None,
@@ -28,7 +28,10 @@ except ImportError:
     from inspect import getargspec
 
 from .options_manager import OptionsManager
+from .memory_interface import MemoryFaultMap
+from .target import Target
 from ..board.board import Board
+from ..debug.halt_watcher import HaltWatcher
 from ..utility.notification import Notifier
 
 LOG = logging.getLogger(__name__)
@@ -131,6 +134,12 @@ class Session(Notifier):
         self._delegate = None
         self._auto_open = auto_open
         self._options = OptionsManager()
+        self._memory_faults = {}
+        self._halt_watcher = HaltWatcher()
+        
+        # Faulting memory ranges may change when the target is reset, or when it runs and
+        # reconfigures clocks and power.
+        self.subscribe(self._memory_faults_handler, [Target.EVENT_PRE_RESET, Target.EVENT_PRE_RUN])
         
         # Set this session on the probe, if we were given a probe.
         if probe is not None:
@@ -267,6 +276,29 @@ class Session(Notifier):
     def project_dir(self):
         return self._project_dir
     
+    def get_memory_faults(self, memif):
+        """! @brief Return the MemoryFaultMap for tolerant memory reads through an interface.
+        
+        Each memory interface, such as a core or a MEM-AP, has its own map since they may not
+        fault at the same addresses. The maps are cleared when a core is reset or resumed, and by
+        clear_memory_faults().
+        """
+        return self._memory_faults.setdefault(memif, MemoryFaultMap())
+    
+    def clear_memory_faults(self):
+        """! @brief Forget the faulting address ranges of all memory interfaces.
+        
+        This should be called when writing to the target, since a write can enable the clock or
+        power of a peripheral that faulted.
+        """
+        for fault_map in list(self._memory_faults.values()):
+            fault_map.clear()
+    
+    @property
+    def halt_watcher(self):
+        """! @brief HaltWatcher shared by everything that waits for cores to halt."""
+        return self._halt_watcher
+    
     @property
     def delegate(self):
         return self._delegate
@@ -284,6 +316,9 @@ class Session(Notifier):
         """! @brief Quick access to debug.traceback option since it is widely used."""
         return self.options.get('debug.traceback')
 
+    def _memory_faults_handler(self, notification):
+        self.clear_memory_faults()
+
     def __enter__(self):
         assert self._probe is not None
         if self._auto_open:
@@ -381,6 +416,7 @@ class Session(Notifier):
         self._closed = True
 
         LOG.debug("uninit session %s", self)
+        self._halt_watcher.stop()
         if self._inited:
             try:
                 self.board.uninit()
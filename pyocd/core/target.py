@@ -210,6 +210,12 @@ class Target(MemoryInterface):
 
     def get_state(self):
         raise NotImplementedError()
+    
+    def wait_for_halt(self, timeout):
+        """! @brief Wait for the core to halt.
+        @return Boolean indicating whether the core halted before the timeout expired.
+        """
+        raise NotImplementedError()
         
     def get_security_state(self):
         raise NotImplementedError()
@@ -17,6 +17,8 @@
 from ..core import (exceptions, memory_interface)
 from .rom_table import ROMTable
 from ..utility import conversion
+from ..utility.future import (TransferFuture, gather)
+from ..utility.timeout import Timeout
 import logging
 import threading
 from contextlib import contextmanager
@@ -236,6 +238,23 @@ class AccessPort(object):
         except exceptions.TransferError as error:
             LOG.error("Transfer error while reading AP#%d ROM table: %s", self.ap_num, error)
 
+    def discover(self, name, fn):
+        """! @brief Return a value found during discovery, from the discovery cache if possible.
+        
+        If the DebugPort has a discovery cache, the value is looked up there under a name that
+        includes the AP number, and _fn_ is only called if the value isn't cached. Otherwise _fn_
+        is called directly.
+        
+        @param self
+        @param name Name of the value, unique for this AP.
+        @param fn Callable that reads the value from the target. The return value must be
+            serializable as JSON.
+        """
+        cache = self.dp.discovery_cache
+        if cache is None:
+            return fn()
+        return cache.get("ap%d.%s" % (self.ap_num, name), fn)
+
     @_locked
     def read_reg(self, addr, now=True):
         return self.dp.read_ap((self.ap_num << APSEL_SHIFT) | addr, now)
@@ -244,10 +263,21 @@ class AccessPort(object):
     def write_reg(self, addr, data):
         self.dp.write_ap((self.ap_num << APSEL_SHIFT) | addr, data)
     
+    def read_reg_async(self, addr):
+        """! @brief Queue an AP register read.
+        @return TransferFuture for the register's value.
+        """
+        return TransferFuture(self.read_reg(addr, now=False))
+    
     def reset_did_occur(self):
         """! @brief Invoked by the DebugPort to inform APs that a reset was performed."""
         pass
     
+    def invalidate_cache(self):
+        """! @brief Invoked by the DebugPort when a transfer error may have left AP registers with
+        values other than those last written."""
+        pass
+    
     def lock(self):
         """! @brief Lock the AP from access by other threads."""
         self._lock.acquire()
@@ -304,6 +334,9 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         
         ## Cached current CSW value.
         self._cached_csw = -1
+        
+        ## Cached current TAR value, tracking auto-increment.
+        self._cached_tar = -1
 
         # Default to the smallest size supported by all targets.
         # A size smaller than the supported size will decrease performance
@@ -315,17 +348,23 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         # then bind our memory interface APIs to its methods. Otherwise use our standard
         # memory interface based on AP register accesses.
         memoryInterface = self.dp.link.get_memory_interface_for_ap(self.ap_num)
+        self._has_memory_interface = memoryInterface is not None
         if memoryInterface is not None:
             LOG.debug("Using accelerated memory access interface")
             self.write_memory = memoryInterface.write_memory
             self.read_memory = memoryInterface.read_memory
             self.write_memory_block32 = memoryInterface.write_memory_block32
             self.read_memory_block32 = memoryInterface.read_memory_block32
+            self.write_memory_block32_bytes = memoryInterface.write_memory_block32_bytes
+            self.read_memory_block32_bytes = memoryInterface.read_memory_block32_bytes
         else:
             self.write_memory = self._write_memory
             self.read_memory = self._read_memory
             self.write_memory_block32 = self._write_memory_block32
             self.read_memory_block32 = self._read_memory_block32
+            self.read_memory_block32_async = self._read_memory_block32_async
+            self.write_memory_block32_bytes = self._write_memory_block32_bytes
+            self.read_memory_block32_bytes = self._read_memory_block32_bytes
 
     @_locked
     def init(self):
@@ -354,6 +393,20 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         # Restore unmodified value of CSW.
         AccessPort.write_reg(self, MEM_AP_CSW, original_csw)
 
+    def read_id_block32(self, addr, size):
+        """! @brief Read a block of read-only identification registers.
+        
+        This is the same as read_memory_block32(), except that the registers may be read from the
+        discovery cache. It must only be used for registers whose values never change.
+        """
+        return self.discover("mem:%08x:%d" % (addr, size),
+            lambda: self.read_memory_block32(addr, size))
+
+    @property
+    def is_poll_memory_offloaded(self):
+        """! @brief Whether poll_memory() is performed by the probe rather than by host reads."""
+        return (not self._has_memory_interface) and self.dp.link.is_poll_ap_offloaded
+
     @property
     def implemented_hprot_mask(self):
         return self._impl_hprot
@@ -461,33 +514,88 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         ap_regaddr = addr & APREG_MASK
         if ap_regaddr == MEM_AP_CSW and self._cached_csw != -1 and now:
             return self._cached_csw
-        return super(MEM_AP, self).read_reg(addr, now)
+        try:
+            result = super(MEM_AP, self).read_reg(addr, now)
+        except exceptions.Error:
+            self.invalidate_cache()
+            raise
+        
+        # Reading DRW increments TAR.
+        if ap_regaddr == MEM_AP_DRW:
+            self._advance_tar(1)
+        if now:
+            return result
+        
+        def read_reg_cb():
+            try:
+                return result()
+            except exceptions.Error:
+                self.invalidate_cache()
+                raise
+        return read_reg_cb
 
     @_locked
     def write_reg(self, addr, data):
         ap_regaddr = addr & APREG_MASK
 
-        # Don't need to write CSW if it's not changing value.
-        if ap_regaddr == MEM_AP_CSW:
-            if data == self._cached_csw:
+        # Don't need to write CSW or TAR if it's not changing value.
+        if ap_regaddr in (MEM_AP_CSW, MEM_AP_TAR):
+            if data == (self._cached_csw if (ap_regaddr == MEM_AP_CSW) else self._cached_tar):
                 if TRACE.isEnabledFor(logging.INFO):
                     num = self.dp.next_access_number
                     TRACE.debug("write_ap:%06d cached (addr=0x%08x) = 0x%08x", num, addr, data)
                 return
-            self._cached_csw = data
+            if ap_regaddr == MEM_AP_CSW:
+                self._cached_csw = data
+            else:
+                self._cached_tar = data
 
         try:
             super(MEM_AP, self).write_reg(addr, data)
-        except exceptions.ProbeError:
-            # Invalidate cached CSW on exception.
-            if ap_regaddr == MEM_AP_CSW:
-                self._cached_csw = -1
+        except exceptions.Error:
+            # Invalidate cached registers on exception.
+            self.invalidate_cache()
             raise
+        
+        # Writing DRW increments TAR.
+        if ap_regaddr == MEM_AP_DRW:
+            self._advance_tar(1)
     
     def reset_did_occur(self):
         """! @copydoc AccessPort.reset_did_occur()"""
         # TODO use notifications to invalidate CSW cache.
+        self.invalidate_cache()
+    
+    def invalidate_cache(self):
+        """! @brief Forget the cached CSW and TAR values."""
         self._cached_csw = -1
+        self._cached_tar = -1
+    
+    def _advance_tar(self, count):
+        """! @brief Update the cached TAR for _count_ DRW transfers.
+        
+        The transfer size and auto-increment mode are taken from the cached CSW. Auto-increment
+        is only guaranteed within an auto_increment_page_size block, so the cached TAR is
+        invalidated if the increment reaches the end of the block.
+        """
+        if self._cached_tar == -1:
+            return
+        if self._cached_csw == -1:
+            self._cached_tar = -1
+            return
+        addrinc = self._cached_csw & CSW_ADDRINC
+        if addrinc == CSW_NADDRINC:
+            return
+        elif addrinc != CSW_SADDRINC:
+            # Packed transfers aren't modelled.
+            self._cached_tar = -1
+            return
+        tar = self._cached_tar + count * (1 << (self._cached_csw & CSW_SIZE))
+        page_mask = ~(self.auto_increment_page_size - 1)
+        if (tar & page_mask) != (self._cached_tar & page_mask):
+            self._cached_tar = -1
+        else:
+            self._cached_tar = tar
 
     @_locked
     def _write_memory(self, addr, data, transfer_size=32):
@@ -571,20 +679,25 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         """! @brief Write a single transaction's worth of aligned words.
         
         The transaction must not cross the MEM-AP's auto-increment boundary.
+        
+        @param self
+        @param addr Word aligned start address.
+        @param data Buffer of little endian words.
         """
         assert (addr & 0x3) == 0
         num = self.dp.next_access_number
-        TRACE.debug("_write_block32:%06d (addr=0x%08x, size=%d) {", num, addr, len(data))
+        TRACE.debug("_write_block32:%06d (addr=0x%08x, size=%d) {", num, addr, len(data) // 4)
         # put address in TAR
         self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
         self.write_reg(MEM_AP_TAR, addr)
         try:
-            self.link.write_ap_multiple((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, data)
+            self.link.write_ap_multiple_bytes((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, data)
+            self._advance_tar(len(data) // 4)
         except exceptions.TransferFaultError as error:
             # Annotate error with target address.
             self._handle_error(error, num)
             error.fault_address = addr
-            error.fault_length = len(data) * 4
+            error.fault_length = len(data)
             raise
         except exceptions.Error as error:
             self._handle_error(error, num)
@@ -596,6 +709,8 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         """! @brief Read a single transaction's worth of aligned words.
         
         The transaction must not cross the MEM-AP's auto-increment boundary.
+        
+        @return A bytearray of _size_ little endian words.
         """
         assert (addr & 0x3) == 0
         num = self.dp.next_access_number
@@ -604,7 +719,8 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
         self.write_reg(MEM_AP_TAR, addr)
         try:
-            resp = self.link.read_ap_multiple((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, size)
+            resp = self.link.read_ap_multiple_bytes((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, size)
+            self._advance_tar(size)
         except exceptions.TransferFaultError as error:
             # Annotate error with target address.
             self._handle_error(error, num)
@@ -618,40 +734,176 @@ class MEM_AP(AccessPort, memory_interface.MemoryInterface):
         return resp
 
     @_locked
-    def _write_memory_block32(self, addr, data):
-        """! @brief Write a block of aligned words in memory."""
+    def _write_memory_block32_bytes(self, addr, data):
+        """! @brief Write a block of aligned words in memory.
+        
+        @param self
+        @param addr Word aligned start address.
+        @param data Buffer of little endian words. It is sliced with a memoryview, so no copies
+            of the data are made.
+        """
         assert (addr & 0x3) == 0
-        size = len(data)
+        data = memoryview(data)
+        size = len(data) & ~0x3
+        offset = 0
         while size > 0:
             n = self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1))
-            if size*4 < n:
-                n = (size*4) & 0xfffffffc
-            self._write_block32(addr, data[:n//4])
-            data = data[n//4:]
-            size -= n//4
+            if size < n:
+                n = size
+            self._write_block32(addr, data[offset:offset + n])
+            offset += n
+            size -= n
             addr += n
         return
 
     @_locked
-    def _read_memory_block32(self, addr, size):
+    def _read_memory_block32_bytes(self, addr, size):
         """! @brief Read a block of aligned words in memory.
         
-        @return An array of word values
+        The reads of all auto-increment pages are queued with the probe before the first result
+        is needed, so the probe can send the whole block with as few commands or requests as
+        possible.
+        
+        @return A bytearray of _size_ little endian words.
         """
         assert (addr & 0x3) == 0
-        resp = []
-        while size > 0:
-            n = self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1))
-            if size*4 < n:
-                n = (size*4) & 0xfffffffc
-            resp += self._read_block32(addr, n//4)
-            size -= n//4
-            addr += n
+        # A read within a single page doesn't need to be deferred.
+        if size * 4 <= self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1)):
+            return self._read_block32(addr, size)
+        num = self.dp.next_access_number
+        TRACE.debug("read_block32:%06d (addr=0x%08x, size=%d) {", num, addr, size)
+        start_addr = addr
+        length = size * 4
+        results = []
+        try:
+            while size > 0:
+                n = (self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1))) // 4
+                n = min(n, size)
+                self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
+                self.write_reg(MEM_AP_TAR, addr)
+                results.append(self.link.read_ap_multiple_bytes(
+                        (self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, n, now=False))
+                self._advance_tar(n)
+                size -= n
+                addr += n * 4
+            resp = bytearray()
+            for result in results:
+                resp += result()
+        except exceptions.TransferFaultError as error:
+            # Annotate error with target address.
+            self._handle_error(error, num)
+            error.fault_address = start_addr
+            error.fault_length = length
+            raise
+        except exceptions.Error as error:
+            self._handle_error(error, num)
+            raise
+        TRACE.debug("read_block32:%06d }", num)
         return resp
 
+    @_locked
+    def _read_memory_block32_async(self, addr, size):
+        """! @brief Queue a read of an aligned block of words in memory.
+        
+        A block read is queued with the probe for each auto-increment page, and the returned
+        future combines their results.
+        
+        @return TransferFuture for the list of word values.
+        """
+        assert (addr & 0x3) == 0
+        num = self.dp.next_access_number
+        TRACE.debug("read_block32_async:%06d (addr=0x%08x, size=%d)", num, addr, size)
+        start_addr = addr
+        length = size * 4
+        
+        def handle_error(error):
+            self._handle_error(error, num)
+            if isinstance(error, exceptions.TransferFaultError):
+                # Annotate error with target address.
+                error.fault_address = start_addr
+                error.fault_length = length
+        
+        futures = []
+        try:
+            while size > 0:
+                n = (self.auto_increment_page_size - (addr & (self.auto_increment_page_size - 1))) // 4
+                n = min(n, size)
+                self.write_reg(MEM_AP_CSW, self._csw | CSW_SIZE32)
+                self.write_reg(MEM_AP_TAR, addr)
+                futures.append(TransferFuture(self.link.read_ap_multiple(
+                        (self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, n, now=False)))
+                self._advance_tar(n)
+                size -= n
+                addr += n * 4
+        except exceptions.Error as error:
+            handle_error(error)
+            raise
+        
+        def read_block32_cb():
+            try:
+                return [w for words in gather(*futures).result() for w in words]
+            except exceptions.Error as error:
+                handle_error(error)
+                raise
+        return TransferFuture(read_block32_cb)
+
+    @_locked
+    def poll_memory(self, addr, mask, value, timeout):
+        """! @brief Wait until the masked value of a memory word matches.
+        
+        The word is read until `(word & mask) == value` or the timeout expires. If the probe
+        supports it, the reads are repeated by the probe, so the host isn't involved for each read.
+        TAR auto-increment is disabled while polling so the same word is read every time. With an
+        accelerated memory interface, the word is polled from the host.
+        
+        @param self
+        @param addr Word aligned address.
+        @param mask Mask applied to the word before comparing.
+        @param value Value to compare the masked word with.
+        @param timeout Maximum time to wait in seconds.
+        @return Boolean indicating whether the value matched before the timeout expired.
+        """
+        assert (addr & 0x3) == 0
+        if self._has_memory_interface:
+            with Timeout(timeout) as t_o:
+                while True:
+                    if (self.read_memory(addr) & mask) == value:
+                        return True
+                    if not t_o.check():
+                        return False
+        
+        num = self.dp.next_access_number
+        TRACE.debug("poll_mem:%06d (addr=0x%08x, mask=0x%08x, value=0x%08x) {", num, addr, mask, value)
+        try:
+            self.write_reg(MEM_AP_CSW, (self._csw & ~CSW_ADDRINC) | CSW_NADDRINC | CSW_SIZE32)
+            self.write_reg(MEM_AP_TAR, addr)
+            result = self.dp.poll_ap((self.ap_num << APSEL_SHIFT) | MEM_AP_DRW, mask, value, timeout)
+        except exceptions.TransferFaultError as error:
+            # Annotate error with target address.
+            self._handle_error(error, num)
+            error.fault_address = addr
+            error.fault_length = 4
+            raise
+        except exceptions.Error as error:
+            self._handle_error(error, num)
+            raise
+        TRACE.debug("poll_mem:%06d } -> %s", num, result)
+        return result
+
+    def _write_memory_block32(self, addr, data):
+        """! @brief Write a block of aligned words in memory."""
+        self._write_memory_block32_bytes(addr, conversion.u32le_list_to_bytes(data))
+
+    def _read_memory_block32(self, addr, size):
+        """! @brief Read a block of aligned words in memory.
+        
+        @return An array of word values
+        """
+        return conversion.bytes_to_u32le_list(self._read_memory_block32_bytes(addr, size))
+
     def _handle_error(self, error, num):
         self.dp._handle_error(error, num)
-        self._cached_csw = -1
+        self.invalidate_cache()
 
 class AHB_AP(MEM_AP):
     """! @brief AHB-AP access port subclass.
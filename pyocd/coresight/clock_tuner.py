@@ -0,0 +1,248 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import logging
+
+from ..core import exceptions
+from ..core.memory_map import MemoryType
+from .ap import AP_IDR
+from .dap import DP_IDCODE
+
+LOG = logging.getLogger(__name__)
+
+## Default path of the tuning cache file if the clock_tune.cache_file option is not set.
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".pyocd", "clock_tune.json")
+
+class ClockTuner(object):
+    """! @brief Finds the fastest SWD/JTAG frequency at which transfers are reliable.
+
+    Starting from the `frequency` session option, which the target was just connected at, the
+    tuner steps the clock up through #FREQUENCIES. At each step it runs a test pattern several
+    times. If the core is halted and the memory map has a RAM region, the pattern is written to
+    the start of RAM and read back; the original RAM contents are saved first and restored when
+    tuning is done. Otherwise the DP IDCODE and AP IDR registers, whose values are known, are read
+    repeatedly. The first step with any transfer error or data mismatch ends the search, and the
+    clock is set back to the last step that passed.
+
+    The selected frequency is stored in a cache file, keyed by the probe's unique ID, the target
+    type, and the DP IDCODE. Later sessions check the cached frequency with the test pattern and
+    only search again if the check fails.
+    """
+
+    ## Candidate frequencies in Hz, in increasing order.
+    FREQUENCIES = (
+        2000000,
+        4000000,
+        6000000,
+        8000000,
+        10000000,
+        12000000,
+        16000000,
+        20000000,
+        24000000,
+        32000000,
+        40000000,
+        50000000,
+        )
+
+    ## Number of words in the test pattern.
+    PATTERN_WORDS = 256
+
+    ## Number of times the test pattern is run at each frequency.
+    ROUNDS = 4
+
+    ## Version of the cache file format.
+    VERSION = 1
+
+    def __init__(self, target):
+        """! @brief Constructor.
+        @param self
+        @param target The CoreSightTarget, which must be connected at the `frequency` option.
+        """
+        self._target = target
+        self._session = target.session
+        self._dp = target.dp
+        self._baseline = self._session.options.get('frequency')
+        self._max_frequency = self._session.options.get('clock_tune.max_frequency')
+        cache_file = self._session.options.get('clock_tune.cache_file') or DEFAULT_CACHE_FILE
+        self._cache_path = os.path.expanduser(cache_file)
+        self._key = "%s:%s:0x%08x" % (self._session.probe.unique_id,
+            self._session.board.target_type, self._dp.dpidr)
+
+        core = target.selected_core
+        self._ap = core.ap if (core is not None) else None
+        self._ram_address = None
+        self._saved_ram = None
+        if (core is not None) and core.is_halted():
+            region = target.memory_map.get_first_region_of_type(MemoryType.RAM)
+            if (region is not None) and (region.length >= self.PATTERN_WORDS * 4):
+                self._ram_address = region.start
+
+    @property
+    def cache_path(self):
+        return self._cache_path
+
+    def tune(self):
+        """! @brief Select and set the fastest reliable frequency.
+        @return The selected frequency in Hz.
+        """
+        if self._ram_address is not None:
+            self._saved_ram = self._ap.read_memory_block32(self._ram_address, self.PATTERN_WORDS)
+        try:
+            frequency = self._find_frequency()
+        finally:
+            if self._saved_ram is not None:
+                self._ap.write_memory_block32(self._ram_address, self._saved_ram)
+        return frequency
+
+    def _find_frequency(self):
+        entries = self._load()
+        cached = entries.get(self._key)
+        if isinstance(cached, int) and self._baseline < cached <= self._max_frequency:
+            if self._check(cached, self._baseline):
+                LOG.info("Using tuned SWD/JTAG frequency of %s", self._format(cached))
+                return cached
+            LOG.info("Cached SWD/JTAG frequency of %s failed; tuning again", self._format(cached))
+
+        best = self._baseline
+        for frequency in self.FREQUENCIES:
+            if frequency <= self._baseline:
+                continue
+            if frequency > self._max_frequency:
+                break
+            if not self._check(frequency, best):
+                break
+            best = frequency
+
+        self._dp.set_clock(best)
+        LOG.info("Tuned SWD/JTAG frequency to %s", self._format(best))
+        entries[self._key] = best
+        self._save(entries)
+        return best
+
+    def _check(self, frequency, fallback):
+        """! @brief Run the test pattern at a frequency.
+
+        If the test fails, the clock is set back to _fallback_ and the connection is recovered.
+
+        @return Boolean indicating whether all rounds passed.
+        """
+        LOG.debug("Testing SWD/JTAG frequency of %s", self._format(frequency))
+        self._dp.set_clock(frequency)
+        try:
+            for round in range(self.ROUNDS):
+                if not self._run_pattern(round):
+                    LOG.debug("Data mismatch at %s", self._format(frequency))
+                    break
+            else:
+                return True
+        except exceptions.TransferError as err:
+            LOG.debug("Transfer error at %s: %s", self._format(frequency), err)
+        self._recover(fallback)
+        return False
+
+    def _recover(self, frequency):
+        """! @brief Go back to a known good frequency after a failed test.
+
+        The DP is reconnected with a line reset, which also clears sticky errors, and the test
+        pattern is run once to make sure the connection is good. Errors are not caught here,
+        because the target could not be reached at a frequency that previously worked.
+        """
+        self._dp.set_clock(frequency)
+        self._dp.init()
+        if not self._run_pattern(0):
+            raise exceptions.TransferError("test pattern mismatch after restoring SWD/JTAG frequency")
+
+    def _run_pattern(self, round):
+        """! @brief Run one round of the test pattern.
+        @return Boolean indicating whether all data read back matched.
+        """
+        if self._ram_address is None:
+            return self._run_register_pattern()
+
+        pattern = self._make_pattern(round)
+        self._ap.write_memory_block32(self._ram_address, pattern)
+        return self._ap.read_memory_block32(self._ram_address, self.PATTERN_WORDS) == pattern
+
+    def _run_register_pattern(self):
+        """! @brief Read registers with known values, queuing all reads before checking them."""
+        count = self.PATTERN_WORDS // 2
+        results = [(self._dp.read_reg(DP_IDCODE, now=False), self._dp.dpidr) for _ in range(count)]
+        if self._ap is not None:
+            results += [(self._ap.read_reg(AP_IDR, now=False), self._ap.idr) for _ in range(count)]
+        return all(result() == expected for result, expected in results)
+
+    def _make_pattern(self, round):
+        """! @brief Build the words written for a round.
+
+        The rounds alternate between patterns that toggle every data line on each bit, walking ones,
+        and a pseudo-random sequence.
+        """
+        kind = round % 4
+        if kind == 0:
+            return [0x55555555 if (i & 1) else 0xaaaaaaaa for i in range(self.PATTERN_WORDS)]
+        elif kind == 1:
+            return [0xaaaaaaaa if (i & 1) else 0x55555555 for i in range(self.PATTERN_WORDS)]
+        elif kind == 2:
+            return [(1 << (i % 32)) for i in range(self.PATTERN_WORDS)]
+        else:
+            value = 0x12345678 + round
+            words = []
+            for _ in range(self.PATTERN_WORDS):
+                value = (value * 1103515245 + 12345) & 0xffffffff
+                words.append(value)
+            return words
+
+    @staticmethod
+    def _format(frequency):
+        return "%g MHz" % (frequency / 1000000.0)
+
+    def _load(self):
+        """! @brief Read the cache file.
+        @return Dict mapping keys to frequencies.
+        """
+        try:
+            with open(self._cache_path, 'r') as f:
+                contents = json.load(f)
+        except (IOError, OSError):
+            return {}
+        except ValueError as err:
+            LOG.warning("Ignoring invalid clock tuning cache file %s: %s", self._cache_path, err)
+            return {}
+        if not isinstance(contents, dict) or contents.get('version') != self.VERSION:
+            return {}
+        return contents.get('frequencies', {})
+
+    def _save(self, entries):
+        """! @brief Write the cache file.
+
+        The file is written to a temporary file that is then renamed, so readers never see a
+        partially written file. Errors are logged but not raised, since the cache is optional.
+        """
+        temp_path = self._cache_path + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self._cache_path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'frequencies': entries}, f)
+            if os.path.exists(self._cache_path):
+                os.remove(self._cache_path)
+            os.rename(temp_path, self._cache_path)
+        except (IOError, OSError) as err:
+            LOG.warning("Failed to write clock tuning cache file %s: %s", self._cache_path, err)
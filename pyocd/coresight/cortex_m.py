@@ -193,6 +193,131 @@ def sysm_to_psr_mask(sysm):
         mask |= CortexM.APSR_MASK
     return mask
 
+## @brief Set of all valid register numbers, for fast validation of register lists.
+_CORE_REGISTER_NUMBERS = frozenset(CORE_REGISTER.values())
+
+## @brief Maximum number of cached register access plans.
+_MAX_CACHED_PLANS = 64
+
+class CoreRegisterAccessPlan(object):
+    """! @brief Precompiled description of how to access a list of core registers.
+    
+    Building a plan resolves register names, validates the register numbers, splits
+    double-precision registers into their two single-precision halves, and maps the CFBP and
+    xPSR subregisters onto the DCRSR register number that holds them. The result is the list of
+    unique DCRSR register numbers to transfer plus, for each requested register, how its value
+    is extracted from or merged into those transfers.
+    
+    Plans are immutable and cached by register list, so repeated accesses of the same registers,
+    such as for gdb's `g` packet, only pay the cost of building the plan once.
+    """
+    
+    _cache = {}
+    
+    @classmethod
+    def get(cls, reg_list):
+        """! @brief Return the plan for a register list, building it if necessary."""
+        key = tuple(reg_list)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        plan = cls(key)
+        if len(cls._cache) >= _MAX_CACHED_PLANS:
+            cls._cache.clear()
+        cls._cache[key] = plan
+        return plan
+    
+    def __init__(self, reg_list):
+        ## List of requested register numbers.
+        self.reg_list = [register_name_to_index(reg) for reg in reg_list]
+        ## Whether any requested register is an FPU register.
+        self.uses_fpu = False
+        ## Unique DCRSR register numbers to read, in order of first use.
+        self.selectors = []
+        ## For each requested register, a 4-tuple of (selector index, high word selector index
+        # or None, shift, mask) used to extract its value from the transferred values.
+        self.read_ops = []
+        ## For each requested register, a list of 4-tuples of (DCRSR register number, data shift,
+        # data mask, field shift) describing the write of that register.
+        self.write_ops = []
+        ## DCRSR register numbers whose current value must be read before a write, because only
+        # part of the register is written.
+        self.read_before_write = []
+        
+        selector_indices = {}
+        def add_selector(selector):
+            try:
+                return selector_indices[selector]
+            except KeyError:
+                selector_indices[selector] = len(self.selectors)
+                self.selectors.append(selector)
+                return selector_indices[selector]
+        
+        fully_written = set()
+        for reg in self.reg_list:
+            if reg not in _CORE_REGISTER_NUMBERS:
+                raise ValueError("unknown reg: %d" % reg)
+            self.uses_fpu = self.uses_fpu or is_fpu_register(reg)
+            
+            if is_double_float_register(reg):
+                # A double is composed of two singles, for instance D2 is S4 and S5.
+                self.read_ops.append((add_selector(-reg), add_selector(-reg + 1), 0, 0xffffffff))
+                self.write_ops.append([(-reg, 0, 0xffffffff, 0), (-reg + 1, 32, 0xffffffff, 0)])
+                fully_written.update((-reg, -reg + 1))
+            elif is_cfbp_subregister(reg):
+                selector = CORE_REGISTER['cfbp']
+                shift = (-reg - 1) * 8
+                self.read_ops.append((add_selector(selector), None, shift, 0xff))
+                self.write_ops.append([(selector, 0, 0xff, shift)])
+                if selector not in fully_written and selector not in self.read_before_write:
+                    self.read_before_write.append(selector)
+            elif is_psr_subregister(reg):
+                selector = CORE_REGISTER['xpsr']
+                mask = sysm_to_psr_mask(reg)
+                self.read_ops.append((add_selector(selector), None, 0, mask))
+                self.write_ops.append([(selector, 0, mask, 0)])
+                if selector not in fully_written and selector not in self.read_before_write:
+                    self.read_before_write.append(selector)
+            else:
+                self.read_ops.append((add_selector(reg), None, 0, 0xffffffff))
+                self.write_ops.append([(reg, 0, 0xffffffff, 0)])
+                fully_written.add(reg)
+    
+    def extract(self, values):
+        """! @brief Build the list of requested register values from the selector values."""
+        results = []
+        for index, high_index, shift, mask in self.read_ops:
+            value = (values[index] >> shift) & mask
+            if high_index is not None:
+                value |= values[high_index] << 32
+            results.append(value)
+        return results
+    
+    def merge(self, data_list, current_values):
+        """! @brief Compute the values to write for each DCRSR register number.
+        
+        @param self This object.
+        @param data_list Values for the requested registers.
+        @param current_values Dict of current values for the registers in #read_before_write.
+        @return List of (DCRSR register number, value) pairs, with each register number
+            appearing once in order of first use.
+        """
+        values = dict(current_values)
+        order = []
+        for ops, data in zip(self.write_ops, data_list):
+            for selector, data_shift, data_mask, field_shift in ops:
+                field_mask = data_mask << field_shift
+                field = ((data >> data_shift) & data_mask) << field_shift
+                if selector not in values:
+                    order.append(selector)
+                    values[selector] = field
+                else:
+                    if selector not in order:
+                        order.append(selector)
+                    values[selector] = (values[selector] & ~field_mask & 0xffffffff) | field
+        return [(selector, values[selector]) for selector in order]
+
 class CortexM(Target, CoreSightCoreComponent):
     """! @brief CoreSight component for a v6-M or v7-M Cortex-M core.
     
@@ -274,6 +399,9 @@ class CortexM(Target, CoreSightCoreComponent):
     S_LOCKUP = (1 << 19)
     S_RETIRE_ST = (1 << 24)
     S_RESET_ST = (1 << 25)
+    
+    ## Maximum time in seconds to wait for a DHCSR condition before rechecking the core state.
+    DHCSR_POLL_INTERVAL = 0.01
 
     # Debug Core Register Data Register
     DCRDR = 0xE000EDF8
@@ -543,10 +671,14 @@ class CortexM(Target, CoreSightCoreComponent):
 
         self.target_xml = b'<?xml version="1.0"?><!DOCTYPE feature SYSTEM "gdb-target.dtd">' + tostring(xml_root)
 
+    def _read_id_register(self, addr):
+        """! @brief Read a read-only identification register, possibly from the discovery cache."""
+        return self.ap.read_id_block32(addr, 1)[0]
+
     def _read_core_type(self):
         """! @brief Read the CPUID register and determine core type and architecture."""
         # Read CPUID register
-        cpuid = self.read32(CortexM.CPUID)
+        cpuid = self._read_id_register(CortexM.CPUID)
 
         implementer = (cpuid & CortexM.CPUID_IMPLEMENTER_MASK) >> CortexM.CPUID_IMPLEMENTER_POS
         if implementer != CortexM.CPUID_IMPLEMENTER_ARM:
@@ -576,24 +708,16 @@ class CortexM(Target, CoreSightCoreComponent):
             self.has_fpu = False
             return
 
-        originalCpacr = self.read32(CortexM.CPACR)
-        cpacr = originalCpacr | CortexM.CPACR_CP10_CP11_MASK
-        self.write32(CortexM.CPACR, cpacr)
-
-        cpacr = self.read32(CortexM.CPACR)
-        self.has_fpu = (cpacr & CortexM.CPACR_CP10_CP11_MASK) != 0
-
-        # Restore previous value.
-        self.write32(CortexM.CPACR, originalCpacr)
+        self.has_fpu = self.ap.discover("fpu", self._test_for_fpu)
 
         if self.has_fpu:
             # Now check whether double-precision is supported.
             # (Minimal tests to distinguish current permitted ARMv7-M and
             # ARMv8-M FPU types; used for printing only).
-            mvfr0 = self.read32(CortexM.MVFR0)
+            mvfr0 = self._read_id_register(CortexM.MVFR0)
             dp_val = (mvfr0 & CortexM.MVFR0_DOUBLE_PRECISION_MASK) >> CortexM.MVFR0_DOUBLE_PRECISION_SHIFT
 
-            mvfr2 = self.read32(CortexM.MVFR2)
+            mvfr2 = self._read_id_register(CortexM.MVFR2)
             vfp_misc_val = (mvfr2 & CortexM.MVFR2_VFP_MISC_MASK) >> CortexM.MVFR2_VFP_MISC_SHIFT
 
             if dp_val >= 2:
@@ -604,6 +728,21 @@ class CortexM(Target, CoreSightCoreComponent):
                 fpu_type = "FPv4-SP"
             LOG.info("FPU present: " + fpu_type)
 
+    def _test_for_fpu(self):
+        """! @brief Check whether the CPACR CP10 and CP11 fields are writable.
+        @return Boolean indicating whether an FPU is present.
+        """
+        originalCpacr = self.read32(CortexM.CPACR)
+        cpacr = originalCpacr | CortexM.CPACR_CP10_CP11_MASK
+        self.write32(CortexM.CPACR, cpacr)
+
+        cpacr = self.read32(CortexM.CPACR)
+
+        # Restore previous value.
+        self.write32(CortexM.CPACR, originalCpacr)
+
+        return (cpacr & CortexM.CPACR_CP10_CP11_MASK) != 0
+
     def write_memory(self, addr, value, transfer_size=32):
         """! @brief Write a single memory location.
         
@@ -625,16 +764,16 @@ class CortexM(Target, CoreSightCoreComponent):
         else:
             return read_memory_cb
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_bytes(self, addr, size):
         """! @brief Read a block of unaligned bytes in memory.
-        @return an array of byte values
+        @return A bytearray of the data.
         """
-        data = self.ap.read_memory_block8(addr, size)
+        data = self.ap.read_memory_bytes(addr, size)
         return self.bp_manager.filter_memory_unaligned_8(addr, size, data)
 
-    def write_memory_block8(self, addr, data):
-        """! @brief Write a block of unaligned bytes in memory."""
-        self.ap.write_memory_block8(addr, data)
+    def write_memory_bytes(self, addr, data):
+        """! @brief Write a block of unaligned bytes in memory from a buffer."""
+        self.ap.write_memory_bytes(addr, data)
 
     def write_memory_block32(self, addr, data):
         """! @brief Write an aligned block of 32-bit words."""
@@ -645,6 +784,20 @@ class CortexM(Target, CoreSightCoreComponent):
         data = self.ap.read_memory_block32(addr, size)
         return self.bp_manager.filter_memory_aligned_32(addr, size, data)
 
+    def read_memory_block32_async(self, addr, size):
+        """! @brief Queue a read of an aligned block of 32-bit words."""
+        return self.ap.read_memory_block32_async(addr, size).then(
+                lambda data: self.bp_manager.filter_memory_aligned_32(addr, size, data))
+
+    def write_memory_block32_bytes(self, addr, data):
+        """! @brief Write an aligned block of 32-bit words from a buffer."""
+        self.ap.write_memory_block32_bytes(addr, data)
+
+    def read_memory_block32_bytes(self, addr, size):
+        """! @brief Read an aligned block of 32-bit words into a bytearray."""
+        data = self.ap.read_memory_block32_bytes(addr, size)
+        return self.bp_manager.filter_memory_unaligned_8(addr, size * 4, data)
+
     def halt(self):
         """! @brief Halt the core
         """
@@ -882,8 +1035,7 @@ class CortexM(Target, CoreSightCoreComponent):
         with timeout.Timeout(2.0) as t_o:
             while t_o.check():
                 try:
-                    dhcsr = self.read32(CortexM.DHCSR)
-                    if (dhcsr & CortexM.S_RESET_ST) == 0:
+                    if self.ap.poll_memory(CortexM.DHCSR, CortexM.S_RESET_ST, 0, self.DHCSR_POLL_INTERVAL):
                         break
                 except exceptions.TransferError:
                     self.flush()
@@ -928,7 +1080,7 @@ class CortexM(Target, CoreSightCoreComponent):
             while t_o.check():
                 if self.get_state() not in (Target.TARGET_RESET, Target.TARGET_RUNNING):
                     break
-                sleep(0.01)
+                self.wait_for_halt(self.DHCSR_POLL_INTERVAL)
 
         # Make sure the thumb bit is set in XPSR in case the reset handler
         # points to an invalid address.
@@ -939,6 +1091,17 @@ class CortexM(Target, CoreSightCoreComponent):
         # Restore to original state.
         self.clear_reset_catch(reset_type)
 
+    def wait_for_halt(self, timeout):
+        """! @brief Wait for the core to halt.
+        
+        DHCSR is polled by the debug probe if it supports it, instead of with a host round trip
+        for each read. Only S_HALT is checked, so callers that also need to detect other states
+        such as lockup should wait with a short timeout and check get_state() between waits.
+        
+        @return Boolean indicating whether the core halted before the timeout expired.
+        """
+        return self.ap.poll_memory(CortexM.DHCSR, CortexM.S_HALT, CortexM.S_HALT, timeout)
+
     def get_state(self):
         dhcsr = self.read_memory(CortexM.DHCSR)
         if dhcsr & CortexM.S_RESET_ST:
@@ -1021,85 +1184,29 @@ class CortexM(Target, CoreSightCoreComponent):
         Read core registers in reg_list and return a list of values.
         If any register in reg_list is a string, find the number
         associated to this register in the lookup table CORE_REGISTER.
+        
+        All registers, including both halves of any double-precision registers, are read
+        with a single flush.
         """
-        # convert to index only
-        reg_list = [register_name_to_index(reg) for reg in reg_list]
-
-        # Sanity check register values
-        for reg in reg_list:
-            if reg not in CORE_REGISTER.values():
-                raise ValueError("unknown reg: %d" % reg)
-            elif is_fpu_register(reg) and (not self.has_fpu):
-                raise ValueError("attempt to read FPU register without FPU")
-
-        # Handle doubles.
-        doubles = [reg for reg in reg_list if is_double_float_register(reg)]
-        hasDoubles = len(doubles) > 0
-        if hasDoubles:
-            originalRegList = reg_list
-            
-            # Strip doubles from reg_list.
-            reg_list = [reg for reg in reg_list if not is_double_float_register(reg)]
-            
-            # Read float regs required to build doubles.
-            singleRegList = []
-            for reg in doubles:
-                singleRegList += (-reg, -reg + 1)
-            singleValues = self.read_core_registers_raw(singleRegList)
-
-        # Begin all reads and writes
-        dhcsr_cb_list = []
+        plan = CoreRegisterAccessPlan.get(reg_list)
+        if plan.uses_fpu and not self.has_fpu:
+            raise ValueError("attempt to read FPU register without FPU")
+        return plan.extract(self._read_dcrsr_registers(plan.selectors))
+
+    def _read_dcrsr_registers(self, selectors):
+        """! @brief Read a list of registers by their DCRSR register numbers."""
+        # Queue all reads. The debugger is so slow compared to the target that S_REGRDY will
+        # always be set by the time DCRDR is read, so DHCSR is only checked once at the end.
         reg_cb_list = []
-        for reg in reg_list:
-            if is_cfbp_subregister(reg):
-                reg = CORE_REGISTER['cfbp']
-            elif is_psr_subregister(reg):
-                reg = CORE_REGISTER['xpsr']
-
-            # write id in DCRSR
-            self.write_memory(CortexM.DCRSR, reg)
-
-            # Technically, we need to poll S_REGRDY in DHCSR here before reading DCRDR. But
-            # we're running so slow compared to the target that it's not necessary.
-            # Read it and assert that S_REGRDY is set
-
-            dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
-            reg_cb = self.read_memory(CortexM.DCRDR, now=False)
-            dhcsr_cb_list.append(dhcsr_cb)
-            reg_cb_list.append(reg_cb)
+        for selector in selectors:
+            self.write_memory(CortexM.DCRSR, selector)
+            reg_cb_list.append(self.read_memory(CortexM.DCRDR, now=False))
+        dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
 
         # Read all results
-        reg_vals = []
-        for reg, reg_cb, dhcsr_cb in zip(reg_list, reg_cb_list, dhcsr_cb_list):
-            dhcsr_val = dhcsr_cb()
-            assert dhcsr_val & CortexM.S_REGRDY
-            val = reg_cb()
-
-            # Special handling for registers that are combined into a single DCRSR number.
-            if is_cfbp_subregister(reg):
-                val = (val >> ((-reg - 1) * 8)) & 0xff
-            elif is_psr_subregister(reg):
-                val &= sysm_to_psr_mask(reg)
-
-            reg_vals.append(val)
-        
-        # Merge double regs back into result list.
-        if hasDoubles:
-            results = []
-            for reg in originalRegList:
-                # Double
-                if is_double_float_register(reg):
-                    doubleIndex = doubles.index(reg)
-                    singleLow = singleValues[doubleIndex * 2]
-                    singleHigh = singleValues[doubleIndex * 2 + 1]
-                    double = (singleHigh << 32) | singleLow
-                    results.append(double)
-                # Other register
-                else:
-                    results.append(reg_vals[reg_list.index(reg)])
-            reg_vals = results
-
-        return reg_vals
+        values = [reg_cb() for reg_cb in reg_cb_list]
+        assert dhcsr_cb() & CortexM.S_REGRDY
+        return values
 
     def write_core_register(self, reg, data):
         """! @brief Write a CPU register.
@@ -1128,72 +1235,32 @@ class CortexM(Target, CoreSightCoreComponent):
         Write core registers in reg_list with the associated value in
         data_list.  If any register in reg_list is a string, find the number
         associated to this register in the lookup table CORE_REGISTER.
+        
+        Writes of CFBP or xPSR subregisters are merged with the current register value, which
+        is read first unless the whole register is also written. Each DCRSR register is written
+        once with its final value.
         """
         assert len(reg_list) == len(data_list)
-        # convert to index only
-        reg_list = [register_name_to_index(reg) for reg in reg_list]
+        plan = CoreRegisterAccessPlan.get(reg_list)
+        if plan.uses_fpu and not self.has_fpu:
+            raise ValueError("attempt to write FPU register without FPU")
 
-        # Sanity check register values
-        for reg in reg_list:
-            if reg not in CORE_REGISTER.values():
-                raise ValueError("unknown reg: %d" % reg)
-            elif is_fpu_register(reg) and (not self.has_fpu):
-                raise ValueError("attempt to write FPU register without FPU")
-
-        # Read special register if it is present in the list and
-        # convert doubles to single float register writes.
-        cfbpValue = None
-        xpsrValue = None
-        reg_data_list = []
-        for reg, data in zip(reg_list, data_list):
-            if is_double_float_register(reg):
-                # Replace double with two single float register writes. For instance,
-                # a write of D2 gets converted to writes to S4 and S5.
-                singleLow = data & 0xffffffff
-                singleHigh = (data >> 32) & 0xffffffff
-                reg_data_list += [(-reg, singleLow), (-reg + 1, singleHigh)]
-            elif is_cfbp_subregister(reg) and cfbpValue is None:
-                cfbpValue = self.read_core_register_raw(CORE_REGISTER['cfbp'])
-            elif is_psr_subregister(reg) and xpsrValue is None:
-                xpsrValue = self.read_core_register_raw(CORE_REGISTER['xpsr'])
-            else:
-                # Other register, just copy directly.
-                reg_data_list.append((reg, data))
-        
-        # Write out registers
-        dhcsr_cb_list = []
-        for reg, data in reg_data_list:
-            if is_cfbp_subregister(reg):
-                # Mask in the new special register value so we don't modify the other register
-                # values that share the same DCRSR number.
-                shift = (-reg - 1) * 8
-                mask = 0xffffffff ^ (0xff << shift)
-                data = (cfbpValue & mask) | ((data & 0xff) << shift)
-                cfbpValue = data # update special register for other writes that might be in the list
-                reg = CORE_REGISTER['cfbp']
-            elif is_psr_subregister(reg):
-                mask = sysm_to_psr_mask(reg)
-                data = (xpsrValue & (0xffffffff ^ mask)) | (data & mask)
-                xpsrValue = data
-                reg = CORE_REGISTER['xpsr']
+        current_values = {}
+        if plan.read_before_write:
+            current_values = dict(zip(plan.read_before_write,
+                                    self._read_dcrsr_registers(plan.read_before_write)))
 
+        # Write out registers
+        for selector, data in plan.merge(data_list, current_values):
             # write DCRDR
             self.write_memory(CortexM.DCRDR, data)
 
             # write id in DCRSR and flag to start write transfer
-            self.write_memory(CortexM.DCRSR, reg | CortexM.DCRSR_REGWnR)
-
-            # Technically, we need to poll S_REGRDY in DHCSR here to ensure the
-            # register write has completed.
-            # Read it and assert that S_REGRDY is set
-            dhcsr_cb = self.read_memory(CortexM.DHCSR, now=False)
-            dhcsr_cb_list.append(dhcsr_cb)
-
-        # Make sure S_REGRDY was set for all register
-        # writes
-        for dhcsr_cb in dhcsr_cb_list:
-            dhcsr_val = dhcsr_cb()
-            assert dhcsr_val & CortexM.S_REGRDY
+            self.write_memory(CortexM.DCRSR, selector | CortexM.DCRSR_REGWnR)
+
+        # Make sure S_REGRDY is set after the final register write.
+        dhcsr_val = self.read_memory(CortexM.DHCSR)
+        assert dhcsr_val & CortexM.S_REGRDY
 
     def set_breakpoint(self, addr, type=Target.BREAKPOINT_AUTO):
         """! @brief Set a hardware or software breakpoint at a specific location in memory.
@@ -75,7 +75,7 @@ class CortexM_v8M(CortexM):
     def _read_core_type(self):
         """! @brief Read the CPUID register and determine core type and architecture."""
         # Read CPUID register
-        cpuid = self.read32(CortexM.CPUID)
+        cpuid = self._read_id_register(CortexM.CPUID)
 
         implementer = (cpuid & CortexM.CPUID_IMPLEMENTER_MASK) >> CortexM.CPUID_IMPLEMENTER_POS
         if implementer != CortexM.CPUID_IMPLEMENTER_ARM:
@@ -87,7 +87,7 @@ class CortexM_v8M(CortexM):
         self.cpu_revision = (cpuid & CortexM.CPUID_VARIANT_MASK) >> CortexM.CPUID_VARIANT_POS
         self.cpu_patch = (cpuid & CortexM.CPUID_REVISION_MASK) >> CortexM.CPUID_REVISION_POS
         
-        pfr1 = self.read32(self.PFR1)
+        pfr1 = self._read_id_register(self.PFR1)
         self.has_security_extension = ((pfr1 & self.PFR1_SECURITY_MASK) >> self.PFR1_SECURITY_SHIFT) == 1
         
         if self.core_type in CORE_TYPE_NAME:
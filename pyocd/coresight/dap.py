@@ -17,6 +17,7 @@
 from ..core import exceptions
 from ..probe.debug_probe import DebugProbe
 from .ap import (MEM_AP_CSW, APSEL, APBANKSEL, APREG_MASK, AccessPort)
+from ..utility.future import TransferFuture
 from ..utility.sequencer import CallSequence
 import logging
 import logging.handlers
@@ -80,6 +81,7 @@ class DebugPort(object):
         self.target = target
         self.valid_aps = None
         self.aps = {}
+        self.discovery_cache = None
         self._access_number = 0
 
     @property
@@ -110,6 +112,8 @@ class DebugPort(object):
             
         # Connect using the selected protocol.
         self.link.connect(protocol)
+        for ap in self.aps.values():
+            ap.invalidate_cache()
 
         # Log the actual protocol if selected was default.
         if protocol == DebugProbe.Protocol.DEFAULT:
@@ -233,7 +237,7 @@ class DebugPort(object):
     def flush(self):
         try:
             self.link.flush()
-        except exceptions.ProbeError as error:
+        except (exceptions.ProbeError, exceptions.TransferError) as error:
             self._handle_error(error, self.next_access_number)
             raise
 
@@ -413,8 +417,40 @@ class DebugPort(object):
             TRACE.debug("read_ap:%06d (addr=0x%08x) -> ...", num, addr)
             return read_ap_cb
 
+    def read_dp_async(self, addr):
+        """! @brief Queue a DP register read.
+        @return TransferFuture for the register's value.
+        """
+        return TransferFuture(self.read_dp(addr, now=False))
+
+    def read_ap_async(self, addr):
+        """! @brief Queue an AP register read.
+        @return TransferFuture for the register's value.
+        """
+        return TransferFuture(self.read_ap(addr, now=False))
+
+    def poll_ap(self, addr, mask, value, timeout):
+        """! @brief Wait until the masked value of an AP register matches.
+        @return Boolean indicating whether the value matched before the timeout expired.
+        """
+        assert type(addr) in (six.integer_types)
+        num = self.next_access_number
+
+        try:
+            result = self.link.poll_ap(addr, mask, value, timeout)
+        except exceptions.ProbeError as error:
+            self._handle_error(error, num)
+            raise
+
+        TRACE.debug("poll_ap:%06d (addr=0x%08x, mask=0x%08x, value=0x%08x) -> %s", num, addr,
+            mask, value, result)
+        return result
+
     def _handle_error(self, error, num):
         TRACE.debug("error:%06d %s", num, error)
+        # The error may be from a deferred transfer, so the APs' cached registers can't be trusted.
+        for ap in self.aps.values():
+            ap.invalidate_cache()
         # Clear sticky error for fault errors.
         if isinstance(error, exceptions.TransferFaultError):
             self.clear_sticky_err()
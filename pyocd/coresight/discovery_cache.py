@@ -0,0 +1,176 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import logging
+
+from ..core import exceptions
+from .rom_table import (CIDR0, CIDR0_OFFSET, IDR_READ_COUNT, IDR_READ_START)
+
+LOG = logging.getLogger(__name__)
+
+## Default directory for the discovery cache files if the discovery_cache.dir option is not set.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pyocd", "discovery_cache")
+
+class DiscoveryCache(object):
+    """! @brief On-disk cache of the values read during CoreSight discovery.
+
+    Walking ROM tables and identifying components and cores reads many ID registers, which is
+    slow for devices with deep ROM tables. With the cache enabled, these reads go through
+    AccessPort.discover(), which returns the value recorded in a previous session instead of
+    accessing the target. The component graph is then rebuilt by the usual discovery code from the
+    cached values, so that side effects of discovery such as powering up debug domains still take
+    place.
+
+    Each board has its own cache file, named for the board's unique ID. The cached values are only
+    used if the DP IDCODE and the IDRs of all APs, which are read on every connect, match those
+    recorded in the file, and the CIDR registers of the first ROM table read back the same as when
+    they were cached. Otherwise discovery reads from the target and the cache file is replaced.
+
+    The cache is disabled by default, and is enabled with the `discovery_cache` session option.
+    """
+
+    ## Version of the cache file format.
+    VERSION = 1
+
+    def __init__(self, path, key):
+        """! @brief Constructor.
+
+        @param self
+        @param path Path of the cache file. The file does not have to exist.
+        @param key String identifying the DP and APs. Cached values are ignored if the key in the
+            file doesn't match.
+        """
+        self._path = path
+        self._key = key
+        self._values = self._load()
+        self._is_modified = False
+
+    @classmethod
+    def for_target(cls, target):
+        """! @brief Create the cache for a target if enabled by the session options.
+
+        The target's APs must have been created.
+
+        @return A DiscoveryCache instance, or None if the cache is disabled.
+        """
+        session = target.session
+        if not session.options.get('discovery_cache') or session.probe is None:
+            return None
+        cache_dir = session.options.get('discovery_cache.dir') or DEFAULT_CACHE_DIR
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', session.board.unique_id) + ".json"
+        key = "dp=%08x" % target.dp.dpidr
+        for ap_num in sorted(target.dp.aps):
+            key += ":ap%d=%08x" % (ap_num, target.dp.aps[ap_num].idr)
+        cache = cls(os.path.join(os.path.expanduser(cache_dir), filename), key)
+        cache.validate(target.dp.aps.values())
+        return cache
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def is_empty(self):
+        return not self._values
+
+    def validate(self, aps):
+        """! @brief Check the cached values against the target.
+
+        The CIDR registers of the first AP's ROM table are read and compared with the cached
+        values. If they don't match, or the read fails, all cached values are dropped.
+
+        @param self
+        @param aps Iterable of the target's AccessPort objects.
+        """
+        if not self._values:
+            return
+        for ap in sorted(aps, key=lambda ap: ap.ap_num):
+            if not ap.has_rom_table:
+                continue
+            name = self.block_name(ap, ap.rom_addr + IDR_READ_START, IDR_READ_COUNT)
+            cached = self._values.get(name)
+            try:
+                cidr = ap.read_memory_block32(ap.rom_addr + CIDR0, 4)
+            except exceptions.TransferError as err:
+                LOG.debug("Failed to read ROM table CIDR for discovery cache validation: %s", err)
+                cidr = None
+            if (cached is None) or (cidr != cached[CIDR0_OFFSET:CIDR0_OFFSET + 4]):
+                LOG.info("Discovery cache does not match the target; discarding it")
+                self._values = {}
+            return
+
+    def get(self, name, fn):
+        """! @brief Return a cached value, calling _fn_ to read and cache it if it isn't cached.
+
+        @param self
+        @param name Unique name of the value.
+        @param fn Callable that reads the value from the target. The return value must be
+            serializable as JSON.
+        """
+        try:
+            return self._values[name]
+        except KeyError:
+            value = fn()
+            self._values[name] = value
+            self._is_modified = True
+            return value
+
+    @staticmethod
+    def block_name(ap, addr, count):
+        """! @brief Return the name under which a block of memory read through an AP is cached."""
+        return "ap%d.mem:%08x:%d" % (ap.ap_num, addr, count)
+
+    def save(self):
+        """! @brief Write the cache file if any values were added.
+
+        The file is written to a temporary file that is then renamed, so readers never see a
+        partially written file. Errors are logged but not raised, since the cache is optional.
+        """
+        if not self._is_modified:
+            return
+        temp_path = self._path + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self._path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'key': self._key, 'values': self._values}, f)
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temp_path, self._path)
+            self._is_modified = False
+        except (IOError, OSError) as err:
+            LOG.warning("Failed to write discovery cache file %s: %s", self._path, err)
+
+    def _load(self):
+        """! @brief Read the cache file.
+        @return Dict of cached values, which is empty if the file's key doesn't match.
+        """
+        try:
+            with open(self._path, 'r') as f:
+                contents = json.load(f)
+        except (IOError, OSError):
+            return {}
+        except ValueError as err:
+            LOG.warning("Ignoring invalid discovery cache file %s: %s", self._path, err)
+            return {}
+        if not isinstance(contents, dict) or contents.get('version') != self.VERSION \
+                or contents.get('key') != self._key:
+            return {}
+        return contents.get('values', {})
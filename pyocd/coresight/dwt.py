@@ -71,6 +71,9 @@ class DWT(CoreSightComponent):
     DWT_CTRL_POSTRESET_MASK = (0xF << 1)
     DWT_CTRL_POSTRESET_SHIFT = 1
     DWT_CTRL_CYCCNTENA_MASK = (1 << 0)
+    
+    ## Value read from DWT_PCSR when no PC sample is available.
+    PCSR_NO_SAMPLE = 0xFFFFFFFF
 
     WATCH_TYPE_TO_FUNCT = {
                             Target.WATCHPOINT_READ: 5,
@@ -188,6 +191,22 @@ class DWT(CoreSightComponent):
     def cycle_count(self, value):
         self.ap.write32(self.address + self.DWT_CYCCNT, value)
 
+    def read_pc_samples(self, count):
+        """! @brief Read the PC sample register repeatedly.
+        
+        All reads are queued before any result is resolved, so that the samples are taken in one
+        burst of transfers with as little time between them as the probe allows. Reading the PC
+        sample register does not affect the running core.
+        
+        @param self
+        @param count Number of samples to read.
+        @return List of sampled PC values. A value of #PCSR_NO_SAMPLE indicates that no sample
+            was available, for instance because the core is halted.
+        """
+        pcsr = self.address + self.DWT_PCSR
+        results = [self.ap.read32(pcsr, now=False) for _ in range(count)]
+        return [result() for result in results]
+
 class DWTv2(DWT):
     """! @brief Data Watchpoint and Trace version 2.x
     
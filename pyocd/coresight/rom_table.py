@@ -130,7 +130,7 @@ class CoreSightComponentID(object):
     def read_id_registers(self):
         """! @brief Read Component ID, Peripheral ID, and DEVID/DEVARCH registers."""
         # Read registers as a single block read for performance reasons.
-        regs = self.ap.read_memory_block32(self.top_address + IDR_READ_START, IDR_READ_COUNT)
+        regs = self.ap.read_id_block32(self.top_address + IDR_READ_START, IDR_READ_COUNT)
         self.cidr = self._extract_id_register_value(regs, CIDR0_OFFSET)
         self.pidr = (self._extract_id_register_value(regs, PIDR4_OFFSET) << 32) | self._extract_id_register_value(regs, PIDR0_OFFSET)
 
@@ -241,7 +241,7 @@ class ROMTable(CoreSightComponent):
         while not foundEnd and entriesRead < ROM_TABLE_MAX_ENTRIES:
             # Read several entries at a time for performance.
             readCount = min(ROM_TABLE_MAX_ENTRIES - entriesRead, ROM_TABLE_ENTRY_READ_COUNT)
-            entries = self.ap.read_memory_block32(entryAddress, readCount)
+            entries = self.ap.read_id_block32(entryAddress, readCount)
             entriesRead += readCount
 
             for entry in entries:
@@ -17,15 +17,16 @@
 from .context import DebugContext
 from ..coresight.cortex_m import (
     CORE_REGISTER,
-    register_name_to_index,
-    is_fpu_register,
+    CoreRegisterAccessPlan,
     is_cfbp_subregister,
     is_psr_subregister,
     sysm_to_psr_mask
 )
 from ..core import exceptions
+from ..core.memory_interface import MemoryInterface
+from ..core.target import Target
 from ..utility import conversion
-from intervaltree import (Interval, IntervalTree)
+from collections import OrderedDict
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -117,17 +118,11 @@ class RegisterCache(object):
             self._run_token = self._core.run_token
 
     def _convert_and_check_registers(self, reg_list):
-        # convert to index only
-        reg_list = [register_name_to_index(reg) for reg in reg_list]
-
-        # Sanity check register values
-        for reg in reg_list:
-            if reg not in CORE_REGISTER.values():
-                raise ValueError("unknown reg: %d" % reg)
-            elif is_fpu_register(reg) and (not self._core.has_fpu):
-                raise ValueError("attempt to read FPU register without FPU")
-
-        return reg_list
+        # The access plan converts to indices and validates the register list.
+        plan = CoreRegisterAccessPlan.get(reg_list)
+        if plan.uses_fpu and (not self._core.has_fpu):
+            raise ValueError("attempt to read FPU register without FPU")
+        return plan.reg_list
 
     def read_core_registers_raw(self, reg_list):
         self._check_cache()
@@ -173,13 +168,13 @@ class RegisterCache(object):
                 self._cache[r] = v & sysm_to_psr_mask(r)
 
         # Build the results list in the same order as requested registers.
+        read_values = dict(zip(read_list, values))
         results = []
         for r in reg_list:
             if r in cached_set:
                 results.append(self._cache[r])
             else:
-                i = read_list.index(r)
-                v = values[i]
+                v = read_values[r]
                 results.append(v)
                 self._cache[r] = v
 
@@ -215,14 +210,63 @@ class RegisterCache(object):
     def invalidate(self):
         self._reset_cache()
 
+class _CacheLine(object):
+    """! @brief One line of cached target memory.
+    
+    A line normally covers line_size bytes starting at an address aligned to the line size. Lines at
+    the edges of a memory region that is not aligned to the line size are clipped to the region.
+    
+    The dirty range is stored as a pair of offsets into the line's data. Because a line is always
+    fully valid, writing back everything between the first and last modified bytes is safe.
+    """
+    
+    def __init__(self, start, data, region):
+        self.start = start
+        self.data = data
+        self.region = region
+        self.dirty_begin = None
+        self.dirty_end = None
+
+    @property
+    def end(self):
+        return self.start + len(self.data)
+
+    @property
+    def is_dirty(self):
+        return self.dirty_begin is not None
+
+    def mark_dirty(self, begin, end):
+        if self.dirty_begin is None:
+            self.dirty_begin = begin
+            self.dirty_end = end
+        else:
+            self.dirty_begin = min(self.dirty_begin, begin)
+            self.dirty_end = max(self.dirty_end, end)
+
+    def clear_dirty(self):
+        self.dirty_begin = None
+        self.dirty_end = None
+
 class MemoryCache(object):
     """! @brief Memory cache.
     
     Maintains a cache of target memory. The constructor is passed a backing DebugContext object that
     will be used to fill the cache.
     
-    The cache is invalidated whenever the target has run since the last cache operation (based on run
-    tokens). If the target is currently running, all accesses cause the cache to be invalidated.
+    Memory is cached in fixed size lines aligned to the line size. Misses are filled a whole line at
+    a time, with runs of adjacent missing lines read in a single access. Lines are kept in least
+    recently used order, and the oldest lines are evicted once the number of cached bytes exceeds
+    the maximum size.
+    
+    When the target has run since the last cache operation (based on run tokens), or is currently
+    running, lines from regions with the `invalidate_cache_on_run` attribute set are discarded. This
+    attribute is false for flash and ROM regions by default, so their lines survive resumes. Flash
+    lines are instead discarded by invalidate_flash() when the flash is programmed or erased.
+    
+    Writes are normally written through to the target. If write-back is enabled, writes to RAM lines
+    only update the cache and mark the line dirty. Dirty lines are written to the target by flush(),
+    when they are evicted, or before an uncached write, with adjacent dirty ranges merged into a
+    single write.
     
     The target's memory map is referenced. All memory accesses must be fully contained within a single
     memory region, or a MemoryAccessError will be raised. However, if an access is outside of all regions,
@@ -230,84 +274,79 @@ class MemoryCache(object):
     region's cacheability flag is honoured.
     """
     
-    def __init__(self, context, core):
+    ## Default size in bytes of a cache line.
+    DEFAULT_LINE_SIZE = 256
+    
+    ## Default maximum number of bytes held in the cache.
+    DEFAULT_MAX_SIZE = 64 * 1024
+
+    def __init__(self, context, core, line_size=DEFAULT_LINE_SIZE, max_size=DEFAULT_MAX_SIZE,
+            write_back=False):
+        """! @brief Constructor.
+        
+        @param self
+        @param context The DebugContext used to access target memory.
+        @param core The core whose run state controls invalidation.
+        @param line_size Size in bytes of each cache line. Must be a power of two.
+        @param max_size Maximum number of bytes to cache. At least one line is always cached.
+        @param write_back Whether writes to RAM are held in the cache until flushed.
+        """
+        if line_size <= 0 or (line_size & (line_size - 1)) != 0:
+            raise ValueError("cache line size must be a power of two")
         self._context = context
         self._core = core
+        self._line_size = line_size
+        self._line_mask = ~(line_size - 1)
+        self._max_lines = max(1, max_size // line_size)
+        self._write_back = write_back
         self._run_token = -1
         self._log = LOG.getChild('memcache')
         self._reset_cache()
 
+    @property
+    def line_size(self):
+        return self._line_size
+
+    @property
+    def max_size(self):
+        return self._max_lines * self._line_size
+
+    @property
+    def write_back(self):
+        return self._write_back
+
     def _reset_cache(self):
-        self._cache = IntervalTree()
+        self._lines = OrderedDict()
         self._metrics = CacheMetrics()
 
     def _check_cache(self):
-        """! @brief Invalidates the cache if appropriate."""
+        """! @brief Invalidates the cache if appropriate.
+        @return Boolean indicating whether the core is running.
+        """
         if self._core.is_running():
             self._log.debug("core is running; invalidating cache")
-            self._reset_cache()
+            self._invalidate_on_run()
+            return True
         elif self._run_token != self._core.run_token:
             self._dump_metrics()
             self._log.debug("out of date run token; invalidating cache")
-            self._reset_cache()
+            self._invalidate_on_run()
             self._run_token = self._core.run_token
+        return False
 
-    def _get_ranges(self, addr, count):
-        """! @brief Splits a memory address range into cached and uncached subranges.
-        @return Returns a 2-tuple with the first element being a set of Interval objects for each
-          of the cached subranges. The second element is a set of Interval objects for each of the
-          non-cached subranges.
-        """
-        cached = self._cache.overlap(addr, addr + count)
-        uncached = {Interval(addr, addr + count)}
-        for cachedIv in cached:
-            newUncachedSet = set()
-            for uncachedIv in uncached:
-
-                # No overlap.
-                if cachedIv.end < uncachedIv.begin or cachedIv.begin > uncachedIv.end:
-                    newUncachedSet.add(uncachedIv)
-                    continue
-
-                # Begin segment.
-                if cachedIv.begin - uncachedIv.begin > 0:
-                    newUncachedSet.add(Interval(uncachedIv.begin, cachedIv.begin))
-
-                # End segment.
-                if uncachedIv.end - cachedIv.end > 0:
-                    newUncachedSet.add(Interval(cachedIv.end, uncachedIv.end))
-            uncached = newUncachedSet
-        return cached, uncached
-
-    def _read_uncached(self, uncached):
-        """! "@brief Reads uncached memory ranges and updates the cache.
-        @return A list of Interval objects is returned. Each Interval has its @a data attribute set
-          to a bytearray of the data read from target memory.
+    def _invalidate_on_run(self):
+        """! @brief Discards lines from regions that may be modified by the core running.
+        
+        Dirty lines in these regions are written to the target first, so writes are not lost.
         """
-        uncachedData = []
-        for uncachedIv in uncached:
-            data = self._context.read_memory_block8(uncachedIv.begin, uncachedIv.end - uncachedIv.begin)
-            iv = Interval(uncachedIv.begin, uncachedIv.end, bytearray(data))
-            self._cache.add(iv) # TODO merge contiguous cached intervals
-            uncachedData.append(iv)
-        return uncachedData
-
-    def _update_metrics(self, cached, uncached, addr, size):
-        cachedSize = 0
-        for iv in cached:
-            begin = iv.begin
-            end = iv.end
-            if iv.begin < addr:
-                begin = addr
-            if iv.end > addr + size:
-                end = addr + size
-            cachedSize += end - begin
-
-        uncachedSize = sum((iv.end - iv.begin) for iv in uncached)
-
-        self._metrics.reads += 1
-        self._metrics.hits += cachedSize
-        self._metrics.misses += uncachedSize
+        dirty = [line for line in self._lines.values()
+                    if line.is_dirty and line.region.invalidate_cache_on_run]
+        if dirty:
+            self._write_dirty_lines(dirty)
+        for key, line in list(self._lines.items()):
+            if line.region.invalidate_cache_on_run:
+                del self._lines[key]
+        self._metrics = CacheMetrics()
 
     def _dump_metrics(self):
         if self._metrics.total > 0:
@@ -317,113 +356,152 @@ class MemoryCache(object):
         else:
             self._log.debug("no reads")
 
-    def _read(self, addr, size):
-        """! @brief Performs a cached read operation of an address range.
-        @return A list of Interval objects sorted by address.
-        """
-        # Get the cached and uncached subranges of the requested read.
-        cached, uncached = self._get_ranges(addr, size)
-        self._update_metrics(cached, uncached, addr, size)
-
-        # Read any uncached ranges.
-        uncachedData = self._read_uncached(uncached)
-
-        # Merged cached with data we just read
-        combined = list(cached) + uncachedData
-        combined.sort(key=lambda x: x.begin)
-        return combined
-
-    def _merge_data(self, combined, addr, size):
-        """! @brief Extracts data from the intersection of an address range across a list of interval objects.
-        
-        The range represented by @a addr and @a size are assumed to overlap the intervals. The first
-        and last interval in the list may have ragged edges not fully contained in the address range, in
-        which case the correct slice of those intervals is extracted.
-        
-        @param self
-        @param combined List of Interval objects forming a contiguous range. The @a data attribute of
-          each interval must be a bytearray.
-        @param addr Start address. Must be within the range of the first interval.
-        @param size Number of bytes. (@a addr + @a size) must be within the range of the last interval.
-        @return A single bytearray object with all data from the intervals that intersects the address
-          range.
-        """
-        result = bytearray()
-        resultAppend = bytearray()
-
-        # Check for fully contained subrange.
-        if len(combined) and combined[0].begin < addr and combined[0].end > addr + size:
-            offset = addr - combined[0].begin
-            endOffset = offset + size
-            result = combined[0].data[offset:endOffset]
-            return result
-        
-        # Take slice of leading ragged edge.
-        if len(combined) and combined[0].begin < addr:
-            offset = addr - combined[0].begin
-            result += combined[0].data[offset:]
-            combined = combined[1:]
-        # Take slice of trailing ragged edge.
-        if len(combined) and combined[-1].end > addr + size:
-            offset = addr + size - combined[-1].begin
-            resultAppend = combined[-1].data[:offset]
-            combined = combined[:-1]
-
-        # Merge.
-        for iv in combined:
-            result += iv.data
-        result += resultAppend
-
-        return result
-
-    def _update_contiguous(self, cached, addr, value):
-        size = len(value)
-        end = addr + size
-        leadBegin = addr
-        leadData = bytearray()
-        trailData = bytearray()
-        trailEnd = end
-
-        if cached[0].begin < addr and cached[0].end > addr:
-            offset = addr - cached[0].begin
-            leadData = cached[0].data[:offset]
-            leadBegin = cached[0].begin
-        if cached[-1].begin < end and cached[-1].end > end:
-            offset = end - cached[-1].begin
-            trailData = cached[-1].data[offset:]
-            trailEnd = cached[-1].end
-
-        self._cache.remove_overlap(addr, end)
-
-        data = leadData + value + trailData
-        self._cache.addi(leadBegin, trailEnd, data)
-
-    def _check_regions(self, addr, count):
-        """! @return A bool indicating whether the given address range is fully contained within
-              one known memory region, and that region is cacheable.
+    def _get_region(self, addr, count):
+        """! @return The memory region fully containing the given address range, if the region is
+              cacheable. None is returned for ranges outside of all regions or in a non-cacheable
+              region.
         @exception MemoryAccessError Raised if the access is not entirely contained within a single region.
         """
         regions = self._core.memory_map.get_intersecting_regions(addr, length=count)
 
         # If no regions matched, then allow an uncached operation.
         if len(regions) == 0:
-            return False
+            return None
 
         # Raise if not fully contained within one region.
         if len(regions) > 1 or not regions[0].contains_range(addr, length=count):
             raise MemoryAccessError("individual memory accesses must not cross memory region boundaries")
 
-        # Otherwise return whether the region is cacheable.
-        return regions[0].is_cacheable
+        # Otherwise return the region if it is cacheable.
+        return regions[0] if regions[0].is_cacheable else None
+
+    def _get_lines(self, region, addr, size, is_write=False):
+        """! @brief Returns the cache lines covering an address range, filling any missing lines.
+        
+        Runs of adjacent missing lines are read from the target with a single access. For writes,
+        missing lines that are entirely overwritten are allocated without being read, and the hit
+        metrics are not updated.
+        
+        Newly filled lines are added to the cache but nothing is evicted, so the caller can safely
+        modify the returned lines before calling _evict().
+
+        Lines are clipped to the region and stored under their start address, so regions that
+        share a line-sized block of the address space each have their own line.
+        
+        @return List of _CacheLine objects sorted by address.
+        """
+        end = addr + size
+        region_end = region.end + 1
+        first = addr & self._line_mask
+        lines = []
+        missing = []
+        for key in range(first, end, self._line_size):
+            line_start = max(key, region.start)
+            line = self._lines.get(line_start)
+            if line is not None:
+                # Move the line to the most recently used end.
+                self._lines[line_start] = self._lines.pop(line_start)
+                if not is_write:
+                    self._metrics.hits += min(end, line.end) - max(addr, line.start)
+            else:
+                line_end = min(key + self._line_size, region_end)
+                if is_write and addr <= line_start and line_end <= end:
+                    line = _CacheLine(line_start, bytearray(line_end - line_start), region)
+                    self._lines[line_start] = line
+                else:
+                    missing.append(len(lines))
+                    if not is_write:
+                        self._metrics.misses += min(end, line_end) - max(addr, line_start)
+            lines.append(line)
+
+        # Read runs of contiguous missing lines.
+        while missing:
+            run_length = 1
+            while run_length < len(missing) and missing[run_length] == missing[0] + run_length:
+                run_length += 1
+            run = missing[:run_length]
+            missing = missing[run_length:]
+
+            run_start = max(first + run[0] * self._line_size, region.start)
+            run_end = min(first + (run[-1] + 1) * self._line_size, region_end)
+            data = self._context.read_memory_bytes(run_start, run_end - run_start)
+            for index in run:
+                key = first + index * self._line_size
+                line_start = max(key, region.start)
+                line_end = min(key + self._line_size, region_end)
+                line = _CacheLine(line_start,
+                    bytearray(data[line_start - run_start:line_end - run_start]), region)
+                self._lines[line_start] = line
+                lines[index] = line
+
+        if not is_write:
+            self._metrics.reads += 1
+        return lines
+
+    def _get_cached_lines(self, region, addr, size):
+        """! @return List of the already cached lines that overlap an address range."""
+        lines = []
+        for key in range(addr & self._line_mask, addr + size, self._line_size):
+            line = self._lines.get(max(key, region.start))
+            if line is not None:
+                lines.append(line)
+        return lines
+
+    def _update_lines(self, lines, addr, value, dirty=False):
+        """! @brief Copies write data into the parts of cache lines it overlaps."""
+        end = addr + len(value)
+        for line in lines:
+            begin = max(addr, line.start)
+            stop = min(end, line.end)
+            if begin >= stop:
+                continue
+            line.data[begin - line.start:stop - line.start] = value[begin - addr:stop - addr]
+            if dirty:
+                line.mark_dirty(begin - line.start, stop - line.start)
+
+    def _evict(self):
+        """! @brief Removes least recently used lines until the cache is within its size limit."""
+        evicted = []
+        while len(self._lines) > self._max_lines:
+            _, line = self._lines.popitem(last=False)
+            if line.is_dirty:
+                evicted.append(line)
+        if evicted:
+            self._write_dirty_lines(evicted)
+
+    def _write_dirty_lines(self, lines):
+        """! @brief Writes the dirty ranges of lines to the target.
+        
+        Dirty ranges that are adjacent in memory are coalesced into a single write.
+        """
+        spans = []
+        for line in sorted(lines, key=lambda x: x.start):
+            begin = line.start + line.dirty_begin
+            data = line.data[line.dirty_begin:line.dirty_end]
+            if spans and spans[-1][0] + len(spans[-1][1]) == begin:
+                spans[-1][1] += data
+            else:
+                spans.append([begin, data])
+            line.clear_dirty()
+
+        try:
+            for begin, data in spans:
+                self._metrics.writes += len(data)
+                self._context.write_memory_bytes(begin, data)
+        except exceptions.Error:
+            # The target's contents are now unknown, so don't keep any of the lines.
+            for line in lines:
+                self._lines.pop(line.start, None)
+            raise
 
     def read_memory(self, addr, transfer_size=32, now=True):
         # TODO use more optimal underlying read_memory call
         if transfer_size == 8:
-            data = self.read_memory_block8(addr, 1)[0]
+            data = self.read_memory_bytes(addr, 1)[0]
         elif transfer_size == 16:
-            data = conversion.byte_list_to_u16le_list(self.read_memory_block8(addr, 2))[0]
+            data = conversion.byte_list_to_u16le_list(self.read_memory_bytes(addr, 2))[0]
         elif transfer_size == 32:
-            data = conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, 4))[0]
+            data = conversion.byte_list_to_u32le_list(self.read_memory_bytes(addr, 4))[0]
 
         if now:
             return data
@@ -432,73 +510,99 @@ class MemoryCache(object):
                 return data
             return read_cb
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_bytes(self, addr, size):
         if size <= 0:
-            return []
+            return bytearray()
 
         self._check_cache()
 
         # Validate memory regions.
-        if not self._check_regions(addr, size):
+        region = self._get_region(addr, size)
+        if region is None:
             self._log.debug("range [%x:%x] is not cacheable", addr, addr+size)
-            return self._context.read_memory_block8(addr, size)
+            return self._context.read_memory_bytes(addr, size)
 
-        # Get the cached and uncached subranges of the requested read.
-        combined = self._read(addr, size)
+        # Copy the requested range out of the lines before anything can be evicted.
+        end = addr + size
+        result = bytearray()
+        for line in self._get_lines(region, addr, size):
+            result += line.data[max(addr, line.start) - line.start:min(end, line.end) - line.start]
+        self._evict()
 
-        # Extract data out of combined intervals.
-        result = list(self._merge_data(combined, addr, size))
         assert len(result) == size, "result size ({}) != requested size ({})".format(len(result), size)
         return result
 
+    def read_memory_block8(self, addr, size):
+        return list(self.read_memory_bytes(addr, size))
+
     def read_memory_block32(self, addr, size):
-        return conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, size*4))
+        return conversion.bytes_to_u32le_list(self.read_memory_bytes(addr, size*4))
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self.read_memory_bytes(addr, size*4)
 
     def write_memory(self, addr, value, transfer_size=32):
         if transfer_size == 8:
-            return self.write_memory_block8(addr, [value])
+            return self.write_memory_bytes(addr, bytearray([value]))
         elif transfer_size == 16:
-            return self.write_memory_block8(addr, conversion.u16le_list_to_byte_list([value]))
+            return self.write_memory_bytes(addr, bytearray(conversion.u16le_list_to_byte_list([value])))
         elif transfer_size == 32:
-            return self.write_memory_block8(addr, conversion.u32le_list_to_byte_list([value]))
+            return self.write_memory_bytes(addr, conversion.u32le_list_to_bytes([value]))
 
-    def write_memory_block8(self, addr, value):
-        if len(value) <= 0:
+    def write_memory_bytes(self, addr, value):
+        # Take our own copy of the data so later changes by the caller don't affect the cache.
+        value = bytearray(value)
+        size = len(value)
+        if size <= 0:
             return
 
-        self._check_cache()
+        is_running = self._check_cache()
 
         # Validate memory regions.
-        cacheable = self._check_regions(addr, len(value))
+        region = self._get_region(addr, size)
+        if region is None:
+            # Pending writes must reach the target first, in case this is a peripheral access
+            # that depends on them.
+            self.flush()
+            return self._context.write_memory_bytes(addr, value)
+
+        # Write-back only applies to RAM. Flash and ROM can't be modified with plain writes. While
+        # the core is running, a dirty line would be discarded by the next access, so the data is
+        # written through instead.
+        if self._write_back and not is_running and not (region.is_flash or region.is_rom):
+            self._update_lines(self._get_lines(region, addr, size, is_write=True), addr, value, dirty=True)
+            self._evict()
+            return
 
         # Write to the target first, so if it fails we don't update the cache.
-        result = self._context.write_memory_block8(addr, value)
+        result = self._context.write_memory_bytes(addr, value)
+        self._metrics.writes += size
+        self._update_lines(self._get_cached_lines(region, addr, size), addr, value)
+        return result
 
-        if cacheable:
-            size = len(value)
-            end = addr + size
-            cached = sorted(self._cache.overlap(addr, end), key=lambda x:x.begin)
-            self._metrics.writes += size
+    def write_memory_block8(self, addr, value):
+        return self.write_memory_bytes(addr, value)
 
-            if len(cached):
-                # Write data is entirely within a single cached interval.
-                if addr >= cached[0].begin and end <= cached[0].end:
-                    beginOffset = addr - cached[0].begin
-                    endOffset = beginOffset + size
-                    cached[0].data[beginOffset:endOffset] = value
+    def write_memory_block32(self, addr, data):
+        return self.write_memory_bytes(addr, conversion.u32le_list_to_bytes(data))
 
-                else:
-                    self._update_contiguous(cached, addr, bytearray(value))
-            else:
-                # No cached data in this range, so just add the entire interval.
-                self._cache.addi(addr, end, bytearray(value))
+    def write_memory_block32_bytes(self, addr, data):
+        return self.write_memory_bytes(addr, data)
 
-        return result
+    def flush(self):
+        """! @brief Writes all dirty lines to the target."""
+        dirty = [line for line in self._lines.values() if line.is_dirty]
+        if dirty:
+            self._write_dirty_lines(dirty)
 
-    def write_memory_block32(self, addr, data):
-        return self.write_memory_block8(addr, conversion.u32le_list_to_byte_list(data))
+    def invalidate_flash(self):
+        """! @brief Discards all lines from flash regions."""
+        for key, line in list(self._lines.items()):
+            if line.region.is_flash:
+                del self._lines[key]
 
     def invalidate(self):
+        """! @brief Discards all cached data, including unwritten dirty lines."""
         self._reset_cache()
 
 class CachingDebugContext(DebugContext):
@@ -507,7 +611,27 @@ class CachingDebugContext(DebugContext):
     def __init__(self, parent):
         super(CachingDebugContext, self).__init__(parent)
         self._regcache = RegisterCache(parent, self.core)
-        self._memcache = MemoryCache(parent, self.core)
+
+        session = self.core.session
+        self._memcache = MemoryCache(parent, self.core,
+                                    line_size=session.options.get('memcache.line_size'),
+                                    max_size=session.options.get('memcache.max_size'),
+                                    write_back=session.options.get('memcache.write_back'))
+
+        # Subscribe to notifications that affect the memory cache.
+        session.subscribe(self._pre_run_handler,
+                    (Target.EVENT_PRE_RUN, Target.EVENT_PRE_RESET, Target.EVENT_PRE_DISCONNECT))
+        session.subscribe(self._flash_program_handler,
+                    (Target.EVENT_PRE_FLASH_PROGRAM, Target.EVENT_POST_FLASH_PROGRAM))
+
+    def _pre_run_handler(self, notification):
+        # Dirty lines must be written before the core can observe memory.
+        self._memcache.flush()
+
+    def _flash_program_handler(self, notification):
+        if notification.event == Target.EVENT_PRE_FLASH_PROGRAM:
+            self._memcache.flush()
+        self._memcache.invalidate_flash()
 
     def write_memory(self, addr, value, transfer_size=32):
         return self._memcache.write_memory(addr, value, transfer_size)
@@ -527,12 +651,41 @@ class CachingDebugContext(DebugContext):
     def read_memory_block32(self, addr, size):
         return self._memcache.read_memory_block32(addr, size)
 
+    def write_memory_bytes(self, addr, data):
+        return self._memcache.write_memory_bytes(addr, data)
+
+    def read_memory_bytes(self, addr, size):
+        return self._memcache.read_memory_bytes(addr, size)
+
+    def write_memory_block32_bytes(self, addr, data):
+        return self._memcache.write_memory_block32_bytes(addr, data)
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self._memcache.read_memory_block32_bytes(addr, size)
+
+    def read_memory_tolerant(self, addr, size, fault_map=None, fill=0):
+        # Bypass the cache, since a faulting word would cause whole cache line fills to fault.
+        # Dirty lines are written first so the target's memory is up to date.
+        self._memcache.flush()
+        return super(CachingDebugContext, self).read_memory_tolerant(addr, size, fault_map, fill)
+
+    def read_memory_async(self, addr, transfer_size=32):
+        # Use the default implementations so reads go through the cache.
+        return MemoryInterface.read_memory_async(self, addr, transfer_size)
+
+    def read_memory_block32_async(self, addr, size):
+        return MemoryInterface.read_memory_block32_async(self, addr, size)
+
     def read_core_registers_raw(self, reg_list):
         return self._regcache.read_core_registers_raw(reg_list)
 
     def write_core_registers_raw(self, reg_list, data_list):
         return self._regcache.write_core_registers_raw(reg_list, data_list)
 
+    def flush(self):
+        self._memcache.flush()
+        super(CachingDebugContext, self).flush()
+
     def invalidate(self):
         self._regcache.invalidate()
         self._memcache.invalidate()
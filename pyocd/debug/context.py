@@ -81,6 +81,27 @@ class DebugContext(MemoryInterface):
     def read_memory_block32(self, addr, size):
         return self._parent.read_memory_block32(addr, size)
 
+    def write_memory_bytes(self, addr, data):
+        return self._parent.write_memory_bytes(addr, data)
+
+    def read_memory_bytes(self, addr, size):
+        return self._parent.read_memory_bytes(addr, size)
+
+    def write_memory_block32_bytes(self, addr, data):
+        return self._parent.write_memory_block32_bytes(addr, data)
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self._parent.read_memory_block32_bytes(addr, size)
+
+    def read_memory_tolerant(self, addr, size, fault_map=None, fill=0):
+        return self._parent.read_memory_tolerant(addr, size, fault_map, fill)
+
+    def read_memory_async(self, addr, transfer_size=32):
+        return self._parent.read_memory_async(addr, transfer_size)
+
+    def read_memory_block32_async(self, addr, size):
+        return self._parent.read_memory_block32_async(addr, size)
+
     def read_core_register(self, reg):
         """! @brief Read CPU register
         
@@ -65,17 +65,23 @@ class FlashReaderContext(DebugContext):
         else:
             return read_memory_cb
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_bytes(self, addr, size):
         matches = self._tree.overlap(addr, addr + size)
         # Must match only one interval (ELF section).
         if len(matches) != 1:
-            return self._parent.read_memory_block8(addr, size)
+            return self._parent.read_memory_bytes(addr, size)
         section = matches.pop().data
         addr -= section.start
         data = section.data[addr:addr + size]
         LOG.debug("read flash data [%x:%x]", section.start + addr, section.start + addr  + size)
-        return list(data)
+        return bytearray(data)
+
+    def read_memory_block8(self, addr, size):
+        return list(self.read_memory_bytes(addr, size))
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self.read_memory_bytes(addr, size * 4)
 
     def read_memory_block32(self, addr, size):
-        return conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, size))
+        return conversion.bytes_to_u32le_list(self.read_memory_block32_bytes(addr, size))
 
@@ -0,0 +1,218 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+from ..core import exceptions
+
+LOG = logging.getLogger(__name__)
+
+class HaltWatch(object):
+    """! @brief Request to be notified when a running core halts.
+
+    Instances are returned by HaltWatcher.watch(). Once the core is seen to be halted, or polling
+    it fails, the watch's event is set, its callback is invoked, and the watch is removed from the
+    watcher. A watch can be used as a context manager that cancels it on exit.
+    """
+
+    def __init__(self, watcher, core, event, callback=None):
+        self._watcher = watcher
+        self._core = core
+        self._event = event
+        self._callback = callback
+        self._halted = False
+        self._error = None
+
+    @property
+    def core(self):
+        """! @brief The core being watched."""
+        return self._core
+
+    @property
+    def event(self):
+        """! @brief threading.Event that is set when the core halts."""
+        return self._event
+
+    @property
+    def is_halted(self):
+        """! @brief Whether the watcher has seen the core halt or failed to poll it."""
+        return self._halted
+
+    @property
+    def error(self):
+        """! @brief The exception raised while polling the core, or None."""
+        return self._error
+
+    def wait(self, timeout=None):
+        """! @brief Wait for the core to halt.
+        @return Boolean indicating whether the core halted before the timeout expired.
+        """
+        self._event.wait(timeout)
+        return self._halted
+
+    def cancel(self):
+        """! @brief Stop watching the core."""
+        self._watcher._remove(self)
+
+    def _signal(self, error=None):
+        self._error = error
+        self._halted = True
+        self._event.set()
+
+    def _notify(self):
+        if self._callback is not None:
+            self._callback(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.cancel()
+
+class HaltWatcher(object):
+    """! @brief Detects when running cores halt, using one background thread per session.
+
+    Callers that resume a core ask the watcher to notify them when it halts, instead of each
+    polling the core's state in their own loop. All cores and gdb connections of a session share
+    the same polling thread. The thread only runs while there are watches.
+
+    Polling backs off exponentially. Just after a watch is added, cores are polled continuously,
+    so a core that soon hits a breakpoint is detected with little latency. The longer the cores
+    run, the longer the thread waits between polls, up to #MAX_POLL_INTERVAL, so a long run
+    leaves the probe mostly idle.
+
+    When a single core is watched and its probe can poll memory itself, such as with CMSIS-DAP
+    value match reads, each poll waits for DHCSR.S_HALT on the probe for up to #MATCH_POLL_TIME.
+    Otherwise DHCSR of each core is read once per poll.
+
+    @code
+    core.resume()
+    with session.halt_watcher.watch(core) as watch:
+        watch.wait()
+    @endcode
+    """
+
+    ## Initial time in seconds between polls after a watch is added.
+    MIN_POLL_INTERVAL = 0.001
+
+    ## Maximum time in seconds between polls.
+    MAX_POLL_INTERVAL = 0.05
+
+    ## Maximum time in seconds that a poll waits for a halt on the probe.
+    MATCH_POLL_TIME = 0.02
+
+    def __init__(self):
+        self._watches = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._reset_backoff = False
+        self._poll_count = 0
+
+    @property
+    def poll_count(self):
+        """! @brief Total number of polls performed, for diagnostics."""
+        return self._poll_count
+
+    def watch(self, core, event=None, callback=None):
+        """! @brief Start watching a core that was resumed.
+
+        @param self
+        @param core The core to watch. It must provide wait_for_halt().
+        @param event Optional threading.Event to set when the core halts. An event may be shared
+            with other sources of wakeup, for instance to wait for either a halt or a user
+            interrupt. A new event is created if not provided.
+        @param callback Optional callable invoked with the HaltWatch when the core halts. It is
+            called on the watcher's thread, without any lock held, so it should only hand off the
+            notification, for instance to an event loop or a worker.
+        @return HaltWatch instance.
+        """
+        watch = HaltWatch(self, core, event if (event is not None) else threading.Event(), callback)
+        with self._condition:
+            self._watches.append(watch)
+            self._reset_backoff = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="halt watcher")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return watch
+
+    def stop(self):
+        """! @brief Cancel all watches and wait for the polling thread to exit."""
+        with self._condition:
+            self._watches = []
+            thread = self._thread
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _remove(self, watch):
+        with self._condition:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _run(self):
+        interval = self.MIN_POLL_INTERVAL
+        while True:
+            with self._condition:
+                if not self._watches:
+                    self._thread = None
+                    return
+                if self._reset_backoff:
+                    self._reset_backoff = False
+                    interval = self.MIN_POLL_INTERVAL
+                # Unique cores, in the order they were added.
+                cores = []
+                for watch in self._watches:
+                    if watch.core not in cores:
+                        cores.append(watch.core)
+
+            results = self._poll(cores)
+
+            with self._condition:
+                done = [watch for watch in self._watches if watch.core in results]
+                for watch in done:
+                    self._watches.remove(watch)
+                    watch._signal(results[watch.core])
+            for watch in done:
+                watch._notify()
+
+            with self._condition:
+                if self._watches and not self._reset_backoff:
+                    self._condition.wait(interval)
+                    interval = min(interval * 2, self.MAX_POLL_INTERVAL)
+
+    def _poll(self, cores):
+        """! @brief Check whether any of the cores halted.
+        @return Dict of the cores that halted or failed, with the exception or None.
+        """
+        self._poll_count += 1
+        timeout = self.MATCH_POLL_TIME if (len(cores) == 1 and self._is_offloaded(cores[0])) else 0
+        results = {}
+        for core in cores:
+            try:
+                if core.wait_for_halt(timeout):
+                    results[core] = None
+            except exceptions.Error as e:
+                LOG.debug("Failed to poll core for halt: %s", e)
+                results[core] = e
+        return results
+
+    @staticmethod
+    def _is_offloaded(core):
+        ap = getattr(core, 'ap', None)
+        return (ap is not None) and getattr(ap, 'is_poll_memory_offloaded', False)
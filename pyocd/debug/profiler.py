@@ -0,0 +1,209 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import logging
+from collections import Counter
+
+from ..core import exceptions
+from ..coresight.dwt import DWT
+from ..utility.timeout import Timeout
+
+LOG = logging.getLogger(__name__)
+
+def _to_str(value):
+    """! @brief Convert a name from the ELF decoders, which may be bytes, to str."""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+class PCProfiler(object):
+    """! @brief Statistical profiler that samples the PC of a running core.
+
+    Samples are read from the DWT PC sample register (DWT_PCSR) over the debug port while the core
+    runs, so no SWO connection is required and the core is never halted. The samples are read in
+    bursts of queued AP reads to get as many samples per second as the probe allows.
+
+    The profiler keeps a histogram of sampled PC values. If an ELF file is provided, each PC is
+    attributed to a function, from the DWARF debug info if present or from the symbol table
+    otherwise, and to a source file and line from the DWARF line table. The profile can be
+    formatted as a flat table or as collapsed stacks, the text format read by flame graph tools.
+    Because only the PC is sampled, collapsed stacks have at most a function and a line frame.
+
+    @code
+    profiler = PCProfiler(session.target.selected_core, session.target.elf)
+    profiler.sample(duration=2.0)
+    print(profiler.format_flat())
+    @endcode
+    """
+
+    ## Number of PC samples read in each burst.
+    BURST_SIZE = 256
+
+    def __init__(self, core, elf=None):
+        """! @brief Constructor.
+        @param self
+        @param core The CortexM core to profile. It must have a DWT.
+        @param elf Optional ELFBinaryFile used to attribute samples to functions and lines.
+        """
+        if core.dwt is None:
+            raise exceptions.TargetError("core #%d does not have a DWT" % core.core_number)
+        self._core = core
+        self._elf = elf
+        self._histogram = Counter()
+        self._missed_count = 0
+        self._locations = {}
+
+    @property
+    def histogram(self):
+        """! @brief Counter mapping sampled PC values to the number of times they were seen."""
+        return self._histogram
+
+    @property
+    def sample_count(self):
+        """! @brief Total number of PC samples collected."""
+        return sum(self._histogram.values())
+
+    @property
+    def missed_count(self):
+        """! @brief Number of reads of DWT_PCSR that did not return a sample.
+
+        This happens while the core is halted or sleeping.
+        """
+        return self._missed_count
+
+    def clear(self):
+        """! @brief Discard all collected samples."""
+        self._histogram.clear()
+        self._missed_count = 0
+
+    def sample(self, duration=None, count=None):
+        """! @brief Collect PC samples.
+
+        Sampling continues until _duration_ has elapsed or _count_ reads of DWT_PCSR have been
+        made, whichever comes first. At least one of the two must be provided. Samples are added to
+        those already collected.
+
+        @param self
+        @param duration Number of seconds to sample for.
+        @param count Number of DWT_PCSR reads to make.
+        @return The number of samples collected by this call.
+        """
+        if duration is None and count is None:
+            raise ValueError("either duration or count must be provided")
+        dwt = self._core.dwt
+        collected = 0
+        remaining = count
+        with Timeout(duration if (duration is not None) else float('inf')) as t_o:
+            while t_o.check() and (remaining is None or remaining > 0):
+                burst = self.BURST_SIZE if (remaining is None) else min(remaining, self.BURST_SIZE)
+                for pc in dwt.read_pc_samples(burst):
+                    if pc == DWT.PCSR_NO_SAMPLE:
+                        self._missed_count += 1
+                    else:
+                        self._histogram[pc] += 1
+                        collected += 1
+                if remaining is not None:
+                    remaining -= burst
+        LOG.debug("Collected %d PC samples", collected)
+        return collected
+
+    def get_location(self, pc):
+        """! @brief Return the function and source line for a PC value.
+        @return Tuple of (function, line) strings. The function is the PC formatted in hex if it
+            can't be attributed to a function. The line is "file:line", or None if unknown.
+        """
+        try:
+            return self._locations[pc]
+        except KeyError:
+            pass
+
+        function = None
+        line = None
+        if self._elf is not None:
+            fninfo = self._elf.address_decoder.get_function_for_address(pc)
+            if fninfo is not None:
+                function = _to_str(fninfo.name)
+            else:
+                syminfo = self._elf.symbol_decoder.get_symbol_for_address(pc)
+                if syminfo is not None:
+                    function = _to_str(syminfo.name)
+            lineinfo = self._elf.address_decoder.get_line_for_address(pc)
+            if lineinfo is not None:
+                path = os.path.join(_to_str(lineinfo.dirname), _to_str(lineinfo.filename))
+                line = "{}:{}".format(path, lineinfo.line)
+        if function is None:
+            function = "0x{:08x}".format(pc)
+
+        self._locations[pc] = (function, line)
+        return function, line
+
+    def get_function_profile(self):
+        """! @brief Return sample counts per function.
+        @return List of (function, count) tuples sorted by decreasing count.
+        """
+        counts = Counter()
+        for pc, count in self._histogram.items():
+            counts[self.get_location(pc)[0]] += count
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def get_line_profile(self):
+        """! @brief Return sample counts per source line.
+        @return List of ((function, line), count) tuples sorted by decreasing count. The line is
+            None for samples that could not be attributed to a line.
+        """
+        counts = Counter()
+        for pc, count in self._histogram.items():
+            counts[self.get_location(pc)] += count
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0][0], item[0][1] or ""))
+
+    def format_flat(self, limit=None, by_line=False):
+        """! @brief Format the profile as a table, with the most sampled entries first.
+        @param self
+        @param limit Optional maximum number of entries to include.
+        @param by_line Whether to list source lines instead of functions.
+        @return String containing the table.
+        """
+        total = self.sample_count
+        if by_line:
+            entries = [("{} ({})".format(function, line or "?"), count)
+                        for (function, line), count in self.get_line_profile()]
+        else:
+            entries = self.get_function_profile()
+        if limit is not None:
+            entries = entries[:limit]
+
+        lines = ["{:>8}  {:>6}  {}".format("Samples", "%", "Line" if by_line else "Function")]
+        for name, count in entries:
+            lines.append("{:>8}  {:>6.2f}  {}".format(count, 100.0 * count / total, name))
+        return "\n".join(lines) + "\n"
+
+    def format_collapsed(self, by_line=False):
+        """! @brief Format the profile as collapsed stacks for flame graph tools.
+
+        Each line holds a stack of frames separated by semicolons, a space, and the number of
+        samples. The stack is the function, followed by the source line if _by_line_ is set.
+
+        @param self
+        @param by_line Whether to add the source line as a frame below the function.
+        @return String containing the collapsed stacks.
+        """
+        if by_line:
+            stacks = [(function if line is None else "{};{}".format(function, line), count)
+                        for (function, line), count in self.get_line_profile()]
+        else:
+            stacks = self.get_function_profile()
+        return "".join("{} {}\n".format(stack, count) for stack, count in stacks)
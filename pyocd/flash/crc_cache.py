@@ -0,0 +1,156 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import json
+import logging
+
+LOG = logging.getLogger(__name__)
+
+## Default directory for the CRC cache files if the flash_crc_cache.dir option is not set.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pyocd", "flash_crc_cache")
+
+class FlashCRCCache(object):
+    """! @brief On-disk cache of the CRC32 of flash pages last programmed through a debug probe.
+
+    Each debug probe has its own cache file, named for the probe's unique ID, holding the page
+    address, size, and CRC32 for each flash region that was programmed through that probe. The
+    FlashBuilder uses the cache to skip pages whose contents have not changed since they were
+    last programmed, without having to read or CRC the whole flash.
+
+    The cache can only reflect programming done by pyOCD. The FlashBuilder checks a few sampled
+    pages against the target before trusting the cache, but flash that is modified by other means
+    may go undetected. For this reason the cache is disabled by default, and is enabled with the
+    `flash_crc_cache` session option.
+    """
+
+    ## Version of the cache file format.
+    VERSION = 1
+
+    def __init__(self, path, region):
+        """! @brief Constructor.
+
+        @param self
+        @param path Path of the cache file. The file does not have to exist.
+        @param region The FlashRegion whose pages are cached.
+        """
+        self._path = path
+        self._key = "%s:0x%08x-0x%08x" % (region.name, region.start, region.end)
+        self._pages = {}
+
+        for addr, size, crc in self._load().get(self._key, []):
+            self._pages[addr] = (size, crc)
+
+    @classmethod
+    def for_flash(cls, flash):
+        """! @brief Create the cache for a flash instance if enabled by the session options.
+        @return A FlashCRCCache instance, or None if the cache is disabled.
+        """
+        session = flash.target.session
+        if not session.options.get('flash_crc_cache') or session.probe is None:
+            return None
+        cache_dir = session.options.get('flash_crc_cache.dir') or DEFAULT_CACHE_DIR
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', session.probe.unique_id) + ".json"
+        return cls(os.path.join(os.path.expanduser(cache_dir), filename), flash.region)
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, addr, size):
+        """! @brief Return the cached CRC32 for a page, or None if the page is not cached."""
+        entry = self._pages.get(addr)
+        if entry is None or entry[0] != size:
+            return None
+        return entry[1]
+
+    def clear(self):
+        """! @brief Forget all cached pages for the region."""
+        self._pages = {}
+
+    def invalidate(self, all_regions=False):
+        """! @brief Remove the region's pages from the cache file before flash is modified.
+
+        This ensures that an interrupted programming operation doesn't leave stale entries behind.
+        The pages remain cached in memory so that entries for unmodified pages are written back by
+        update().
+
+        @param self
+        @param all_regions Whether to remove the entries for every region programmed through the
+            probe. This should be set for a chip erase, since the flash algorithm may erase more
+            than the current region.
+        """
+        if all_regions:
+            self._pages = {}
+            regions = {}
+        else:
+            regions = self._load()
+            regions.pop(self._key, None)
+        self._save(regions)
+
+    def update(self, pages, erased_ranges=()):
+        """! @brief Record the contents of newly programmed pages and save the cache file.
+
+        @param self
+        @param pages Iterable of (address, size, crc) tuples for pages whose contents are known.
+        @param erased_ranges Iterable of (start, end) address ranges that were erased. Cached pages
+            within these ranges are forgotten unless they are in _pages_.
+        """
+        for start, end in erased_ranges:
+            for addr in [a for a in self._pages if start <= a < end]:
+                del self._pages[addr]
+        for addr, size, crc in pages:
+            self._pages[addr] = (size, crc)
+
+        regions = self._load()
+        regions[self._key] = sorted([addr, size, crc] for addr, (size, crc) in self._pages.items())
+        self._save(regions)
+
+    def _load(self):
+        """! @brief Read the cache file.
+        @return Dict mapping region keys to lists of [address, size, crc] entries.
+        """
+        try:
+            with open(self._path, 'r') as f:
+                contents = json.load(f)
+        except (IOError, OSError):
+            return {}
+        except ValueError as err:
+            LOG.warning("Ignoring invalid flash CRC cache file %s: %s", self._path, err)
+            return {}
+        if not isinstance(contents, dict) or contents.get('version') != self.VERSION:
+            return {}
+        return contents.get('regions', {})
+
+    def _save(self, regions):
+        """! @brief Write the cache file.
+
+        The file is written to a temporary file that is then renamed, so readers never see a
+        partially written file. Errors are logged but not raised, since the cache is optional.
+        """
+        temp_path = self._path + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self._path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.VERSION, 'regions': regions}, f)
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temp_path, self._path)
+        except (IOError, OSError) as err:
+            LOG.warning("Failed to write flash CRC cache file %s: %s", self._path, err)
@@ -127,6 +127,9 @@ class Flash(object):
         ## Currently unused, but defined as part of the flash algorithm specification.
         VERIFY = 3
 
+    ## Maximum time in seconds to wait for the target to halt before rechecking its state.
+    COMPLETION_POLL_INTERVAL = 0.1
+
     def __init__(self, target, flash_algo):
         self.target = target
         self.flash_algo = flash_algo
@@ -530,8 +533,9 @@ class Flash(object):
         """!
         @brief Wait until the breakpoint is hit.
         """
+        # Let the probe poll for the halt, and check for other states such as lockup in between.
         while self.target.get_state() == Target.TARGET_RUNNING:
-            pass
+            self.target.wait_for_halt(self.COMPLETION_POLL_INTERVAL)
 
         if self.flash_algo_debug:
             regs = self.target.read_core_registers_raw(list(range(19)) + [20])
@@ -16,15 +16,19 @@
 
 from ..core.target import Target
 from ..core.exceptions import (FlashFailure, FlashProgramFailure)
+from .crc_cache import FlashCRCCache
 from ..utility.notification import Notification
 from ..utility.mask import same
 import logging
-from struct import unpack
+import hashlib
+from struct import (pack, unpack)
 from time import time
 from binascii import crc32
 
 # Number of bytes in a page to read to quickly determine if the page has the same data
 PAGE_ESTIMATE_SIZE = 32
+# Maximum number of pages checked against the target before trusting the CRC cache
+CRC_CACHE_SAMPLE_COUNT = 4
 DATA_TRANSFER_B_PER_S = 40 * 1000 # ~40KB/s, depends on clock speed, theoretical limit for HID is 56,000 B/s
 
 LOG = logging.getLogger(__name__)
@@ -149,16 +153,20 @@ class FlashBuilder(object):
     # Type of flash analysis
     FLASH_ANALYSIS_CRC32 = "CRC32"
     FLASH_ANALYSIS_PARTIAL_PAGE_READ = "PAGE_READ"
+    FLASH_ANALYSIS_CRC_CACHE = "CRC_CACHE"
+    FLASH_ANALYSIS_DELTA = "DELTA"
 
     def __init__(self, flash):
         self.flash = flash
         self.flash_start = flash.region.start
         self.flash_operation_list = []
+        self.previous_operation_list = []
         self.sector_list = []
         self.page_list = []
         self.perf = ProgrammingInfo()
         self.enable_double_buffering = True
         self.log_performance = True
+        self.cleanup_after_program = True
         self.buffered_data_size = 0
         self.program_byte_count = 0
         self.sector_erase_count = 0
@@ -210,6 +218,28 @@ class FlashBuilder(object):
                                operation.addr, operation.addr + len(operation.data)))
             prev_flash_operation = operation
     
+    def add_previous_data(self, addr, data):
+        """! @brief Add a block of the image that was previously programmed.
+
+        Pages whose new data is identical to the previous data are expected to be unchanged on
+        the target. Instead of analyzing each page separately, they are all verified with a single
+        CRC run when programming starts, and only the changed pages are programmed.
+        
+        @param self
+        @param addr Base address of the block of data.
+        @param data Previously programmed data. Should be a list of byte values.
+        
+        @exception ValueError Address range of the data is outside the address range of the flash
+            region associated with the builder.
+        """
+        if len(data) == 0:
+            return
+        if not self.flash.region.contains_range(start=addr, length=len(data)):
+            raise ValueError("Flash address range 0x%x-0x%x is not contained within region '%s'" %
+                (addr, addr + len(data) - 1, self.flash.region.name))
+        self.previous_operation_list.append(_FlashOperation(addr, data))
+        self.previous_operation_list.sort(key=lambda operation: operation.addr)
+    
     def _enable_read_access(self):
         """! @brief Ensure flash is accessible by initing the algo for verify.
         
@@ -257,7 +287,7 @@ class FlashBuilder(object):
                 old_data_len = current_page.size - len(current_page.data)
                 if keep_unwritten and self.flash.region.is_readable:
                     self._enable_read_access()
-                    old_data = self.flash.target.read_memory_block8(page_data_end, old_data_len)
+                    old_data = self.flash.target.read_memory_bytes(page_data_end, old_data_len)
                 else:
                     old_data = [self.flash.region.erased_byte_value] * old_data_len
                 current_page.data.extend(old_data)
@@ -295,7 +325,7 @@ class FlashBuilder(object):
                     old_data_len = flash_addr - page_data_end
                     if keep_unwritten and self.flash.region.is_readable:
                         self._enable_read_access()
-                        old_data = self.flash.target.read_memory_block8(page_data_end, old_data_len)
+                        old_data = self.flash.target.read_memory_bytes(page_data_end, old_data_len)
                     else:
                         old_data = [self.flash.region.erased_byte_value] * old_data_len
                     current_page.data.extend(old_data)
@@ -330,7 +360,7 @@ class FlashBuilder(object):
                     raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % sector_page_addr)
                 new_page = _FlashPage(page_info)
                 self._enable_read_access()
-                new_page.data = self.flash.target.read_memory_block8(new_page.addr, new_page.size)
+                new_page.data = list(self.flash.target.read_memory_bytes(new_page.addr, new_page.size))
                 new_page.same = True
                 sector.add_page(new_page)
                 self.page_list.append(new_page)
@@ -416,12 +446,18 @@ class FlashBuilder(object):
         # Convert the list of flash operations into flash sectors and pages
         self._build_sectors_and_pages(keep_unwritten)
         assert len(self.sector_list) != 0 and len(self.sector_list[0].page_list) != 0
+        if smart_flash and self.previous_operation_list:
+            self._analyze_pages_with_previous_image()
         self.flash_operation_list = None # Don't need this data in memory anymore.
+        self.previous_operation_list = []
         
         # If smart flash was set to false then mark all pages
         # as requiring programming
+        crc_cache = FlashCRCCache.for_flash(self.flash)
         if not smart_flash:
             self._mark_all_pages_for_programming()
+        elif crc_cache is not None:
+            self._analyze_pages_with_crc_cache(crc_cache)
         
         # If the flash algo doesn't support erase all, disable chip erase.
         if not self.flash.is_erase_all_supported:
@@ -454,6 +490,10 @@ class FlashBuilder(object):
             LOG.debug("Chip erase weight %f, sector erase weight %f" % (chip_erase_program_time, page_program_time))
             chip_erase = chip_erase_program_time < page_program_time
 
+        # Don't leave cached CRCs for pages that are about to be modified.
+        if crc_cache is not None:
+            crc_cache.invalidate(all_regions=chip_erase)
+
         if chip_erase:
             if self.flash.is_double_buffering_supported and self.enable_double_buffering:
                 LOG.debug("Using double buffer chip erase program")
@@ -467,9 +507,11 @@ class FlashBuilder(object):
             else:
                 flash_operation = self._sector_erase_program(progress_cb)
 
-        # Cleanup flash algo and reset target after programming.
-        self.flash.cleanup()
-        self.flash.target.reset_and_halt()
+        # Cleanup flash algo and reset target after programming. This is skipped when more data
+        # will be programmed with the same flash algo, for example by a StreamingFlashLoader.
+        if self.cleanup_after_program:
+            self.flash.cleanup()
+            self.flash.target.reset_and_halt()
 
         program_finish = time()
         self.perf.program_time = program_finish - program_start
@@ -492,6 +534,16 @@ class FlashBuilder(object):
             if sector.are_any_pages_not_same():
                 erase_byte_count += sector.size
                 erase_sector_count += 1
+
+        # Record the new flash contents.
+        if crc_cache is not None:
+            if chip_erase:
+                erased_ranges = [(self.flash.region.start, self.flash.region.end + 1)]
+            else:
+                erased_ranges = [(sector.addr, sector.addr + sector.size)
+                                    for sector in self.sector_list if sector.are_any_pages_not_same()]
+            crc_cache.update(((page.addr, page.size, self._get_page_crc(page)) for page in self.page_list),
+                                erased_ranges)
         
         self.perf.total_byte_count = self.program_byte_count
         self.perf.program_byte_count = actual_program_byte_count
@@ -563,7 +615,7 @@ class FlashBuilder(object):
             # Analyze pages that haven't been analyzed yet
             if page.same is None:
                 size = min(PAGE_ESTIMATE_SIZE, len(page.data))
-                data = self.flash.target.read_memory_block8(page.addr, size)
+                data = self.flash.target.read_memory_bytes(page.addr, size)
                 page_same = same(data, page.data[0:size])
                 if page_same is False:
                     page.same = False
@@ -591,11 +643,7 @@ class FlashBuilder(object):
                 sector_list.append((page.addr, page.size))
                 page_list.append(page)
                 # Compute CRC of data (Padded with 0xFF)
-                data = list(page.data)
-                pad_size = page.size - len(page.data)
-                if pad_size > 0:
-                    data.extend([0xFF] * pad_size)
-                page.crc = crc32(bytearray(data)) & 0xFFFFFFFF
+                self._get_page_crc(page)
 
         # Analyze pages
         if len(page_list) > 0:
@@ -608,6 +656,126 @@ class FlashBuilder(object):
                 elif page_same is False:
                     page.same = False
 
+    def _get_page_crc(self, page):
+        """! @brief Return the CRC32 of a page's data, padded to the page size with 0xFF."""
+        if page.crc is None:
+            data = bytearray(page.data)
+            pad_size = page.size - len(data)
+            if pad_size > 0:
+                data.extend([0xFF] * pad_size)
+            page.crc = crc32(data) & 0xFFFFFFFF
+        return page.crc
+
+    def _read_page_crcs(self, page_list):
+        """! @brief Compute the CRC32 of the current flash contents of pages.
+        @return List of CRCs, or None if flash can be neither read nor CRCed by the analyzer.
+        """
+        if self.flash.get_flash_info().crc_supported:
+            self._enable_read_access()
+            return self.flash.compute_crcs([(page.addr, page.size) for page in page_list])
+        elif self.flash.region.is_readable:
+            self._enable_read_access()
+            return [crc32(bytearray(self.flash.target.read_memory_bytes(page.addr, page.size))) & 0xFFFFFFFF
+                    for page in page_list]
+        else:
+            return None
+
+    def _hash_pages(self, operation_list):
+        """! @brief Compute a content hash for each page written by a list of flash operations.
+
+        The hash covers the offset and value of every byte written to the page, so two images only
+        produce the same hash for a page if they write identical data to identical locations in it.
+        
+        @return Dict of page address to hash digest.
+        """
+        hashes = {}
+        next_addr = {}
+        page_info = None
+        for operation in operation_list:
+            pos = 0
+            while pos < len(operation.data):
+                addr = operation.addr + pos
+                if page_info is None or not (page_info.base_addr <= addr < page_info.base_addr + page_info.size):
+                    page_info = self.flash.get_page_info(addr)
+                    if page_info is None:
+                        raise FlashFailure("Attempt to program flash at invalid address 0x%08x" % addr)
+                page_addr = page_info.base_addr
+                amount = min(page_addr + page_info.size - addr, len(operation.data) - pos)
+                
+                # Mark the start of each run of data so that runs split differently across
+                # operations still produce the same hash.
+                page_hash = hashes.setdefault(page_addr, hashlib.sha1())
+                if next_addr.get(page_addr) != addr:
+                    page_hash.update(pack("<I", addr - page_addr))
+                page_hash.update(bytearray(operation.data[pos:pos + amount]))
+                next_addr[page_addr] = addr + amount
+                pos += amount
+        return {addr: page_hash.digest() for addr, page_hash in hashes.items()}
+
+    def _analyze_pages_with_previous_image(self):
+        """! @brief Compare pages with the previously programmed image.
+
+        Pages whose hash differs from the previous image are marked as needing programming without
+        touching the target. The remaining pages are all checked with a single CRC run, and
+        marked as the same or not depending on the result. If the flash can't be verified, the
+        unchanged pages are left for the normal analysis.
+        """
+        new_hashes = self._hash_pages(self.flash_operation_list)
+        previous_hashes = self._hash_pages(self.previous_operation_list)
+        
+        unchanged_pages = []
+        for page in self.page_list:
+            if page.same is not None or page.addr not in new_hashes:
+                continue
+            if new_hashes[page.addr] == previous_hashes.get(page.addr):
+                unchanged_pages.append(page)
+            else:
+                page.same = False
+        LOG.debug("Delta analysis: %d pages changed, %d unchanged",
+            len(new_hashes) - len(unchanged_pages), len(unchanged_pages))
+        self.perf.analyze_type = FlashBuilder.FLASH_ANALYSIS_DELTA
+        
+        if len(unchanged_pages) == 0:
+            return
+        crc_list = self._read_page_crcs(unchanged_pages)
+        if crc_list is None:
+            return
+        for page, crc in zip(unchanged_pages, crc_list):
+            page.same = (crc == self._get_page_crc(page))
+            if not page.same:
+                LOG.debug("Page 0x%08x does not match the previous image", page.addr)
+
+    def _analyze_pages_with_crc_cache(self, crc_cache):
+        """! @brief Mark pages that are unchanged since they were last programmed as the same.
+
+        The CRC of each page's new data is compared with the CRC saved in the cache when the page
+        was last programmed. Before the cache is trusted, up to CRC_CACHE_SAMPLE_COUNT of the
+        matching pages, evenly spread across the region, are checked against the target. If any
+        of them differ then flash was changed by other means, so the region's cache is discarded
+        and the pages are left for the normal analysis.
+        """
+        page_list = [page for page in self.page_list
+                    if page.same is None and crc_cache.get(page.addr, page.size) == self._get_page_crc(page)]
+        if len(page_list) == 0:
+            return
+
+        sample_count = min(CRC_CACHE_SAMPLE_COUNT, len(page_list))
+        if sample_count == 1:
+            samples = [page_list[0]]
+        else:
+            samples = [page_list[i * (len(page_list) - 1) // (sample_count - 1)] for i in range(sample_count)]
+        crc_list = self._read_page_crcs(samples)
+        if crc_list != [page.crc for page in samples]:
+            LOG.info("Flash CRC cache for region '%s' does not match target; ignoring it",
+                self.flash.region.name)
+            crc_cache.clear()
+            return
+
+        LOG.debug("Flash CRC cache matched %d of %d pages", len(page_list), len(self.page_list))
+        for page in page_list:
+            page.same = True
+        self.perf.analyze_type = FlashBuilder.FLASH_ANALYSIS_CRC_CACHE
+
     def _compute_sector_erase_pages_and_weight(self, fast_verify):
         """! @brief Quickly analyze flash contents and compute weights for sector erase.
 
@@ -811,11 +979,11 @@ class FlashBuilder(object):
                     data = page.cached_estimate_data
                     offset = len(data)
                 else:
-                    data = []
+                    data = bytearray()
                     offset = 0
                 assert len(page.data) == page.size, "page data size (%d) != page size (%d)" % (len(page.data), page.size)
-                data.extend(self.flash.target.read_memory_block8(page.addr + offset,
-                                                                    page.size - offset))
+                data.extend(self.flash.target.read_memory_bytes(page.addr + offset,
+                                                                page.size - offset))
                 page.same = same(page.data, data)
                 page.cached_estimate_data = None # This data isn't needed anymore.
                 progress += page.get_verify_weight()
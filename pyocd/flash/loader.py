@@ -17,32 +17,117 @@
 from __future__ import print_function
 import os
 import logging
-import itertools
-from intelhex import IntelHex
+import mmap
+import binascii
 from enum import Enum
 import six
 import errno
+import threading
+from six.moves import queue
 
 from .flash_builder import (FlashBuilder, get_page_count, get_sector_count)
 from ..core.memory_map import MemoryType
+from ..core.target import Target
 from ..core import exceptions
 from ..utility.progress import print_progress
 from elftools.elf.elffile import ELFFile
-from ..utility.compatibility import FileNotFoundError_
+from ..utility.compatibility import (FileNotFoundError_, to_str_safe)
 
 LOG = logging.getLogger(__name__)
 
-def ranges(i):
-    """!
-    Accepts a sorted list of byte addresses. Breaks the addresses into contiguous ranges.
-    Yields 2-tuples of the start and end address for each contiguous range.
+## Maximum size of the chunks in which file contents are passed to the flash loader.
+FILE_CHUNK_SIZE = 64 * 1024
+
+def iter_file_chunks(file_obj, offset, size):
+    """! @brief Generator that reads a range of a file in chunks.
+    
+    If the file object refers to a real file, the file is memory mapped so that only the chunk
+    being returned is copied into memory. Otherwise the file is read with seek() and read().
     
-    For instance, the input [0, 1, 2, 3, 32, 33, 34, 35] will yield the following 2-tuples:
-    (0, 3) and (32, 35).
+    @param file_obj File object opened in binary mode.
+    @param offset Offset of the first byte in the file.
+    @param size Number of bytes to read. Reading stops early at the end of the file.
+    @return Yields bytearrays of at most FILE_CHUNK_SIZE bytes.
     """
-    for a, b in itertools.groupby(enumerate(i), lambda x: x[1] - x[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
+    if size <= 0:
+        return
+    try:
+        fileno = file_obj.fileno()
+    except (AttributeError, EnvironmentError, ValueError):
+        fileno = None
+    
+    if fileno is not None:
+        mapping = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            end = min(offset + size, len(mapping))
+            for pos in range(offset, end, FILE_CHUNK_SIZE):
+                yield bytearray(mapping[pos:min(pos + FILE_CHUNK_SIZE, end)])
+        finally:
+            mapping.close()
+    else:
+        file_obj.seek(offset, os.SEEK_SET)
+        while size > 0:
+            data = file_obj.read(min(FILE_CHUNK_SIZE, size))
+            if not data:
+                break
+            size -= len(data)
+            yield bytearray(data)
+
+def iter_hex_records(file_obj):
+    """! @brief Generator that parses the data records of an Intel hex file.
+    
+    Only the current line of the file is held in memory. Start address records are ignored.
+    
+    @param file_obj File object for the hex file, opened in either text or binary mode.
+    @return Yields 2-tuples of the address and data bytearray of each data record, in file order.
+    @exception ValueError The file contains an invalid record.
+    """
+    base = 0
+    for line_number, line in enumerate(file_obj, 1):
+        line = to_str_safe(line).strip()
+        if not line:
+            continue
+        try:
+            if line[0] != ':':
+                raise ValueError("missing start code")
+            record = bytearray(binascii.unhexlify(line[1:]))
+        except (TypeError, binascii.Error) as err:
+            raise ValueError("invalid hex record on line %d: %s" % (line_number, err))
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise ValueError("invalid hex record length on line %d" % line_number)
+        if sum(record) & 0xff:
+            raise ValueError("invalid hex record checksum on line %d" % line_number)
+        
+        record_type = record[3]
+        data = record[4:-1]
+        if record_type == 0x00:
+            yield base + ((record[1] << 8) | record[2]), data
+        elif record_type == 0x01:
+            break
+        elif record_type in (0x02, 0x04):
+            if len(data) != 2:
+                raise ValueError("invalid hex address record on line %d" % line_number)
+            shift = 4 if (record_type == 0x02) else 16
+            base = ((data[0] << 8) | data[1]) << shift
+
+def iter_hex_data(file_obj):
+    """! @brief Generator that combines consecutive contiguous hex records into chunks.
+    @return Yields 2-tuples of the start address and data bytearray of each chunk. Chunks are
+        at most FILE_CHUNK_SIZE bytes, unless a single record is larger.
+    """
+    start = None
+    chunk = bytearray()
+    for addr, data in iter_hex_records(file_obj):
+        if (start is not None) and ((addr != start + len(chunk))
+                or (len(chunk) + len(data) > FILE_CHUNK_SIZE)):
+            yield start, chunk
+            start = None
+        if start is None:
+            start = addr
+            chunk = bytearray()
+        chunk += data
+    if start is not None:
+        yield start, chunk
 
 class FileProgrammer(object):
     """! @brief Class to manage programming a file in any supported format with many options.
@@ -52,6 +137,10 @@ class FileProgrammer(object):
     respecting format-specific options such as the base address for binary files. Then the heavy
     lifting of flash programming is handled by FlashLoader, and beneath that, FlashBuilder.
     
+    Files are read in chunks as they are programmed. When sector erase is used, the data is
+    passed to a StreamingFlashLoader so that memory use doesn't depend on the size of the image.
+    Chip erase and delta programming need the whole image, so a FlashLoader is used for those.
+    
     Support file formats are:
     - Binary (.bin)
     - Intel Hex (.hex)
@@ -92,15 +181,29 @@ class FileProgrammer(object):
             'elf': self._program_elf,
             'hex': self._program_hex,
             }
+        self._size_handlers = {
+            'axf': self._get_elf_size,
+            'bin': self._get_bin_size,
+            'elf': self._get_elf_size,
+            'hex': self._get_hex_size,
+            }
     
-    def program(self, file_or_path, file_format=None, **kwargs):
+    def program(self, file_or_path, file_format=None, previous=None, **kwargs):
         """! @brief Program a file into flash.
         
+        If the image that was last programmed is passed in _previous_, then delta programming is
+        used. The pages of the two images are compared on the host and only pages that have changed
+        are programmed. Unchanged pages are verified against the target with a single CRC run.
+        
         @param self
         @param file_or_path Either a string that is a path to a file, or a file-like object.
         @param file_format Optional file format name, one of "bin", "hex", "elf", "axf". If not provided,
             the file's extension will be used. If a file object is passed for _file_or_path_ then
             this parameter must be used to set the format.
+        @param previous Optional path or file-like object for the image that was previously
+            programmed. Its format is taken from the file's extension if it is a path that has one,
+            otherwise the format of the new image is used. Format-specific parameters apply to both
+            images.
         @param kwargs Optional keyword arguments for format-specific parameters.
         
         The only current format-specific keyword parameters are for the binary format:
@@ -113,6 +216,54 @@ class FileProgrammer(object):
         @exception ValueError Invalid argument value, for instance providing a file object but
             not setting file_format.
         """
+        file_format = self._get_format(file_or_path, file_format)
+        if previous is not None:
+            previous_format = self._get_format(previous, None, default_format=file_format)
+        
+        # Stream the image when using sector erase. The size is None if the file can't be
+        # streamed.
+        chip_erase = self._chip_erase if (self._chip_erase is not None) \
+                        else self._session.options.get('chip_erase')
+        stream_size = None
+        if chip_erase == "sector":
+            stream_size = self._read_file(file_or_path, file_format,
+                                            self._size_handlers[file_format], **kwargs)
+        
+        if stream_size is not None:
+            self._loader = StreamingFlashLoader(self._session, stream_size,
+                                        progress=self._progress,
+                                        smart_flash=self._smart_flash,
+                                        trust_crc=self._trust_crc,
+                                        keep_unwritten=self._keep_unwritten)
+        else:
+            self._loader = FlashLoader(self._session,
+                                        progress=self._progress,
+                                        chip_erase=self._chip_erase,
+                                        smart_flash=self._smart_flash,
+                                        trust_crc=self._trust_crc,
+                                        keep_unwritten=self._keep_unwritten)
+        
+        # Pass to the format-specific programmer. The previous image is read first, since a
+        # streaming loader needs it before the new data is programmed.
+        if previous is not None:
+            self._read_file(previous, previous_format, self._format_handlers[previous_format],
+                            self._loader.add_previous_data, **kwargs)
+        self._read_file(file_or_path, file_format, self._format_handlers[file_format],
+                        self._loader.add_data, **kwargs)
+        self._loader.commit()
+
+    def _get_format(self, file_or_path, file_format, default_format=None):
+        """! @brief Determine and validate the format of a file.
+        
+        @param self
+        @param file_or_path Either a string that is a path to a file, or a file-like object.
+        @param file_format Format name passed by the caller, or None.
+        @param default_format Format to use if none is provided and the path has no extension.
+        @return The format name.
+        
+        @exception FileNotFoundError Provided file_or_path string does not reference a file.
+        @exception ValueError The format could not be determined or is not supported.
+        """
         isPath = isinstance(file_or_path, six.string_types)
         
         # Check for valid path first.
@@ -123,26 +274,34 @@ class FileProgrammer(object):
         if not file_format:
             if isPath:
                 # Extract the extension from the path.
-                file_format = os.path.splitext(file_or_path)[1][1:]
+                file_format = os.path.splitext(file_or_path)[1][1:] or default_format
                 
                 # Explicitly check for no extension.
-                if file_format == '':
+                if not file_format:
                     raise ValueError("file path '{}' does not have an extension and "
                                         "no format is set".format(file_or_path))
+            elif default_format:
+                file_format = default_format
             else:
                 raise ValueError("file object provided but no format is set")
         
         # Check the format is one we understand.
         if file_format not in self._format_handlers:
             raise ValueError("unknown file format '%s'" % file_format)
-            
-        self._loader = FlashLoader(self._session,
-                                    progress=self._progress,
-                                    chip_erase=self._chip_erase,
-                                    smart_flash=self._smart_flash,
-                                    trust_crc=self._trust_crc,
-                                    keep_unwritten=self._keep_unwritten)
+        return file_format
+
+    def _read_file(self, file_or_path, file_format, handler, *args, **kwargs):
+        """! @brief Open a file if needed and pass it to a format handler.
         
+        @param self
+        @param file_or_path Either a string that is a path to a file, or a file-like object.
+        @param file_format Name of the file's format.
+        @param handler Callable that is passed the file object, followed by _args_ and _kwargs_.
+        @param args Additional positional arguments for the handler.
+        @param kwargs Format-specific parameters.
+        @return The handler's return value.
+        """
+        isPath = isinstance(file_or_path, six.string_types)
         file_obj = None
         try:
             # Open the file if a path was provided.
@@ -155,15 +314,13 @@ class FileProgrammer(object):
             else:
                 file_obj = file_or_path
 
-            # Pass to the format-specific programmer.
-            self._format_handlers[file_format](file_obj, **kwargs)
-            self._loader.commit()
+            return handler(file_obj, *args, **kwargs)
         finally:
             if isPath and file_obj is not None:
                 file_obj.close()
 
-    def _program_bin(self, file_obj, **kwargs):
-        """! @brief Binary file format loader"""
+    def _get_bin_address(self, **kwargs):
+        """! @brief Return the address at which to program a binary file."""
         # If no base address is specified use the start of the boot memory.
         address = kwargs.get('base_address', None)
         if address is None:
@@ -171,47 +328,77 @@ class FileProgrammer(object):
             if boot_memory is None:
                 raise exceptions.TargetSupportError("No boot memory is defined for this device")
             address = boot_memory.start
+        return address
+
+    def _get_bin_size(self, file_obj, **kwargs):
+        """! @brief Return the number of bytes of a binary file to program."""
+        file_obj.seek(0, os.SEEK_END)
+        return max(0, file_obj.tell() - kwargs.get('skip', 0))
+
+    def _program_bin(self, file_obj, add_data, **kwargs):
+        """! @brief Binary file format loader"""
+        address = self._get_bin_address(**kwargs)
+        for data in iter_file_chunks(file_obj, kwargs.get('skip', 0), self._get_bin_size(file_obj, **kwargs)):
+            add_data(address, data)
+            address += len(data)
+
+    def _get_hex_size(self, file_obj, **kwargs):
+        """! @brief Return the number of data bytes in a hex file.
         
-        file_obj.seek(kwargs.get('skip', 0), os.SEEK_SET)
-        data = list(bytearray(file_obj.read()))
-        
-        self._loader.add_data(address, data)
+        None is returned if the records are not in ascending address order, in which case the file
+        cannot be streamed.
+        """
+        file_obj.seek(0, os.SEEK_SET)
+        size = 0
+        end = 0
+        for addr, data in iter_hex_records(file_obj):
+            if addr < end:
+                LOG.debug("Hex file records are not in address order")
+                return None
+            size += len(data)
+            end = addr + len(data)
+        return size
 
-    def _program_hex(self, file_obj, **kwargs):
+    def _program_hex(self, file_obj, add_data, **kwargs):
         """! Intel hex file format loader"""
-        hexfile = IntelHex(file_obj)
-        addresses = hexfile.addresses()
-        addresses.sort()
-
-        data_list = list(ranges(addresses))
-        for start, end in data_list:
-            size = end - start + 1
-            data = list(hexfile.tobinarray(start=start, size=size))
+        file_obj.seek(0, os.SEEK_SET)
+        for start, data in iter_hex_data(file_obj):
             # Ignore invalid addresses for HEX files only
             # Binary files (obviously) don't contain addresses
             # For ELF files, any metadata that's not part of the application code 
             # will be held in a section that doesn't have the SHF_WRITE flag set
             try:
-                self._loader.add_data(start, data)
+                add_data(start, data)
             except ValueError as e:
                 LOG.warning("Failed to add data chunk: %s", e)
 
-    def _program_elf(self, file_obj, **kwargs):
+    def _get_elf_segments(self, file_obj):
+        """! @brief Return the loadable segments of an ELF file sorted by load address."""
         elf = ELFFile(file_obj)
+        segments = []
         for segment in elf.iter_segments():
             if segment.header.p_type == 'PT_LOAD' and segment.header.p_filesz != 0:
-                addr = segment['p_paddr']
-                data = bytearray(segment.data())
-                LOG.debug("Writing segment LMA:0x%08x, VMA:0x%08x, size %d", addr, 
-                          segment['p_vaddr'], segment.header.p_filesz)
-                try:
-                    self._loader.add_data(addr, data)
-                except ValueError as e:
-                    LOG.warning("Failed to add data chunk: %s", e)
+                segments.append(segment)
             else:
-                LOG.debug("Skipping segment LMA:0x%08x, VMA:0x%08x, size %d", addr,
+                LOG.debug("Skipping segment LMA:0x%08x, VMA:0x%08x, size %d", segment['p_paddr'],
                           segment['p_vaddr'], segment.header.p_filesz)
-                        
+        return sorted(segments, key=lambda segment: segment['p_paddr'])
+
+    def _get_elf_size(self, file_obj, **kwargs):
+        """! @brief Return the number of bytes in the loadable segments of an ELF file."""
+        return sum(segment.header.p_filesz for segment in self._get_elf_segments(file_obj))
+
+    def _program_elf(self, file_obj, add_data, **kwargs):
+        for segment in self._get_elf_segments(file_obj):
+            addr = segment['p_paddr']
+            LOG.debug("Writing segment LMA:0x%08x, VMA:0x%08x, size %d", addr, 
+                      segment['p_vaddr'], segment.header.p_filesz)
+            try:
+                for data in iter_file_chunks(file_obj, segment['p_offset'], segment.header.p_filesz):
+                    add_data(addr, data)
+                    addr += len(data)
+            except ValueError as e:
+                LOG.warning("Failed to add data chunk: %s", e)
 
 class FlashEraser(object):
     """! @brief Class that manages high level flash erasing.
@@ -259,14 +446,21 @@ class FlashEraser(object):
         @param self
         @param addresses List of addresses or address ranges of the sectors to erase.
         """
-        if self._mode == self.Mode.MASS:
-            self._mass_erase()
-        elif self._mode == self.Mode.CHIP:
-            self._chip_erase()
-        elif self._mode == self.Mode.SECTOR and addresses:
-            self._sector_erase(addresses)
-        else:
+        if self._mode == self.Mode.SECTOR and not addresses:
             LOG.warning("No operation performed")
+            return
+
+        # Erasing changes flash contents just like programming, so send the same notifications.
+        self._session.notify(Target.EVENT_PRE_FLASH_PROGRAM, self)
+        try:
+            if self._mode == self.Mode.MASS:
+                self._mass_erase()
+            elif self._mode == self.Mode.CHIP:
+                self._chip_erase()
+            else:
+                self._sector_erase(addresses)
+        finally:
+            self._session.notify(Target.EVENT_POST_FLASH_PROGRAM, self)
     
     def _mass_erase(self):
         LOG.info("Mass erasing device...")
@@ -427,6 +621,7 @@ class FlashLoader(object):
     def _reset_state(self):
         """! @brief Clear all state variables. """
         self._builders = {}
+        self._previous_data = []
         self._total_data_size = 0
         self._progress_offset = 0
         self._current_progress_fraction = 0
@@ -450,18 +645,12 @@ class FlashLoader(object):
         """
         while len(data):
             # Look up flash region.
-            region = self._map.get_region_for_address(address)
-            if region is None:
-                raise ValueError("no memory region defined for address 0x%08x" % address)
-            if not region.is_flash:
-                raise ValueError("memory region at address 0x%08x is not flash" % address)
+            region = self._get_region(address)
         
             # Get our builder instance.
             if region in self._builders:
                 builder = self._builders[region]
             else:
-                if region.flash is None:
-                    raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no flash instance" % address)
                 builder = region.flash.get_flash_builder()
                 builder.log_performance = False
                 self._builders[region] = builder
@@ -478,6 +667,39 @@ class FlashLoader(object):
         
         return self
     
+    def _get_region(self, address):
+        """! @brief Return the flash region containing an address.
+        
+        @exception ValueError Raised when the address is not within a flash memory region.
+        @exception TargetSupportError Raised if the flash memory region does not have a valid Flash
+            instance associated with it.
+        """
+        region = self._map.get_region_for_address(address)
+        if region is None:
+            raise ValueError("no memory region defined for address 0x%08x" % address)
+        if not region.is_flash:
+            raise ValueError("memory region at address 0x%08x is not flash" % address)
+        if region.flash is None:
+            raise exceptions.TargetSupportError("flash memory region at address 0x%08x has no flash instance" % address)
+        return region
+    
+    def add_previous_data(self, address, data):
+        """! @brief Add a chunk of the image that was previously programmed.
+        
+        When previous data is provided, the flash builder for each region compares the pages of the
+        new data with the previous data, and only programs the pages that differ. The unchanged
+        pages are verified against the target in a single pass before being skipped. Previous data
+        outside of the flash regions being programmed is ignored.
+        
+        @param self
+        @param address Integer address for where the first byte of _data_ was written.
+        @param data A list of byte values that were programmed starting at the given address.
+        
+        @return The FlashLoader instance is returned, to allow chaining further calls.
+        """
+        self._previous_data.append((address, data))
+        return self
+    
     def commit(self):
         """! @brief Write all collected data to flash.
         
@@ -496,6 +718,14 @@ class FlashLoader(object):
         
         # Iterate over builders we've created and program the data.
         for builder in sorted(self._builders.values(), key=lambda v: v.flash_start):
+            # Pass each builder the part of the previous image within its region.
+            region = builder.flash.region
+            for address, data in self._previous_data:
+                start = max(address, region.start)
+                end = min(address + len(data), region.end + 1)
+                if start < end:
+                    builder.add_previous_data(start, data[start - address:end - address])
+            
             # Determine this builder's portion of total progress.
             self._current_progress_fraction = builder.buffered_data_size / self._total_data_size
             
@@ -567,3 +797,326 @@ class FlashLoader(object):
         mgr.add_data(address, data)
         mgr.commit()
 
+class StreamingFlashLoader(FlashLoader):
+    """! @brief Flash loader that programs data in batches while it is being added.
+    
+    FlashLoader holds all data until commit() is called. For large images this can use a lot of
+    memory. This subclass instead keeps only the data for erase sectors that have not been
+    programmed yet. Once more than the batch size is pending, the sectors that are complete are
+    programmed with a FlashBuilder. A sector is complete when data has been added beyond its end,
+    so the data must be added in ascending address order. The flash algorithm stays loaded
+    between batches, and the target is reset only after the last batch of each region.
+    
+    Only sector erase is supported, since the decision to use chip erase depends on the whole
+    image. Data for sectors that were already programmed cannot be added.
+    
+    Delta programming is supported, but because sectors are programmed while data is still being
+    added, the previously programmed image must be passed to add_previous_data() before the new
+    data for the same sectors. Each batch is then given the part of the previous image within the
+    sectors it programs.
+    """
+    
+    ## Default minimum amount of pending data that causes a batch to be programmed.
+    DEFAULT_BATCH_SIZE = 256 * 1024
+    
+    def __init__(self, session, total_size, batch_size=DEFAULT_BATCH_SIZE, progress=None,
+            smart_flash=None, trust_crc=None, keep_unwritten=None):
+        """! @brief Constructor.
+        
+        @param self
+        @param session The session object.
+        @param total_size The number of bytes that will be added, used to report progress.
+        @param batch_size Programming starts once this many bytes are pending.
+        @param progress A progress report handler as a callable that takes a percentage completed.
+        @param smart_flash See FlashLoader.
+        @param trust_crc See FlashLoader.
+        @param keep_unwritten See FlashLoader.
+        """
+        self._total_size = total_size
+        self._batch_size = batch_size
+        super(StreamingFlashLoader, self).__init__(session, progress=progress, chip_erase="sector",
+                smart_flash=smart_flash, trust_crc=trust_crc, keep_unwritten=keep_unwritten)
+    
+    def _reset_state(self):
+        """! @brief Clear all state variables. """
+        super(StreamingFlashLoader, self)._reset_state()
+        self._region = None
+        self._pending = []
+        self._pending_size = 0
+        # End address of the sectors already programmed in each region.
+        self._programmed_ends = {}
+        self._perf_list = []
+    
+    def add_data(self, address, data):
+        """! @brief Add a chunk of data to be programmed.
+        
+        Complete sectors may be programmed before this method returns.
+        
+        @param self
+        @param address Integer address for where the first byte of _data_ should be written.
+        @param data A bytearray or list of byte values to be programmed at the given address.
+        
+        @return The StreamingFlashLoader instance.
+        
+        @exception ValueError Raised when the address is not within a flash memory region, or the
+            data is within a sector that was already programmed or overlaps pending data.
+        @exception TargetSupportError Raised if the flash memory region does not have a valid Flash
+            instance associated with it.
+        """
+        while len(data):
+            region = self._get_region(address)
+            if region is not self._region:
+                self._program_batch(final=True)
+                self._region = region
+            
+            length = min(len(data), region.end - address + 1)
+            self._check_order(address, length)
+            self._pending.append((address, data[:length]))
+            self._pending_size += length
+            self._total_data_size += length
+            
+            data = data[length:]
+            address += length
+            
+            if self._pending_size >= self._batch_size:
+                self._program_batch(final=False)
+        
+        return self
+    
+    def add_previous_data(self, address, data):
+        """! @brief Add a chunk of the image that was previously programmed.
+        
+        See FlashLoader.add_previous_data(). The data must be added before any new data for the
+        same sectors.
+        
+        @exception ValueError Raised when the data is within a sector that was already programmed.
+        """
+        for region, end in self._programmed_ends.items():
+            if (address < end) and (region.start < address + len(data)):
+                raise ValueError("previous data at 0x%08x is within a sector that has already "
+                                    "been programmed" % max(address, region.start))
+        return super(StreamingFlashLoader, self).add_previous_data(address, data)
+    
+    def commit(self):
+        """! @brief Program the remaining pending data.
+        
+        After calling this method, the loader instance can be reused to program more data.
+        """
+        self._program_batch(final=True)
+        if self._perf_list:
+            self._log_performance(self._perf_list)
+        self._reset_state()
+    
+    def _check_order(self, address, length):
+        """! @brief Verify that new data doesn't go in an already programmed sector or overlap."""
+        programmed_end = self._programmed_ends.get(self._region)
+        if (programmed_end is not None) and (address < programmed_end):
+            raise ValueError("data at 0x%08x is within a sector that has already been programmed"
+                                % address)
+        for start, data in self._pending:
+            if (address < start + len(data)) and (start < address + length):
+                raise ValueError("data at 0x%08x..0x%08x overlaps with 0x%08x..0x%08x"
+                                    % (address, address + length, start, start + len(data)))
+    
+    def _program_batch(self, final):
+        """! @brief Program the pending data for complete sectors.
+        
+        @param self
+        @param final If True, all pending data is programmed and the flash algorithm is cleaned up
+            afterwards. Otherwise the data for the sector containing the end of the pending data
+            is kept, since more data may be added to that sector.
+        """
+        if not self._pending:
+            return
+        region = self._region
+        end = max(start + len(data) for start, data in self._pending)
+        
+        # Find the start of the sector that may still receive data. The last sector of the region
+        # is kept for the final batch, so the flash algo is always cleaned up by commit().
+        boundary = end
+        if not final:
+            info = region.flash.get_sector_info(min(end, region.end))
+            if info is not None:
+                boundary = info.base_addr
+            programmed_end = boundary
+        else:
+            # The sector holding the last byte is programmed too, so no more data can go in it.
+            info = region.flash.get_sector_info(end - 1)
+            programmed_end = (info.base_addr + info.size) if (info is not None) else end
+        
+        # Split the pending data at the boundary.
+        batch = []
+        remaining = []
+        for start, data in self._pending:
+            if start + len(data) <= boundary:
+                batch.append((start, data))
+            elif start >= boundary:
+                remaining.append((start, data))
+            else:
+                batch.append((start, data[:boundary - start]))
+                remaining.append((boundary, data[boundary - start:]))
+        if not batch:
+            return
+        
+        builder = region.flash.get_flash_builder()
+        builder.log_performance = False
+        builder.cleanup_after_program = final
+        for start, data in batch:
+            builder.add_data(start, data)
+        
+        # Pass the builder the part of the previous image within the sectors being programmed.
+        previous_start = self._programmed_ends.get(region, region.start)
+        previous_end = min(programmed_end, region.end + 1)
+        for address, data in self._previous_data:
+            start = max(address, previous_start)
+            stop = min(address + len(data), previous_end)
+            if start < stop:
+                builder.add_previous_data(start, data[start - address:stop - address])
+        
+        self._pending = remaining
+        self._pending_size = sum(len(data) for _, data in remaining)
+        self._programmed_ends[region] = programmed_end
+        
+        self._program_builder(builder)
+    
+    def _program_builder(self, builder):
+        """! @brief Program one batch of data that was added to a FlashBuilder."""
+        # Determine this batch's portion of total progress.
+        if self._total_size:
+            self._current_progress_fraction = float(builder.buffered_data_size) / self._total_size
+        
+        perf = builder.program(chip_erase="sector",
+                                progress_cb=self._progress_cb,
+                                smart_flash=self._smart_flash,
+                                fast_verify=self._trust_crc,
+                                keep_unwritten=self._keep_unwritten)
+        self._perf_list.append(perf)
+        self._progress_offset += self._current_progress_fraction
+
+class BackgroundFlashLoader(StreamingFlashLoader):
+    """! @brief Streaming flash loader that programs batches on a worker thread.
+    
+    StreamingFlashLoader programs complete sectors from within add_data(), so the caller can't
+    produce more data while the target is busy. This subclass hands each batch to a worker thread
+    instead, and add_data() returns as soon as the data is recorded. Receiving the data and
+    programming it then overlap, which is what the gdbserver uses to program flash while gdb is
+    still sending vFlashWrite packets. Smart flash analysis is performed for each batch.
+    
+    Only a few batches may be waiting for the worker; add_data() blocks when that limit is
+    reached, so memory use stays bounded when data arrives faster than it can be programmed.
+    
+    All target accesses are made by the worker thread between the first batch and the return of
+    commit(). The caller must not access the target in the meantime.
+    
+    If programming a batch fails, the remaining batches are discarded and the error is raised
+    from the next call to add_data() or commit(). The loader is reset before the error is raised.
+    """
+    
+    ## Default minimum amount of pending data that causes a batch to be programmed.
+    DEFAULT_BATCH_SIZE = 32 * 1024
+    
+    ## Maximum number of batches waiting to be programmed.
+    MAX_QUEUED_BATCHES = 4
+    
+    def __init__(self, session, total_size, batch_size=DEFAULT_BATCH_SIZE, progress=None,
+            smart_flash=None, trust_crc=None, keep_unwritten=None):
+        """! @brief Constructor.
+        
+        The parameters are the same as for StreamingFlashLoader.
+        """
+        super(BackgroundFlashLoader, self).__init__(session, total_size, batch_size=batch_size,
+                progress=progress, smart_flash=smart_flash, trust_crc=trust_crc,
+                keep_unwritten=keep_unwritten)
+    
+    def _reset_state(self):
+        """! @brief Clear all state variables. """
+        super(BackgroundFlashLoader, self)._reset_state()
+        self._queue = queue.Queue(self.MAX_QUEUED_BATCHES)
+        self._thread = None
+        self._error = None
+        self._cancel = False
+    
+    def add_data(self, address, data):
+        """! @brief Add a chunk of data to be programmed.
+        
+        Complete sectors are queued to be programmed by the worker thread.
+        
+        @exception ValueError See StreamingFlashLoader.add_data().
+        @exception TargetSupportError See StreamingFlashLoader.add_data().
+        @exception FlashFailure Programming of a previous batch failed.
+        """
+        try:
+            self._check_error()
+            return super(BackgroundFlashLoader, self).add_data(address, data)
+        except:
+            self.abort()
+            raise
+    
+    def commit(self):
+        """! @brief Program the remaining pending data and wait for all batches to complete.
+        
+        @exception FlashFailure Programming failed.
+        """
+        try:
+            self._program_batch(final=True)
+            self._stop_worker()
+            self._check_error()
+        except:
+            self.abort()
+            raise
+        super(BackgroundFlashLoader, self).commit()
+    
+    def abort(self):
+        """! @brief Discard all data that hasn't been programmed yet and reset the loader.
+        
+        A batch being programmed when this method is called is allowed to complete.
+        """
+        self._cancel = True
+        self._stop_worker()
+        self._reset_state()
+    
+    def _check_error(self):
+        """! @brief Raise the exception from the worker thread, if there was one."""
+        if self._error is not None:
+            raise self._error
+    
+    def _program_builder(self, builder):
+        """! @brief Queue a batch to be programmed by the worker thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="flash programming")
+            self._thread.daemon = True
+            self._thread.start()
+        self._queue.put(builder)
+    
+    def _stop_worker(self):
+        """! @brief Wait for the worker thread to program all queued batches and exit."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+    
+    def _worker(self):
+        # Flash whose algo was left loaded for the next batch.
+        active_flash = None
+        while True:
+            builder = self._queue.get()
+            if builder is None:
+                break
+            if self._cancel or (self._error is not None):
+                continue
+            active_flash = builder.flash
+            try:
+                super(BackgroundFlashLoader, self)._program_builder(builder)
+            except Exception as e:
+                LOG.debug("Flash programming failed on worker thread", exc_info=True)
+                self._error = e
+            else:
+                if builder.cleanup_after_program:
+                    active_flash = None
+        
+        # Clean up if the final batch was discarded or failed.
+        if active_flash is not None:
+            try:
+                active_flash.cleanup()
+            except exceptions.Error as e:
+                LOG.warning("Failed to clean up flash algo: %s", e)
@@ -0,0 +1,436 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import socket
+import threading
+from six.moves import queue
+
+from ..core.target import Target
+from .gdbserver import (GDBServer, ConnectionClosedException, checksum, CTRL_C, TRACE_ACK,
+    TRACE_PACKETS)
+from .framing import PacketFramer
+
+LOG = logging.getLogger(__name__)
+
+class _GDBConnection(asyncio.Protocol):
+    """! @brief Connection from gdb to one core, served by the event loop.
+
+    The protocol frames and acks the data received from gdb on the event loop's thread, and
+    queues good packets for the core's server. It also provides the packet I/O interface that
+    GDBServer's command handlers use, with the same methods as GDBServerPacketIOThread. Those
+    methods are called on the probe's worker thread, so writes are handed to the event loop.
+    """
+
+    def __init__(self, server, loop):
+        self._server = server
+        self._loop = loop
+        self._transport = None
+        self._framer = PacketFramer()
+        self._receive_queue = queue.Queue()
+        self.interrupt_event = threading.Event()
+        self.send_acks = True
+        self._clear_send_acks = False
+        self._expecting_ack = False
+        self.drop_reply = False
+        self._last_packet = b''
+        self._accepted = False
+        self._closed = False
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._accepted = self._server._accept_connection(self)
+        if not self._accepted:
+            self.close()
+
+    def connection_lost(self, exc):
+        self._closed = True
+        if self._accepted:
+            self._server._connection_lost(self)
+
+    def data_received(self, data):
+        TRACE_PACKETS.debug('-->>>> GDB read %d bytes: %s', len(data), data)
+        self._framer.feed(data)
+        for kind, packet in self._framer:
+            if kind in (PacketFramer.ACK, PacketFramer.NACK):
+                if self._expecting_ack:
+                    self._expecting_ack = False
+                    self._handle_ack(kind)
+                continue
+
+            if self._expecting_ack:
+                self._expecting_ack = False
+                LOG.debug("GDB: expected n/ack but got %s", packet or CTRL_C)
+
+            if kind == PacketFramer.INTERRUPT:
+                self.interrupt_event.set()
+                self._server._interrupt_received()
+            else:
+                self._handle_incoming_packet(packet)
+
+    def _handle_ack(self, kind):
+        TRACE_ACK.debug('got ack: %s', b'+' if (kind == PacketFramer.ACK) else b'-')
+        if kind == PacketFramer.NACK:
+            self._write_packet(self._last_packet)
+            return
+
+        # Handle disabling of acks.
+        if self._clear_send_acks:
+            self.send_acks = False
+            self._clear_send_acks = False
+
+    def _handle_incoming_packet(self, packet):
+        data, cksum = packet[1:].split(b'#')
+        good_packet = (checksum(data).lower() == cksum.lower())
+
+        if self.send_acks:
+            ack = b'+' if good_packet else b'-'
+            self._transport.write(ack)
+            TRACE_ACK.debug(ack)
+
+        if good_packet:
+            self._receive_queue.put(packet)
+            self._server._packet_received()
+
+    def _write_packet(self, packet):
+        if self._closed:
+            return
+        TRACE_PACKETS.debug('--<<<< GDB send %d bytes: %s', len(packet), packet)
+        self._transport.write(packet)
+        if self.send_acks:
+            self._expecting_ack = True
+
+    def _set_clear_send_acks(self):
+        self._clear_send_acks = True
+
+    def close(self):
+        """! @brief Close the connection without notifying the server. Event loop thread only."""
+        self._closed = True
+        if self._transport is not None:
+            self._transport.close()
+
+    ## @name Packet I/O interface
+    #
+    # These methods are called on the probe's worker thread.
+    ##@{
+
+    def set_send_acks(self, ack):
+        if ack:
+            self.send_acks = True
+        else:
+            self._loop.call_soon_threadsafe(self._set_clear_send_acks)
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self.close)
+
+    def send(self, packet):
+        if self._closed or not packet:
+            return
+        if not self.drop_reply:
+            self._last_packet = packet
+            self._loop.call_soon_threadsafe(self._write_packet, packet)
+        else:
+            self.drop_reply = False
+            LOG.debug("GDB dropped reply %s", packet)
+
+    def receive(self, block=True):
+        if self._closed:
+            raise ConnectionClosedException()
+        while True:
+            try:
+                return self._receive_queue.get(block, 0.1)
+            except queue.Empty:
+                if not block:
+                    return None
+                if self._closed:
+                    raise ConnectionClosedException()
+
+    ##@}
+
+class _CoreServer(GDBServer):
+    """! @brief GDB server for one core, driven by an AsyncGDBServer.
+
+    The server doesn't have its own thread or listening socket. All command handlers run on the
+    worker thread of the core's session, one job at a time, so cores on the same probe never
+    access it concurrently. Resuming the target doesn't block the worker until the target halts.
+    Instead the session's halt watcher calls back when the core halts, and the stop reply or
+    notification is sent to gdb right away.
+    """
+
+    def __init__(self, host, session, core, worker):
+        self._host = host
+        self._worker = worker
+        self._connection = None
+        self._stop_reply_pending = False
+        super(_CoreServer, self).__init__(session, core=core)
+
+    def _start_server(self):
+        # The host's event loop listens on the port.
+        pass
+
+    def _submit(self, fn, *args):
+        """! @brief Run a function on the session's worker thread."""
+        try:
+            self._worker.submit(self._run_job, fn, *args)
+        except RuntimeError:
+            # The worker was shut down when the host was closed.
+            pass
+
+    def _run_job(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
+
+    ## @name Event loop callbacks
+    ##@{
+
+    def _accept_connection(self, connection):
+        if self._connection is not None:
+            self.log.warning("Rejecting connection to port %d because gdb is already connected",
+                self.port)
+            return False
+        self.log.info("One client connected!")
+        self._connection = connection
+        self._submit(self._start_connection, connection)
+        return True
+
+    def _connection_lost(self, connection):
+        if connection is not self._connection:
+            # The host closed the connection.
+            return
+        self.log.info("Client disconnected!")
+        self._connection = None
+        self._submit(self._end_connection, connection)
+
+    def _packet_received(self):
+        self._submit(self._service_packet)
+
+    def _interrupt_received(self):
+        self._submit(self._service_interrupt)
+
+    ##@}
+
+    ## @name Worker jobs
+    ##@{
+
+    def _start_connection(self, connection):
+        self.packet_io = connection
+        self.detach_event.clear()
+
+    def _end_connection(self, connection):
+        if self.packet_io is connection:
+            self.packet_io = None
+            self._stop_reply_pending = False
+            self._cleanup_for_next_connection()
+
+    def _service_packet(self):
+        connection = self.packet_io
+        if connection is None:
+            return
+        # The packet may have been taken already by a handler waiting for a reply from gdb.
+        packet = connection.receive(block=False)
+        if packet is None:
+            return
+
+        resp, detach = self.handle_message(packet)
+        if resp is not None:
+            connection.send(resp)
+
+        if detach or self.detach_event.is_set():
+            self._detach(connection)
+        elif self.non_stop and self.is_target_running and (self.halt_watch is None):
+            self._watch_running_core()
+
+    def _service_interrupt(self):
+        connection = self.packet_io
+        if (connection is None) or not connection.interrupt_event.is_set():
+            return
+        connection.interrupt_event.clear()
+
+        if self._stop_reply_pending:
+            self._cancel_halt_watch()
+            self._send_stop_reply(self._interrupt_running_target())
+        elif self.non_stop:
+            self._cancel_halt_watch()
+            self.target.halt()
+            self.is_target_running = False
+            self.send_stop_notification()
+        else:
+            self.log.error("Got unexpected ctrl-c, ignoring")
+
+    def _service_halt(self, watch):
+        if watch is not self.halt_watch:
+            # The watch was cancelled after the core halted.
+            return
+        self.halt_watch = None
+
+        if self._stop_reply_pending:
+            # A ctrl-c returned by gdb for a semihosting syscall is handled like any other.
+            if self.packet_io.interrupt_event.is_set():
+                self._service_interrupt()
+                return
+            val = self._get_stop_reply_for_halt()
+            if val is None:
+                self._watch_running_core()
+            else:
+                self._send_stop_reply(val)
+        elif self.non_stop and self.is_target_running:
+            try:
+                if self.target.get_state() == Target.TARGET_HALTED:
+                    self.log.debug("state halted")
+                    self.is_target_running = False
+                    self.send_stop_notification()
+                    return
+            except Exception as e:
+                self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
+                return
+            self._watch_running_core()
+
+    ##@}
+
+    def _send_stop_reply(self, val):
+        self._stop_reply_pending = False
+        self.packet_io.send(self.create_rsp_packet(val))
+
+    def _watch_running_core(self):
+        self.halt_watch = self._watch_for_halt(callback=self._halt_detected)
+
+    def _halt_detected(self, watch):
+        # Called on the halt watcher's thread.
+        self._submit(self._service_halt, watch)
+
+    def _cancel_halt_watch(self):
+        if self.halt_watch is not None:
+            self.halt_watch.cancel()
+            self.halt_watch = None
+
+    def _detach(self, connection):
+        connection.stop()
+        self.packet_io = None
+        self._stop_reply_pending = False
+        self._cleanup_for_next_connection()
+        if not self.persist:
+            self._host._server_finished(self)
+
+    def resume(self, data):
+        # Only start the target. The stop reply is sent when the halt watcher sees it halt.
+        self._resume_target(data)
+        self._stop_reply_pending = True
+        self._watch_running_core()
+        return None
+
+    def close(self):
+        """! @brief Release the server's resources. Runs on the worker thread."""
+        self._cancel_halt_watch()
+        self._cleanup()
+
+class AsyncGDBServer(object):
+    """! @brief GDB servers for any number of sessions and cores on a single asyncio event loop.
+
+    With the threaded GDBServer, every core has a server thread and a packet I/O thread that wake
+    up periodically, so host CPU use grows with the number of boards. Here one event loop owns
+    every listening socket and gdb connection, and does all of the packet framing and acking.
+    Target operations for each session run on a single worker thread per session, which sleeps
+    until there is a command from gdb or a halt to report. Halts of running cores are detected by
+    each session's halt watcher, which calls back as soon as a core halts so the stop reply is
+    pushed to gdb immediately.
+
+    Each core listens on the port given by its session's `gdbserver_port` option plus the core
+    number, as with GDBServer. Call run() to serve connections until stop() is called or, unless
+    the `persist` option is set, until gdb has detached from every core.
+
+    This class requires Python 3.
+    """
+
+    def __init__(self, server_listening_callback=None):
+        self._server_listening_callback = server_listening_callback
+        self._loop = asyncio.new_event_loop()
+        self._servers = []
+        self._workers = []
+        self._listeners = {}
+
+    @property
+    def servers(self):
+        """! @brief List of the server objects for all cores, with their `port` attribute."""
+        return list(self._servers)
+
+    def add_session(self, session):
+        """! @brief Start listening for gdb connections to each core of an open session."""
+        worker = ThreadPoolExecutor(max_workers=1)
+        self._workers.append(worker)
+        for core_number in session.board.target.cores:
+            # Create the server on the worker since it accesses the target.
+            server = worker.submit(_CoreServer, self, session, core_number, worker).result()
+            self._servers.append(server)
+            self._listen(server)
+
+    def _listen(self, server):
+        host = 'localhost' if server.serve_local_only else None
+        listener = self._loop.run_until_complete(self._loop.create_server(
+            lambda: _GDBConnection(server, self._loop), host, server.port, family=socket.AF_INET))
+        # Read back bound port in case auto-assigned (port 0)
+        server.port = listener.sockets[0].getsockname()[1]
+        self._listeners[server] = listener
+        server.log.info('GDB server started on port %d', server.port)
+        if self._server_listening_callback:
+            self._server_listening_callback(server)
+
+    def run(self):
+        """! @brief Serve gdb connections until stopped."""
+        if self._listeners:
+            self._loop.run_forever()
+
+    def stop(self):
+        """! @brief Make run() return. May be called from any thread."""
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def close(self):
+        """! @brief Close all connections and release the servers' resources."""
+        for server in list(self._listeners):
+            self._close_listener(server)
+        for server in self._servers:
+            if server._connection is not None:
+                server._connection.close()
+                server._connection = None
+        futures = [server._worker.submit(server._run_job, server.close) for server in self._servers]
+        for future in futures:
+            future.result()
+        for worker in self._workers:
+            worker.shutdown()
+        # Let the transports finish closing.
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+
+    def _close_listener(self, server):
+        listener = self._listeners.pop(server)
+        listener.close()
+        self._loop.run_until_complete(listener.wait_closed())
+
+    def _server_finished(self, server):
+        """! @brief Stop serving a core after gdb detached. May be called from any thread."""
+        self._loop.call_soon_threadsafe(self._stop_listening, server)
+
+    def _stop_listening(self, server):
+        listener = self._listeners.pop(server, None)
+        if listener is not None:
+            listener.close()
+        if not self._listeners:
+            # Let the closed connection finish closing first.
+            self._loop.call_soon(self._loop.stop)
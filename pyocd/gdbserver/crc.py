@@ -0,0 +1,124 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from binascii import crc32
+
+LOG = logging.getLogger(__name__)
+
+## Table that reverses the order of the bits in a byte, for bytes.translate().
+_BIT_REVERSE = bytes(bytearray(int('{:08b}'.format(i)[::-1], 2) for i in range(256)))
+
+## Core registers changed by running the analyzer.
+_ANALYZER_REGISTERS = ['r0', 'r1', 'r2', 'r3', 'r4', 'r5', 'r6', 'r7', 'r8', 'r9', 'r10', 'r11',
+                        'r12', 'sp', 'lr', 'pc', 'xpsr']
+
+## Smallest block checked with the analyzer. Smaller pieces are read and compared on the host.
+MIN_ANALYZER_BLOCK_SIZE = 256
+
+## Maximum number of blocks passed to one call of the analyzer. Each one uses 4 bytes of the
+# flash algo's data buffer.
+MAX_ANALYZER_BLOCKS = 32
+
+def _reverse32(value):
+    return int('{:032b}'.format(value)[::-1], 2)
+
+def gdb_crc32(data, crc=0xFFFFFFFF):
+    """! @brief Compute the CRC-32 used by gdb for the qCRC packet.
+
+    gdb's CRC is the MSB-first variant of CRC-32, with no final inversion. It is computed with the
+    reflected CRC-32 from binascii on data with the bits of each byte reversed, which is much faster
+    than a table-driven loop in Python.
+
+    @param data Bytes-like object.
+    @param crc Initial CRC value, or the result for the preceding data to continue a computation.
+    @return Integer CRC.
+    """
+    reflected = crc32(bytes(data).translate(_BIT_REVERSE), _reverse32(crc) ^ 0xFFFFFFFF)
+    return _reverse32((reflected & 0xFFFFFFFF) ^ 0xFFFFFFFF)
+
+def split_for_analyzer(start, end):
+    """! @brief Split an address range into blocks the flash analyzer can compute CRCs for.
+
+    The analyzer takes blocks whose size is a power of two, that are aligned to their size, and
+    whose address divided by the size fits in 16 bits.
+
+    @return Tuple of a list of (address, size) blocks for the analyzer, and a list of (address,
+        size) ranges that are too small or misaligned and must be checked on the host.
+    """
+    blocks = []
+    host_ranges = []
+    addr = start
+    while addr < end:
+        size = (addr & -addr) if addr else (1 << 31)
+        while size > end - addr:
+            size >>= 1
+        if size >= MIN_ANALYZER_BLOCK_SIZE and (addr // size) <= 0xFFFF:
+            blocks.append((addr, size))
+        elif host_ranges and sum(host_ranges[-1]) == addr:
+            host_ranges[-1] = (host_ranges[-1][0], host_ranges[-1][1] + size)
+        else:
+            host_ranges.append((addr, size))
+        addr += size
+    return blocks, host_ranges
+
+def check_flash_contents(flash, addr, data):
+    """! @brief Check whether flash holds the given data using CRCs computed on the target.
+
+    The analyzer that Flash.compute_crcs() loads into target RAM computes the reflected CRC-32 of
+    each block. Because gdb uses a different CRC, the analyzer can't answer qCRC directly, but it
+    can confirm that flash matches data the host already has, such as the data from a load. Only
+    four bytes per block are then read from the target. Small or misaligned pieces at the ends of
+    the range are read and compared on the host.
+
+    The target must be halted. The analyzer is run without resetting the target, and the core
+    registers it changes are restored afterwards. Target RAM used by the flash algo is not
+    restored.
+
+    @param flash Flash instance with analyzer support.
+    @param addr Start address of the data.
+    @param data Bytes-like object with the expected flash contents.
+    @return Boolean indicating whether all CRCs matched.
+    """
+    target = flash.target
+    data = bytes(data)
+    blocks, host_ranges = split_for_analyzer(addr, addr + len(data))
+
+    for start, size in host_ranges:
+        offset = start - addr
+        if bytearray(target.read_memory_block8(start, size)) != data[offset:offset + size]:
+            return False
+    if not blocks:
+        return True
+
+    saved_registers = target.read_core_registers_raw(_ANALYZER_REGISTERS)
+    try:
+        flash.init(flash.Operation.VERIFY, reset=False)
+        try:
+            crcs = []
+            for i in range(0, len(blocks), MAX_ANALYZER_BLOCKS):
+                crcs += flash.compute_crcs(blocks[i:i + MAX_ANALYZER_BLOCKS])
+        finally:
+            flash.cleanup()
+    finally:
+        target.write_core_registers_raw(_ANALYZER_REGISTERS, saved_registers)
+
+    for (start, size), crc in zip(blocks, crcs):
+        offset = start - addr
+        if crc != (crc32(data[offset:offset + size]) & 0xFFFFFFFF):
+            LOG.debug("Flash CRC mismatch for 0x%08x..0x%08x", start, start + size)
+            return False
+    return True
@@ -0,0 +1,113 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+_PACKET_START = ord('$')
+_ACK = ord('+')
+_NACK = ord('-')
+_CTRL_C = 0x03
+
+class PacketFramer(object):
+    """! @brief Splits the byte stream received from gdb into RSP packets.
+
+    Received data is appended to the framer with feed(). Iterating over the framer then yields
+    each complete item found in the data received so far, as a (kind, packet) tuple. The kind is
+    one of #PACKET, #ACK, #NACK, or #INTERRUPT. For packets, the second element is the complete
+    packet as bytes, from the '$' through the two checksum characters, and for other kinds it is
+    None. Bytes outside of a packet that aren't an ack, nack, or Ctrl-C are discarded.
+
+    Framing takes time linear in the amount of data, no matter how the data is split up when it is
+    received. The search for the end of a packet resumes where the previous search stopped rather
+    than starting over, and consumed data is only removed from the front of the buffer once there
+    is enough of it to make the copy worthwhile. Binary data in a packet has '#' escaped, so the
+    first '#' after the start of a packet always marks its end.
+    """
+
+    ## Item kinds.
+    PACKET = 0
+    ACK = 1
+    NACK = 2
+    INTERRUPT = 3
+
+    ## Minimum number of consumed bytes before they are removed from the buffer.
+    COMPACT_THRESHOLD = 16384
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0 # Offset of the first unconsumed byte.
+        self._packet_start = None # Offset of the '$' of the current incomplete packet.
+        self._scan_pos = 0 # Offset at which to resume the search for the current packet's '#'.
+
+    @property
+    def buffered_count(self):
+        """! @brief Number of received bytes that have not been returned as part of an item."""
+        start = self._pos if (self._packet_start is None) else self._packet_start
+        return len(self._buffer) - start
+
+    def feed(self, data):
+        """! @brief Add received data."""
+        self._buffer += data
+
+    def __iter__(self):
+        while True:
+            item = self._next_item()
+            if item is None:
+                break
+            yield item
+        self._compact()
+
+    def _next_item(self):
+        buf = self._buffer
+        while self._packet_start is None:
+            if self._pos >= len(buf):
+                return None
+            c = buf[self._pos]
+            self._pos += 1
+            if c == _PACKET_START:
+                self._packet_start = self._pos - 1
+                self._scan_pos = self._pos
+            elif c == _ACK:
+                return (self.ACK, None)
+            elif c == _NACK:
+                return (self.NACK, None)
+            elif c == _CTRL_C:
+                return (self.INTERRUPT, None)
+
+        end = buf.find(b'#', self._scan_pos)
+        if end < 0:
+            self._scan_pos = len(buf)
+            return None
+        self._scan_pos = end
+        # Wait for both checksum characters.
+        if end + 2 >= len(buf):
+            return None
+        packet = bytes(buf[self._packet_start:end + 3])
+        self._pos = end + 3
+        self._packet_start = None
+        return (self.PACKET, packet)
+
+    def _compact(self):
+        """! @brief Remove consumed data from the front of the buffer."""
+        start = self._pos if (self._packet_start is None) else self._packet_start
+        if start == len(self._buffer):
+            del self._buffer[:]
+        elif start >= self.COMPACT_THRESHOLD:
+            del self._buffer[:start]
+        else:
+            return
+        self._pos -= start
+        self._scan_pos = max(self._scan_pos - start, 0)
+        if self._packet_start is not None:
+            self._packet_start -= start
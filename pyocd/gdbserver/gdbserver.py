@@ -16,22 +16,24 @@
 
 from ..core import exceptions
 from ..core.target import Target
-from ..flash.loader import (FlashLoader, FlashEraser)
+from ..flash.loader import (BackgroundFlashLoader, FlashLoader, FlashEraser)
 from ..utility.cmdline import convert_vector_catch
 from ..utility.conversion import (hex_to_byte_list, hex_encode, hex_decode, hex8_to_u32le)
 from ..utility.progress import print_progress
-from ..utility.compatibility import (iter_single_bytes, to_bytes_safe, to_str_safe)
+from ..utility.compatibility import (to_bytes_safe, to_str_safe)
 from ..utility.server import StreamServer
 from ..trace.swv import SWVReader
 from ..utility.sockets import ListenerSocket
 from .syscall import GDBSyscallIOHandler
+from .framing import PacketFramer
+from .crc import (check_flash_contents, gdb_crc32)
 from ..debug import semihost
 from ..debug.cache import MemoryAccessError
 from .context_facade import GDBDebugContextFacade
 from .symbols import GDBSymbolProvider
 from ..rtos import RTOS
 from . import signals
-import logging, threading, socket
+import logging, threading, socket, select, re
 from struct import unpack
 from time import (sleep, time)
 import sys
@@ -53,7 +55,7 @@ TRACE_PACKETS = LOG.getChild("trace_packet")
 TRACE_PACKETS.setLevel(logging.CRITICAL)
 
 def checksum(data):
-    return ("%02x" % (sum(six.iterbytes(data)) % 256)).encode()
+    return ("%02x" % (sum(bytearray(data)) % 256)).encode()
 
 def unescape(data):
     """! @brief De-escapes binary data from Gdb.
@@ -77,19 +79,16 @@ def unescape(data):
 
     return data
 
+## Characters that must be escaped in binary data sent to gdb.
+_ESCAPE_RE = re.compile(b'[#$}*]')
+
 def escape(data):
     """! @brief Escape binary data to be sent to Gdb.
     
     @param data Bytes-like object containing raw binary.
     @return Bytes object with the characters in '#$}*' escaped as required by Gdb.
     """
-    result = b''
-    for c in iter_single_bytes(data):
-        if c in b'#$}*':
-            result += b'}' + six.int2byte(six.byte2int(c) ^ 0x20)
-        else:
-            result += c
-    return result
+    return _ESCAPE_RE.sub(lambda m: b'}' + six.int2byte(six.byte2int(m.group()) ^ 0x20), bytes(data))
 
 class GDBError(exceptions.Error):
     """! @brief Error communicating with GDB."""
@@ -108,6 +107,9 @@ class GDBServerPacketIOThread(threading.Thread):
     method writes outgoing packets to the socket immediately.
     """
     
+    ## Seconds between checks for shutdown while waiting for data.
+    SHUTDOWN_CHECK_INTERVAL = 0.1
+    
     def __init__(self, abstract_socket):
         super(GDBServerPacketIOThread, self).__init__()
         self.name = "gdb-packet-thread-port%d" % abstract_socket.port
@@ -118,7 +120,7 @@ class GDBServerPacketIOThread(threading.Thread):
         self.interrupt_event = threading.Event()
         self.send_acks = True
         self._clear_send_acks = False
-        self._buffer = b''
+        self._framer = PacketFramer()
         self._expecting_ack = False
         self.drop_reply = False
         self._last_packet = b''
@@ -164,27 +166,33 @@ class GDBServerPacketIOThread(threading.Thread):
     def run(self):
         self.log.debug("Starting GDB server packet I/O thread")
 
-        self._abstract_socket.set_timeout(0.01)
-
         while not self._shutdown_event.is_set():
             try:
+                # Block until data is received. The timeout only serves to check for shutdown.
+                readable, _, _ = select.select([self._abstract_socket], [], [],
+                                    self.SHUTDOWN_CHECK_INTERVAL)
+                if not readable:
+                    continue
                 data = self._abstract_socket.read()
-
-                # Handle closed connection
-                if len(data) == 0:
-                    self.log.debug("GDB packet thread: other side closed connection")
+            except (socket.error, select.error, ValueError) as err:
+                # The socket was closed under us, or the connection failed.
+                if not self._shutdown_event.is_set():
+                    self.log.debug("GDB packet thread: connection error: %s", err)
                     self._closed = True
-                    break
+                break
 
-                TRACE_PACKETS.debug('-->>>> GDB read %d bytes: %s', len(data), data)
+            # Handle closed connection
+            if len(data) == 0:
+                self.log.debug("GDB packet thread: other side closed connection")
+                self._closed = True
+                break
 
-                self._buffer += data
-            except socket.error:
-                pass
+            TRACE_PACKETS.debug('-->>>> GDB read %d bytes: %s', len(data), data)
 
             if self._shutdown_event.is_set():
                 break
 
+            self._framer.feed(data)
             self._process_data()
 
         self.log.debug("GDB packet thread stopping")
@@ -203,49 +211,35 @@ class GDBServerPacketIOThread(threading.Thread):
         if self.send_acks:
             self._expecting_ack = True
 
-    def _check_expected_ack(self):
-        # Handle expected ack.
-        c = self._buffer[0:1]
-        if c in (b'+', b'-'):
-            self._buffer = self._buffer[1:]
-            TRACE_ACK.debug('got ack: %s', c)
-            if c == b'-':
-                # Handle nack from gdb
-                self._write_packet(self._last_packet)
-                return
-
-            # Handle disabling of acks.
-            if self._clear_send_acks:
-                self.send_acks = False
-                self._clear_send_acks = False
-        else:
-            self.log.debug("GDB: expected n/ack but got '%s'", c)
+    def _handle_ack(self, kind):
+        TRACE_ACK.debug('got ack: %s', b'+' if (kind == PacketFramer.ACK) else b'-')
+        if kind == PacketFramer.NACK:
+            # Handle nack from gdb
+            self._write_packet(self._last_packet)
+            return
+
+        # Handle disabling of acks.
+        if self._clear_send_acks:
+            self.send_acks = False
+            self._clear_send_acks = False
 
     def _process_data(self):
-        """! @brief Process all incoming data until there are no more complete packets."""
-        while len(self._buffer):
+        """! @brief Handle all complete packets, acks, and interrupts received so far."""
+        for kind, packet in self._framer:
+            if kind in (PacketFramer.ACK, PacketFramer.NACK):
+                if self._expecting_ack:
+                    self._expecting_ack = False
+                    self._handle_ack(kind)
+                continue
+
             if self._expecting_ack:
                 self._expecting_ack = False
-                self._check_expected_ack()
+                self.log.debug("GDB: expected n/ack but got %s", packet or CTRL_C)
 
-            # Check for a ctrl-c.
-            if len(self._buffer) and self._buffer[0:1] == CTRL_C:
+            if kind == PacketFramer.INTERRUPT:
                 self.interrupt_event.set()
-                self._buffer = self._buffer[1:]
-
-            try:
-                # Look for complete packet and extract from buffer.
-                pkt_begin = self._buffer.index(b"$")
-                pkt_end = self._buffer.index(b"#") + 2
-                if pkt_begin >= 0 and pkt_end < len(self._buffer):
-                    pkt = self._buffer[pkt_begin:pkt_end + 1]
-                    self._buffer = self._buffer[pkt_end + 1:]
-                    self._handling_incoming_packet(pkt)
-                else:
-                    break
-            except ValueError:
-                # No complete packet received yet.
-                break
+            else:
+                self._handling_incoming_packet(packet)
 
     def _handling_incoming_packet(self, packet):
         # Compute checksum
@@ -267,6 +261,13 @@ class GDBServer(threading.Thread):
     This class start a GDB server listening a gdb connection on a specific port.
     It implements the RSP (Remote Serial Protocol).
     """
+
+    ## Number of bytes read at a time to compute a CRC on the host for qCRC.
+    CRC_READ_SIZE = 32 * 1024
+
+    ## Seconds between checks for shutdown while the target is running.
+    RUN_WAIT_INTERVAL = 0.1
+
     def __init__(self, session, core=None, server_listening_callback=None):
         super(GDBServer, self).__init__()
         self.session = session
@@ -303,6 +304,11 @@ class GDBServer(threading.Thread):
         self._is_extended_remote = False
         self.is_target_running = (self.target.get_state() == Target.TARGET_RUNNING)
         self.flash_loader = None
+        self.flash_erase_size = 0
+        self.flash_image = None
+        self.halt_watch = None
+        self._loading_image = None
+        self._checking_flash_crc = False
         self.shutdown_event = threading.Event()
         self.detach_event = threading.Event()
         if core is None:
@@ -310,19 +316,13 @@ class GDBServer(threading.Thread):
         else:
             self.target_context = self.board.target.get_target_context(core=core)
         self.target_facade = GDBDebugContextFacade(self.target_context)
+        self._memory_faults = self.session.get_memory_faults(self.target_context.core)
         self.thread_provider = None
         self.did_init_thread_providers = False
         self.current_thread_id = 0
         self.first_run_after_reset_or_flash = True
 
-        self.abstract_socket = ListenerSocket(self.port, self.packet_size)
-        if self.serve_local_only:
-            self.abstract_socket.host = 'localhost'
-        self.abstract_socket.init()
-        # Read back bound port in case auto-assigned (port 0)
-        self.port = self.abstract_socket.port
-
-        self.session.subscribe(self.event_handler, Target.EVENT_POST_RESET)
+        self.session.subscribe(self.event_handler, (Target.EVENT_POST_RESET, Target.EVENT_PRE_RUN))
 
         # Init semihosting and telnet console.
         if self.semihost_use_syscalls:
@@ -388,6 +388,7 @@ class GDBServer(threading.Thread):
                 b'S' : (self.step,               1   ), # Step with signal.
                 b'T' : (self.is_thread_alive,    1   ), # Thread liveness query.
                 b'v' : (self.v_command,          2   ), # v command.
+                b'x' : (self.get_memory_binary,  2   ), # Read memory (binary).
                 b'X' : (self.write_memory,       2   ), # Write memory (binary).
                 b'z' : (self.breakpoint,         1   ), # Insert breakpoint/watchpoint.
                 b'Z' : (self.breakpoint,         1   ), # Remove breakpoint/watchpoint.
@@ -398,6 +399,17 @@ class GDBServer(threading.Thread):
 
         # pylint: enable=invalid-name
 
+        self._start_server()
+
+    def _start_server(self):
+        """! @brief Open the listening socket and start the server thread."""
+        self.abstract_socket = ListenerSocket(self.port, self.packet_size)
+        if self.serve_local_only:
+            self.abstract_socket.host = 'localhost'
+        self.abstract_socket.init()
+        # Read back bound port in case auto-assigned (port 0)
+        self.port = self.abstract_socket.port
+
         self.setDaemon(True)
         self.start()
 
@@ -426,9 +438,18 @@ class GDBServer(threading.Thread):
         if self._swv_reader:
             self._swv_reader.stop()
             self._swv_reader = None
-        self.abstract_socket.cleanup()
+        if self.abstract_socket is not None:
+            self.abstract_socket.cleanup()
 
     def _cleanup_for_next_connection(self):
+        if self.halt_watch is not None:
+            self.halt_watch.cancel()
+            self.halt_watch = None
+        # Discard the data of a load that gdb didn't finish.
+        if isinstance(self.flash_loader, BackgroundFlashLoader):
+            self.flash_loader.abort()
+        self.flash_loader = None
+        self.flash_erase_size = 0
         self.non_stop = False
         self.thread_provider = None
         self.did_init_thread_providers = False
@@ -486,13 +507,21 @@ class GDBServer(threading.Thread):
                     self.packet_io.interrupt_event.clear()
 
                 if self.non_stop and self.is_target_running:
-                    try:
-                        if self.target.get_state() == Target.TARGET_HALTED:
-                            self.log.debug("state halted")
-                            self.is_target_running = False
-                            self.send_stop_notification()
-                    except Exception as e:
-                        self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
+                    # Only read the state once the halt watcher has seen the core halt.
+                    if self.halt_watch is None:
+                        self.halt_watch = self._watch_for_halt()
+                    if self.halt_watch.is_halted:
+                        self.halt_watch = None
+                        try:
+                            if self.target.get_state() == Target.TARGET_HALTED:
+                                self.log.debug("state halted")
+                                self.is_target_running = False
+                                self.send_stop_notification()
+                        except Exception as e:
+                            self.log.error("Unexpected exception: %s", e, exc_info=self.session.log_tracebacks)
+                elif self.halt_watch is not None:
+                    self.halt_watch.cancel()
+                    self.halt_watch = None
 
                 # read command
                 try:
@@ -696,6 +725,36 @@ class GDBServer(threading.Thread):
         return addr
 
     def resume(self, data):
+        self._resume_target(data)
+        val = b''
+
+        # The halt watcher sets the interrupt event too, so a single wait ends on either a halt
+        # or a ctrl-c from gdb.
+        halt_watch = self._watch_for_halt(self.packet_io.interrupt_event)
+        try:
+            while True:
+                if self.shutdown_event.isSet():
+                    self.packet_io.interrupt_event.clear()
+                    return self.create_rsp_packet(val)
+
+                if not self.packet_io.interrupt_event.wait(self.RUN_WAIT_INTERVAL):
+                    continue
+                self.packet_io.interrupt_event.clear()
+
+                if not halt_watch.is_halted:
+                    val = self._interrupt_running_target()
+                    break
+
+                val = self._get_stop_reply_for_halt()
+                if val is not None:
+                    break
+                halt_watch = self._watch_for_halt(self.packet_io.interrupt_event)
+        finally:
+            halt_watch.cancel()
+
+        return self.create_rsp_packet(val)
+
+    def _resume_target(self, data):
         addr = self._get_resume_step_addr(data)
         self.target.resume()
         self.log.debug("target resumed")
@@ -705,45 +764,45 @@ class GDBServer(threading.Thread):
             if self.thread_provider is not None:
                 self.thread_provider.read_from_target = True
 
-        val = b''
+    def _interrupt_running_target(self):
+        """! @brief Halt the target in response to a ctrl-c and return the stop reply data."""
+        self.log.debug("receive CTRL-C")
+        self.target.halt()
+        return self.get_t_response(forceSignal=signals.SIGINT)
 
-        while True:
-            if self.shutdown_event.isSet():
-                self.packet_io.interrupt_event.clear()
-                return self.create_rsp_packet(val)
+    def _get_stop_reply_for_halt(self):
+        """! @brief Handle the halt watcher reporting that the resumed core halted.
 
-            # Wait for a ctrl-c to be received.
-            if self.packet_io.interrupt_event.wait(0.01):
-                self.log.debug("receive CTRL-C")
-                self.packet_io.interrupt_event.clear()
-                self.target.halt()
-                val = self.get_t_response(forceSignal=signals.SIGINT)
-                break
+        @return The stop reply data for gdb, or None if the core is running again. That happens
+            after a semihosting request was handled, or if the watcher failed to poll the core but
+            its state could be read.
+        """
+        try:
+            if self.target.get_state() != Target.TARGET_HALTED:
+                return None
 
+            # Handle semihosting
+            if self.enable_semihosting:
+                was_semihost = self.semihost.check_and_handle_semihost_request()
+
+                if was_semihost:
+                    self.target.resume()
+                    return None
+
+            pc = self.target_context.read_core_register('pc')
+            self.log.debug("state halted; pc=0x%08x", pc)
+            return self.get_t_response()
+        except exceptions.Error as e:
             try:
-                if self.target.get_state() == Target.TARGET_HALTED:
-                    # Handle semihosting
-                    if self.enable_semihosting:
-                        was_semihost = self.semihost.check_and_handle_semihost_request()
-
-                        if was_semihost:
-                            self.target.resume()
-                            continue
-
-                    pc = self.target_context.read_core_register('pc')
-                    self.log.debug("state halted; pc=0x%08x", pc)
-                    val = self.get_t_response()
-                    break
-            except exceptions.Error as e:
-                try:
-                    self.target.halt()
-                except:
-                    pass
-                self.log.warning('Exception while target was running: %s', e, exc_info=self.session.log_tracebacks)
-                val = ('S%02x' % self.target_facade.get_signal_value()).encode()
-                break
+                self.target.halt()
+            except:
+                pass
+            self.log.warning('Exception while target was running: %s', e, exc_info=self.session.log_tracebacks)
+            return ('S%02x' % self.target_facade.get_signal_value()).encode()
 
-        return self.create_rsp_packet(val)
+    def _watch_for_halt(self, event=None, callback=None):
+        """! @brief Ask the session's halt watcher to notify us when the core halts."""
+        return self.session.halt_watcher.watch(self.target_context.core, event, callback)
 
     def step(self, data, start=0, end=0):
         addr = self._get_resume_step_addr(data)
@@ -854,6 +913,8 @@ class GDBServer(threading.Thread):
         self.log.debug("flash op: %s", ops)
 
         if ops == b'FlashErase':
+            # gdb erases every range before writing, so the total size is known for progress.
+            self.flash_erase_size += int(data.split(b':')[1].split(b',')[1], 16)
             return self.create_rsp_packet(b"OK")
 
         elif ops == b'FlashWrite':
@@ -869,10 +930,20 @@ class GDBServer(threading.Thread):
 
             # Get flash loader if there isn't one already
             if self.flash_loader is None:
-                self.flash_loader = FlashLoader(self.session)
+                self.flash_loader = self._create_flash_loader()
+                self._loading_image = []
 
-            # Add data to flash loader
-            self.flash_loader.add_data(write_addr, unescape(data[idx_begin:len(data) - 3]))
+            # Add data to flash loader. After an error, gdb aborts the load, so start over with
+            # a new flash loader for the next one.
+            write_data = bytearray(unescape(data[idx_begin:len(data) - 3]))
+            try:
+                self.flash_loader.add_data(write_addr, write_data)
+            except:
+                self.flash_loader = None
+                self.flash_erase_size = 0
+                self._loading_image = None
+                raise
+            self._record_loaded_data(write_addr, write_data)
 
             return self.create_rsp_packet(b"OK")
 
@@ -880,12 +951,19 @@ class GDBServer(threading.Thread):
         elif b'FlashDone' in ops :
             # Only program if we received data.
             if self.flash_loader is not None:
-                # Write all buffered flash contents.
-                self.flash_loader.commit()
-
                 # Set flash loader to None so that on the next flash command a new
                 # object is used.
+                loader = self.flash_loader
                 self.flash_loader = None
+                self.flash_erase_size = 0
+
+                # Write all buffered flash contents.
+                image = self._loading_image
+                self._loading_image = None
+                loader.commit()
+
+                # Keep the data that was written so qCRC can check it on the target.
+                self.flash_image = image
 
             self.first_run_after_reset_or_flash = True
             if self.thread_provider is not None:
@@ -895,7 +973,36 @@ class GDBServer(threading.Thread):
 
         return None
 
+    def _create_flash_loader(self):
+        """! @brief Return the flash loader for a gdb load.
+        
+        When streaming is enabled, sectors are programmed by a BackgroundFlashLoader while gdb
+        is still sending data. gdb sorts the data it writes by address, as streaming requires.
+        Chip erase needs the whole image, so the data is buffered until vFlashDone in that case.
+        """
+        if self.session.options.get('stream_flash') \
+                and self.session.options.get('chip_erase') == "sector":
+            return BackgroundFlashLoader(self.session, self.flash_erase_size)
+        else:
+            return FlashLoader(self.session)
+
     def get_memory(self, data):
+        mem = self._read_memory_for_gdb(data)
+        if mem is None:
+            return self.create_rsp_packet(b'E01') #EPERM
+        return self.create_rsp_packet(hex_encode(mem))
+
+    def get_memory_binary(self, data):
+        mem = self._read_memory_for_gdb(data)
+        if mem is None:
+            return self.create_rsp_packet(b'E01') #EPERM
+        # The 'b' prefix distinguishes the data from an error reply.
+        return self.create_rsp_packet(b'b' + escape(mem))
+
+    def _read_memory_for_gdb(self, data):
+        """! @brief Perform the read for an 'm' or 'x' packet.
+        @return Bytearray of the data that was read, or None on error.
+        """
         split = data.split(b',')
         addr = int(split[0], 16)
         length = split[1].split(b'#')[0]
@@ -904,17 +1011,35 @@ class GDBServer(threading.Thread):
         TRACE_MEM.debug("GDB getMem: addr=%x len=%x", addr, length)
 
         try:
-            mem = self.target_context.read_memory_block8(addr, length)
-            # Flush so an exception is thrown now if invalid memory was accesses
-            self.target_context.flush()
-            val = hex_encode(bytearray(mem))
+            if self._memory_faults.find(addr, addr + length):
+                mem = self._read_memory_prefix(addr, length)
+            else:
+                try:
+                    mem = self.target_context.read_memory_block8(addr, length)
+                    # Flush so an exception is thrown now if invalid memory was accesses
+                    self.target_context.flush()
+                except exceptions.TransferFaultError:
+                    mem = self._read_memory_prefix(addr, length)
+            if len(mem) or not length:
+                return bytearray(mem)
+            self.log.debug("get_memory faulted at 0x%x", addr)
         except exceptions.TransferError:
             self.log.debug("get_memory failed at 0x%x" % addr)
-            val = b'E01' #EPERM
         except MemoryAccessError as e:
             self.log.debug("get_memory failed at 0x%x: %s", addr, str(e))
-            val = b'E01' #EPERM
-        return self.create_rsp_packet(val)
+        return None
+
+    def _read_memory_prefix(self, addr, length):
+        """! @brief Read memory up to the first faulting address.
+        
+        GDB accepts a reply to the 'm' packet with fewer bytes than requested, so only the data
+        before the first fault is returned. Faulting ranges are recorded in the session's fault map
+        so later reads don't access them.
+        """
+        data, faults = self.target_context.read_memory_tolerant(addr, length, self._memory_faults)
+        if faults:
+            data = data[:faults[0][0] - addr]
+        return data
 
     def write_memory_hex(self, data):
         split = data.split(b',')
@@ -927,7 +1052,9 @@ class GDBServer(threading.Thread):
         data = hex_to_byte_list(split[0])
 
         TRACE_MEM.debug("GDB writeMemHex: addr=%x len=%x", addr, length)
+        self.flash_image = None
 
+        self.session.clear_memory_faults()
         try:
             if length > 0:
                 self.target_context.write_memory_block8(addr, data)
@@ -949,11 +1076,13 @@ class GDBServer(threading.Thread):
         length = int(split[1].split(b':')[0], 16)
 
         TRACE_MEM.debug("GDB writeMem: addr=%x len=%x", addr, length)
+        self.flash_image = None
 
         idx_begin = data.index(b':') + 1
         data = data[idx_begin:len(data) - 3]
         data = unescape(data)
 
+        self.session.clear_memory_faults()
         try:
             if length > 0:
                 self.target_context.write_memory_block8(addr, data)
@@ -998,7 +1127,8 @@ class GDBServer(threading.Thread):
             self.gdb_features = query[1].split(b';')
 
             # Build our list of features.
-            features = [b'qXfer:features:read+', b'QStartNoAckMode+', b'qXfer:threads:read+', b'QNonStop+']
+            features = [b'qXfer:features:read+', b'QStartNoAckMode+', b'qXfer:threads:read+', b'QNonStop+',
+                        b'binary-upload+']
             features.append(b'PacketSize=' + six.b(hex(self.packet_size))[2:])
             if self.target_facade.get_memory_map_xml() is not None:
                 features.append(b'qXfer:memory-map:read+')
@@ -1027,6 +1157,10 @@ class GDBServer(threading.Thread):
                 self.log.debug("Unsupported qXfer request: %s:%s:%s:%s", query[1], query[2], query[3], query[4])
                 return None
 
+        elif query[0] == b'CRC':
+            data = query[1].split(b'#')[0].split(b',')
+            return self.compute_crc(int(data[0], 16), int(data[1], 16))
+
         elif query[0].startswith(b'C'):
             if not self.is_threading_enabled():
                 return self.create_rsp_packet(b"QC1")
@@ -1059,6 +1193,71 @@ class GDBServer(threading.Thread):
         else:
             return self.create_rsp_packet(b"")
 
+    def compute_crc(self, addr, length):
+        """! @brief Reply to a qCRC packet, as sent by gdb's compare-sections command.
+        
+        If the range holds data from the last load and the flash supports the analyzer, the CRCs
+        are computed on the target to check that flash still holds that data, and gdb's CRC is
+        then computed from the data on the host. Otherwise the memory is read and the CRC is
+        computed on the host. Either way, gdb doesn't have to read the memory itself.
+        """
+        crc = None
+        expected = self._get_loaded_data(addr, length)
+        if expected is not None:
+            try:
+                self._checking_flash_crc = True
+                if check_flash_contents(self.target.memory_map.get_region_for_address(addr).flash,
+                                        addr, expected):
+                    crc = gdb_crc32(expected)
+            except exceptions.Error as e:
+                self.log.debug("qCRC check on target failed: %s", e,
+                                exc_info=self.session.log_tracebacks)
+            finally:
+                self._checking_flash_crc = False
+
+        if crc is None:
+            crc = 0xFFFFFFFF
+            try:
+                for offset in range(0, length, self.CRC_READ_SIZE):
+                    size = min(self.CRC_READ_SIZE, length - offset)
+                    mem = self.target_context.read_memory_block8(addr + offset, size)
+                    crc = gdb_crc32(bytearray(mem), crc)
+            except (exceptions.TransferError, MemoryAccessError) as e:
+                self.log.debug("qCRC read failed at 0x%x: %s", addr, e)
+                return self.create_rsp_packet(b'E01') #EPERM
+
+        return self.create_rsp_packet(("C%08x" % crc).encode())
+
+    def _record_loaded_data(self, addr, data):
+        """! @brief Add data written by a vFlashWrite packet to the image being loaded."""
+        image = self._loading_image
+        if image and (image[-1][0] + len(image[-1][1]) == addr):
+            image[-1][1].extend(data)
+        else:
+            image.append((addr, data))
+
+    def _get_loaded_data(self, addr, length):
+        """! @brief Return the data from the last load for a range, if it can be checked on target.
+        
+        Running the analyzer overwrites target RAM. This is only acceptable before the target has
+        run after a load, since the flash algo has just used the same RAM. The record of the load
+        is discarded when the target is resumed or stepped, or when gdb writes memory.
+        
+        @return Bytearray of the data, or None.
+        """
+        if not self.flash_image or length == 0:
+            return None
+        region = self.target.memory_map.get_region_for_address(addr)
+        if region is None or not region.is_flash or region.flash is None \
+                or not region.contains_range(addr, length=length) \
+                or not region.flash.get_flash_info().crc_supported \
+                or self.target.get_state() != Target.TARGET_HALTED:
+            return None
+        for start, data in self.flash_image:
+            if start <= addr and (addr + length) <= start + len(data):
+                return data[addr - start:addr - start + length]
+        return None
+
     def init_thread_providers(self):
         symbol_provider = GDBSymbolProvider(self)
 
@@ -1331,7 +1530,12 @@ class GDBServer(threading.Thread):
             return None
 
     def event_handler(self, notification):
-        if notification.event == Target.EVENT_POST_RESET:
+        if notification.event == Target.EVENT_PRE_RUN:
+            # The flash algo runs the target while loading and checking CRCs.
+            if (self.flash_loader is None) and (self._loading_image is None) \
+                    and not self._checking_flash_crc:
+                self.flash_image = None
+        elif notification.event == Target.EVENT_POST_RESET:
             # Invalidate threads list if flash is reprogrammed.
             self.log.debug("Received EVENT_POST_RESET event")
             self.first_run_after_reset_or_flash = True
@@ -16,8 +16,14 @@
 
 from .cmsis_dap_probe import CMSISDAPProbe
 from .stlink_probe import StlinkProbe
+from .shared_probe import SharedProbe
+from .remote_probe import RemoteProbe
 
+## Probe classes in search order. Probes shared by a probe daemon come first, so they take
+# priority over the same probe found connected to this host.
 PROBE_CLASSES = [
+    SharedProbe,
+    RemoteProbe,
     CMSISDAPProbe,
     StlinkProbe,
     ]
@@ -31,6 +37,12 @@ class DebugProbeAggregator(object):
         for cls in PROBE_CLASSES:
             probes += cls.get_all_connected_probes()
         
+        # A probe owned by a probe daemon is also found connected to this host, but only the
+        # daemon can use it.
+        shared_ids = set(probe.unique_id for probe in probes if isinstance(probe, SharedProbe))
+        probes = [probe for probe in probes
+                    if isinstance(probe, SharedProbe) or (probe.unique_id not in shared_ids)]
+        
         # Filter by unique ID.
         if unique_id is not None:
             unique_id = unique_id.lower()
@@ -135,14 +135,25 @@ class CMSISDAPProbe(DebugProbe):
     def supports_swj_sequence(self):
         return True
 
-    def create_associated_board(self):
-        assert self.session is not None
-        
+    @property
+    def is_poll_ap_offloaded(self):
+        return True
+
+    @property
+    def associated_board_id(self):
         # Only support associated Mbed boards for DAPLink firmware. We can't assume other
         # CMSIS-DAP firmware is using the same serial number format, so we cannot reliably
         # extract the board ID.
         if self._link.vidpid == self.DAPLINK_VIDPID:
-            return MbedBoard(self.session, board_id=self.unique_id[0:4])
+            return self.unique_id[0:4]
+        else:
+            return None
+
+    def create_associated_board(self):
+        assert self.session is not None
+        board_id = self.associated_board_id
+        if board_id is not None:
+            return MbedBoard(self.session, board_id=board_id)
         else:
             return None
     
@@ -192,6 +203,8 @@ class CMSISDAPProbe(DebugProbe):
 
     def swj_sequence(self, length, bits):
         try:
+            # A line reset or dormant state transition may select a different DP.
+            self._invalidate_cached_registers()
             self._link.swj_sequence(length, bits)
         except DAPAccess.Error as exc:
             six.raise_from(self._convert_exception(exc), exc)
@@ -314,6 +327,21 @@ class CMSISDAPProbe(DebugProbe):
 
         return True
 
+    def poll_ap(self, addr, mask, value, timeout):
+        """! @brief Wait until the masked value of an AP register matches.
+        
+        Uses CMSIS-DAP value match reads, so the register is polled by the probe.
+        """
+        assert type(addr) in (six.integer_types)
+        ap_reg = self.REG_ADDR_TO_ID_MAP[self.AP, (addr & self.A32)]
+
+        try:
+            self.write_dp(self.DP_SELECT, addr & self.APSEL_APBANKSEL)
+            return self._link.reg_wait_match(ap_reg, mask, value, timeout)
+        except DAPAccess.Error as error:
+            self._invalidate_cached_registers()
+            six.raise_from(self._convert_exception(error), error)
+
     def read_ap_multiple(self, addr, count=1, now=True):
         assert type(addr) in (six.integer_types)
         ap_reg = self.REG_ADDR_TO_ID_MAP[self.AP, (addr & self.A32)]
@@ -350,6 +378,42 @@ class CMSISDAPProbe(DebugProbe):
             self._invalidate_cached_registers()
             six.raise_from(self._convert_exception(exc), exc)
     
+    def read_ap_multiple_bytes(self, addr, count=1, now=True):
+        assert type(addr) in (six.integer_types)
+        ap_reg = self.REG_ADDR_TO_ID_MAP[self.AP, (addr & self.A32)]
+        
+        try:
+            # Select the AP and bank.
+            self.write_dp(self.DP_SELECT, addr & self.APSEL_APBANKSEL)
+            
+            result = self._link.reg_read_repeat_bytes(count, ap_reg, dap_index=0, now=now)
+        except DAPAccess.Error as exc:
+            self._invalidate_cached_registers()
+            six.raise_from(self._convert_exception(exc), exc)
+
+        # Need to wrap the deferred callback to convert exceptions.
+        def read_ap_repeat_bytes_callback():
+            try:
+                return result()
+            except DAPAccess.Error as exc:
+                self._invalidate_cached_registers()
+                six.raise_from(self._convert_exception(exc), exc)
+
+        return result if now else read_ap_repeat_bytes_callback
+
+    def write_ap_multiple_bytes(self, addr, data):
+        assert type(addr) in (six.integer_types)
+        ap_reg = self.REG_ADDR_TO_ID_MAP[self.AP, (addr & self.A32)]
+        
+        try:
+            # Select the AP and bank.
+            self.write_dp(self.DP_SELECT, addr & self.APSEL_APBANKSEL)
+            
+            return self._link.reg_write_repeat_bytes(len(data) // 4, ap_reg, data, dap_index=0)
+        except DAPAccess.Error as exc:
+            self._invalidate_cached_registers()
+            six.raise_from(self._convert_exception(exc), exc)
+    
     # ------------------------------------------- #
     #          SWO functions
     # ------------------------------------------- #
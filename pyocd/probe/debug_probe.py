@@ -16,6 +16,10 @@
 
 from enum import Enum
 
+from ..utility import conversion
+from ..utility.future import TransferFuture
+from ..utility.timeout import Timeout
+
 class DebugProbe(object):
     """! @brief Abstract debug probe class."""
 
@@ -109,6 +113,22 @@ class DebugProbe(object):
         """
         raise NotImplementedError()
 
+    @property
+    def is_poll_ap_offloaded(self):
+        """! @brief Whether poll_ap() reads the register without a host round trip for each read.
+        
+        The default is False, since the default poll_ap() implementation reads from the host.
+        """
+        return False
+
+    @property
+    def associated_board_id(self):
+        """! @brief Board ID of the board of which the probe is a component, or None.
+        
+        This is the board ID passed to the board created by create_associated_board().
+        """
+        return None
+
     def create_associated_board(self):
         """! @brief Create a board instance representing the board of which the probe is a component.
         
@@ -217,13 +237,88 @@ class DebugProbe(object):
         """! @brief Write an AP register."""
         raise NotImplementedError()
 
+    def poll_ap(self, addr, mask, value, timeout):
+        """! @brief Wait until the masked value of an AP register matches.
+        
+        The register is read until `(register & mask) == value` or the timeout expires. It is
+        always read at least once. The default implementation polls with read_ap(), one host
+        round trip per read. Probes that can repeat the read themselves should override this.
+        
+        @param self
+        @param addr AP register address.
+        @param mask Mask applied to the register value before comparing.
+        @param value Value to compare the masked register value with.
+        @param timeout Maximum time to wait in seconds.
+        @return Boolean indicating whether the value matched before the timeout expired.
+        """
+        with Timeout(timeout) as t_o:
+            while True:
+                if (self.read_ap(addr) & mask) == value:
+                    return True
+                if not t_o.check():
+                    return False
+
     def read_ap_multiple(self, addr, count=1, now=True):
         """! @brief Read one AP register multiple times."""
         raise NotImplementedError()
 
+    def read_dp_async(self, addr):
+        """! @brief Queue a DP register read.
+        @return TransferFuture for the register's value.
+        """
+        return TransferFuture(self.read_dp(addr, now=False))
+
+    def read_ap_async(self, addr):
+        """! @brief Queue an AP register read.
+        @return TransferFuture for the register's value.
+        """
+        return TransferFuture(self.read_ap(addr, now=False))
+
+    def read_ap_multiple_async(self, addr, count=1):
+        """! @brief Queue reads of one AP register multiple times.
+        @return TransferFuture for the list of register values.
+        """
+        return TransferFuture(self.read_ap_multiple(addr, count, now=False))
+
     def write_ap_multiple(self, addr, values):
         """! @brief Write one AP register multiple times."""
         raise NotImplementedError()
+
+    def read_ap_multiple_bytes(self, addr, count=1, now=True):
+        """! @brief Read one AP register multiple times, returning the raw data.
+        
+        The default implementation is built on read_ap_multiple(). Probes that receive register
+        data as a byte stream should override this method to avoid converting to and from lists.
+        
+        @param self
+        @param addr AP register address.
+        @param count Number of times to read the register.
+        @param now Boolean specifying whether the read is synchronous (True) or asynchronous.
+        @return If _now_ is True, a bytearray of _count_ little endian words. When _now_ is False,
+            a callable is returned that when invoked will return the bytearray.
+        """
+        result = self.read_ap_multiple(addr, count, now)
+
+        def read_ap_multiple_bytes_cb():
+            return conversion.u32le_list_to_bytes(result())
+
+        if now:
+            return conversion.u32le_list_to_bytes(result)
+        else:
+            return read_ap_multiple_bytes_cb
+
+    def write_ap_multiple_bytes(self, addr, data):
+        """! @brief Write one AP register multiple times from a buffer.
+        
+        The default implementation is built on write_ap_multiple().
+        
+        @param self
+        @param addr AP register address.
+        @param data Object supporting the buffer protocol with a length that is a multiple of 4,
+            containing little endian words. The buffer can be modified as soon as this method
+            returns, even if the write is deferred until the next flush.
+        """
+        self.write_ap_multiple(addr, conversion.bytes_to_u32le_list(data))
     
     def get_memory_interface_for_ap(self, apsel):
         """! @brief Returns a @ref pyocd.core.memory_interface.MemoryInterface "MemoryInterface" for
@@ -106,11 +106,19 @@ class DAPSWOStatus:
 DAP_OK = 0
 DAP_ERROR = 0xff
 
+class DAPTransferRequest:
+    """! Request bits for DAP_Transfer"""
+    APnDP = 0x01 # Bit [0]
+    RnW = 0x02 # Bit [1]
+    A32_MASK = 0x0c # Bits [3:2]
+    VALUE_MATCH = 0x10 # Bit [4]
+    MATCH_MASK = 0x20 # Bit [5]
+
 class DAPTransferResponse:
     """! Responses to DAP_Transfer and DAP_TransferBlock"""
     ACK_MASK = 0x07 # Bits [2:0]
     PROTOCOL_ERROR_MASK = 0x08 # Bit [3]
-    VALUE_MISMATCH_MASK = 0x08 # Bit [4]
+    VALUE_MISMATCH_MASK = 0x10 # Bit [4]
     
     # Values for ACK bitfield.
     ACK_OK = 1
@@ -262,6 +270,52 @@ class CMSISDAPProtocol(object):
         return resp[1]
 
 
+    def transfer_value_match(self, request, mask, value, dap_index=0):
+        """! @brief Read a register until its masked value matches, using a value match read.
+        
+        A single DAP_Transfer command writes the match mask and then performs a value match read.
+        The probe repeats the read up to the match_retry count set with transfer_configure()
+        before reporting a mismatch.
+        
+        @param self
+        @param request Request byte for the register read, including the APnDP and A[3:2] bits.
+        @param mask Mask applied to the register value before comparing.
+        @param value Value to compare the masked register value with.
+        @param dap_index JTAG device index.
+        @return Boolean indicating whether the register matched.
+        
+        @exception DAPAccessIntf.TransferError Raised for an ACK other than OK or a protocol error.
+        """
+        cmd = []
+        cmd.append(Command.DAP_TRANSFER)
+        cmd.append(dap_index)
+        cmd.append(2)
+        cmd.append(DAPTransferRequest.MATCH_MASK)
+        cmd.extend((mask >> shift) & 0xff for shift in (0, 8, 16, 24))
+        cmd.append((request & (DAPTransferRequest.APnDP | DAPTransferRequest.A32_MASK))
+                        | DAPTransferRequest.RnW | DAPTransferRequest.VALUE_MATCH)
+        cmd.extend((value >> shift) & 0xff for shift in (0, 8, 16, 24))
+        self.interface.write(cmd)
+
+        resp = self.interface.read()
+        if resp[0] != Command.DAP_TRANSFER:
+            # Response is to a different command
+            raise DAPAccessIntf.DeviceError()
+
+        count = resp[1]
+        response = resp[2]
+        ack = response & DAPTransferResponse.ACK_MASK
+        if ack == DAPTransferResponse.ACK_FAULT:
+            raise DAPAccessIntf.TransferFaultError()
+        elif ack == DAPTransferResponse.ACK_WAIT:
+            raise DAPAccessIntf.TransferTimeoutError()
+        elif ack != DAPTransferResponse.ACK_OK:
+            raise DAPAccessIntf.TransferError("Unexpected ACK value (%d) returned by probe" % ack)
+        elif response & DAPTransferResponse.PROTOCOL_ERROR_MASK:
+            raise DAPAccessIntf.TransferError("SWD protocol error")
+
+        return (count == 2) and (response & DAPTransferResponse.VALUE_MISMATCH_MASK) == 0
+
     def set_swj_clock(self, clock=1000000):
         cmd = []
         cmd.append(Command.DAP_SWJ_CLOCK)
@@ -212,6 +212,10 @@ class DAPAccessIntf(object):
         """! @brief Write out all unsent commands"""
         raise NotImplementedError()
 
+    def get_transfer_statistics(self):
+        """! @brief Get an object holding transfer throughput counters"""
+        raise NotImplementedError()
+
     def vendor(self, index, data=None):
         """! @brief Send a vendor specific command"""
         raise NotImplementedError()
@@ -262,3 +266,21 @@ class DAPAccessIntf(object):
     def reg_read_repeat(self, num_repeats, reg_id, dap_index=0, now=True):
         """! @brief Read one or more words from the same DP or AP register"""
         raise NotImplementedError()
+
+    def reg_wait_match(self, reg_id, mask, value, timeout, dap_index=0):
+        """! @brief Wait until the masked value of a DP or AP register matches
+        
+        @return Boolean indicating whether the value matched before the timeout expired.
+        """
+        raise NotImplementedError()
+
+    def reg_write_repeat_bytes(self, num_repeats, reg_id, data, dap_index=0):
+        """! @brief Write one or more words to the same DP or AP register from a buffer
+        
+        The data is a buffer (bytes, bytearray, memoryview) of _num_repeats_ little endian words.
+        """
+        raise NotImplementedError()
+
+    def reg_read_repeat_bytes(self, num_repeats, reg_id, dap_index=0, now=True):
+        """! @brief Read one or more words from the same DP or AP register into a bytearray"""
+        raise NotImplementedError()
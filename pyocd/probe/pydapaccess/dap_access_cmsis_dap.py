@@ -18,8 +18,13 @@
 import re
 import logging
 import time
+import array
 import collections
+import math
+import threading
+import struct
 import six
+from contextlib import contextmanager
 from .dap_settings import DAPSettings
 from .dap_access_api import DAPAccessIntf
 from .cmsis_dap_core import CMSISDAPProtocol
@@ -35,6 +40,8 @@ from .cmsis_dap_core import (
     DAPTransferResponse,
     )
 from ...core import session
+from ...utility import conversion
+from ...utility.timeout import Timeout
 
 # CMSIS-DAP values
 AP_ACC = 1 << 0
@@ -56,12 +63,32 @@ LOG = logging.getLogger(__name__)
 TRACE = LOG.getChild("trace")
 TRACE.setLevel(logging.CRITICAL)
 
+## @brief Weight of new samples in the smoothed round trip and service time measurements.
+_TIMING_SMOOTHING = 0.125
+
+# Packet headers. DAP_Transfer uses the same layout for the request and response header.
+_TRANSFER_HEADER = struct.Struct("<BBB")
+_TRANSFER_BLOCK_HEADER = struct.Struct("<BBHB")
+_TRANSFER_BLOCK_RESPONSE_HEADER = struct.Struct("<BHB")
+
+## @brief Types of response data that can be decoded without first copying to a bytearray.
+if six.PY3:
+    _RESPONSE_BUFFER_TYPES = (bytearray, bytes, array.array)
+else:
+    _RESPONSE_BUFFER_TYPES = (bytearray,)
+
+## @brief Prebuilt runs of each read request byte, used to encode reads in DAP_Transfer packets.
+_READ_REQUESTS = {request: bytes(bytearray([request] * 255))
+                    for request in range(256) if request & READ}
+
 def _get_interfaces():
     """! @brief Get the connected USB devices"""
     # Get CMSIS-DAPv1 interfaces.
     v1_interfaces = INTERFACE[USB_BACKEND].get_all_connected_interfaces()
     
     # Get CMSIS-DAPv2 interfaces.
+    if USB_BACKEND_V2 is None:
+        return v1_interfaces
     v2_interfaces = INTERFACE[USB_BACKEND_V2].get_all_connected_interfaces()
     
     # Prefer v2 over v1 if a device provides both.
@@ -87,7 +114,7 @@ class _Transfer(object):
     """
 
     def __init__(self, daplink, dap_index, transfer_count,
-                 transfer_request, transfer_data):
+                 transfer_request, transfer_data, raw=False):
         # Writes should not need a transfer object
         # since they don't have any response data
         assert isinstance(dap_index, six.integer_types)
@@ -99,9 +126,13 @@ class _Transfer(object):
         self.transfer_count = transfer_count
         self.transfer_request = transfer_request
         self.transfer_data = transfer_data
+        self._raw = raw
         self._size_bytes = 0
         if transfer_request & READ:
             self._size_bytes = transfer_count * 4
+        # Response data is copied into this buffer as packets are received.
+        self._buffer = bytearray(self._size_bytes)
+        self._buffer_pos = 0
         self._result = None
         self._error = None
 
@@ -110,19 +141,33 @@ class _Transfer(object):
         """
         return self._size_bytes
 
-    def add_response(self, data):
+    def add_response_data(self, data, offset):
         """! @brief Add data read from the remote device to this object.
 
-        The size of data added must match exactly the size
-        that get_data_size returns.
+        Copies as much of _data_ starting at _offset_ as is still needed by this transfer
+        into the transfer's buffer. Once all data has been received the result is set. For raw
+        transfers the result is the bytearray of little endian words, otherwise it is
+        converted to a list of integers.
+        
+        @param self
+        @param data Memoryview of response data.
+        @param offset Offset into _data_ to start copying from.
+        @return Offset into _data_ following the bytes that were used.
         """
-        assert len(data) == self._size_bytes
-        result = []
-        for i in range(0, self._size_bytes, 4):
-            word = ((data[0 + i] << 0) | (data[1 + i] << 8) |
-                    (data[2 + i] << 16) | (data[3 + i] << 24))
-            result.append(word)
-        self._result = result
+        count = min(self._size_bytes - self._buffer_pos, len(data) - offset)
+        end = offset + count
+        self._buffer[self._buffer_pos:self._buffer_pos + count] = data[offset:end]
+        self._buffer_pos += count
+        if self._buffer_pos == self._size_bytes:
+            if self._raw:
+                self._result = self._buffer
+            else:
+                self._result = list(struct.unpack_from("<%dI" % self.transfer_count, self._buffer))
+        return end
+
+    @property
+    def is_complete(self):
+        return self._result is not None
 
     def add_error(self, error):
         """! @brief Attach an exception to this transfer rather than data.
@@ -132,13 +177,12 @@ class _Transfer(object):
 
     def get_result(self):
         """! @brief Get the result of this transfer.
+        
+        Blocks until the completion thread has received the response containing the data
+        for this transfer.
         """
-        while self._result is None:
-            if len(self.daplink._commands_to_read) > 0:
-                self.daplink._read_packet()
-            else:
-                assert not self.daplink._crnt_cmd.get_empty()
-                self.daplink.flush()
+        if self._result is None:
+            self.daplink._wait_for_transfer(self)
 
         if self._error is not None:
             # Pylint is confused and thinks self._error is None
@@ -164,14 +208,41 @@ class _Command(object):
 
     def __init__(self, size):
         self._size = size
+        # Request packet buffer, allocated once and reused when the command is recycled.
+        self._buffer = bytearray(size)
+        self._data = []
+        self.reset()
+        TRACE.debug("New _Command")
+
+    def reset(self):
+        """! @brief Clear the command so it can be reused for a new packet."""
         self._read_count = 0
         self._write_count = 0
         self._block_allowed = True
         self._block_request = None
-        self._data = []
+        del self._data[:]
         self._dap_index = None
         self._data_encoded = False
-        TRACE.debug("New _Command")
+        ## Time the command was written to the probe.
+        self.send_time = None
+        ## Number of commands that were in flight when this command was sent.
+        self.queued_behind = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def read_count(self):
+        return self._read_count
+
+    @property
+    def write_count(self):
+        return self._write_count
+
+    @property
+    def transfer_count(self):
+        return self._read_count + self._write_count
 
     def _get_free_words(self, blockAllowed, isRead):
         """! @brief Return the number of words free in the transmit packet
@@ -235,11 +306,11 @@ class _Command(object):
             max_count = self._write_count + self._read_count + size
             delta = max_count - 255
             size = min(size - delta, size)
-            TRACE.debug("get_request_space(%d, %02x:%s)[wc=%d, rc=%d, ba=%d->%d] -> (sz=%d, free=%d, delta=%d)" %
-                    (count, request, 'r' if is_read else 'w', self._write_count, self._read_count, self._block_allowed, blockAllowed, size, free, delta))
+            TRACE.debug("get_request_space(%d, %02x:%s)[wc=%d, rc=%d, ba=%d->%d] -> (sz=%d, free=%d, delta=%d)",
+                    count, request, 'r' if is_read else 'w', self._write_count, self._read_count, self._block_allowed, blockAllowed, size, free, delta)
         else:
-            TRACE.debug("get_request_space(%d, %02x:%s)[wc=%d, rc=%d, ba=%d->%d] -> (sz=%d, free=%d)" %
-                (count, request, 'r' if is_read else 'w', self._write_count, self._read_count, self._block_allowed, blockAllowed, size, free))
+            TRACE.debug("get_request_space(%d, %02x:%s)[wc=%d, rc=%d, ba=%d->%d] -> (sz=%d, free=%d)",
+                count, request, 'r' if is_read else 'w', self._write_count, self._read_count, self._block_allowed, blockAllowed, size, free)
 
         # We can get a negative free count if the packet already contains more data than can be
         # sent by a DAP_Transfer command, but the new request forces DAP_Transfer. In this case,
@@ -257,6 +328,8 @@ class _Command(object):
 
     def add(self, count, request, data, dap_index):
         """! @brief Add a single or block register transfer operation to this command
+        
+        For writes, _data_ must be a buffer holding _count_ little endian words.
         """
         assert self._data_encoded is False
         if self._dap_index is None:
@@ -275,41 +348,30 @@ class _Command(object):
             self._write_count += count
         self._data.append((count, request, data))
 
-        TRACE.debug("add(%d, %02x:%s) -> [wc=%d, rc=%d, ba=%d]" %
-                (count, request, 'r' if (request & READ) else 'w', self._write_count, self._read_count, self._block_allowed))
+        TRACE.debug("add(%d, %02x:%s) -> [wc=%d, rc=%d, ba=%d]",
+                count, request, 'r' if (request & READ) else 'w', self._write_count, self._read_count, self._block_allowed)
 
     def _encode_transfer_data(self):
         """! @brief Encode this command into a byte array that can be sent
 
-        The data returned by this function is a bytearray in
-        the format that of a DAP_Transfer CMSIS-DAP command.
+        The data is written in the format of a DAP_Transfer CMSIS-DAP command
+        to the command's preallocated packet buffer, which is returned.
         """
         assert self.get_empty() is False
-        buf = bytearray(self._size)
+        buf = self._buffer
         transfer_count = self._read_count + self._write_count
-        pos = 0
-        buf[pos] = Command.DAP_TRANSFER
-        pos += 1
-        buf[pos] = self._dap_index
-        pos += 1
-        buf[pos] = transfer_count
-        pos += 1
-        for count, request, write_list in self._data:
-            assert write_list is None or len(write_list) <= count
-            write_pos = 0
-            for _ in range(count):
-                buf[pos] = request
-                pos += 1
-                if not request & READ:
-                    buf[pos] = (write_list[write_pos] >> (8 * 0)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 1)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 2)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 3)) & 0xff
-                    pos += 1
-                    write_pos += 1
+        _TRANSFER_HEADER.pack_into(buf, 0, Command.DAP_TRANSFER, self._dap_index, transfer_count)
+        pos = _TRANSFER_HEADER.size
+        for count, request, write_data in self._data:
+            if request & READ:
+                buf[pos:pos + count] = _READ_REQUESTS[request][:count]
+                pos += count
+            else:
+                assert len(write_data) == count * 4
+                for write_pos in range(0, count * 4, 4):
+                    buf[pos] = request
+                    buf[pos + 1:pos + 5] = write_data[write_pos:write_pos + 4]
+                    pos += 5
         return buf
 
     def _check_response(self, response):
@@ -346,83 +408,69 @@ class _Command(object):
         """! @brief Take a byte array and extract the data from it
 
         Decode the response returned by a DAP_Transfer CMSIS-DAP command
-        and return it as an array of bytes.
+        and return a memoryview of the read data within it.
         """
         assert self.get_empty() is False
-        if data[0] != Command.DAP_TRANSFER:
+        command, transfer_count, response = _TRANSFER_HEADER.unpack_from(data)
+        if command != Command.DAP_TRANSFER:
             raise ValueError('DAP_TRANSFER response error')
 
         # Check response and raise an exception on errors.
-        self._check_response(data[2])
+        self._check_response(response)
 
         # Check for count mismatch after checking for DAP_TRANSFER_FAULT
         # This allows TransferFaultError or TransferTimeoutError to get
         # thrown instead of TransferFaultError
-        if data[1] != self._read_count + self._write_count:
+        if transfer_count != self._read_count + self._write_count:
             raise DAPAccessIntf.TransferError()
 
-        return data[3:3 + 4 * self._read_count]
+        start = _TRANSFER_HEADER.size
+        return memoryview(data)[start:start + 4 * self._read_count]
 
     def _encode_transfer_block_data(self):
         """! @brief Encode this command into a byte array that can be sent
 
-        The data returned by this function is a bytearray in
-        the format that of a DAP_TransferBlock CMSIS-DAP command.
+        The data is written in the format of a DAP_TransferBlock CMSIS-DAP command
+        to the command's preallocated packet buffer, which is returned.
         """
         assert self.get_empty() is False
-        buf = bytearray(self._size)
+        buf = self._buffer
         transfer_count = self._read_count + self._write_count
         assert not (self._read_count != 0 and self._write_count != 0)
         assert self._block_request is not None
-        pos = 0
-        buf[pos] = Command.DAP_TRANSFER_BLOCK
-        pos += 1
-        buf[pos] = self._dap_index
-        pos += 1
-        buf[pos] = transfer_count & 0xff
-        pos += 1
-        buf[pos] = (transfer_count >> 8) & 0xff
-        pos += 1
-        buf[pos] = self._block_request
-        pos += 1
-        for count, request, write_list in self._data:
-            assert write_list is None or len(write_list) <= count
-            assert request == self._block_request
-            write_pos = 0
-            if not request & READ:
-                for _ in range(count):
-                    buf[pos] = (write_list[write_pos] >> (8 * 0)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 1)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 2)) & 0xff
-                    pos += 1
-                    buf[pos] = (write_list[write_pos] >> (8 * 3)) & 0xff
-                    pos += 1
-                    write_pos += 1
+        _TRANSFER_BLOCK_HEADER.pack_into(buf, 0, Command.DAP_TRANSFER_BLOCK, self._dap_index,
+                transfer_count, self._block_request)
+        pos = _TRANSFER_BLOCK_HEADER.size
+        if not self._block_request & READ:
+            for count, request, write_data in self._data:
+                assert len(write_data) == count * 4
+                assert request == self._block_request
+                buf[pos:pos + count * 4] = write_data
+                pos += count * 4
         return buf
 
     def _decode_transfer_block_data(self, data):
         """! @brief Take a byte array and extract the data from it
 
         Decode the response returned by a DAP_TransferBlock CMSIS-DAP command
-        and return it as an array of bytes.
+        and return a memoryview of the read data within it.
         """
         assert self.get_empty() is False
-        if data[0] != Command.DAP_TRANSFER_BLOCK:
+        command, transfer_count, response = _TRANSFER_BLOCK_RESPONSE_HEADER.unpack_from(data)
+        if command != Command.DAP_TRANSFER_BLOCK:
             raise ValueError('DAP_TRANSFER_BLOCK response error')
 
         # Check response and raise an exception on errors.
-        self._check_response(data[3])
+        self._check_response(response)
 
         # Check for count mismatch after checking for DAP_TRANSFER_FAULT
         # This allows TransferFaultError or TransferTimeoutError to get
         # thrown instead of TransferFaultError
-        transfer_count = data[1] | (data[2] << 8)
         if transfer_count != self._read_count + self._write_count:
             raise DAPAccessIntf.TransferError()
 
-        return data[4:4 + 4 * self._read_count]
+        start = _TRANSFER_BLOCK_RESPONSE_HEADER.size
+        return memoryview(data)[start:start + 4 * self._read_count]
 
     def encode_data(self):
         """! @brief Encode this command into a byte array that can be sent
@@ -449,9 +497,62 @@ class _Command(object):
             data = self._decode_transfer_data(data)
         return data
 
+class TransferStatistics(object):
+    """! @brief Throughput counters for the CMSIS-DAP transfer engine.
+    
+    All counters are cumulative since the last call to reset(). Times are in seconds.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.time()
+        ## Number of command packets written to the probe.
+        self.packets_sent = 0
+        ## Number of response packets received from the probe.
+        self.packets_received = 0
+        ## Number of register transfers (words) carried by sent packets.
+        self.transfer_count = 0
+        ## Number of payload bytes written to target registers.
+        self.write_bytes = 0
+        ## Number of payload bytes read from target registers.
+        self.read_bytes = 0
+        ## Number of times the caller had to wait because the in-flight window was full.
+        self.window_stalls = 0
+        ## Smoothed round trip time of a packet sent to an idle probe, or None if not yet measured.
+        self.round_trip_time = None
+        ## Smoothed interval between responses while the pipeline is busy, or None.
+        self.service_time = None
+        ## Current limit on the number of packets in flight.
+        self.window = 0
+
+    @property
+    def elapsed_time(self):
+        return time.time() - self.start_time
+
+    @property
+    def data_throughput(self):
+        """! @brief Payload bytes read and written per second since the counters were reset."""
+        elapsed = self.elapsed_time
+        if elapsed <= 0:
+            return 0.0
+        return (self.read_bytes + self.write_bytes) / elapsed
+
+    def __repr__(self):
+        return "<TransferStatistics@%x sent=%d recv=%d rd=%d wr=%d stalls=%d rtt=%s svc=%s win=%d>" % (
+            id(self), self.packets_sent, self.packets_received, self.read_bytes,
+            self.write_bytes, self.window_stalls, self.round_trip_time, self.service_time,
+            self.window)
+
 class DAPAccessCMSISDAP(DAPAccessIntf):
     """! @brief An implementation of the DAPAccessIntf layer for DAPLINK boards
     """
+    
+    ## Number of times the probe repeats a value match read before reporting a mismatch. This
+    # bounds the time the probe is busy with one value match command to a few milliseconds at
+    # common SWD clock rates.
+    VALUE_MATCH_RETRY = 100
 
     # ------------------------------------------- #
     #          Static Functions
@@ -550,8 +651,18 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         self._crnt_cmd = None
         self._packet_size = None
         self._commands_to_read = None
-        self._command_response_buf = None
+        self._command_pool = []
         self._swo_status = None
+        # Pipelined transfer engine state. The condition protects the in-flight command queue,
+        # the transfer list, and the response buffer, which are shared with the completion thread.
+        self._transfer_cond = threading.Condition(threading.RLock())
+        self._completion_thread = None
+        self._closing = False
+        self._pipeline_error = None
+        self._pipeline_failing = False
+        self._window = 1
+        self._last_response_time = None
+        self._stats = TransferStatistics()
 
     @property
     def vendor_name(self):
@@ -596,37 +707,44 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         self._swo_status = SWOStatus.DISABLED
 
         self._init_deferred_buffers()
+        self._window = self._packet_count
+        self._stats.reset()
+        self._stats.window = self._window
+        self._start_completion_thread()
 
     def close(self):
         assert self._interface is not None
-        self.flush()
-        self._interface.close()
+        try:
+            self.flush()
+        finally:
+            self._stop_completion_thread()
+            self._interface.close()
 
     def get_unique_id(self):
         return self._unique_id
 
     def reset(self):
-        self.flush()
-        self._protocol.set_swj_pins(0, Pin.nRESET)
-        time.sleep(0.1)
-        self._protocol.set_swj_pins(Pin.nRESET, Pin.nRESET)
-        time.sleep(0.1)
-
-    def assert_reset(self, asserted):
-        self.flush()
-        if asserted:
+        with self._direct_command():
             self._protocol.set_swj_pins(0, Pin.nRESET)
-        else:
+            time.sleep(0.1)
             self._protocol.set_swj_pins(Pin.nRESET, Pin.nRESET)
+            time.sleep(0.1)
+
+    def assert_reset(self, asserted):
+        with self._direct_command():
+            if asserted:
+                self._protocol.set_swj_pins(0, Pin.nRESET)
+            else:
+                self._protocol.set_swj_pins(Pin.nRESET, Pin.nRESET)
     
     def is_reset_asserted(self):
-        self.flush()
-        pins = self._protocol.set_swj_pins(0, Pin.NONE)
+        with self._direct_command():
+            pins = self._protocol.set_swj_pins(0, Pin.NONE)
         return (pins & Pin.nRESET) == 0
 
     def set_clock(self, frequency):
-        self.flush()
-        self._protocol.set_swj_clock(frequency)
+        with self._direct_command():
+            self._protocol.set_swj_clock(frequency)
         self._frequency = frequency
 
     def get_swj_mode(self):
@@ -658,54 +776,78 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         self._deferred_transfer = enable
 
     def flush(self):
-        # Send current packet
-        self._send_packet()
-        # Read all backlogged
-        for _ in range(len(self._commands_to_read)):
-            self._read_packet()
+        with self._transfer_cond:
+            # Send current packet
+            self._send_packet()
+            # Wait for the completion thread to receive all backlogged responses.
+            while self._commands_to_read and self._pipeline_error is None:
+                self._transfer_cond.wait()
+            self._check_pipeline_error()
+
+    @contextmanager
+    def _direct_command(self):
+        """! @brief Context for sending commands with the protocol object instead of the pipeline.
+        
+        Pending transfers are flushed first. The transfer lock is held until the context exits, so
+        no transfers are sent and the completion thread can't take the commands' responses.
+        """
+        with self._transfer_cond:
+            self.flush()
+            yield
+
+    def get_transfer_statistics(self):
+        """! @brief Return the TransferStatistics object holding throughput counters."""
+        return self._stats
 
     def identify(self, item):
         assert isinstance(item, DAPAccessIntf.ID)
-        return self._protocol.dap_info(item)
+        with self._direct_command():
+            return self._protocol.dap_info(item)
 
     def vendor(self, index, data=None):
         if data is None:
             data = []
-        return self._protocol.vendor(index, data)
+        with self._direct_command():
+            return self._protocol.vendor(index, data)
 
     # ------------------------------------------- #
     #             Target access functions
     # ------------------------------------------- #
     def connect(self, port=DAPAccessIntf.PORT.DEFAULT):
         assert isinstance(port, DAPAccessIntf.PORT)
-        actual_port = self._protocol.connect(port.value)
-        self._dap_port = DAPAccessIntf.PORT(actual_port)
-        # set clock frequency
-        self._protocol.set_swj_clock(self._frequency)
-        # configure transfer
-        self._protocol.transfer_configure()
-        
-        # configure the selected protocol with defaults.
-        if self._dap_port == DAPAccessIntf.PORT.SWD:
-            self.configure_swd()
-        elif self._dap_port == DAPAccessIntf.PORT.JTAG:
-            self.configure_jtag()
+        with self._direct_command():
+            actual_port = self._protocol.connect(port.value)
+            self._dap_port = DAPAccessIntf.PORT(actual_port)
+            # set clock frequency
+            self._protocol.set_swj_clock(self._frequency)
+            # configure transfer
+            self._protocol.transfer_configure(match_retry=self.VALUE_MATCH_RETRY)
+            
+            # configure the selected protocol with defaults.
+            if self._dap_port == DAPAccessIntf.PORT.SWD:
+                self.configure_swd()
+            elif self._dap_port == DAPAccessIntf.PORT.JTAG:
+                self.configure_jtag()
 
     def configure_swd(self, turnaround=1, always_send_data_phase=False):
-        self._protocol.swd_configure(turnaround, always_send_data_phase)
+        with self._direct_command():
+            self._protocol.swd_configure(turnaround, always_send_data_phase)
     
     def configure_jtag(self, devices_irlen=None):
-        self._protocol.jtag_configure(devices_irlen)
+        with self._direct_command():
+            self._protocol.jtag_configure(devices_irlen)
 
     def swj_sequence(self, length, bits):
-        self._protocol.swj_sequence(length, bits)
+        with self._direct_command():
+            self._protocol.swj_sequence(length, bits)
 
     def jtag_sequence(self, cycles, tms, read_tdo, tdi):
-        return self._protocol.jtag_sequence(cycles, length, read_tdo, tdi)
+        with self._direct_command():
+            return self._protocol.jtag_sequence(cycles, length, read_tdo, tdi)
 
     def disconnect(self):
-        self.flush()
-        self._protocol.disconnect()
+        with self._direct_command():
+            self._protocol.disconnect()
     
     def has_swo(self):
         return self._has_swo_uart
@@ -715,33 +857,35 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         if not self._has_swo_uart:
             return False
         
-        try:
-            if enabled:
-                # Select the streaming SWO endpoint if available.
-                if self._interface.has_swo_ep:
-                    transport = DAPSWOTransport.DAP_SWO_EP
-                else:
-                    transport = DAPSWOTransport.DAP_SWO_DATA
+        with self._direct_command():
+            try:
+                if enabled:
+                    # Select the streaming SWO endpoint if available.
+                    if self._interface.has_swo_ep:
+                        transport = DAPSWOTransport.DAP_SWO_EP
+                    else:
+                        transport = DAPSWOTransport.DAP_SWO_DATA
                 
-                if self._protocol.swo_transport(transport) != 0:
-                    self._swo_disable()
-                    return False
-                if self._protocol.swo_mode(DAPSWOMode.UART) != 0:
-                    self._swo_disable()
-                    return False
-                if self._protocol.swo_baudrate(rate) == 0:
+                    if self._protocol.swo_transport(transport) != 0:
+                        self._swo_disable()
+                        return False
+                    if self._protocol.swo_mode(DAPSWOMode.UART) != 0:
+                        self._swo_disable()
+                        return False
+                    if self._protocol.swo_baudrate(rate) == 0:
+                        self._swo_disable()
+                        return False
+                    self._swo_status = SWOStatus.CONFIGURED
+                else:
                     self._swo_disable()
-                    return False
-                self._swo_status = SWOStatus.CONFIGURED
-            else:
+                    return True
+            except DAPAccessIntf.CommandError as e:
+                LOG.debug("Exception while configuring SWO: %s", e)
                 self._swo_disable()
-                return True
-        except DAPAccessIntf.CommandError as e:
-            LOG.debug("Exception while configuring SWO: %s", e)
-            self._swo_disable()
-            return False
+                return False
     
     def _swo_disable(self):
+        """! @brief Turn off SWO. Must be called within _direct_command()."""
         try:
             self._protocol.swo_mode(DAPSWOMode.OFF)
             self._protocol.swo_transport(DAPSWOTransport.NONE)
@@ -755,20 +899,22 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         if not self._has_swo_uart:
             return False
         
-        if start:
-            self._protocol.swo_control(DAPSWOControl.START)
-            if self._interface.has_swo_ep:
-                self._interface.start_swo()
-            self._swo_status = SWOStatus.RUNNING
-        else:
-            self._protocol.swo_control(DAPSWOControl.STOP)
-            if self._interface.has_swo_ep:
-                self._interface.stop_swo()
-            self._swo_status = SWOStatus.CONFIGURED
+        with self._direct_command():
+            if start:
+                self._protocol.swo_control(DAPSWOControl.START)
+                if self._interface.has_swo_ep:
+                    self._interface.start_swo()
+                self._swo_status = SWOStatus.RUNNING
+            else:
+                self._protocol.swo_control(DAPSWOControl.STOP)
+                if self._interface.has_swo_ep:
+                    self._interface.stop_swo()
+                self._swo_status = SWOStatus.CONFIGURED
         return True
     
     def get_swo_status(self):
-        return self._protocol.swo_status()
+        with self._direct_command():
+            return self._protocol.swo_status()
     
     def swo_read(self, count=None):
         if self._interface.has_swo_ep:
@@ -776,7 +922,8 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         else:
             if count is None:
                 count = self._packet_size
-            status, count, data = self._protocol.swo_data(count)
+            with self._direct_command():
+                status, count, data = self._protocol.swo_data(count)
             return bytearray(data)
 
     def write_reg(self, reg_id, value, dap_index=0):
@@ -790,7 +937,7 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         else:
             request |= AP_ACC
         request |= (reg_id.value % 4) * 4
-        self._write(dap_index, 1, request, [value])
+        self._write(dap_index, 1, request, struct.pack("<I", value & 0xffffffff))
 
     def read_reg(self, reg_id, dap_index=0, now=True):
         assert reg_id in self.REG
@@ -817,9 +964,47 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         else:
             return read_reg_cb
 
+    def reg_wait_match(self, reg_id, mask, value, timeout, dap_index=0):
+        """! @brief Wait until the masked value of a DP or AP register matches.
+        
+        Pending transfers are flushed, then value match reads are sent until the register matches
+        or the timeout expires. Each value match read is repeated on the probe up to
+        #VALUE_MATCH_RETRY times, so most of the polling happens without USB round trips.
+        
+        @return Boolean indicating whether the value matched before the timeout expired.
+        """
+        assert reg_id in self.REG
+        assert isinstance(dap_index, six.integer_types)
+
+        request = READ
+        if reg_id.value < 4:
+            request |= DP_ACC
+        else:
+            request |= AP_ACC
+        request |= (reg_id.value % 4) << 2
+
+        with self._transfer_cond:
+            self.flush()
+            with Timeout(timeout) as t_o:
+                while True:
+                    self._stats.packets_sent += 1
+                    self._stats.transfer_count += 2
+                    matched = self._protocol.transfer_value_match(request, mask, value, dap_index)
+                    self._stats.packets_received += 1
+                    if matched:
+                        return True
+                    if not t_o.check():
+                        return False
+
     def reg_write_repeat(self, num_repeats, reg_id, data_array, dap_index=0):
         assert isinstance(num_repeats, six.integer_types)
         assert num_repeats == len(data_array)
+        self.reg_write_repeat_bytes(num_repeats, reg_id,
+            conversion.u32le_list_to_bytes(data_array), dap_index)
+
+    def reg_write_repeat_bytes(self, num_repeats, reg_id, data, dap_index=0):
+        assert isinstance(num_repeats, six.integer_types)
+        assert num_repeats * 4 == len(data)
         assert reg_id in self.REG
         assert isinstance(dap_index, six.integer_types)
 
@@ -829,10 +1014,17 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         else:
             request |= AP_ACC
         request |= (reg_id.value % 4) * 4
-        self._write(dap_index, num_repeats, request, data_array)
+        self._write(dap_index, num_repeats, request, data)
 
     def reg_read_repeat(self, num_repeats, reg_id, dap_index=0,
                         now=True):
+        return self._reg_read_repeat(num_repeats, reg_id, dap_index, now, raw=False)
+
+    def reg_read_repeat_bytes(self, num_repeats, reg_id, dap_index=0,
+                        now=True):
+        return self._reg_read_repeat(num_repeats, reg_id, dap_index, now, raw=True)
+
+    def _reg_read_repeat(self, num_repeats, reg_id, dap_index, now, raw):
         assert isinstance(num_repeats, six.integer_types)
         assert reg_id in self.REG
         assert isinstance(dap_index, six.integer_types)
@@ -844,12 +1036,13 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         else:
             request |= AP_ACC
         request |= (reg_id.value % 4) * 4
-        transfer = self._write(dap_index, num_repeats, request, None)
+        transfer = self._write(dap_index, num_repeats, request, None, raw)
         assert transfer is not None
+        result_len = num_repeats * 4 if raw else num_repeats
 
         def reg_read_repeat_cb():
             res = transfer.get_result()
-            assert len(res) == num_repeats
+            assert len(res) == result_len
             return res
 
         if now:
@@ -870,56 +1063,189 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         # not completed (started by write_reg, read_reg,
         # reg_write_repeat and reg_read_repeat)
         self._transfer_list = collections.deque()
+        # Commands are recycled once their response has been received, so the
+        # packet buffers they hold are only allocated once.
+        self._command_pool = []
         # The current packet - this can contain multiple
         # different transfers
-        self._crnt_cmd = _Command(self._packet_size)
+        self._crnt_cmd = self._new_command()
         # Packets that have been sent but not read
         self._commands_to_read = collections.deque()
-        # Buffer for data returned for completed commands.
-        # This data will be added to transfers
-        self._command_response_buf = bytearray()
 
-    def _read_packet(self):
-        """! @brief Reads and decodes a single packet
+    def _new_command(self):
+        """! @brief Get an empty command from the pool or create a new one."""
+        with self._transfer_cond:
+            if self._command_pool:
+                return self._command_pool.pop()
+        return _Command(self._packet_size)
 
-        Reads a single packet from the device and
-        stores the data from it in the current Command
-        object
+    def _recycle_command(self, cmd):
+        """! @brief Return a completed command to the pool.
+        
+        Must be called with the transfer condition locked.
         """
-        # Grab command, send it and decode response
-        cmd = self._commands_to_read.popleft()
-        try:
-            raw_data = self._interface.read()
-            raw_data = bytearray(raw_data)
-            decoded_data = cmd.decode_data(raw_data)
-        except Exception as exception:
-            self._abort_all_transfers(exception)
-            raise
+        if cmd.size == self._packet_size:
+            cmd.reset()
+            self._command_pool.append(cmd)
+
+    def _start_completion_thread(self):
+        """! @brief Start the thread that receives and decodes responses."""
+        assert self._completion_thread is None
+        self._closing = False
+        self._pipeline_error = None
+        self._pipeline_failing = False
+        self._completion_thread = threading.Thread(target=self._completion_task,
+            name="CMSIS-DAP completion (%s)" % self._unique_id)
+        self._completion_thread.daemon = True
+        self._completion_thread.start()
+
+    def _stop_completion_thread(self):
+        if self._completion_thread is None:
+            return
+        with self._transfer_cond:
+            self._closing = True
+            self._transfer_cond.notify_all()
+        self._completion_thread.join()
+        self._completion_thread = None
+
+    def _completion_task(self):
+        """! @brief Completion thread body.
+        
+        Responses are received in the order commands were sent, so the thread always reads
+        the response for the oldest in-flight command. The interface is only read while there
+        is a command in flight, which leaves it free for direct protocol commands sent within
+        _direct_command().
+        """
+        while True:
+            with self._transfer_cond:
+                while not self._commands_to_read and not self._closing:
+                    self._transfer_cond.wait()
+                if not self._commands_to_read:
+                    return
+                cmd = self._commands_to_read[0]
+
+            try:
+                raw_data = self._interface.read()
+                if not isinstance(raw_data, _RESPONSE_BUFFER_TYPES):
+                    raw_data = bytearray(raw_data)
+                decoded_data = cmd.decode_data(raw_data)
+            except Exception as exception:
+                self._fail_pipeline(exception)
+                continue
 
-        decoded_data = bytearray(decoded_data)
-        self._command_response_buf.extend(decoded_data)
+            with self._transfer_cond:
+                self._commands_to_read.popleft()
+                self._update_timing(cmd)
+                self._stats.packets_received += 1
+                self._process_response(decoded_data)
+                self._recycle_command(cmd)
+                self._transfer_cond.notify_all()
 
-        # Attach data to transfers
+    def _process_response(self, decoded_data):
+        """! @brief Attach data from a decoded response to transfers.
+        
+        Must be called with the transfer condition locked.
+        """
         pos = 0
-        while True:
-            size_left = len(self._command_response_buf) - pos
-            if size_left == 0:
-                # If size left is 0 then the transfer list might
-                # be empty, so don't try to access element 0
-                break
+        size = len(decoded_data)
+        while pos < size:
             transfer = self._transfer_list[0]
-            size = transfer.get_data_size()
-            if size > size_left:
-                break
+            pos = transfer.add_response_data(decoded_data, pos)
+            if transfer.is_complete:
+                self._transfer_list.popleft()
+
+    def _update_timing(self, cmd):
+        """! @brief Update round trip measurements and resize the in-flight window.
+        
+        Two smoothed values are maintained. The round trip time is measured for packets sent
+        while no other packet was in flight. The service time is the interval between responses
+        while packets are queued in the probe, which is how long the probe takes to process one
+        packet. Enough packets must be in flight to cover one round trip plus one being
+        processed in order to keep the probe busy.
+        
+        Must be called with the transfer condition locked.
+        """
+        now = time.time()
+        if cmd.queued_behind == 0:
+            self._stats.round_trip_time = self._smooth(self._stats.round_trip_time, now - cmd.send_time)
+        elif self._last_response_time is not None:
+            interval = now - max(self._last_response_time, cmd.send_time)
+            self._stats.service_time = self._smooth(self._stats.service_time, interval)
+        self._last_response_time = now
+
+        rtt = self._stats.round_trip_time
+        service = self._stats.service_time
+        if rtt is not None and service:
+            window = int(math.ceil(rtt / service)) + 1
+            self._window = max(1, min(self._packet_count, window))
+            self._stats.window = self._window
+
+    @staticmethod
+    def _smooth(average, sample):
+        if average is None:
+            return sample
+        return average + (sample - average) * _TIMING_SMOOTHING
+
+    def _fail_pipeline(self, exception):
+        """! @brief Handle an error raised while receiving a response.
+        
+        Runs on the completion thread. For transfer errors the probe still returns a response
+        for each command in flight, so they are read and discarded. Then all outstanding
+        transfers are failed and the error is reported to the caller's thread the next time it
+        waits on the pipeline.
 
-            self._transfer_list.popleft()
-            data = self._command_response_buf[pos:pos + size]
-            pos += size
-            transfer.add_response(data)
+        No packets are sent while the responses are discarded, so every command still in
+        flight was sent before the failure and the drain ends once all of them are read.
+        """
+        with self._transfer_cond:
+            self._pipeline_failing = True
+            # Remove the command whose response failed.
+            self._commands_to_read.popleft()
 
-        # Remove used data from _command_response_buf
-        if pos > 0:
-            self._command_response_buf = self._command_response_buf[pos:]
+        if isinstance(exception, DAPAccessIntf.TransferError):
+            while True:
+                with self._transfer_cond:
+                    if not self._commands_to_read:
+                        break
+                try:
+                    self._interface.read()
+                except Exception:
+                    break
+                with self._transfer_cond:
+                    self._commands_to_read.popleft()
+
+        with self._transfer_cond:
+            for transfer in self._transfer_list:
+                transfer.add_error(exception)
+            self._transfer_list.clear()
+            self._commands_to_read.clear()
+            self._last_response_time = None
+            self._pipeline_error = exception
+            self._pipeline_failing = False
+            self._transfer_cond.notify_all()
+
+    def _check_pipeline_error(self):
+        """! @brief Raise an error reported by the completion thread.
+        
+        Must be called with the transfer condition locked.
+        """
+        if self._pipeline_error is not None:
+            exception = self._pipeline_error
+            self._pipeline_error = None
+            self._abort_all_transfers(exception)
+            raise exception
+
+    def _wait_for_transfer(self, transfer):
+        """! @brief Block until a transfer has received its response or failed."""
+        with self._transfer_cond:
+            while transfer._result is None and transfer._error is None:
+                self._check_pipeline_error()
+                if self._commands_to_read:
+                    self._transfer_cond.wait()
+                else:
+                    assert not self._crnt_cmd.get_empty()
+                    self._send_packet()
+            self._check_pipeline_error()
 
     def _send_packet(self):
         """! @brief Send a single packet to the interface
@@ -927,27 +1253,61 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         This function guarentees that the number of packets
         that are stored in daplink's buffer (the number of
         packets written but not read) does not exceed the
-        number supported by the given device.
+        in-flight window, which is never larger than the number
+        supported by the given device.
         """
         cmd = self._crnt_cmd
         if cmd.get_empty():
             return
 
-        max_packets = self._interface.get_packet_count()
-        if len(self._commands_to_read) >= max_packets:
-            self._read_packet()
-        data = cmd.encode_data()
-        try:
-            self._interface.write(list(data))
-        except Exception as exception:
-            self._abort_all_transfers(exception)
-            raise
-        self._commands_to_read.append(cmd)
-        self._crnt_cmd = _Command(self._packet_size)
+        # The condition stays locked from the checks until the command is queued, so the
+        # completion thread can't start failing the pipeline in between.
+        with self._transfer_cond:
+            # Wait for the completion thread to finish discarding responses after an error.
+            while self._pipeline_failing:
+                self._transfer_cond.wait()
+            self._check_pipeline_error()
+            if len(self._commands_to_read) >= self._window:
+                self._stats.window_stalls += 1
+                while (self._pipeline_failing or len(self._commands_to_read) >= self._window) \
+                        and self._pipeline_error is None:
+                    self._transfer_cond.wait()
+                self._check_pipeline_error()
+            queued_behind = len(self._commands_to_read)
+
+            data = cmd.encode_data()
+            cmd.send_time = time.time()
+            cmd.queued_behind = queued_behind
+            try:
+                self._interface.write(data)
+            except Exception as exception:
+                # Let the completion thread finish with commands already in flight.
+                while self._commands_to_read and self._pipeline_error is None:
+                    self._transfer_cond.wait()
+                self._pipeline_error = None
+                self._abort_all_transfers(exception)
+                raise
+
+            self._stats.packets_sent += 1
+            self._stats.transfer_count += cmd.transfer_count
+            self._stats.write_bytes += cmd.write_count * 4
+            self._stats.read_bytes += cmd.read_count * 4
+            self._commands_to_read.append(cmd)
+            self._crnt_cmd = self._new_command()
+            self._transfer_cond.notify_all()
 
     def _write(self, dap_index, transfer_count,
-               transfer_request, transfer_data):
+               transfer_request, transfer_data, raw=False):
         """! @brief Write one or more commands
+        
+        @param self
+        @param dap_index DAP index, currently must be 0.
+        @param transfer_count Number of register transfers.
+        @param transfer_request Transfer request byte.
+        @param transfer_data For writes, a buffer of _transfer_count_ little endian words.
+            Must be None for reads.
+        @param raw For reads, whether the returned _Transfer produces a bytearray instead
+            of a list of words.
         """
         assert dap_index == 0  # dap index currently unsupported
         assert isinstance(transfer_count, six.integer_types)
@@ -958,8 +1318,15 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
         transfer = None
         if transfer_request & READ:
             transfer = _Transfer(self, dap_index, transfer_count,
-                                 transfer_request, transfer_data)
-            self._transfer_list.append(transfer)
+                                 transfer_request, transfer_data, raw)
+            with self._transfer_cond:
+                self._transfer_list.append(transfer)
+        else:
+            # Writes may be deferred, so take a copy of a mutable buffer to let the caller reuse it
+            # immediately. Slices of a memoryview then don't copy the data again for each packet.
+            if not isinstance(transfer_data, bytes):
+                transfer_data = bytes(transfer_data)
+            transfer_data = memoryview(transfer_data)
 
         # Build physical packet by adding it to command
         cmd = self._crnt_cmd
@@ -981,7 +1348,7 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
             if transfer_data is None:
                 data = None
             else:
-                data = transfer_data[trans_data_pos:trans_data_pos + size]
+                data = transfer_data[trans_data_pos * 4:(trans_data_pos + size) * 4]
             cmd.add(size, transfer_request, data, dap_index)
             size_to_transfer -= size
             trans_data_pos += size
@@ -999,16 +1366,14 @@ class DAPAccessCMSISDAP(DAPAccessIntf):
 
     def _abort_all_transfers(self, exception):
         """! @brief Abort any ongoing transfers and clear all buffers
+        
+        Must only be called when no commands are in flight. Responses for in-flight
+        commands that failed are drained by the completion thread.
         """
-        pending_reads = len(self._commands_to_read)
-        # invalidate _transfer_list
-        for transfer in self._transfer_list:
-            transfer.add_error(exception)
-        # clear all deferred buffers
-        self._init_deferred_buffers()
-        # finish all pending reads and ignore the data
-        # Only do this if the error is a tranfer error.
-        # Otherwise this could cause another exception
-        if isinstance(exception, DAPAccessIntf.TransferError):
-            for _ in range(pending_reads):
-                self._interface.read()
+        with self._transfer_cond:
+            assert not self._commands_to_read
+            # invalidate _transfer_list
+            for transfer in self._transfer_list:
+                transfer.add_error(exception)
+            # clear all deferred buffers
+            self._init_deferred_buffers()
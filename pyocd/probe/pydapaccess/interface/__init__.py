@@ -21,6 +21,7 @@ from .hidapi_backend import HidApiUSB
 from .pyusb_backend import PyUSB
 from .pyusb_v2_backend import PyUSBv2
 from .pywinusb_backend import PyWinUSB
+from .simulated_backend import SimulatedCMSISDAP
 
 LOG = logging.getLogger(__name__)
 
@@ -29,6 +30,7 @@ INTERFACE = {
              'pyusb': PyUSB,
              'pyusb_v2': PyUSBv2,
              'pywinusb': PyWinUSB,
+             'simulated': SimulatedCMSISDAP,
             }
 
 # Allow user to override backend with an environment variable.
@@ -58,4 +60,9 @@ if not USB_BACKEND:
     else:
         raise DAPAccessIntf.DeviceError("No USB backend found")
 
-USB_BACKEND_V2 = "pyusb_v2"
+# CMSIS-DAPv2 probes are found with pyusb. When the simulated probe is selected, no v2 backend
+# is used so that only the simulated probe is enumerated.
+if USB_BACKEND == "simulated":
+    USB_BACKEND_V2 = None
+else:
+    USB_BACKEND_V2 = "pyusb_v2"
@@ -43,6 +43,7 @@ class HidApiUSB(Interface):
         super(HidApiUSB, self).__init__()
         # Vendor page and usage_id = 2
         self.device = None
+        self._init_report_buffer()
 
     def open(self):
         try:
@@ -100,10 +101,16 @@ class HidApiUSB(Interface):
     def write(self, data):
         """! @brief Write data on the OUT endpoint associated to the HID interface
         """
-        for _ in range(self.packet_size - len(data)):
-            data.append(0)
+        # Copy the data into the report after the report ID. Only the bytes left over from a
+        # longer previous report need to be cleared to pad it to the packet size.
+        report = self._report_buffer
+        length = len(data)
+        report[1:length + 1] = data
+        if length < self._report_length:
+            report[length + 1:self._report_length + 1] = self._zeros[:self._report_length - length]
+        self._report_length = length
         #logging.debug("send: %s", data)
-        self.device.write([0] + data)
+        self.device.write(report)
         return
 
 
@@ -127,3 +134,10 @@ class HidApiUSB(Interface):
 
     def set_packet_size(self, size):
         self.packet_size = size
+        self._init_report_buffer()
+
+    def _init_report_buffer(self):
+        """! @brief Allocate the buffer for output reports, sized for the report ID plus a packet."""
+        self._report_buffer = bytearray(self.packet_size + 1)
+        self._zeros = memoryview(bytearray(self.packet_size))
+        self._report_length = 0
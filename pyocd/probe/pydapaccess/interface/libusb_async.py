@@ -0,0 +1,194 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import ctypes
+import logging
+import os
+import threading
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import usb.util
+    import usb.backend.libusb1 as libusb1
+except ImportError:
+    libusb1 = None
+
+## Environment variable that enables asynchronous reads in the pyusb backends when set to 1.
+ASYNC_ENV = "PYOCD_USB_ASYNC"
+
+## libusb functions used by AsyncEndpointReader.
+_REQUIRED_FUNCTIONS = (
+    'libusb_alloc_transfer',
+    'libusb_free_transfer',
+    'libusb_submit_transfer',
+    'libusb_cancel_transfer',
+    'libusb_handle_events_timeout',
+    )
+
+def is_async_enabled():
+    """! @brief Whether asynchronous reads were enabled with the PYOCD_USB_ASYNC variable."""
+    return os.getenv(ASYNC_ENV, "0") not in ("", "0")
+
+class _timeval(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long),
+                ('tv_usec', ctypes.c_long)]
+
+class AsyncEndpointReader(object):
+    """! @brief Reads an IN endpoint with several libusb transfers queued at once.
+
+    The synchronous pyusb read API has at most one transfer queued for an endpoint, so the bus is
+    idle from the time one transfer completes until the host thread submits the next. This class
+    uses the libusb asynchronous API, through the ctypes bindings of pyusb's libusb1 backend, to
+    keep a number of transfers queued. When a transfer completes its data is appended to #queue
+    and the transfer is immediately resubmitted.
+
+    Completions are handled by an event thread owned by the reader. The queue is a deque, whose
+    append and popleft operations are atomic, so the consumer doesn't need a lock. A None entry is
+    appended to the queue when the reader stops, either because stop() was called or because of an
+    error such as the device being disconnected.
+    """
+
+    ## Time in seconds the event thread waits for events before checking whether it should exit.
+    EVENT_TIMEOUT = 0.1
+
+    def __init__(self, dev, ep, transfer_size, transfer_count, name):
+        """! @brief Constructor.
+
+        @param self
+        @param dev The pyusb Device. The interface containing the endpoint must be claimed.
+        @param ep The pyusb Endpoint to read. It must be a bulk or interrupt IN endpoint.
+        @param transfer_size Size in bytes of each transfer. A transfer completes when it's full or
+            when the device sends a short packet.
+        @param transfer_count Number of transfers kept queued.
+        @param name Name of the event thread.
+        """
+        self._dev = dev
+        self._ep = ep
+        self._transfer_size = transfer_size
+        self._transfer_count = transfer_count
+        self._name = name
+        self._lib = None
+        self._transfers = []
+        self._buffers = []
+        self._active = 0
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._thread = None
+        # The ctypes callback object must stay alive as long as transfers use it.
+        self._callback = libusb1._libusb_transfer_cb_fn_p(self._transfer_done)
+
+        ## Deque of received data, as bytearrays, terminated by None when the reader stops.
+        self.queue = collections.deque()
+
+    @staticmethod
+    def is_supported(dev):
+        """! @brief Whether the device is opened with a libusb 1.0 backend that supports async reads."""
+        if libusb1 is None:
+            return False
+        backend = dev.backend
+        if not isinstance(backend, libusb1._LibUSB):
+            return False
+        return all(hasattr(backend.lib, fn) for fn in _REQUIRED_FUNCTIONS)
+
+    def start(self):
+        """! @brief Submit the transfers and start the event thread."""
+        backend = self._dev.backend
+        lib = self._lib = backend.lib
+        # These functions are not declared by pyusb.
+        lib.libusb_cancel_transfer.argtypes = [ctypes.POINTER(libusb1._libusb_transfer)]
+        lib.libusb_handle_events_timeout.argtypes = [ctypes.c_void_p, ctypes.POINTER(_timeval)]
+        self._ctx = backend.ctx
+
+        handle = self._dev._ctx.managed_open()
+        ep_type = usb.util.endpoint_type(self._ep.bmAttributes)
+        for _ in range(self._transfer_count):
+            buf = (ctypes.c_ubyte * self._transfer_size)()
+            transfer_p = lib.libusb_alloc_transfer(0)
+            if not transfer_p:
+                raise MemoryError("unable to allocate USB transfer")
+            transfer = transfer_p.contents
+            transfer.dev_handle = handle.handle
+            transfer.endpoint = self._ep.bEndpointAddress
+            transfer.type = ep_type
+            transfer.timeout = 0
+            transfer.buffer = ctypes.cast(buf, ctypes.c_void_p)
+            transfer.length = self._transfer_size
+            transfer.callback = self._callback
+            transfer.user_data = None
+            transfer.num_iso_packets = 0
+            self._transfers.append(transfer_p)
+            self._buffers.append(buf)
+
+        with self._lock:
+            for transfer_p in self._transfers:
+                libusb1._check(lib.libusb_submit_transfer(transfer_p))
+                self._active += 1
+
+        self._thread = threading.Thread(target=self._event_task, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """! @brief Cancel the transfers and wait for the event thread to exit."""
+        with self._lock:
+            self._stopping = True
+            for transfer_p in self._transfers:
+                # Fails harmlessly for transfers that are not queued.
+                self._lib.libusb_cancel_transfer(transfer_p)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for transfer_p in self._transfers:
+            self._lib.libusb_free_transfer(transfer_p)
+        self._transfers = []
+        self._buffers = []
+
+    def _transfer_done(self, transfer_p):
+        """! @brief libusb callback for a completed, cancelled, or failed transfer.
+
+        Called from the event thread.
+        """
+        transfer = transfer_p.contents
+        status = transfer.status
+        if status == libusb1.LIBUSB_TRANSFER_COMPLETED:
+            self.queue.append(bytearray(ctypes.string_at(transfer.buffer, transfer.actual_length)))
+
+        with self._lock:
+            if not self._stopping and status in (libusb1.LIBUSB_TRANSFER_COMPLETED,
+                                                libusb1.LIBUSB_TRANSFER_TIMED_OUT):
+                result = self._lib.libusb_submit_transfer(transfer_p)
+                if result == 0:
+                    return
+                LOG.error("%s: failed to resubmit USB transfer (%d)", self._name, result)
+            elif not self._stopping:
+                LOG.error("%s: USB transfer failed: %s", self._name,
+                        libusb1._str_transfer_error.get(status, status))
+            if not self._stopping:
+                # Data would be lost or out of order, so stop the reader.
+                self._stopping = True
+                for other_p in self._transfers:
+                    self._lib.libusb_cancel_transfer(other_p)
+            self._active -= 1
+
+    def _event_task(self):
+        timeout = _timeval(0, int(self.EVENT_TIMEOUT * 1000000))
+        try:
+            while self._active:
+                self._lib.libusb_handle_events_timeout(self._ctx, ctypes.byref(timeout))
+        finally:
+            self.queue.append(None)
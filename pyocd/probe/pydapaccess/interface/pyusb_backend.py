@@ -17,6 +17,8 @@
 from .interface import Interface
 from .common import (filter_device_by_class, is_known_cmsis_dap_vid_pid)
 from ..dap_access_api import DAPAccessIntf
+from . import libusb_async
+import collections
 import logging
 import os
 import threading
@@ -43,6 +45,9 @@ class PyUSB(Interface):
 
     isAvailable = IS_AVAILABLE
 
+    ## Number of IN transfers kept queued when asynchronous reads are enabled.
+    ASYNC_TRANSFER_COUNT = 4
+
     def __init__(self):
         super(PyUSB, self).__init__()
         self.ep_out = None
@@ -53,7 +58,8 @@ class PyUSB(Interface):
         self.kernel_driver_was_attached = False
         self.closed = True
         self.thread = None
-        self.rcv_data = []
+        self.rx_reader = None
+        self.rcv_data = collections.deque()
         self.read_sem = threading.Semaphore(0)
         self.packet_size = 64
 
@@ -131,6 +137,15 @@ class PyUSB(Interface):
             # USB timeout expected
             pass
 
+        # Use queued asynchronous reads if enabled and supported by the libusb backend.
+        if libusb_async.is_async_enabled() and libusb_async.AsyncEndpointReader.is_supported(self.dev):
+            self.rx_reader = libusb_async.AsyncEndpointReader(self.dev, self.ep_in,
+                                self.ep_in.wMaxPacketSize, self.ASYNC_TRANSFER_COUNT,
+                                "CMSIS-DAP receive (%s)" % self.serial_number)
+            self.rcv_data = self.rx_reader.queue
+            self.rx_reader.start()
+            return
+
         # Start RX thread
         self.thread = threading.Thread(target=self.rx_task)
         self.thread.daemon = True
@@ -176,10 +191,13 @@ class PyUSB(Interface):
         if self.ep_out:
             report_size = self.ep_out.wMaxPacketSize
 
-        for _ in range(report_size - len(data)):
-            data.append(0)
+        # Pad to the report size without modifying the caller's buffer.
+        if len(data) < report_size:
+            data = bytearray(data)
+            data.extend(bytearray(report_size - len(data)))
 
-        self.read_sem.release()
+        if self.rx_reader is None:
+            self.read_sem.release()
 
         if not self.ep_out:
             bmRequestType = 0x21              #Host to device request of type Class of Recipient Interface
@@ -204,7 +222,7 @@ class PyUSB(Interface):
         if self.rcv_data[0] is None:
             raise DAPAccessIntf.DeviceError("Device %s read thread exited" %
                                             self.serial_number)
-        return self.rcv_data.pop(0)
+        return self.rcv_data.popleft()
 
     def set_packet_count(self, count):
         # No interface level restrictions on count
@@ -223,10 +241,14 @@ class PyUSB(Interface):
 
         LOG.debug("closing interface")
         self.closed = True
-        self.read_sem.release()
-        self.thread.join()
+        if self.rx_reader is not None:
+            self.rx_reader.stop()
+            self.rx_reader = None
+        else:
+            self.read_sem.release()
+            self.thread.join()
         assert self.rcv_data[-1] is None
-        self.rcv_data = []
+        self.rcv_data = collections.deque()
         usb.util.release_interface(self.dev, self.intf_number)
         if self.kernel_driver_was_attached:
             try:
@@ -17,7 +17,9 @@
 from .interface import Interface
 from .common import (USB_CLASS_VENDOR_SPECIFIC, filter_device_by_class, is_known_cmsis_dap_vid_pid)
 from ..dap_access_api import DAPAccessIntf
+from . import libusb_async
 from ... import common
+import collections
 import logging
 import os
 import threading
@@ -43,6 +45,15 @@ class PyUSBv2(Interface):
 
     isAvailable = IS_AVAILABLE
 
+    ## Number of DAP response transfers kept queued when asynchronous reads are enabled.
+    ASYNC_TRANSFER_COUNT = 4
+    
+    ## Number of SWO transfers kept queued when asynchronous reads are enabled.
+    ASYNC_SWO_TRANSFER_COUNT = 8
+    
+    ## Size of each SWO transfer in max size packets when asynchronous reads are enabled.
+    ASYNC_SWO_TRANSFER_PACKETS = 8
+
     def __init__(self):
         super(PyUSBv2, self).__init__()
         self.ep_out = None
@@ -57,8 +68,10 @@ class PyUSBv2(Interface):
         self.rx_stop_event = None
         self.swo_thread = None
         self.swo_stop_event = None
-        self.rcv_data = []
-        self.swo_data = []
+        self.rx_reader = None
+        self.swo_reader = None
+        self.rcv_data = collections.deque()
+        self.swo_data = collections.deque()
         self.read_sem = threading.Semaphore(0)
         self.packet_size = 512
         self.is_swo_running = False
@@ -66,6 +79,12 @@ class PyUSBv2(Interface):
     @property
     def has_swo_ep(self):
         return self.ep_swo is not None
+    
+    @property
+    def use_async_reads(self):
+        """! @brief Whether queued asynchronous reads are enabled and supported."""
+        return libusb_async.is_async_enabled() \
+                and libusb_async.AsyncEndpointReader.is_supported(self.dev)
 
     def open(self):
         assert self.closed is True
@@ -121,6 +140,14 @@ class PyUSBv2(Interface):
             # USB timeout expected
             pass
 
+        if self.use_async_reads:
+            self.rx_reader = libusb_async.AsyncEndpointReader(self.dev, self.ep_in,
+                                self.ep_in.wMaxPacketSize, self.ASYNC_TRANSFER_COUNT,
+                                "CMSIS-DAP receive (%s)" % self.serial_number)
+            self.rcv_data = self.rx_reader.queue
+            self.rx_reader.start()
+            return
+
         # Start RX thread
         self.rx_stop_event = threading.Event()
         thread_name = "CMSIS-DAP receive (%s)" % self.serial_number
@@ -129,6 +156,16 @@ class PyUSBv2(Interface):
         self.thread.start()
     
     def start_swo(self):
+        if self.use_async_reads:
+            self.swo_reader = libusb_async.AsyncEndpointReader(self.dev, self.ep_swo,
+                                self.ep_swo.wMaxPacketSize * self.ASYNC_SWO_TRANSFER_PACKETS,
+                                self.ASYNC_SWO_TRANSFER_COUNT,
+                                "SWO receive (%s)" % self.serial_number)
+            self.swo_data = self.swo_reader.queue
+            self.swo_reader.start()
+            self.is_swo_running = True
+            return
+        
         self.swo_stop_event = threading.Event()
         thread_name = "SWO receive (%s)" % self.serial_number
         self.swo_thread = threading.Thread(target=self.swo_rx_task, name=thread_name)
@@ -137,6 +174,12 @@ class PyUSBv2(Interface):
         self.is_swo_running = True
     
     def stop_swo(self):
+        if self.swo_reader is not None:
+            self.swo_reader.stop()
+            self.swo_reader = None
+            self.is_swo_running = False
+            return
+        
         self.swo_stop_event.set()
         self.swo_thread.join()
         self.swo_thread = None
@@ -194,10 +237,13 @@ class PyUSBv2(Interface):
         if self.ep_out:
             report_size = self.ep_out.wMaxPacketSize
 
-        for _ in range(report_size - len(data)):
-            data.append(0)
+        # Pad to the report size without modifying the caller's buffer.
+        if len(data) < report_size:
+            data = bytearray(data)
+            data.extend(bytearray(report_size - len(data)))
 
-        self.read_sem.release()
+        if self.rx_reader is None:
+            self.read_sem.release()
 
         self.ep_out.write(data)
         #logging.debug('sent: %s', data)
@@ -209,7 +255,7 @@ class PyUSBv2(Interface):
 
         if self.rcv_data[0] is None:
             raise DAPAccessIntf.DeviceError("Device %s read thread exited unexpectedly" % self.serial_number)
-        return self.rcv_data.pop(0)
+        return self.rcv_data.popleft()
 
     def read_swo(self):
         # Accumulate all available SWO data.
@@ -217,7 +263,7 @@ class PyUSBv2(Interface):
         while len(self.swo_data):
             if self.swo_data[0] is None:
                 raise DAPAccessIntf.DeviceError("Device %s SWO thread exited unexpectedly" % self.serial_number)
-            data += self.swo_data.pop(0)
+            data += self.swo_data.popleft()
         
         return data
 
@@ -238,12 +284,16 @@ class PyUSBv2(Interface):
         if self.is_swo_running:
             self.stop_swo()
         self.closed = True
-        self.rx_stop_event.set()
-        self.read_sem.release()
-        self.thread.join()
+        if self.rx_reader is not None:
+            self.rx_reader.stop()
+            self.rx_reader = None
+        else:
+            self.rx_stop_event.set()
+            self.read_sem.release()
+            self.thread.join()
         assert self.rcv_data[-1] is None
-        self.rcv_data = []
-        self.swo_data = []
+        self.rcv_data = collections.deque()
+        self.swo_data = collections.deque()
         usb.util.release_interface(self.dev, self.intf_number)
         usb.util.dispose_resources(self.dev)
         self.ep_out = None
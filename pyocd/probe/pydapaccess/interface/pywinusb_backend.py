@@ -52,6 +52,7 @@ class PyWinUSB(Interface):
         # comprable to a based list implmentation.
         self.rcv_data = collections.deque()
         self.device = None
+        self._init_report_buffer()
 
     # handler called when a report is received
     def rx_handler(self, data):
@@ -138,10 +139,16 @@ class PyWinUSB(Interface):
     def write(self, data):
         """! @brief Write data on the OUT endpoint associated to the HID interface
         """
-        for _ in range(self.packet_size - len(data)):
-            data.append(0)
+        # Copy the data into the report after the report ID. Only the bytes left over from a
+        # longer previous report need to be cleared to pad it to the packet size.
+        report = self._report_buffer
+        length = len(data)
+        report[1:length + 1] = data
+        if length < self._report_length:
+            report[length + 1:self._report_length + 1] = self._zeros[:self._report_length - length]
+        self._report_length = length
         #logging.debug("send: %s", data)
-        self.report.send([0] + data)
+        self.report.send(report)
         return
 
 
@@ -168,6 +175,13 @@ class PyWinUSB(Interface):
 
     def set_packet_size(self, size):
         self.packet_size = size
+        self._init_report_buffer()
+
+    def _init_report_buffer(self):
+        """! @brief Allocate the buffer for output reports, sized for the report ID plus a packet."""
+        self._report_buffer = bytearray(self.packet_size + 1)
+        self._zeros = memoryview(bytearray(self.packet_size))
+        self._report_length = 0
 
     def get_serial_number(self):
         return self.serial_number
@@ -0,0 +1,943 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .interface import Interface
+from ..dap_access_api import DAPAccessIntf
+from ..cmsis_dap_core import (
+    Command,
+    Capabilities,
+    Pin,
+    DAPSWOTransport,
+    DAPSWOMode,
+    DAPSWOControl,
+    DAPSWOStatus,
+    DAPTransferResponse,
+    DAP_OK,
+    DAP_ERROR,
+    DAP_SWD_PORT,
+    )
+import collections
+import logging
+import os
+import struct
+import threading
+from time import (sleep, time)
+
+LOG = logging.getLogger(__name__)
+
+## @brief Environment variables used to configure the simulated probe.
+#
+# The simulated probe is selected by setting the PYOCD_USB_BACKEND environment
+# variable to "simulated".
+LATENCY_ENV = 'PYOCD_SIM_LATENCY'
+PACKET_SIZE_ENV = 'PYOCD_SIM_PACKET_SIZE'
+PACKET_COUNT_ENV = 'PYOCD_SIM_PACKET_COUNT'
+SWD_TIMING_ENV = 'PYOCD_SIM_SWD_TIMING'
+
+## @brief Unique ID reported by the simulated probe.
+SIMULATED_SERIAL_NUMBER = "simulated0"
+
+# Transfer request bits.
+_APnDP = 0x01
+_RnW = 0x02
+_A32 = 0x0c
+_VALUE_MATCH = 0x10
+_MATCH_MASK = 0x20
+
+## Value mismatch bit of a DAP_Transfer response.
+_VALUE_MISMATCH = 0x10
+
+## Approximate number of SWCLK cycles used by a single SWD transfer, including
+# request, turnaround, ack, data, parity, and idle cycles.
+_SWD_CYCLES_PER_TRANSFER = 46
+
+# DP registers.
+_DP_IDCODE = 0x0
+_DP_ABORT = 0x0
+_DP_CTRL_STAT = 0x4
+_DP_SELECT = 0x8
+_DP_RDBUFF = 0xc
+
+_ABORT_STKCMPCLR = 0x02
+_ABORT_STKERRCLR = 0x04
+_ABORT_WDERRCLR = 0x08
+_ABORT_ORUNERRCLR = 0x10
+
+_CTRLSTAT_STICKYORUN = 0x00000002
+_CTRLSTAT_STICKYCMP = 0x00000010
+_CTRLSTAT_STICKYERR = 0x00000020
+_CTRLSTAT_WDATAERR = 0x00000080
+_CTRLSTAT_PWRUPREQ = 0x50000000
+_CTRLSTAT_RW_MASK = 0x50000f01
+
+# MEM-AP registers.
+_AP_CSW = 0x00
+_AP_TAR = 0x04
+_AP_DRW = 0x0c
+_AP_BD0 = 0x10
+_AP_BD3 = 0x1c
+_AP_CFG = 0xf4
+_AP_BASE = 0xf8
+_AP_IDR = 0xfc
+
+_CSW_SIZE_MASK = 0x00000007
+_CSW_ADDRINC_MASK = 0x00000030
+_CSW_DEVICEEN = 0x00000040
+_CSW_RW_MASK = 0x2f000037
+_CSW_RESET = 0x03000040
+
+## Auto-increment of TAR wraps at this boundary, as with the Cortex-M3/M4 AHB-AP.
+_TAR_WRAP = 0x1000
+
+# Cortex-M debug registers.
+_CPUID = 0xE000ED00
+_AIRCR = 0xE000ED0C
+_DFSR = 0xE000ED30
+_CPACR = 0xE000ED88
+_DHCSR = 0xE000EDF0
+_DCRSR = 0xE000EDF4
+_DCRDR = 0xE000EDF8
+_DEMCR = 0xE000EDFC
+_MVFR0 = 0xE000EF40
+_MVFR1 = 0xE000EF44
+
+_DBGKEY = 0xA05F0000
+_DHCSR_CTRL_MASK = 0x2f
+_C_DEBUGEN = (1 << 0)
+_C_HALT = (1 << 1)
+_C_STEP = (1 << 2)
+_S_REGRDY = (1 << 16)
+_S_HALT = (1 << 17)
+_S_RETIRE_ST = (1 << 24)
+_S_RESET_ST = (1 << 25)
+
+_DCRSR_REGWnR = (1 << 16)
+_DCRSR_REGSEL = 0x7f
+
+_DFSR_VCATCH = (1 << 3)
+_DFSR_HALTED = (1 << 0)
+
+_AIRCR_VECTKEY = 0x05FA0000
+_AIRCR_VECTRESET = (1 << 0)
+_AIRCR_SYSRESETREQ = (1 << 2)
+_AIRCR_READ_KEY = 0xFA050000
+
+_DEMCR_VC_CORERESET = (1 << 0)
+_CPACR_CP10_CP11_MASK = (0xf << 20)
+
+# Core register numbers used when emulating reset.
+_REG_SP = 13
+_REG_LR = 14
+_REG_PC = 15
+_REG_XPSR = 16
+_REG_MSP = 17
+_XPSR_THUMB = 0x01000000
+
+# Trace components.
+_ITM_BASE = 0xE0000000
+_ITM_STIM_END = 0xE0000080
+_ITM_TER = 0xE0000E00
+_ITM_TCR = 0xE0000E80
+_ITM_TCR_ITMENA = (1 << 0)
+_DWT_BASE = 0xE0001000
+_DWT_CTRL_NUMCOMP_MASK = 0xf0000000
+_FPB_BASE = 0xE0002000
+_SCS_BASE = 0xE000E000
+_ROM_TABLE_BASE = 0xE00FF000
+
+_PPB_START = 0xE0000000
+_PPB_END = 0xE0100000
+
+# JEP106 code and continuation for Arm.
+_ARM_JEP106_ID = 0x3b
+_ARM_JEP106_CONT = 0x4
+
+def _make_id_block(component_class, part):
+    """! @brief Build the CoreSight ID registers for a component.
+
+    @return Dict mapping register offset within the component's 4 kB block to value.
+    """
+    pidr = [
+        part & 0xff,
+        ((part >> 8) & 0xf) | ((_ARM_JEP106_ID & 0xf) << 4),
+        ((_ARM_JEP106_ID >> 4) & 0x7) | 0x08,
+        0,
+        ]
+    cidr = [0x0d, component_class << 4, 0x05, 0xb1]
+    regs = {0xfd0: _ARM_JEP106_CONT}
+    for i, value in enumerate(pidr):
+        regs[0xfe0 + i * 4] = value
+    for i, value in enumerate(cidr):
+        regs[0xff0 + i * 4] = value
+    return regs
+
+class _MemoryRegion(object):
+    """! @brief A plain memory region of the simulated target."""
+
+    def __init__(self, name, start, length, is_writable, fill=0):
+        self.name = name
+        self.start = start
+        self.end = start + length
+        self.is_writable = is_writable
+        self.data = bytearray([fill]) * length
+
+    def contains_range(self, addr, length):
+        return (self.start <= addr) and (addr + length <= self.end)
+
+class SimulatedTarget(object):
+    """! @brief Model of a Cortex-M4 based MCU as seen through its AHB-AP.
+
+    The model has a flash region that is read-only from the debugger, a RAM region, and the
+    private peripheral bus with a ROM table, SCS, DWT, FPB, and ITM. Only the debug relevant
+    behaviour of the core is modelled: it never executes instructions, but can be halted,
+    resumed, stepped, and reset, and its registers can be accessed through DCRSR and DCRDR.
+    Accesses outside of the modelled regions produce a bus fault.
+    """
+
+    ## CPUID for a Cortex-M4 r0p1.
+    CPUID = 0x410FC241
+
+    def __init__(self, flash_start=0x00000000, flash_size=0x80000, ram_start=0x20000000,
+                ram_size=0x20000):
+        self.flash = _MemoryRegion("flash", flash_start, flash_size, False, fill=0xff)
+        self.ram = _MemoryRegion("ram", ram_start, ram_size, True)
+        self.regions = [self.flash, self.ram]
+        self.trace_output = None
+        self._lock = threading.RLock()
+        self._build_ppb()
+        self.power_on_reset()
+
+    def _build_ppb(self):
+        # Registers with no special behaviour are kept in a sparse dict.
+        self._ppb = {}
+        components = [
+            (_ROM_TABLE_BASE, 0x1, 0x4c4),
+            (_SCS_BASE, 0xe, 0x00c),
+            (_DWT_BASE, 0xe, 0x002),
+            (_FPB_BASE, 0xe, 0x003),
+            (_ITM_BASE, 0xe, 0x001),
+            ]
+        self._read_only = set()
+        for base, component_class, part in components:
+            for offset, value in _make_id_block(component_class, part).items():
+                self._ppb[base + offset] = value
+                self._read_only.add(base + offset)
+        for i, base in enumerate([_SCS_BASE, _DWT_BASE, _FPB_BASE, _ITM_BASE]):
+            entry = ((base - _ROM_TABLE_BASE) & 0xfffff000) | 0x3
+            self._ppb[_ROM_TABLE_BASE + i * 4] = entry
+            self._read_only.add(_ROM_TABLE_BASE + i * 4)
+        self._read_only.update([_CPUID, _MVFR0, _MVFR1])
+        self._ppb[_CPUID] = self.CPUID
+        self._ppb[_MVFR0] = 0x10110021 # Single precision FPv4.
+        self._ppb[_MVFR1] = 0x11000011
+        self._ppb[_DWT_BASE] = 0x40000000 # 4 comparators.
+        self._ppb[_FPB_BASE] = 0x00000260 # 6 code and 2 literal comparators.
+
+    def power_on_reset(self):
+        """! @brief Reset all state, including the debug logic."""
+        with self._lock:
+            self._dhcsr_ctrl = 0
+            self._demcr = 0
+            self.core_registers = {}
+            self._dcrdr = 0
+            self._dfsr = 0
+            self.reset_count = 0
+            self.system_reset()
+            self._reset_flag = True
+
+    def system_reset(self):
+        """! @brief Perform a system reset.
+
+        Core registers are loaded from the vector table at the start of flash. If reset vector
+        catch is enabled, the core halts.
+        """
+        with self._lock:
+            self.reset_count += 1
+            self._reset_flag = True
+            sp = self._read_region_word(self.flash.start) or 0
+            pc = self._read_region_word(self.flash.start + 4) or 0
+            self.core_registers = {
+                _REG_SP: sp & ~0x3,
+                _REG_MSP: sp & ~0x3,
+                _REG_LR: 0xffffffff,
+                _REG_PC: pc & ~0x1,
+                _REG_XPSR: _XPSR_THUMB,
+                }
+            if (self._dhcsr_ctrl & _C_DEBUGEN) and (self._demcr & _DEMCR_VC_CORERESET):
+                self.is_halted = True
+                self._dhcsr_ctrl |= _C_HALT
+                self._dfsr |= _DFSR_VCATCH
+            else:
+                self.is_halted = False
+                self._dhcsr_ctrl &= ~(_C_HALT | _C_STEP)
+
+    def load(self, addr, data):
+        """! @brief Directly copy data into a memory region, bypassing access permissions.
+
+        This is intended for preloading flash contents.
+        """
+        region = self._find_region(addr, len(data))
+        if region is None:
+            raise ValueError("address range [0x%08x:0x%08x) is not in a memory region"
+                                % (addr, addr + len(data)))
+        offset = addr - region.start
+        region.data[offset:offset + len(data)] = data
+
+    def _find_region(self, addr, length):
+        for region in self.regions:
+            if region.contains_range(addr, length):
+                return region
+        return None
+
+    def _read_region_word(self, addr):
+        region = self._find_region(addr, 4)
+        if region is None:
+            return None
+        return struct.unpack_from("<I", region.data, addr - region.start)[0]
+
+    def read(self, addr, size):
+        """! @brief Perform a single bus read.
+        @param addr Aligned address.
+        @param size Access size in bytes, 1, 2, or 4.
+        @return The value, or None if the access faulted.
+        """
+        if _PPB_START <= addr < _PPB_END:
+            with self._lock:
+                word = self._read_ppb(addr & ~0x3)
+            shift = (addr & 0x3) * 8
+            return (word >> shift) & ((1 << (size * 8)) - 1)
+        region = self._find_region(addr, size)
+        if region is None:
+            return None
+        offset = addr - region.start
+        if size == 4:
+            return struct.unpack_from("<I", region.data, offset)[0]
+        elif size == 2:
+            return struct.unpack_from("<H", region.data, offset)[0]
+        else:
+            return region.data[offset]
+
+    def write(self, addr, size, value):
+        """! @brief Perform a single bus write.
+        @return Boolean indicating whether the write succeeded.
+        """
+        if _PPB_START <= addr < _PPB_END:
+            with self._lock:
+                self._write_ppb(addr, size, value)
+            return True
+        region = self._find_region(addr, size)
+        if region is None or not region.is_writable:
+            return False
+        offset = addr - region.start
+        if size == 4:
+            struct.pack_into("<I", region.data, offset, value)
+        elif size == 2:
+            struct.pack_into("<H", region.data, offset, value)
+        else:
+            region.data[offset] = value
+        return True
+
+    def read_block(self, addr, length):
+        """! @brief Read a block of plain memory.
+        @return A memoryview of the data, or None if the range is not entirely within a
+            single memory region.
+        """
+        region = self._find_region(addr, length)
+        if region is None:
+            return None
+        offset = addr - region.start
+        return memoryview(region.data)[offset:offset + length]
+
+    def write_block(self, addr, data):
+        """! @brief Write a block of plain memory.
+        @return Boolean indicating whether the write was performed. If False, no data was
+            written and the caller should fall back to individual accesses.
+        """
+        region = self._find_region(addr, len(data))
+        if region is None or not region.is_writable:
+            return False
+        offset = addr - region.start
+        region.data[offset:offset + len(data)] = data
+        return True
+
+    def _read_ppb(self, addr):
+        if addr == _DHCSR:
+            value = self._dhcsr_ctrl | _S_REGRDY
+            if self.is_halted:
+                value |= _S_HALT
+            else:
+                value |= _S_RETIRE_ST
+            if self._reset_flag:
+                value |= _S_RESET_ST
+                self._reset_flag = False
+            return value
+        elif addr == _DCRDR:
+            return self._dcrdr
+        elif addr == _DEMCR:
+            return self._demcr
+        elif addr == _DFSR:
+            return self._dfsr
+        elif addr == _AIRCR:
+            return _AIRCR_READ_KEY | (self._ppb.get(_AIRCR, 0) & 0x700)
+        elif addr == _DWT_BASE:
+            return (self._ppb[_DWT_BASE] & ~_DWT_CTRL_NUMCOMP_MASK) | 0x40000000
+        return self._ppb.get(addr, 0)
+
+    def _write_ppb(self, addr, size, value):
+        word_addr = addr & ~0x3
+        if size != 4:
+            # Stimulus ports accept byte and halfword writes directly.
+            if _ITM_BASE <= word_addr < _ITM_STIM_END:
+                shift = (addr & 0x3) * 8
+                self._itm_write(word_addr, size, (value >> shift) & ((1 << (size * 8)) - 1))
+                return
+            # Other registers are updated with a read-modify-write of the containing word.
+            shift = (addr & 0x3) * 8
+            mask = ((1 << (size * 8)) - 1) << shift
+            value = (self._read_ppb(word_addr) & ~mask) | (value & mask)
+        addr = word_addr
+
+        if addr == _DHCSR:
+            if (value & 0xffff0000) != _DBGKEY:
+                return
+            ctrl = value & _DHCSR_CTRL_MASK
+            if not (ctrl & _C_DEBUGEN):
+                self.is_halted = False
+            elif ctrl & _C_HALT:
+                self.is_halted = True
+                self._dfsr |= _DFSR_HALTED
+            elif self.is_halted and (ctrl & _C_STEP):
+                # The step completes immediately.
+                self._dfsr |= _DFSR_HALTED
+            else:
+                self.is_halted = False
+            self._dhcsr_ctrl = ctrl
+        elif addr == _DCRSR:
+            regsel = value & _DCRSR_REGSEL
+            if value & _DCRSR_REGWnR:
+                self.core_registers[regsel] = self._dcrdr
+            else:
+                self._dcrdr = self.core_registers.get(regsel, 0)
+        elif addr == _DCRDR:
+            self._dcrdr = value
+        elif addr == _DEMCR:
+            self._demcr = value
+        elif addr == _DFSR:
+            self._dfsr &= ~value
+        elif addr == _AIRCR:
+            if (value & 0xffff0000) != _AIRCR_VECTKEY:
+                return
+            self._ppb[_AIRCR] = value & 0x700
+            if value & (_AIRCR_SYSRESETREQ | _AIRCR_VECTRESET):
+                self.system_reset()
+        elif addr == _CPACR:
+            self._ppb[addr] = value & _CPACR_CP10_CP11_MASK
+        elif _ITM_BASE <= addr < _ITM_STIM_END:
+            self._itm_write(addr, 4, value)
+        elif addr not in self._read_only:
+            self._ppb[addr] = value
+
+    def _itm_write(self, addr, size, value):
+        port = (addr - _ITM_BASE) // 4
+        if not (self._ppb.get(_ITM_TCR, 0) & _ITM_TCR_ITMENA):
+            return
+        if not (self._ppb.get(_ITM_TER, 0) & (1 << port)):
+            return
+        if self.trace_output is None:
+            return
+        # Emit an ITM software source packet.
+        size_code = {1: 1, 2: 2, 4: 3}[size]
+        packet = bytearray([(port << 3) | size_code])
+        packet += struct.pack("<I", value)[:size]
+        self.trace_output(packet)
+
+class SimulatedDebugPort(object):
+    """! @brief Model of an SWD DP with a single AHB-AP at APSEL 0.
+
+    Accesses are performed on the SimulatedTarget. Sticky error flags are handled as
+    specified by ADIv5: once STICKYERR is set, all AP accesses return a FAULT ack until the
+    flag is cleared with a write to the ABORT register.
+    """
+
+    ## DPIDR of an SW-DP v1 as found on Cortex-M3/M4.
+    DPIDR = 0x2ba01477
+
+    ## IDR of the Cortex-M3/M4 AHB-AP.
+    AP_IDR = 0x24770011
+
+    def __init__(self, target):
+        self.target = target
+        self.reset()
+
+    def reset(self):
+        self._ctrl_stat = 0
+        self._select = 0
+        self._rdbuff = 0
+        self._csw = _CSW_RESET
+        self._tar = 0
+
+    def transfer(self, request, value=0):
+        """! @brief Perform one DP or AP register access.
+        @return 2-tuple of the ack value and the read data (0 for writes).
+        """
+        addr = request & _A32
+        is_read = (request & _RnW) != 0
+        if not (request & _APnDP):
+            return DAPTransferResponse.ACK_OK, self._dp_access(addr, is_read, value)
+        if self._ctrl_stat & _CTRLSTAT_STICKYERR:
+            return DAPTransferResponse.ACK_FAULT, 0
+        addr |= self._select & 0xf0
+        if (self._select >> 24) != 0:
+            # Accesses to non-existent APs are ignored and read as zero.
+            result = 0
+        else:
+            result = self._ap_access(addr, is_read, value)
+        if result is None:
+            self._ctrl_stat |= _CTRLSTAT_STICKYERR
+            return DAPTransferResponse.ACK_FAULT, 0
+        if is_read:
+            self._rdbuff = result
+            return DAPTransferResponse.ACK_OK, result
+        return DAPTransferResponse.ACK_OK, 0
+
+    def _dp_access(self, addr, is_read, value):
+        if is_read:
+            if addr == _DP_IDCODE:
+                return self.DPIDR
+            elif addr == _DP_CTRL_STAT:
+                # Power-up acknowledge bits follow the request bits.
+                return self._ctrl_stat | ((self._ctrl_stat & _CTRLSTAT_PWRUPREQ) << 1)
+            elif addr == _DP_SELECT:
+                return self._select
+            else:
+                return self._rdbuff
+        else:
+            if addr == _DP_ABORT:
+                if value & _ABORT_STKERRCLR:
+                    self._ctrl_stat &= ~_CTRLSTAT_STICKYERR
+                if value & _ABORT_STKCMPCLR:
+                    self._ctrl_stat &= ~_CTRLSTAT_STICKYCMP
+                if value & _ABORT_WDERRCLR:
+                    self._ctrl_stat &= ~_CTRLSTAT_WDATAERR
+                if value & _ABORT_ORUNERRCLR:
+                    self._ctrl_stat &= ~_CTRLSTAT_STICKYORUN
+            elif addr == _DP_CTRL_STAT:
+                self._ctrl_stat = (self._ctrl_stat & ~_CTRLSTAT_RW_MASK) | (value & _CTRLSTAT_RW_MASK)
+            elif addr == _DP_SELECT:
+                self._select = value
+            return 0
+
+    def _transfer_size(self):
+        size = self._csw & _CSW_SIZE_MASK
+        return 1 << size if size <= 2 else 4
+
+    def _increment_tar(self, size):
+        if self._csw & _CSW_ADDRINC_MASK:
+            self._tar = (self._tar & ~(_TAR_WRAP - 1)) | ((self._tar + size) & (_TAR_WRAP - 1))
+
+    def _ap_access(self, addr, is_read, value):
+        if addr == _AP_DRW:
+            size = self._transfer_size()
+            tar = self._tar & ~(size - 1)
+            shift = (tar & 0x3) * 8
+            if is_read:
+                result = self.target.read(tar, size)
+                if result is not None:
+                    result <<= shift
+            else:
+                mask = (1 << (size * 8)) - 1
+                result = 0 if self.target.write(tar, size, (value >> shift) & mask) else None
+            if result is not None:
+                self._increment_tar(size)
+            return result
+        elif _AP_BD0 <= addr <= _AP_BD3:
+            bd_addr = (self._tar & ~0xf) + (addr - _AP_BD0)
+            if is_read:
+                return self.target.read(bd_addr, 4)
+            return 0 if self.target.write(bd_addr, 4, value) else None
+        elif is_read:
+            if addr == _AP_CSW:
+                return self._csw
+            elif addr == _AP_TAR:
+                return self._tar
+            elif addr == _AP_BASE:
+                return _ROM_TABLE_BASE | 0x3
+            elif addr == _AP_IDR:
+                return self.AP_IDR
+            return 0
+        else:
+            if addr == _AP_CSW:
+                self._csw = (value & _CSW_RW_MASK) | _CSW_DEVICEEN
+            elif addr == _AP_TAR:
+                self._tar = value
+            return 0
+
+    def block_transfer(self, request, count, data=None):
+        """! @brief Perform repeated accesses of one register.
+
+        Reads and writes of DRW with 32-bit transfers are performed directly on memory
+        when possible, falling back to individual accesses when a fault may occur.
+
+        @param request Transfer request byte.
+        @param count Number of words.
+        @param data Write data as bytes-like object, or None for reads.
+        @return 3-tuple of the number of completed transfers, ack value, and read data.
+        """
+        is_read = (request & _RnW) != 0
+        result = bytearray()
+        done = 0
+        if ((request & (_APnDP | _A32)) == (_APnDP | _AP_DRW)) \
+                and ((self._select & 0xff0000f0) == 0) \
+                and ((self._csw & _CSW_SIZE_MASK) == 2) \
+                and ((self._csw & _CSW_ADDRINC_MASK) != 0) \
+                and not (self._ctrl_stat & _CTRLSTAT_STICKYERR):
+            # Process in chunks that end at the TAR auto-increment boundary.
+            while done < count:
+                tar = self._tar & ~0x3
+                n = min(count - done, (_TAR_WRAP - (tar & (_TAR_WRAP - 1))) // 4)
+                if is_read:
+                    chunk = self.target.read_block(tar, n * 4)
+                    if chunk is None:
+                        break
+                    result += chunk
+                    self._rdbuff = struct.unpack_from("<I", chunk, n * 4 - 4)[0]
+                elif not self.target.write_block(tar, data[done * 4:(done + n) * 4]):
+                    break
+                self._increment_tar(n * 4)
+                done += n
+
+        # Remaining words, and any that may fault, are handled one at a time.
+        while done < count:
+            if is_read:
+                ack, value = self.transfer(request)
+            else:
+                value = struct.unpack_from("<I", data, done * 4)[0]
+                ack, _ = self.transfer(request, value)
+            if ack != DAPTransferResponse.ACK_OK:
+                return done, ack, result
+            if is_read:
+                result += struct.pack("<I", value)
+            done += 1
+        return done, DAPTransferResponse.ACK_OK, result
+
+class SimulatedCMSISDAP(Interface):
+    """! @brief CMSIS-DAP interface backed by an in-process probe simulator.
+
+    Commands are executed against a SimulatedDebugPort and SimulatedTarget as soon as they
+    are written. Responses become available to read() after a configurable delay that
+    models the USB round trip latency and, optionally, the time taken on the SWD wire at
+    the currently configured SWJ clock frequency. Packets are serviced one at a time, so
+    pipelining several packets hides latency the same way it does for a real probe.
+
+    The simulator is selected by setting the `PYOCD_USB_BACKEND` environment variable to
+    "simulated". Only the simulated probe is then enumerated; CMSIS-DAPv2 probes are not
+    searched for. These environment variables configure the simulated probe:
+    - `PYOCD_SIM_LATENCY`: USB round trip latency in seconds (default 0).
+    - `PYOCD_SIM_PACKET_SIZE`: Maximum packet size (default 64).
+    - `PYOCD_SIM_PACKET_COUNT`: Maximum packet count (default 4).
+    - `PYOCD_SIM_SWD_TIMING`: Set to 1 to model SWD transfer time (default 0).
+
+    The target model is shared by all interface instances with the same serial number, so
+    memory contents persist across sessions within a process.
+    """
+
+    isAvailable = True
+
+    ## Target models, keyed by serial number.
+    _targets = {}
+
+    ## Size of the SWO trace buffer.
+    SWO_BUFFER_SIZE = 4096
+
+    def __init__(self, serial_number=SIMULATED_SERIAL_NUMBER, latency=0.0, packet_size=64,
+                packet_count=4, swd_timing=False, target=None):
+        super(SimulatedCMSISDAP, self).__init__()
+        self.vendor_name = "pyOCD"
+        self.product_name = "Simulated CMSIS-DAP"
+        self.serial_number = serial_number
+        self.packet_size = packet_size
+        self.packet_count = packet_count
+        self.latency = latency
+        self.swd_timing = swd_timing
+        if target is None:
+            target = SimulatedCMSISDAP._targets.setdefault(serial_number, SimulatedTarget())
+        self.target = target
+        self.dp = SimulatedDebugPort(target)
+        self.clock_frequency = 1000000
+        self.match_retry = 0
+        self._match_mask = 0xffffffff
+        self._responses = collections.deque()
+        self._cond = threading.Condition()
+        self._busy_until = 0
+        self._swo_buffer = bytearray()
+        self._swo_mode = DAPSWOMode.OFF
+        self._swo_transport = DAPSWOTransport.NONE
+        self._swo_capturing = False
+        self._swo_overrun = False
+        self._nreset = True
+        self.closed = True
+
+    @staticmethod
+    def get_all_connected_interfaces():
+        """! @brief Returns the simulated probe configured from environment variables."""
+        return [SimulatedCMSISDAP(
+                    latency=float(os.getenv(LATENCY_ENV, "0")),
+                    packet_size=int(os.getenv(PACKET_SIZE_ENV, "64")),
+                    packet_count=int(os.getenv(PACKET_COUNT_ENV, "4")),
+                    swd_timing=os.getenv(SWD_TIMING_ENV, "0") not in ("", "0"),
+                    )]
+
+    def get_serial_number(self):
+        return self.serial_number
+
+    def set_packet_count(self, count):
+        self.packet_count = count
+
+    def set_packet_size(self, size):
+        self.packet_size = size
+
+    def open(self):
+        self.closed = False
+        self.target.trace_output = self.inject_swo
+
+    def close(self):
+        self.closed = True
+        self.target.trace_output = None
+        with self._cond:
+            self._responses.clear()
+
+    def inject_swo(self, data):
+        """! @brief Add data to the SWO buffer if capture is running."""
+        with self._cond:
+            if not self._swo_capturing:
+                return
+            space = self.SWO_BUFFER_SIZE - len(self._swo_buffer)
+            if len(data) > space:
+                self._swo_overrun = True
+                data = data[:space]
+            self._swo_buffer += data
+
+    def write(self, data):
+        """! @brief Execute a command and queue its response."""
+        data = bytearray(data)
+        response, transfer_count = self._execute(data)
+        if len(response) > self.packet_size:
+            raise DAPAccessIntf.DeviceError("simulated probe response exceeds the packet size")
+
+        now = time()
+        service_time = 0
+        if self.swd_timing:
+            service_time = transfer_count * _SWD_CYCLES_PER_TRANSFER / float(self.clock_frequency)
+        with self._cond:
+            # The probe services one command at a time.
+            start = max(now + self.latency / 2, self._busy_until)
+            self._busy_until = start + service_time
+            self._responses.append((self._busy_until + self.latency / 2, response))
+            self._cond.notify_all()
+
+    def read(self, size=-1, timeout=-1):
+        """! @brief Return the oldest response, blocking until its delivery time."""
+        with self._cond:
+            while not self._responses:
+                self._cond.wait()
+            ready_time, response = self._responses.popleft()
+        delay = ready_time - time()
+        if delay > 0:
+            sleep(delay)
+        return response
+
+    def _execute(self, data):
+        command = data[0]
+        if command == Command.DAP_TRANSFER:
+            return self._transfer(data)
+        elif command == Command.DAP_TRANSFER_BLOCK:
+            return self._transfer_block(data)
+        elif command == Command.DAP_INFO:
+            return self._info(data[1]), 0
+        elif command == Command.DAP_CONNECT:
+            port = data[1]
+            # Only SWD is supported; the default port selects SWD.
+            return bytearray([command, DAP_SWD_PORT if port in (0, DAP_SWD_PORT) else 0]), 0
+        elif command == Command.DAP_SWJ_CLOCK:
+            frequency = struct.unpack_from("<I", data, 1)[0]
+            if frequency:
+                self.clock_frequency = frequency
+            return bytearray([command, DAP_OK]), 0
+        elif command == Command.DAP_TRANSFER_CONFIGURE:
+            self.match_retry = struct.unpack_from("<H", data, 4)[0]
+            return bytearray([command, DAP_OK]), 0
+        elif command == Command.DAP_WRITE_ABORT:
+            self.dp.transfer(_DP_ABORT, struct.unpack_from("<I", data, 2)[0])
+            return bytearray([command, DAP_OK]), 1
+        elif command == Command.DAP_SWJ_PINS:
+            return self._swj_pins(data), 0
+        elif command == Command.DAP_RESET_TARGET:
+            self.target.system_reset()
+            return bytearray([command, DAP_OK, 0]), 0
+        elif command == Command.DAP_SWJ_SEQUENCE:
+            # A line reset or JTAG-to-SWD sequence resets the DP.
+            self.dp.reset()
+            return bytearray([command, DAP_OK]), 0
+        elif command == Command.DAP_SWO_TRANSPORT:
+            return self._swo_transport_cmd(data[1]), 0
+        elif command == Command.DAP_SWO_MODE:
+            return self._swo_mode_cmd(data[1]), 0
+        elif command == Command.DAP_SWO_BAUDRATE:
+            # Any baudrate is supported exactly.
+            return bytearray([command]) + data[1:5], 0
+        elif command == Command.DAP_SWO_CONTROL:
+            return self._swo_control_cmd(data[1]), 0
+        elif command == Command.DAP_SWO_STATUS:
+            return self._swo_status_cmd(), 0
+        elif command == Command.DAP_SWO_DATA:
+            return self._swo_data_cmd(struct.unpack_from("<H", data, 1)[0]), 0
+        elif command in (Command.DAP_LED, Command.DAP_DISCONNECT, Command.DAP_SWD_CONFIGURE,
+                        Command.DAP_DELAY):
+            return bytearray([command, DAP_OK]), 0
+        else:
+            # Unsupported commands, including JTAG and vendor commands.
+            return bytearray([command, DAP_ERROR]), 0
+
+    def _info(self, id_):
+        if id_ == DAPAccessIntf.ID.VENDOR.value:
+            value = self.vendor_name
+        elif id_ == DAPAccessIntf.ID.PRODUCT.value:
+            value = self.product_name
+        elif id_ == DAPAccessIntf.ID.SER_NUM.value:
+            value = self.serial_number
+        elif id_ == DAPAccessIntf.ID.FW_VER.value:
+            value = "1.0"
+        elif id_ == DAPAccessIntf.ID.CAPABILITIES.value:
+            return bytearray([Command.DAP_INFO, 1, Capabilities.SWD | Capabilities.SWO_UART])
+        elif id_ == DAPAccessIntf.ID.SWO_BUFFER_SIZE.value:
+            return bytearray([Command.DAP_INFO, 4]) + struct.pack("<I", self.SWO_BUFFER_SIZE)
+        elif id_ == DAPAccessIntf.ID.MAX_PACKET_COUNT.value:
+            return bytearray([Command.DAP_INFO, 1, self.packet_count])
+        elif id_ == DAPAccessIntf.ID.MAX_PACKET_SIZE.value:
+            return bytearray([Command.DAP_INFO, 2]) + struct.pack("<H", self.packet_size)
+        else:
+            return bytearray([Command.DAP_INFO, 0])
+        # String values are null terminated.
+        value = bytearray(value.encode('ascii')) + bytearray([0])
+        return bytearray([Command.DAP_INFO, len(value)]) + value
+
+    def _swj_pins(self, data):
+        output, select = data[1], data[2]
+        if select & Pin.nRESET:
+            if output & Pin.nRESET:
+                # Deasserting nRESET performs a system reset.
+                self.target.system_reset()
+                self._nreset = True
+            else:
+                self._nreset = False
+        pins = Pin.nRESET if self._nreset else 0
+        return bytearray([Command.DAP_SWJ_PINS, pins | Pin.SWCLK_TCK | Pin.SWDIO_TMS])
+
+    def _transfer(self, data):
+        """! @brief Execute a DAP_Transfer command."""
+        count = data[2]
+        pos = 3
+        out = bytearray([Command.DAP_TRANSFER, 0, 0])
+        ack = DAPTransferResponse.ACK_OK
+        done = 0
+        for done in range(count):
+            request = data[pos]
+            pos += 1
+            if request & _RnW:
+                if request & _VALUE_MATCH:
+                    match_value = struct.unpack_from("<I", data, pos)[0]
+                    pos += 4
+                    ack, matched = self._match_read(request, match_value)
+                    if ack == DAPTransferResponse.ACK_OK and not matched:
+                        ack |= _VALUE_MISMATCH
+                else:
+                    ack, value = self.dp.transfer(request)
+                    if ack == DAPTransferResponse.ACK_OK:
+                        out += struct.pack("<I", value)
+            else:
+                value = struct.unpack_from("<I", data, pos)[0]
+                pos += 4
+                if request & _MATCH_MASK:
+                    self._match_mask = value
+                else:
+                    ack, _ = self.dp.transfer(request, value)
+            if ack != DAPTransferResponse.ACK_OK:
+                break
+        else:
+            done = count
+        out[1] = done
+        out[2] = ack
+        return out, count
+
+    def _match_read(self, request, match_value):
+        """! @brief Read a register until it matches, as for a value match transfer."""
+        for _ in range(self.match_retry + 1):
+            ack, value = self.dp.transfer(request & ~_VALUE_MATCH)
+            if ack != DAPTransferResponse.ACK_OK:
+                return ack, False
+            if (value & self._match_mask) == match_value:
+                return ack, True
+        return ack, False
+
+    def _transfer_block(self, data):
+        """! @brief Execute a DAP_TransferBlock command."""
+        count, request = struct.unpack_from("<HB", data, 2)
+        if request & _RnW:
+            done, ack, result = self.dp.block_transfer(request, count)
+        else:
+            done, ack, result = self.dp.block_transfer(request, count, data[5:5 + count * 4])
+        return bytearray(struct.pack("<BHB", Command.DAP_TRANSFER_BLOCK, done, ack)) + result, count
+
+    def _swo_transport_cmd(self, transport):
+        if transport not in (DAPSWOTransport.NONE, DAPSWOTransport.DAP_SWO_DATA):
+            return bytearray([Command.DAP_SWO_TRANSPORT, DAP_ERROR])
+        self._swo_transport = transport
+        return bytearray([Command.DAP_SWO_TRANSPORT, DAP_OK])
+
+    def _swo_mode_cmd(self, mode):
+        if mode not in (DAPSWOMode.OFF, DAPSWOMode.UART):
+            return bytearray([Command.DAP_SWO_MODE, DAP_ERROR])
+        self._swo_mode = mode
+        return bytearray([Command.DAP_SWO_MODE, DAP_OK])
+
+    def _swo_control_cmd(self, control):
+        with self._cond:
+            self._swo_capturing = (control == DAPSWOControl.START) \
+                                    and (self._swo_mode != DAPSWOMode.OFF)
+            if self._swo_capturing:
+                self._swo_buffer = bytearray()
+                self._swo_overrun = False
+        return bytearray([Command.DAP_SWO_CONTROL, DAP_OK])
+
+    def _swo_status_byte(self):
+        status = DAPSWOStatus.CAPTURE if self._swo_capturing else 0
+        if self._swo_overrun:
+            status |= DAPSWOStatus.OVERRUN
+        return status
+
+    def _swo_status_cmd(self):
+        with self._cond:
+            return bytearray([Command.DAP_SWO_STATUS, self._swo_status_byte()]) \
+                    + struct.pack("<I", len(self._swo_buffer))
+
+    def _swo_data_cmd(self, count):
+        with self._cond:
+            count = min(count, len(self._swo_buffer), self.packet_size - 4)
+            data = self._swo_buffer[:count]
+            del self._swo_buffer[:count]
+            status = self._swo_status_byte()
+            self._swo_overrun = False
+        return bytearray(struct.pack("<BBH", Command.DAP_SWO_DATA, status, count)) + data
@@ -0,0 +1,134 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import socket
+import zlib
+
+from .shared_probe import (
+    SharedProbe,
+    send_message,
+    receive_message,
+    decode_exception,
+    )
+from ..core import exceptions
+
+LOG = logging.getLogger(__name__)
+
+## Environment variable listing remote probe servers as comma separated host:port addresses.
+REMOTE_PROBES_ENV = "PYOCD_REMOTE_PROBES"
+
+## Default TCP port of `pyocd server`.
+DEFAULT_PORT = 5555
+
+def parse_address(address):
+    """! @brief Convert a "host:port" string to a (host, port) tuple.
+
+    The port is optional and defaults to #DEFAULT_PORT.
+    """
+    host, sep, port = address.strip().rpartition(':')
+    if not sep:
+        return (port, DEFAULT_PORT)
+    try:
+        return (host, int(port))
+    except ValueError:
+        raise ValueError("invalid remote probe server address '%s'" % address)
+
+def get_server_addresses():
+    """! @brief Return the (host, port) addresses listed in the PYOCD_REMOTE_PROBES variable."""
+    addresses = []
+    for address in os.getenv(REMOTE_PROBES_ENV, "").split(','):
+        if not address.strip():
+            continue
+        try:
+            addresses.append(parse_address(address))
+        except ValueError as error:
+            LOG.warning("%s", error)
+    return addresses
+
+class RemoteProbe(SharedProbe):
+    """! @brief Debug probe served by `pyocd server` on another host.
+
+    Remote probe servers are found through the PYOCD_REMOTE_PROBES environment variable. The
+    protocol is the same as for probes shared by a local probe daemon. Because every round trip
+    crosses the network, the queuing and pipelining of operations matters much more here, and
+    messages are compressed unless the `remote_probe.compression` session option is disabled.
+
+    The unique ID of a remote probe is the unique ID of the probe on the server, followed by "@"
+    and the server address, so it can be selected by either.
+    """
+
+    ## Seconds to wait for a connection to a server.
+    CONNECT_TIMEOUT = 5.0
+
+    @classmethod
+    def get_all_connected_probes(cls):
+        probes = []
+        for address in get_server_addresses():
+            try:
+                info = cls._query_info(address)
+            except (socket.error, ValueError, zlib.error, exceptions.Error) as error:
+                LOG.warning("Unable to get probe information from %s:%d: %s",
+                        address[0], address[1], error)
+                continue
+            probes.append(cls(address, info))
+        return probes
+
+    @classmethod
+    def _query_info(cls, address):
+        """! @brief Ask a server for the info of its probe without opening the probe."""
+        sock = socket.create_connection(address, cls.CONNECT_TIMEOUT)
+        try:
+            send_message(sock, {'ops': [['info']]})
+            response = receive_message(sock)
+        finally:
+            sock.close()
+        if response is None:
+            raise exceptions.ProbeDisconnected("server closed the connection")
+        if response.get('error') is not None:
+            raise decode_exception(response['error'])
+        return response['results'][0]
+
+    def __init__(self, address, info):
+        """! @brief Constructor.
+        @param self
+        @param address (host, port) address of the server.
+        @param info Probe info dict returned by the server.
+        """
+        super(RemoteProbe, self).__init__(info)
+        self._address = address
+
+    @property
+    def description(self):
+        return "{} @ {}:{}".format(self._info['description'], *self._address)
+
+    @property
+    def unique_id(self):
+        return "{}@{}:{}".format(self._info['unique_id'], *self._address)
+
+    def _create_socket(self):
+        sock = socket.create_connection(self._address, self.CONNECT_TIMEOUT)
+        sock.settimeout(None)
+        # Requests are complete messages, so don't let Nagle's algorithm hold them back.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _get_open_options(self):
+        compress = True
+        if self.session is not None:
+            compress = self.session.options.get('remote_probe.compression')
+        return {'compress': compress}
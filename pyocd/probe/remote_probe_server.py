@@ -0,0 +1,65 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+
+from .remote_probe import DEFAULT_PORT
+from .shared_probe_server import SharedProbeServer
+
+class RemoteProbeServer(SharedProbeServer):
+    """! @brief Serves a debug probe to RemoteProbe clients over TCP.
+
+    This is the server run by `pyocd server`. Except for the transport, it behaves the same as the
+    probe daemon's server. Clients find the server through its address, so nothing is published.
+    """
+
+    def __init__(self, probe, port=DEFAULT_PORT, serve_local_only=True):
+        """! @brief Constructor.
+        @param self
+        @param probe The DebugProbe to share. It must not be open.
+        @param port TCP port to listen on. If 0 is passed, an unused port is selected by the OS and
+            can be read from the `port` property after open() is called.
+        @param serve_local_only Whether to only accept connections from this host.
+        """
+        super(RemoteProbeServer, self).__init__(probe)
+        self.name = "remote probe server"
+        self._host = 'localhost' if serve_local_only else ''
+        self._port = port
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def address(self):
+        return "{}:{}".format(self._host or "*", self._port)
+
+    def _create_listener(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self._host, self._port))
+        self._port = listener.getsockname()[1]
+        listener.listen(4)
+        return listener
+
+    def _configure_connection(self, connection):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _publish(self):
+        pass
+
+    def _unpublish(self):
+        pass
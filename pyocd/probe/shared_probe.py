@@ -0,0 +1,570 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import collections
+import errno
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import tempfile
+import zlib
+import six
+
+from .debug_probe import DebugProbe
+from ..board.mbed_board import MbedBoard
+from ..core import exceptions
+from ..core.memory_interface import MemoryInterface
+from ..utility import conversion
+
+LOG = logging.getLogger(__name__)
+
+## Environment variable that overrides the directory holding probe daemon sockets.
+DAEMON_DIR_ENV = "PYOCD_DAEMON_DIR"
+
+## Version of the protocol spoken between SharedProbe and SharedProbeServer.
+PROTOCOL_VERSION = 1
+
+## Header that precedes each message, holding the length of the message.
+_HEADER = struct.Struct(">I")
+
+## Flag set in the header of a compressed message.
+_COMPRESSED_FLAG = 0x80000000
+
+## Messages shorter than this are never compressed.
+COMPRESSION_THRESHOLD = 512
+
+def get_daemon_dir():
+    """! @brief Return the directory in which probe daemons create their sockets.
+
+    The default is a per-user directory in the system temporary directory. It can be changed with
+    the PYOCD_DAEMON_DIR environment variable.
+    """
+    path = os.getenv(DAEMON_DIR_ENV)
+    if path:
+        return path
+    user = os.getuid() if hasattr(os, 'getuid') else os.getenv('USERNAME', 'user')
+    return os.path.join(tempfile.gettempdir(), "pyocd-daemon-{}".format(user))
+
+def get_daemon_paths(unique_id, directory=None):
+    """! @brief Return the socket and info file paths of the daemon for a probe."""
+    if directory is None:
+        directory = get_daemon_dir()
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', unique_id)
+    return (os.path.join(directory, name + ".sock"), os.path.join(directory, name + ".json"))
+
+def _is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+    return True
+
+def read_daemon_info(directory=None):
+    """! @brief Return the info dicts of all running probe daemons.
+
+    Info files left behind by daemons that are no longer running are ignored.
+    """
+    if directory is None:
+        directory = get_daemon_dir()
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return []
+    infos = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r') as info_file:
+                info = json.load(info_file)
+        except (IOError, OSError, ValueError):
+            continue
+        if not os.path.exists(info.get('socket', '')) or not _is_process_alive(info.get('pid', 0)):
+            continue
+        infos.append(info)
+    return infos
+
+def encode_value(value):
+    """! @brief Convert an operation argument or result to a JSON compatible value.
+
+    Byte buffers are sent as base64 strings wrapped in a dict, so they are distinguishable from
+    other strings.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return {'bytes': base64.b64encode(bytes(value)).decode('ascii')}
+    return value
+
+def decode_value(value):
+    """! @brief Reverse of encode_value()."""
+    if isinstance(value, dict) and 'bytes' in value:
+        return bytearray(base64.b64decode(value['bytes']))
+    return value
+
+def encode_exception(error):
+    """! @brief Convert an exception to a dict that can be sent to a client."""
+    info = {'type': error.__class__.__name__, 'message': str(error)}
+    if isinstance(error, exceptions.TransferFaultError):
+        info['address'] = error.fault_address
+        info['length'] = error.fault_length
+    elif not isinstance(error, exceptions.Error):
+        info['type'] = exceptions.ProbeError.__name__
+    return info
+
+def decode_exception(info):
+    """! @brief Create an exception from a dict produced by encode_exception()."""
+    cls = getattr(exceptions, info.get('type', ''), None)
+    if not (isinstance(cls, type) and issubclass(cls, exceptions.Error)):
+        cls = exceptions.ProbeError
+    if issubclass(cls, exceptions.TransferFaultError):
+        return cls(info.get('address'), info.get('length'))
+    return cls(info.get('message', ''))
+
+def send_message(sock, message, compress=False):
+    """! @brief Send one message, a JSON compatible object, preceded by its length.
+
+    If _compress_ is True, a message of at least #COMPRESSION_THRESHOLD bytes is compressed with
+    zlib. A flag in the header tells the receiver whether the message is compressed.
+    """
+    data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    header = len(data)
+    if compress and len(data) >= COMPRESSION_THRESHOLD:
+        data = zlib.compress(data, 1)
+        header = len(data) | _COMPRESSED_FLAG
+    sock.sendall(_HEADER.pack(header) + data)
+
+def _receive_exactly(sock, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+def receive_message(sock):
+    """! @brief Receive one message.
+    @return The decoded message, or None if the peer closed the connection between messages.
+    @exception ProbeDisconnected The connection was closed in the middle of a message.
+    """
+    header = _receive_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    header, = _HEADER.unpack(header)
+    data = _receive_exactly(sock, header & ~_COMPRESSED_FLAG)
+    if data is None:
+        raise exceptions.ProbeDisconnected("connection closed in the middle of a message")
+    if header & _COMPRESSED_FLAG:
+        data = zlib.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+class _PendingResult(object):
+    """! @brief Result of a queued operation that has not been sent yet."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = False
+        self.value = None
+        self.error = None
+
+class SharedProbe(DebugProbe):
+    """! @brief Debug probe owned by a probe daemon running in another process.
+
+    The probe daemon, started with `pyocd daemon`, keeps a probe open and connected and serves it
+    to one client at a time over a Unix domain socket. Each daemon advertises its probe with an
+    info file next to its socket, which is how instances of this class are discovered.
+
+    Operations are queued locally and sent to the daemon in batches. Like with a CMSIS-DAP probe,
+    register writes and `now=False` reads are only sent when a result is needed, flush() is
+    called, or the queue grows to #MAX_QUEUED_OPS entries. The daemon performs all operations in a
+    batch using the deferred transfer support of its own probe, so one batch is one round trip
+    between the processes no matter how many operations it contains. When the queue fills up, the
+    batch is sent without waiting for its response, so the daemon works on it while the next batch
+    is queued. Errors raised by the daemon's probe are raised again by this class with the same
+    exception type.
+    """
+
+    ## Number of queued operations that causes the queue to be sent.
+    MAX_QUEUED_OPS = 1024
+
+    ## Maximum number of batches sent before waiting for a response.
+    MAX_PIPELINED_REQUESTS = 4
+
+    @classmethod
+    def get_all_connected_probes(cls):
+        if not hasattr(socket, 'AF_UNIX'):
+            return []
+        return [cls(info) for info in read_daemon_info()]
+
+    @classmethod
+    def get_probe_with_id(cls, unique_id):
+        for probe in cls.get_all_connected_probes():
+            if probe.unique_id == unique_id:
+                return probe
+        return None
+
+    def __init__(self, info):
+        """! @brief Constructor.
+        @param self
+        @param info Dict read from the daemon's info file.
+        """
+        super(SharedProbe, self).__init__()
+        self._info = info
+        self._socket = None
+        self._is_open = False
+        self._protocol = None
+        self._supported_protocols = None
+        self._ops = []
+        self._results = []
+        self._in_flight = collections.deque()
+        self._compress = False
+        self._memory_interfaces = {}
+
+    @property
+    def description(self):
+        return self._info['description']
+
+    @property
+    def vendor_name(self):
+        return self._info['vendor_name']
+
+    @property
+    def product_name(self):
+        return self._info['product_name']
+
+    @property
+    def supported_wire_protocols(self):
+        """! @brief Only valid after opening."""
+        return self._supported_protocols
+
+    @property
+    def unique_id(self):
+        return self._info['unique_id']
+
+    @property
+    def wire_protocol(self):
+        return self._protocol
+
+    @property
+    def is_open(self):
+        return self._is_open
+
+    @property
+    def supports_swj_sequence(self):
+        return self._info['supports_swj_sequence']
+
+    @property
+    def is_poll_ap_offloaded(self):
+        # The daemon polls the register, with a single request from this process.
+        return True
+
+    @property
+    def associated_board_id(self):
+        return self._info.get('board_id')
+
+    def create_associated_board(self):
+        assert self.session is not None
+        board_id = self.associated_board_id
+        if board_id is not None:
+            return MbedBoard(self.session, board_id=board_id)
+        else:
+            return None
+
+    def _create_socket(self):
+        """! @brief Create a socket connected to the daemon."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._info['socket'])
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _get_open_options(self):
+        """! @brief Return the options dict passed to the daemon when opening the probe."""
+        return None
+
+    def open(self):
+        try:
+            self._socket = self._create_socket()
+        except socket.error as error:
+            six.raise_from(exceptions.ProbeError("unable to connect to probe daemon: %s" % error), error)
+        options = self._get_open_options()
+        try:
+            info = self._call('open', options)
+            if info['version'] != PROTOCOL_VERSION:
+                raise exceptions.ProbeError("probe daemon uses protocol version %d, expected %d"
+                        % (info['version'], PROTOCOL_VERSION))
+        except exceptions.Error:
+            self._close_socket()
+            raise
+        self._compress = bool(options and options.get('compress'))
+        self._supported_protocols = [DebugProbe.Protocol[name]
+                for name in info['supported_wire_protocols']]
+        self._is_open = True
+
+    def close(self):
+        if self._socket is None:
+            return
+        try:
+            self._call('close')
+        finally:
+            self._close_socket()
+            self._is_open = False
+            self._protocol = None
+
+    def _close_socket(self):
+        try:
+            self._socket.close()
+        finally:
+            self._socket = None
+            self._compress = False
+            self._ops = []
+            self._results = []
+            self._in_flight.clear()
+            self._memory_interfaces = {}
+
+    def _send_request(self, request):
+        """! @brief Send a request to the daemon."""
+        if self._socket is None:
+            raise exceptions.ProbeError("probe is not open")
+        try:
+            send_message(self._socket, request, compress=self._compress)
+        except socket.error as error:
+            six.raise_from(exceptions.ProbeDisconnected(
+                    "lost connection to probe daemon: %s" % error), error)
+
+    def _receive_response(self):
+        """! @brief Receive the response to the oldest outstanding request."""
+        try:
+            response = receive_message(self._socket)
+        except (socket.error, ValueError, zlib.error) as error:
+            six.raise_from(exceptions.ProbeDisconnected(
+                    "lost connection to probe daemon: %s" % error), error)
+        if response is None:
+            raise exceptions.ProbeDisconnected("probe daemon closed the connection")
+        return response
+
+    def _send_queue(self, wait=True):
+        """! @brief Send queued operations to the daemon and distribute the results.
+
+        If _wait_ is False, the batch is pipelined. It is sent without waiting for the response, so
+        the caller can continue queuing operations while the daemon performs the batch. Responses
+        are only waited for when more than #MAX_PIPELINED_REQUESTS batches are outstanding.
+
+        @exception Error The first error raised by the daemon's probe while performing the batches
+            whose responses were received. The results of all operations in a batch from the failed
+            one on are set to this error.
+        """
+        if self._ops:
+            ops, results = self._ops, self._results
+            self._ops = []
+            self._results = []
+            self._in_flight.append(results)
+            try:
+                self._send_request({'ops': ops})
+            except exceptions.Error as error:
+                self._fail_in_flight(error)
+                raise
+
+        # Receive every outstanding response even after an error, so the stream stays in sync.
+        failure = None
+        while self._in_flight and (wait or len(self._in_flight) > self.MAX_PIPELINED_REQUESTS):
+            try:
+                response = self._receive_response()
+            except exceptions.Error as error:
+                self._fail_in_flight(error)
+                raise
+            results = self._in_flight.popleft()
+            values = response.get('results', [])
+            for pending, value in zip(results, values):
+                if pending is not None:
+                    pending.value = decode_value(value)
+                    pending.done = True
+            if response.get('error') is not None:
+                error = decode_exception(response['error'])
+                self._fail_results(results[len(values):], error)
+                if failure is None:
+                    failure = error
+        if failure is not None:
+            raise failure
+
+    def _fail_results(self, results, error):
+        for pending in results:
+            if pending is not None:
+                pending.error = error
+                pending.done = True
+
+    def _fail_in_flight(self, error):
+        """! @brief Set the results of all outstanding batches to an error."""
+        while self._in_flight:
+            self._fail_results(self._in_flight.popleft(), error)
+
+    def _queue_op(self, *op):
+        """! @brief Queue an operation that has no result."""
+        self._ops.append([encode_value(arg) for arg in op])
+        self._results.append(None)
+        if len(self._ops) >= self.MAX_QUEUED_OPS:
+            self._send_queue(wait=False)
+
+    def _queue_read(self, *op):
+        """! @brief Queue an operation with a result.
+        @return Callable that returns the result, sending the queue first if necessary.
+        """
+        pending = _PendingResult()
+        self._ops.append([encode_value(arg) for arg in op])
+        self._results.append(pending)
+
+        def read_result_callback():
+            if not pending.done:
+                self._send_queue()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        if len(self._ops) >= self.MAX_QUEUED_OPS:
+            self._send_queue(wait=False)
+        return read_result_callback
+
+    def _call(self, *op):
+        """! @brief Perform an operation immediately, along with any queued operations."""
+        return self._queue_read(*op)()
+
+    # ------------------------------------------- #
+    #          Target control functions
+    # ------------------------------------------- #
+    def connect(self, protocol=None):
+        name = self._call('connect', protocol.name if protocol is not None else None)
+        self._protocol = DebugProbe.Protocol[name]
+
+    def disconnect(self):
+        self._call('disconnect')
+        self._protocol = None
+
+    def swj_sequence(self, length, bits):
+        self._call('swj_sequence', length, bits)
+
+    def set_clock(self, frequency):
+        self._call('set_clock', frequency)
+
+    def reset(self):
+        self._call('reset')
+
+    def assert_reset(self, asserted):
+        self._call('assert_reset', asserted)
+
+    def is_reset_asserted(self):
+        return self._call('is_reset_asserted')
+
+    def flush(self):
+        self._call('flush')
+
+    # ------------------------------------------- #
+    #          DAP Access functions
+    # ------------------------------------------- #
+
+    def read_dp(self, addr, now=True):
+        result = self._queue_read('read_dp', addr)
+        return result() if now else result
+
+    def write_dp(self, addr, data):
+        self._queue_op('write_dp', addr, data)
+        return True
+
+    def read_ap(self, addr, now=True):
+        result = self._queue_read('read_ap', addr)
+        return result() if now else result
+
+    def write_ap(self, addr, data):
+        self._queue_op('write_ap', addr, data)
+        return True
+
+    def poll_ap(self, addr, mask, value, timeout):
+        return self._call('poll_ap', addr, mask, value, timeout)
+
+    def read_ap_multiple(self, addr, count=1, now=True):
+        result = self._queue_read('read_ap_multiple_bytes', addr, count)
+
+        def read_ap_multiple_callback():
+            return conversion.bytes_to_u32le_list(result())
+
+        return read_ap_multiple_callback() if now else read_ap_multiple_callback
+
+    def write_ap_multiple(self, addr, values):
+        self._queue_op('write_ap_multiple_bytes', addr, conversion.u32le_list_to_bytes(values))
+
+    def read_ap_multiple_bytes(self, addr, count=1, now=True):
+        result = self._queue_read('read_ap_multiple_bytes', addr, count)
+        return result() if now else result
+
+    def write_ap_multiple_bytes(self, addr, data):
+        self._queue_op('write_ap_multiple_bytes', addr, bytearray(data))
+
+    def get_memory_interface_for_ap(self, apsel):
+        if apsel not in self._memory_interfaces:
+            if self._call('has_memory_interface', apsel):
+                self._memory_interfaces[apsel] = SharedMemoryInterface(self, apsel)
+            else:
+                self._memory_interfaces[apsel] = None
+        return self._memory_interfaces[apsel]
+
+    # ------------------------------------------- #
+    #          SWO functions
+    # ------------------------------------------- #
+
+    def has_swo(self):
+        return self._call('has_swo')
+
+    def swo_start(self, baudrate):
+        self._call('swo_start', baudrate)
+
+    def swo_stop(self):
+        self._call('swo_stop')
+
+    def swo_read(self):
+        return self._call('swo_read')
+
+class SharedMemoryInterface(MemoryInterface):
+    """! @brief Accelerated memory interface of a probe owned by a probe daemon.
+
+    Only used when the daemon's probe itself provides an accelerated memory interface for the AP.
+    """
+
+    def __init__(self, probe, apsel):
+        self._probe = probe
+        self._apsel = apsel
+
+    def write_memory(self, addr, data, transfer_size=32):
+        self._probe._queue_op('write_memory', self._apsel, addr, data, transfer_size)
+
+    def read_memory(self, addr, transfer_size=32, now=True):
+        result = self._probe._queue_read('read_memory', self._apsel, addr, transfer_size)
+        return result() if now else result
+
+    def write_memory_block32(self, addr, data):
+        self.write_memory_block32_bytes(addr, conversion.u32le_list_to_bytes(data))
+
+    def read_memory_block32(self, addr, size):
+        return conversion.bytes_to_u32le_list(self.read_memory_block32_bytes(addr, size))
+
+    def write_memory_block32_bytes(self, addr, data):
+        self._probe._queue_op('write_memory_block32_bytes', self._apsel, addr, bytearray(data))
+
+    def read_memory_block32_bytes(self, addr, size):
+        return self._probe._call('read_memory_block32_bytes', self._apsel, addr, size)
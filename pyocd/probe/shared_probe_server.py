@@ -0,0 +1,376 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import os
+import socket
+import threading
+import zlib
+
+from .debug_probe import DebugProbe
+from .shared_probe import (
+    PROTOCOL_VERSION,
+    get_daemon_paths,
+    encode_value,
+    decode_value,
+    encode_exception,
+    send_message,
+    receive_message,
+    )
+from ..core import exceptions
+
+LOG = logging.getLogger(__name__)
+
+## Operation modes.
+_IMMEDIATE = 0 # Performed after the results of earlier reads are collected.
+_QUEUED = 1 # Queued by the probe without waiting for earlier reads.
+_DEFERRED = 2 # Read started with now=False, returning a callback for the result.
+
+class _Client(object):
+    """! @brief State of a client connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.compress = False
+
+class SharedProbeServer(threading.Thread):
+    """! @brief Serves a debug probe to SharedProbe clients in other processes.
+
+    The server opens the probe when it starts and keeps it open until it is stopped. Once a client
+    has connected the wire protocol, it also stays connected between clients. Any number of clients
+    can be connected to the server, but only the client that has opened the probe can use it. A
+    client that opens the probe while another client is using it waits until that client closes
+    the probe or disconnects. Exclusive use is required because pyOCD caches AP and DP register
+    values on the assumption that nothing else changes them.
+
+    Each request from a client is a batch of operations. Reads are started with `now=False` so the
+    probe can combine the whole batch into as few transfers as possible, and their results are
+    collected before an operation that can't be deferred is performed, or at the end of the batch.
+    If an operation fails, the rest of the batch is skipped and the error is returned together
+    with the results of the operations that completed.
+
+    This class listens on a Unix domain socket and advertises the probe with an info file next to
+    the socket. Subclasses can listen on other kinds of sockets by overriding _create_listener(),
+    _publish(), and _unpublish().
+    """
+
+    ## Seconds between checks of whether the server should stop while waiting.
+    ACCEPT_TIMEOUT = 0.5
+
+    ## Operations that are passed the client as their first parameter.
+    _CLIENT_OPS = ('info', 'open', 'close')
+
+    def __init__(self, probe, directory=None):
+        """! @brief Constructor.
+        @param self
+        @param probe The DebugProbe to share. It must not be open.
+        @param directory Directory for the socket and info file. Defaults to the directory returned
+            by @ref pyocd.probe.shared_probe.get_daemon_dir() "get_daemon_dir()".
+        """
+        super(SharedProbeServer, self).__init__(name="shared probe server")
+        self.daemon = True
+        self._probe = probe
+        self._socket_path, self._info_path = get_daemon_paths(probe.unique_id, directory)
+        self._info = None
+        self._listener = None
+        self._clients = set()
+        self._client_threads = []
+        self._owner = None
+        self._owner_condition = threading.Condition()
+        self._shutdown_event = threading.Event()
+
+        ## Map from operation name to handler and mode.
+        self._handlers = {
+            'info':                         (self._get_info, _IMMEDIATE),
+            'open':                         (self._open, _IMMEDIATE),
+            'close':                        (self._close, _IMMEDIATE),
+            'connect':                      (self._connect, _IMMEDIATE),
+            'disconnect':                   (self._disconnect, _IMMEDIATE),
+            'swj_sequence':                 (probe.swj_sequence, _IMMEDIATE),
+            'set_clock':                    (probe.set_clock, _IMMEDIATE),
+            'reset':                        (probe.reset, _IMMEDIATE),
+            'assert_reset':                 (probe.assert_reset, _IMMEDIATE),
+            'is_reset_asserted':            (probe.is_reset_asserted, _IMMEDIATE),
+            'flush':                        (probe.flush, _IMMEDIATE),
+            'read_dp':                      (self._read_dp, _DEFERRED),
+            'write_dp':                     (probe.write_dp, _QUEUED),
+            'read_ap':                      (self._read_ap, _DEFERRED),
+            'write_ap':                     (probe.write_ap, _QUEUED),
+            'poll_ap':                      (probe.poll_ap, _IMMEDIATE),
+            'read_ap_multiple_bytes':       (self._read_ap_multiple_bytes, _DEFERRED),
+            'write_ap_multiple_bytes':      (probe.write_ap_multiple_bytes, _QUEUED),
+            'has_memory_interface':         (self._has_memory_interface, _IMMEDIATE),
+            'write_memory':                 (self._write_memory, _QUEUED),
+            'read_memory':                  (self._read_memory, _DEFERRED),
+            'write_memory_block32_bytes':   (self._write_memory_block32_bytes, _QUEUED),
+            'read_memory_block32_bytes':    (self._read_memory_block32_bytes, _IMMEDIATE),
+            'has_swo':                      (probe.has_swo, _IMMEDIATE),
+            'swo_start':                    (probe.swo_start, _IMMEDIATE),
+            'swo_stop':                     (probe.swo_stop, _IMMEDIATE),
+            'swo_read':                     (self._swo_read, _IMMEDIATE),
+            }
+
+    @property
+    def address(self):
+        """! @brief Description of the address clients connect to."""
+        return self._socket_path
+
+    def open(self):
+        """! @brief Open the probe, start listening, and advertise the probe."""
+        self._probe.open()
+        try:
+            protocols = self._probe.supported_wire_protocols or [DebugProbe.Protocol.DEFAULT]
+            self._info = {
+                'version': PROTOCOL_VERSION,
+                'unique_id': self._probe.unique_id,
+                'description': self._probe.description,
+                'vendor_name': self._probe.vendor_name,
+                'product_name': self._probe.product_name,
+                'board_id': self._probe.associated_board_id,
+                'supports_swj_sequence': self._probe.supports_swj_sequence,
+                'supported_wire_protocols': [p.name for p in protocols],
+                }
+            self._listener = self._create_listener()
+            self._listener.settimeout(self.ACCEPT_TIMEOUT)
+            self._publish()
+        except Exception:
+            self._cleanup()
+            raise
+        LOG.info("Sharing probe %s on %s", self._probe.unique_id, self.address)
+
+    def _create_listener(self):
+        """! @brief Create the listening socket."""
+        directory = os.path.dirname(self._socket_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        # Remove a socket left behind by a daemon that didn't exit cleanly.
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self._socket_path)
+        listener.listen(4)
+        return listener
+
+    def _publish(self):
+        """! @brief Make the server discoverable by clients."""
+        info = dict(self._info, pid=os.getpid(), socket=self._socket_path)
+        # Write to a temporary file first so clients never see a partial file.
+        temp_path = self._info_path + ".tmp"
+        with open(temp_path, 'w') as info_file:
+            json.dump(info, info_file, indent=4)
+        os.rename(temp_path, self._info_path)
+
+    def _unpublish(self):
+        """! @brief Remove what _publish() and _create_listener() left in the file system."""
+        for path in (self._info_path, self._socket_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stop(self):
+        """! @brief Stop serving and wait for the server thread to exit."""
+        self._shutdown_event.set()
+        if self.is_alive():
+            self.join()
+        else:
+            self._cleanup()
+
+    def run(self):
+        try:
+            while not self._shutdown_event.is_set():
+                try:
+                    connection, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(None)
+                self._configure_connection(connection)
+                client = _Client(connection)
+                self._clients.add(client)
+                thread = threading.Thread(target=self._serve, args=(client,),
+                                            name="shared probe client")
+                thread.daemon = True
+                self._client_threads.append(thread)
+                thread.start()
+        finally:
+            for client in list(self._clients):
+                try:
+                    client.connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            for thread in self._client_threads:
+                thread.join()
+            self._cleanup()
+
+    def _configure_connection(self, connection):
+        """! @brief Hook to set options of a newly accepted connection."""
+        pass
+
+    def _cleanup(self):
+        self._unpublish()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._probe.is_open:
+            try:
+                if self._probe.wire_protocol is not None:
+                    self._probe.disconnect()
+                self._probe.close()
+            except exceptions.Error as error:
+                LOG.warning("Error closing shared probe: %s", error)
+
+    def _serve(self, client):
+        """! @brief Handle requests from one client until it disconnects."""
+        LOG.debug("Shared probe client connected")
+        connection = client.connection
+        try:
+            while not self._shutdown_event.is_set():
+                request = receive_message(connection)
+                if request is None:
+                    break
+                send_message(connection, self._perform(client, request.get('ops', [])),
+                            compress=client.compress)
+        except (socket.error, ValueError, zlib.error, exceptions.ProbeDisconnected) as error:
+            if not self._shutdown_event.is_set():
+                LOG.warning("Shared probe client connection failed: %s", error)
+        finally:
+            self._release(client)
+            self._clients.discard(client)
+            connection.close()
+        LOG.debug("Shared probe client disconnected")
+
+    def _acquire(self, client):
+        """! @brief Wait until the client is the only user of the probe."""
+        with self._owner_condition:
+            while self._owner not in (None, client):
+                if self._shutdown_event.is_set():
+                    raise exceptions.ProbeError("server is stopping")
+                self._owner_condition.wait(self.ACCEPT_TIMEOUT)
+            self._owner = client
+
+    def _release(self, client):
+        """! @brief Let other clients use the probe, if the client was using it."""
+        with self._owner_condition:
+            if self._owner is not client:
+                return
+            # Don't leave queued transfers from this client behind for the next one.
+            try:
+                self._probe.flush()
+            except exceptions.Error:
+                pass
+            self._owner = None
+            self._owner_condition.notify_all()
+
+    def _perform(self, client, ops):
+        """! @brief Perform a batch of operations.
+        @return Response dict with the list of results and the error, if any.
+        """
+        results = []
+        deferred = []
+        try:
+            for op in ops:
+                name = op[0]
+                handler, mode = self._handlers.get(name, (None, None))
+                if handler is None:
+                    raise exceptions.ProbeError("unsupported operation '%s'" % name)
+                args = [decode_value(arg) for arg in op[1:]]
+                if name in self._CLIENT_OPS:
+                    args.insert(0, client)
+                elif self._owner is not client:
+                    raise exceptions.ProbeError("probe is not open")
+                if mode == _IMMEDIATE:
+                    self._resolve(deferred, results)
+                result = handler(*args)
+                if mode == _DEFERRED:
+                    deferred.append((len(results), result))
+                    results.append(None)
+                elif mode == _QUEUED:
+                    results.append(None)
+                else:
+                    results.append(encode_value(result))
+            self._resolve(deferred, results)
+            return {'results': results, 'error': None}
+        except Exception as error:
+            LOG.debug("Shared probe operation failed: %s", error, exc_info=True)
+            # Only report results up to the first operation that didn't complete.
+            if deferred:
+                del results[deferred[0][0]:]
+            return {'results': results, 'error': encode_exception(error)}
+
+    def _resolve(self, deferred, results):
+        """! @brief Fill in the results of deferred reads."""
+        while deferred:
+            index, callback = deferred[0]
+            results[index] = encode_value(callback())
+            deferred.pop(0)
+
+    def _get_info(self, client):
+        return self._info
+
+    def _open(self, client, options=None):
+        self._acquire(client)
+        client.compress = bool(options and options.get('compress'))
+        return self._info
+
+    def _close(self, client):
+        # The probe stays open for the next client.
+        self._release(client)
+
+    def _connect(self, protocol):
+        protocol = DebugProbe.Protocol[protocol] if protocol is not None else None
+        current = self._probe.wire_protocol
+        # Reconnecting is skipped unless a different protocol is requested.
+        if (current is None) or (protocol not in (None, DebugProbe.Protocol.DEFAULT, current)):
+            self._probe.connect(protocol)
+        return self._probe.wire_protocol.name
+
+    def _disconnect(self):
+        # The wire protocol stays connected for the next client.
+        pass
+
+    def _read_dp(self, addr):
+        return self._probe.read_dp(addr, now=False)
+
+    def _read_ap(self, addr):
+        return self._probe.read_ap(addr, now=False)
+
+    def _read_ap_multiple_bytes(self, addr, count):
+        return self._probe.read_ap_multiple_bytes(addr, count, now=False)
+
+    def _get_memory_interface(self, apsel):
+        memif = self._probe.get_memory_interface_for_ap(apsel)
+        if memif is None:
+            raise exceptions.ProbeError("probe has no memory interface for AP #%d" % apsel)
+        return memif
+
+    def _has_memory_interface(self, apsel):
+        return self._probe.get_memory_interface_for_ap(apsel) is not None
+
+    def _write_memory(self, apsel, addr, data, transfer_size):
+        self._get_memory_interface(apsel).write_memory(addr, data, transfer_size)
+
+    def _read_memory(self, apsel, addr, transfer_size):
+        return self._get_memory_interface(apsel).read_memory(addr, transfer_size, now=False)
+
+    def _write_memory_block32_bytes(self, apsel, addr, data):
+        self._get_memory_interface(apsel).write_memory_block32_bytes(addr, data)
+
+    def _read_memory_block32_bytes(self, apsel, addr, size):
+        return bytearray(self._get_memory_interface(apsel).read_memory_block32_bytes(addr, size))
+
+    def _swo_read(self):
+        return bytearray(self._probe.swo_read())
@@ -102,6 +102,10 @@ class StlinkProbe(DebugProbe):
     def supports_swj_sequence(self):
         return False
 
+    @property
+    def associated_board_id(self):
+        return self._board_id
+
     def create_associated_board(self):
         assert self.session is not None
         if self._board_id is not None:
@@ -250,3 +254,9 @@ class STLinkMemoryInterface(MemoryInterface):
     def read_memory_block32(self, addr, size):
         return conversion.byte_list_to_u32le_list(self._link.read_mem32(addr, size * 4, self._apsel))
 
+    def write_memory_block32_bytes(self, addr, data):
+        self._link.write_mem32(addr, bytearray(data), self._apsel)
+
+    def read_memory_block32_bytes(self, addr, size):
+        return bytearray(self._link.read_mem32(addr, size * 4, self._apsel))
+
@@ -289,6 +289,13 @@ class CortexM_S5JS100(CortexM):
             else:
                 raise Exception("Timeout waiting for target halt")
 
+    def wait_for_halt(self, timeout):
+        # DHCSR reads can fail while the core is running; get_state() recovers from that.
+        try:
+            return super(CortexM_S5JS100, self).wait_for_halt(timeout)
+        except exceptions.TransferError:
+            return False
+
     def resume(self):
         """! @brief Resume execution of the core.
         """
@@ -334,7 +341,3 @@ class CortexM_S5JS100(CortexM):
             return Target.TARGET_HALTED
         else:
             return Target.TARGET_RUNNING
- 
-
-
-
@@ -23,12 +23,6 @@ import logging
 import itertools
 from struct import unpack
 
-try:
-    from intelhex import IntelHex
-    intelhex_available = True
-except ImportError:
-    intelhex_available = False
-
 from .. import __version__
 from .. import target
 from ..core.helpers import ConnectHelper
@@ -135,12 +129,6 @@ def main():
     if not args.no_deprecation_warning:
         LOG.warning("pyocd-flashtool is deprecated; please use the new combined pyocd tool.")
         
-    # Sanity checks before attaching to board
-    if args.format == 'hex' and not intelhex_available:
-        print("Unable to program hex file")
-        print("Module 'intelhex' must be installed first")
-        exit()
-
     if args.list_all:
         ConnectHelper.list_connected_probes()
     else:
@@ -41,6 +41,7 @@ from ..probe.pydapaccess import DAPAccess
 from ..probe.debug_probe import DebugProbe
 from ..coresight.ap import MEM_AP
 from ..core.target import Target
+from ..debug.profiler import PCProfiler
 from ..flash.loader import (FlashEraser, FlashLoader, FileProgrammer)
 from ..gdbserver.gdbserver import GDBServer
 from ..utility import (mask, conversion)
@@ -329,6 +330,17 @@ COMMAND_INFO = {
             'help' : "Show a symbol's value.",
             'extra_help' : "An ELF file must have been specified with the --elf option.",
             },
+        'profile' : {
+            'aliases' : [],
+            'args' : "[SECONDS] [FILE]",
+            'help' : "Profile the running core by sampling its PC.",
+            'extra_help' : "PC samples are read from the DWT for SECONDS seconds, 1 by default, "
+                           "without halting the core. The functions with the most samples are "
+                           "listed. If FILE is given, the profile is written to it as collapsed "
+                           "stacks with function and source line frames, for use with flame "
+                           "graph tools. Functions and lines are only known if an ELF file was "
+                           "specified with the --elf option.",
+            },
         'gdbserver' : {
             'aliases' : [],
             'args' : "ACTION",
@@ -617,6 +629,7 @@ class PyOCDCommander(object):
                 'initdp' :  self.handle_initdp,
                 'makeap' :  self.handle_makeap,
                 'symbol' :  self.handle_symbol,
+                'profile' : self.handle_profile,
                 'gdbserver':self.handle_gdbserver,
                 'fill' :    self.handle_fill,
                 'find' :    self.handle_find,
@@ -891,6 +904,7 @@ class PyOCDCommander(object):
                 if len(r):
                     r = r[0]
                     addr = p.base_address + r.address_offset
+                    self.session.clear_memory_faults()
                     if len(subargs) == 2:
                         print("writing 0x%x to 0x%x:%d (%s)" % (value, addr, r.size, r.name))
                         self.target.write_memory(addr, value, r.size)
@@ -986,11 +1000,15 @@ class PyOCDCommander(object):
         if flash_init_required:
             region.flash.init(region.flash.Operation.VERIFY)
 
-        data = bytearray(self.target.aps[self.selected_ap].read_memory_block8(addr, count))
+        ap = self.target.aps[self.selected_ap]
+        data, faults = ap.read_memory_tolerant(addr, count, self.session.get_memory_faults(ap))
 
         if flash_init_required:
             region.flash.cleanup()
 
+        for start, end in faults:
+            print("Warning: faulted reading 0x%08x-0x%08x; saved as zeroes" % (start, end - 1))
+
         with open(filename, 'wb') as f:
             f.write(data)
             print("Saved %d bytes to %s" % (count, filename))
@@ -1002,6 +1020,7 @@ class PyOCDCommander(object):
         addr = self.convert_value(args[0])
         filename = args[1]
 
+        self.session.clear_memory_faults()
         with open(filename, 'rb') as f:
             data = bytearray(f.read())
             if self.is_flash_write(addr, 8, data):
@@ -1071,6 +1090,7 @@ class PyOCDCommander(object):
         end_addr = addr + length
         print("Filling 0x%08x-0x%08x with pattern %s" % (addr, end_addr - 1, pattern_str))
         
+        self.session.clear_memory_faults()
         for chunk in range(chunk_count):
             # Get this chunk's size.
             chunk_size = min(end_addr - addr, CHUNK_SIZE)
@@ -1183,6 +1203,7 @@ class PyOCDCommander(object):
             region.flash.program_phrase(addr, data)
             region.flash.cleanup()
         else:
+            self.session.clear_memory_faults()
             self.target.aps[self.selected_ap].write_memory_block8(addr, data)
             self.target.flush()
 
@@ -1433,6 +1454,7 @@ class PyOCDCommander(object):
             return
         addr = self.convert_value(args[0])
         data = self.convert_value(args[1])
+        self.session.clear_memory_faults()
         self.target.dp.write_reg(addr, data)
 
     def handle_readap(self, args):
@@ -1460,6 +1482,7 @@ class PyOCDCommander(object):
             addr = (self.convert_value(args[0]) << 24) | self.convert_value(args[1])
             data_arg = 2
         data = self.convert_value(args[data_arg])
+        self.session.clear_memory_faults()
         self.target.dp.write_ap(addr, data)
 
     def handle_initdp(self, args):
@@ -1524,6 +1547,28 @@ class PyOCDCommander(object):
         else:
             print("No symbol named '{}' was found".format(name))
 
+    def handle_profile(self, args):
+        duration = float(args[0]) if len(args) >= 1 else 1.0
+        core = self.target.selected_core
+        if core.dwt is None:
+            raise ToolError("core #%d does not have a DWT" % core.core_number)
+        if core.is_halted():
+            print("Core is halted; resume it with 'go' before profiling")
+            return
+        
+        profiler = PCProfiler(core, self.elf)
+        profiler.sample(duration=duration)
+        if profiler.sample_count == 0:
+            print("No PC samples were collected")
+            return
+        print("Collected %d PC samples (%d missed)" % (profiler.sample_count, profiler.missed_count))
+        print(profiler.format_flat(limit=20), end='')
+        
+        if len(args) >= 2:
+            with open(args[1], 'w') as f:
+                f.write(profiler.format_collapsed(by_line=True))
+            print("Wrote collapsed stacks to %s" % args[1])
+
     def handle_gdbserver(self, args):
         if len(args) < 1:
             raise ToolError("missing action argument")
@@ -14,51 +14,187 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
 import struct
 import binascii
+import sys
 import six
 
+# NumPy is optional. When it is installed, it is used to unpack large buffers into lists of
+# integers. Packing lists is left to struct, which is faster than building a NumPy array from
+# Python integers.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## @brief Minimum number of elements for which NumPy is used to unpack a buffer.
+#
+# Below this, the cost of creating the NumPy array is greater than the time saved.
+_NUMPY_MIN_LENGTH = 1024
+
+## @brief Typecode for array.array with 16-bit elements.
+_U16_TYPECODE = 'H'
+
+## @brief Typecode for array.array with 32-bit elements.
+#
+# The size of the C types backing array.array typecodes is platform dependent, so pick the first
+# one that is 4 bytes.
+_U32_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+## @brief Whether typed arrays must be byte swapped to get little endian values.
+_NEEDS_BYTESWAP = (sys.byteorder != 'little')
+
+def _as_byte_buffer(data):
+    """! @brief Return an object supporting the buffer protocol with byte items.
+    
+    Bytes and bytearray objects are returned unmodified. Other buffer objects are returned as a
+    memoryview with byte format. Anything else, such as a list or range of byte values, is copied
+    into a new bytearray.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    if six.PY3:
+        try:
+            view = memoryview(data)
+        except TypeError:
+            return bytearray(data)
+        if view.itemsize != 1 or view.format != 'B':
+            view = view.cast('B')
+        return view
+    elif isinstance(data, memoryview):
+        return data.tobytes()
+    else:
+        return bytearray(data)
+
+def _swapped(arr):
+    """! @brief Return a typed array with little endian element order in memory."""
+    if _NEEDS_BYTESWAP:
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+def _use_numpy(count):
+    """! @brief Whether NumPy should be used to convert _count_ elements."""
+    return (numpy is not None) and (count >= _NUMPY_MIN_LENGTH)
+
+def _unpack_list(code, dtype, data):
+    """! @brief Unpack a buffer of little endian integers into a list.
+    
+    @param code Struct format character for the integer type.
+    @param dtype Equivalent NumPy dtype.
+    @param data Object supporting the buffer protocol. Trailing bytes that don't make up a whole
+        integer are ignored.
+    """
+    count = len(data) // struct.calcsize(code)
+    if _use_numpy(count):
+        return numpy.frombuffer(data, dtype=dtype, count=count).tolist()
+    return list(struct.unpack_from("<%d%s" % (count, code), data))
+
 def byte_list_to_u32le_list(data, pad=0x00):
     """! @brief Convert a list of bytes to a list of 32-bit integers (little endian)
     
     If the length of the data list is not a multiple of 4, then the pad value is used
     for the additional required bytes.
+    
+    Any object supporting the buffer protocol can be passed in place of a list.
     """
-    res = []
-    for i in range(len(data) // 4):
-        res.append(data[i * 4 + 0] |
-                   data[i * 4 + 1] << 8 |
-                   data[i * 4 + 2] << 16 |
-                   data[i * 4 + 3] << 24)
+    data = _as_byte_buffer(data)
     remainder = (len(data) % 4)
     if remainder != 0:
-        padCount = 4 - remainder
-        res += byte_list_to_u32le_list(list(data[-remainder:]) + [pad] * padCount)
-    return res
+        data = bytearray(data) + bytearray([pad] * (4 - remainder))
+    return _unpack_list('I', '<u4', data)
 
 def u32le_list_to_byte_list(data):
     """! @brief Convert a word array into a byte array"""
-    res = []
-    for x in data:
-        res.append((x >> 0) & 0xff)
-        res.append((x >> 8) & 0xff)
-        res.append((x >> 16) & 0xff)
-        res.append((x >> 24) & 0xff)
-    return res
+    return list(u32le_list_to_bytes(data))
 
 def u16le_list_to_byte_list(data):
     """! @brief Convert a halfword array into a byte array"""
-    byteData = []
-    for h in data:
-        byteData.extend([h & 0xff, (h >> 8) & 0xff])
-    return byteData
+    return list(u16le_list_to_bytes(data))
 
 def byte_list_to_u16le_list(byteData):
-    """! @brief Convert a byte array into a halfword array"""
-    data = []
-    for i in range(0, len(byteData), 2):
-        data.append(byteData[i] | (byteData[i + 1] << 8))
-    return data
+    """! @brief Convert a byte array into a halfword array
+    
+    The length of the byte array must be a multiple of 2. Any object supporting the buffer
+    protocol can be passed in place of a list.
+    
+    @exception ValueError The length of _byteData_ is not a multiple of 2.
+    """
+    byteData = _as_byte_buffer(byteData)
+    if len(byteData) % 2:
+        raise ValueError("buffer length (%d) is not a multiple of 2" % len(byteData))
+    return _unpack_list('H', '<u2', byteData)
+
+def bytes_to_u32le_list(data):
+    """! @brief Convert a buffer of little endian bytes to a list of 32-bit integers.
+    
+    The length of the buffer must be a multiple of 4. Any object supporting the buffer protocol,
+    such as bytes, bytearray, or memoryview, is accepted.
+    """
+    return _unpack_list('I', '<u4', data)
+
+def u32le_list_to_bytes(data):
+    """! @brief Convert a list of 32-bit integers to a bytearray of little endian bytes.
+    
+    Typed arrays are converted without unpacking the elements. Values that are negative or wider
+    than 32 bits are truncated to their low 32 bits.
+    """
+    if isinstance(data, array.array) and data.typecode == _U32_TYPECODE:
+        return bytearray(_swapped(data).tobytes() if six.PY3 else _swapped(data).tostring())
+    return _pack_masked("<%dI", 0xffffffff, data)
+
+def u16le_list_to_bytes(data):
+    """! @brief Convert a list of 16-bit integers to a bytearray of little endian bytes.
+    
+    Values that are negative or wider than 16 bits are truncated to their low 16 bits.
+    """
+    if isinstance(data, array.array) and data.typecode == _U16_TYPECODE:
+        return bytearray(_swapped(data).tobytes() if six.PY3 else _swapped(data).tostring())
+    return _pack_masked("<%dH", 0xffff, data)
+
+def _pack_masked(fmt, mask, data):
+    """! @brief Pack integers with struct, truncating any that don't fit to the given mask."""
+    fmt = fmt % len(data)
+    try:
+        return bytearray(struct.pack(fmt, *data))
+    except struct.error:
+        # Only mask when needed, since it is much slower for large lists.
+        return bytearray(struct.pack(fmt, *[v & mask for v in data]))
+
+def _bytes_to_array(typecode, data):
+    data = _as_byte_buffer(data)
+    arr = array.array(typecode)
+    itemsize = arr.itemsize
+    if len(data) % itemsize:
+        raise ValueError("buffer length (%d) is not a multiple of %d" % (len(data), itemsize))
+    if six.PY3:
+        arr.frombytes(data)
+    else:
+        arr.fromstring(bytes(data))
+    if _NEEDS_BYTESWAP:
+        arr.byteswap()
+    return arr
+
+def bytes_to_u32le_array(data):
+    """! @brief Convert a buffer of little endian bytes to a typed array of 32-bit integers.
+    
+    @param data Any object supporting the buffer protocol, or a sequence of byte values. The
+        length must be a multiple of 4.
+    @return An array.array of unsigned 32-bit integers.
+    @exception ValueError The length of _data_ is not a multiple of 4.
+    """
+    return _bytes_to_array(_U32_TYPECODE, data)
+
+def bytes_to_u16le_array(data):
+    """! @brief Convert a buffer of little endian bytes to a typed array of 16-bit integers.
+    
+    @param data Any object supporting the buffer protocol, or a sequence of byte values. The
+        length must be a multiple of 2.
+    @return An array.array of unsigned 16-bit integers.
+    @exception ValueError The length of _data_ is not a multiple of 2.
+    """
+    return _bytes_to_array(_U16_TYPECODE, data)
 
 def u32_to_float32(data):
     """! @brief Convert a 32-bit int to an IEEE754 float"""
@@ -82,25 +218,11 @@ def float64_to_u64(data):
 
 def u32_to_hex8le(val):
     """! @brief Create 8-digit hexadecimal string from 32-bit register value"""
-    return ''.join("%02x" % (x & 0xFF) for x in (
-        val,
-        val >> 8,
-        val >> 16,
-        val >> 24,
-    ))
+    return binascii.hexlify(struct.pack("<I", val & 0xffffffff)).decode()
 
 def u64_to_hex16le(val):
     """! @brief Create 16-digit hexadecimal string from 64-bit register value"""
-    return ''.join("%02x" % (x & 0xFF) for x in (
-        val,
-        val >> 8,
-        val >> 16,
-        val >> 24,
-        val >> 32,
-        val >> 40,
-        val >> 48,
-        val >> 56,
-    ))
+    return binascii.hexlify(struct.pack("<Q", val & 0xffffffffffffffff)).decode()
 
 def hex8_to_u32be(data):
     """! @brief Build 32-bit register value from big-endian 8-digit hexadecimal string"""
@@ -124,7 +246,7 @@ def byte_to_hex2(val):
 
 def hex_to_byte_list(data):
     """! @brief Convert string of hex bytes to list of integers"""
-    return list(six.iterbytes(binascii.unhexlify(data)))
+    return list(bytearray(binascii.unhexlify(data)))
 
 def hex_decode(cmd):
     """! @brief Return the binary data represented by the hexadecimal string."""
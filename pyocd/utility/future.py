@@ -0,0 +1,192 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+from ..core import exceptions
+
+LOG = logging.getLogger(__name__)
+
+class TransferFuture(object):
+    """! @brief The result of a deferred transfer.
+
+    A transfer future is created for a transfer that has been queued with the debug probe but whose
+    result is not yet available. The result is obtained by calling result(), which waits for the
+    probe to complete the transfer if necessary. Because transfers are queued, many futures can be
+    created before any of them is resolved, and then all of them are completed by the same flush of
+    the probe's queue.
+
+    Futures are resolved lazily by the thread that asks for the result. They can be composed with
+    then(), combined with gather(), and awaited from an asyncio coroutine. A future is also
+    callable, returning the result, so it can be used anywhere a deferred read callback returned
+    by a `now=False` read is expected.
+
+    @code
+    futures = [target.read_memory_async(addr) for addr in addresses]
+    values = gather(*futures).result()
+    @endcode
+    """
+
+    def __init__(self, resolver):
+        """! @brief Constructor.
+
+        @param self
+        @param resolver Callable that takes no parameters and returns the result of the transfer,
+            waiting for it to complete. Usually this is the callback returned by a `now=False` read.
+        """
+        self._resolver = resolver
+        self._done = False
+        self._cancelled = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    @classmethod
+    def from_result(cls, result):
+        """! @brief Create a future that has already completed with the given result."""
+        future = cls(None)
+        future._set_result(result)
+        return future
+
+    @classmethod
+    def from_exception(cls, exception):
+        """! @brief Create a future that has already failed with the given exception."""
+        future = cls(None)
+        future._set_exception(exception)
+        return future
+
+    @classmethod
+    def call(cls, fn, *args, **kwargs):
+        """! @brief Call a function now and return a completed future with its result.
+
+        If the function raises an exception, it is stored in the future and raised by result().
+        This is used for operations that can't be deferred.
+        """
+        try:
+            return cls.from_result(fn(*args, **kwargs))
+        except Exception as error:
+            return cls.from_exception(error)
+
+    def done(self):
+        """! @brief Whether the future has a result, exception, or has been cancelled."""
+        return self._done
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """! @brief Cancel the future.
+
+        A queued transfer can't be removed from the probe's queue, but its result is discarded and
+        result() raises TransferCancelledError. Cancelling a future that is already done has no
+        effect.
+
+        @return Boolean indicating whether the future was cancelled.
+        """
+        if self._done:
+            return self._cancelled
+        self._resolver = None
+        self._cancelled = True
+        self._set_exception(exceptions.TransferCancelledError("transfer was cancelled"))
+        return True
+
+    def result(self):
+        """! @brief Return the result of the transfer, waiting for it to complete if necessary.
+        @exception Error The exception raised by the transfer is re-raised.
+        """
+        self._resolve()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """! @brief Return the exception raised by the transfer, or None if it succeeded."""
+        self._resolve()
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """! @brief Add a callback invoked with the future as its only parameter once it's done.
+
+        If the future is already done, the callback is invoked immediately.
+        """
+        if self._done:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def then(self, fn):
+        """! @brief Create a new future whose result is _fn_ applied to this future's result.
+
+        Exceptions from this future, or raised by _fn_, are passed through to the new future.
+        """
+        return TransferFuture(lambda: fn(self.result()))
+
+    __call__ = result
+
+    def __await__(self):
+        """! @brief Wait for the result from an asyncio coroutine.
+
+        Resolving the future blocks until the probe completes the transfer, so an unresolved future
+        is resolved in the event loop's default executor to leave the loop free to run other tasks.
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        if self._done:
+            waiter = loop.create_future()
+            if self._exception is not None:
+                waiter.set_exception(self._exception)
+            else:
+                waiter.set_result(self._result)
+        else:
+            waiter = loop.run_in_executor(None, self.result)
+        return waiter.__await__()
+
+    def _resolve(self):
+        if self._done:
+            return
+        try:
+            result = self._resolver()
+        except Exception as error:
+            self._set_exception(error)
+        else:
+            self._set_result(result)
+
+    def _set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def _set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        self._done = True
+        self._resolver = None
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as error:
+                LOG.error("Exception in transfer future callback: %s", error, exc_info=True)
+
+def gather(*futures):
+    """! @brief Combine futures into a single future whose result is the list of their results.
+
+    The returned future resolves the futures in order. Because the underlying transfers have all
+    been queued already, they are completed by one flush of the probe's queue. If any of the
+    futures fails, the combined future raises the first exception.
+    """
+    return TransferFuture(lambda: [f.result() for f in futures])
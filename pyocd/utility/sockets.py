@@ -57,6 +57,15 @@ class ListenerSocket(object):
     def write(self, data):
         return self.conn.send(data)
 
+    def fileno(self):
+        """! @brief Return the connection's file descriptor, so the socket can be used with select.
+
+        -1 is returned if there is no connection.
+        """
+        if self.conn is None:
+            return -1
+        return self.conn.fileno()
+
     def close(self):
         return_value = None
         if self.conn is not None:
@@ -52,7 +52,6 @@ setup(
         'colorama',
         'enum34>=1.0,<2.0;python_version<"3.4"',
         'hidapi;platform_system=="Darwin"',
-        'intelhex>=2.0,<3.0',
         'intervaltree>=3.0.2,<4.0',
         'prettytable',
         'pyelftools',
@@ -76,6 +75,7 @@ setup(
     ],
     extras_require={
         'dissassembler': ['capstone'],
+        'numpy': ['numpy'],
     },
     entry_points={
         'console_scripts': [
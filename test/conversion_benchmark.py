@@ -0,0 +1,84 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+import argparse
+from timeit import Timer
+from random import randrange
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.utility import conversion
+
+## Buffer sizes in bytes to benchmark.
+SIZES = [
+    ("1 KB", 1024),
+    ("64 KB", 64 * 1024),
+    ("4 MB", 4 * 1024 * 1024),
+    ]
+
+def make_benchmarks(size):
+    """! @brief Return a list of (name, callable) pairs for data of the given size."""
+    data = bytearray(randrange(0, 256) for _ in range(size))
+    byte_list = list(data)
+    u32_list = conversion.bytes_to_u32le_list(data)
+    u16_list = conversion.byte_list_to_u16le_list(data)
+    u32_array = conversion.bytes_to_u32le_array(data)
+
+    return [
+        ("byte_list_to_u32le_list(list)", lambda: conversion.byte_list_to_u32le_list(byte_list)),
+        ("byte_list_to_u32le_list(bytearray)", lambda: conversion.byte_list_to_u32le_list(data)),
+        ("u32le_list_to_byte_list", lambda: conversion.u32le_list_to_byte_list(u32_list)),
+        ("byte_list_to_u16le_list", lambda: conversion.byte_list_to_u16le_list(data)),
+        ("u16le_list_to_byte_list", lambda: conversion.u16le_list_to_byte_list(u16_list)),
+        ("bytes_to_u32le_list", lambda: conversion.bytes_to_u32le_list(data)),
+        ("u32le_list_to_bytes(list)", lambda: conversion.u32le_list_to_bytes(u32_list)),
+        ("bytes_to_u32le_array", lambda: conversion.bytes_to_u32le_array(data)),
+        ("u32le_list_to_bytes(array)", lambda: conversion.u32le_list_to_bytes(u32_array)),
+        ]
+
+def run_benchmark(fn, size, min_time):
+    """! @brief Time a callable and return throughput in bytes per second."""
+    timer = Timer(fn)
+    number, elapsed = timer.autorange() if hasattr(timer, 'autorange') else (1, timer.timeit(1))
+    # Repeat until we've run for at least min_time seconds to reduce noise.
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    return float(size) * number / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Conversion utilities micro-benchmark')
+    parser.add_argument('-t', '--min-time', type=float, default=0.2,
+        help="Minimum time in seconds to run each benchmark (default 0.2).")
+    parser.add_argument('-s', '--size', action='append', choices=[s[0] for s in SIZES],
+        help="Only run the given size. May be repeated.")
+    args = parser.parse_args()
+
+    print("NumPy available: %s" % (conversion.numpy is not None))
+    format_str = "{:<38}{:>16}"
+    for size_name, size in SIZES:
+        if args.size and size_name not in args.size:
+            continue
+        print("\n------ %s ------" % size_name)
+        for name, fn in make_benchmarks(size):
+            throughput = run_benchmark(fn, size, args.min_time)
+            print(format_str.format(name, "%.3f MB/s" % (throughput / 1e6)))
+
+if __name__ == "__main__":
+    main()
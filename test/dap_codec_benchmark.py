@@ -0,0 +1,153 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+import argparse
+import collections
+import struct
+import threading
+from time import time
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.probe.pydapaccess.dap_access_api import DAPAccessIntf
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.interface.interface import Interface
+from pyocd.probe.pydapaccess.cmsis_dap_core import (Command, DAPTransferResponse)
+
+class LoopbackInterface(Interface):
+    """! @brief CMSIS-DAP interface that answers every transfer with success.
+
+    Read data is all zeroes. Responses are built with as little work as possible so the
+    benchmark measures the cost of the host side packet encoding and decoding.
+    """
+
+    def __init__(self, packet_count, packet_size):
+        super(LoopbackInterface, self).__init__()
+        self.packet_count = packet_count
+        self.packet_size = packet_size
+        self._responses = collections.deque()
+        self._cond = threading.Condition()
+        self._zeroes = bytearray(packet_size)
+
+    def get_serial_number(self):
+        return "loopback"
+
+    def set_packet_size(self, size):
+        pass
+
+    def write(self, data):
+        if isinstance(data, list):
+            data = bytearray(data)
+        command = data[0]
+        if command == Command.DAP_TRANSFER_BLOCK:
+            count, request = struct.unpack_from("<HB", data, 2)
+            response = bytearray(struct.pack("<BHB", command, count, DAPTransferResponse.ACK_OK))
+            if request & 0x02:
+                response += self._zeroes[:count * 4]
+        elif command == Command.DAP_TRANSFER:
+            count = data[2]
+            reads = 0
+            pos = 3
+            for _ in range(count):
+                if data[pos] & 0x02:
+                    reads += 1
+                    pos += 1
+                else:
+                    pos += 5
+            response = bytearray([command, count, DAPTransferResponse.ACK_OK])
+            response += self._zeroes[:reads * 4]
+        elif command == Command.DAP_INFO:
+            response = self._info(data[1])
+        else:
+            response = bytearray([command, 0])
+        with self._cond:
+            self._responses.append(response)
+            self._cond.notify()
+
+    def read(self, size=-1, timeout=-1):
+        with self._cond:
+            while not self._responses:
+                self._cond.wait()
+            return self._responses.popleft()
+
+    def _info(self, id_):
+        if id_ == DAPAccessIntf.ID.MAX_PACKET_COUNT.value:
+            return bytearray([Command.DAP_INFO, 1, self.packet_count])
+        elif id_ == DAPAccessIntf.ID.MAX_PACKET_SIZE.value:
+            return bytearray([Command.DAP_INFO, 2]) + struct.pack("<H", self.packet_size)
+        elif id_ == DAPAccessIntf.ID.CAPABILITIES.value:
+            return bytearray([Command.DAP_INFO, 1, 0])
+        return bytearray([Command.DAP_INFO, 0])
+
+def block_read(link, size):
+    link.reg_read_repeat_bytes(size // 4, DAPAccessIntf.REG.AP_0xC)
+
+def block_write(link, size, data):
+    link.reg_write_repeat_bytes(size // 4, DAPAccessIntf.REG.AP_0xC, data)
+    link.flush()
+
+def single_reads(link, size):
+    # Deferred single register reads, encoded as DAP_Transfer commands.
+    callbacks = [link.read_reg(DAPAccessIntf.REG.AP_0xC, now=False) for _ in range(size // 4)]
+    for cb in callbacks:
+        cb()
+
+def run(fn, size, min_time):
+    count = 0
+    start = time()
+    while True:
+        fn()
+        count += 1
+        elapsed = time() - start
+        if elapsed >= min_time:
+            return float(size) * count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='CMSIS-DAP packet codec benchmark')
+    parser.add_argument('-p', '--packet-size', type=int, default=512,
+        help="Probe packet size (default 512).")
+    parser.add_argument('-c', '--packet-count', type=int, default=4,
+        help="Probe packet count (default 4).")
+    parser.add_argument('-s', '--size', type=int, default=64 * 1024,
+        help="Bytes per operation (default 65536).")
+    parser.add_argument('-t', '--min-time', type=float, default=1.0,
+        help="Minimum time in seconds to run each benchmark (default 1.0).")
+    args = parser.parse_args()
+
+    link = DAPAccessCMSISDAP(None, interface=LoopbackInterface(args.packet_count, args.packet_size))
+    link.open()
+    link.set_deferred_transfer(True)
+    try:
+        data = bytearray(args.size)
+        benchmarks = [
+            ("block read", lambda: block_read(link, args.size)),
+            ("block write", lambda: block_write(link, args.size, data)),
+            ("single reads", lambda: single_reads(link, args.size)),
+            ]
+        print("Packet size %d, packet count %d, %d bytes per operation" %
+                (args.packet_size, args.packet_count, args.size))
+        format_str = "{:<16}{:>16}"
+        for name, fn in benchmarks:
+            throughput = run(fn, args.size, args.min_time)
+            print(format_str.format(name, "%.3f MB/s" % (throughput / 1e6)))
+    finally:
+        link.close()
+
+if __name__ == "__main__":
+    main()
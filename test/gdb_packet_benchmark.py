@@ -0,0 +1,181 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, sys
+import argparse
+import random
+import socket
+import threading
+from time import time
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.gdbserver.framing import PacketFramer
+from pyocd.gdbserver.gdbserver import (GDBServerPacketIOThread, checksum, escape)
+
+def make_packet(data):
+    return b'$' + data + b'#' + checksum(data)
+
+def record_load_session(image_size, packet_size):
+    """! @brief Build the byte stream gdb sends to the server for a `load` command.
+
+    The stream has the packets gdb sends to program an image of random data with vFlashWrite,
+    each followed by the ack for the server's reply, as a recording of a real session would.
+    """
+    rng = random.Random(0)
+    image = bytes(bytearray(rng.randint(0, 255) for _ in range(image_size)))
+    packets = [make_packet(b"vFlashErase:00000000,%x" % image_size)]
+    # Leave room for the command, address, and escaping within the packet size.
+    chunk_size = (packet_size - 32) // 2
+    for offset in range(0, image_size, chunk_size):
+        data = escape(image[offset:offset + chunk_size])
+        packets.append(make_packet(b"vFlashWrite:%x:" % offset + data))
+    packets.append(make_packet(b"vFlashDone"))
+    return b"+".join(packets) + b"+", len(packets)
+
+def legacy_frame(chunks):
+    """! @brief The framing previously done by GDBServerPacketIOThread, for comparison."""
+    start = time()
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer):
+            if buffer[0:1] in (b'+', b'-'):
+                buffer = buffer[1:]
+            try:
+                pkt_begin = buffer.index(b"$")
+                pkt_end = buffer.index(b"#") + 2
+                if pkt_begin >= 0 and pkt_end < len(buffer):
+                    pkt = buffer[pkt_begin:pkt_end + 1]
+                    buffer = buffer[pkt_end + 1:]
+                else:
+                    break
+            except ValueError:
+                break
+    return time() - start
+
+def count_packets(stream):
+    framer = PacketFramer()
+    framer.feed(stream)
+    return sum(1 for kind, _ in framer if kind == PacketFramer.PACKET)
+
+def framer_frame(chunks):
+    start = time()
+    framer = PacketFramer()
+    for chunk in chunks:
+        framer.feed(chunk)
+        for _ in framer:
+            pass
+    return time() - start
+
+class SocketPairAdapter(object):
+    """! @brief Abstract socket for GDBServerPacketIOThread backed by one end of a socket pair."""
+
+    def __init__(self, sock, read_size):
+        self.sock = sock
+        self.read_size = read_size
+        self.port = 0
+
+    def read(self):
+        return self.sock.recv(self.read_size)
+
+    def write(self, data):
+        return self.sock.send(data)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+def packet_io_thread(stream, packet_count, read_size):
+    """! @brief Replay the stream through a packet I/O thread over a socket pair.
+
+    Only the time from starting to send the stream until the last packet is received is measured,
+    so thread creation and shutdown are excluded.
+    """
+    gdb, server = socket.socketpair()
+    packet_io = GDBServerPacketIOThread(SocketPairAdapter(server, read_size))
+
+    # Discard the acks sent by the server.
+    def drain():
+        try:
+            while gdb.recv(65536):
+                pass
+        except socket.error:
+            pass
+    drainer = threading.Thread(target=drain)
+    drainer.daemon = True
+    drainer.start()
+
+    sender = threading.Thread(target=gdb.sendall, args=(stream,))
+    sender.daemon = True
+    start = time()
+    sender.start()
+    try:
+        for _ in range(packet_count):
+            packet_io.receive()
+        elapsed = time() - start
+    finally:
+        packet_io.stop()
+        packet_io.join()
+        gdb.close()
+        server.close()
+    return elapsed
+
+def run(fn, size, min_time):
+    """! @brief Call a benchmark function, which returns the time it measured, repeatedly."""
+    count = 0
+    elapsed = 0
+    while elapsed < min_time:
+        elapsed += fn()
+        count += 1
+    return float(size) * count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='GDB RSP packet framing benchmark')
+    parser.add_argument('-s', '--size', type=int, default=256 * 1024,
+        help="Size of the image loaded by the replayed session (default 262144).")
+    parser.add_argument('-p', '--packet-size', type=lambda x: int(x, 0), default=0x4000,
+        help="Maximum packet size negotiated with gdb (default 16384).")
+    parser.add_argument('-r', '--read-size', type=int, default=2048,
+        help="Bytes received from the socket at a time (default 2048).")
+    parser.add_argument('-f', '--file', help="Replay a recording of the bytes sent by gdb "
+        "instead of a generated load session.")
+    parser.add_argument('-t', '--min-time', type=float, default=1.0,
+        help="Minimum time in seconds to run each benchmark (default 1.0).")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'rb') as f:
+            stream = f.read()
+        packet_count = count_packets(stream)
+    else:
+        stream, packet_count = record_load_session(args.size, args.packet_size)
+    chunks = [stream[i:i + args.read_size] for i in range(0, len(stream), args.read_size)]
+
+    print("%d bytes in %d packets, received %d bytes at a time" %
+            (len(stream), packet_count, args.read_size))
+    benchmarks = [
+        ("legacy framing", lambda: legacy_frame(chunks)),
+        ("PacketFramer", lambda: framer_frame(chunks)),
+        ("packet I/O thread", lambda: packet_io_thread(stream, packet_count, args.read_size)),
+        ]
+    format_str = "{:<20}{:>16}"
+    for name, fn in benchmarks:
+        throughput = run(fn, len(stream), args.min_time)
+        print(format_str.format(name, "%.3f MB/s" % (throughput / 1e6)))
+
+if __name__ == "__main__":
+    main()
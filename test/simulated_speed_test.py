@@ -0,0 +1,98 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import print_function
+
+import os, sys
+import argparse
+import logging
+from time import time
+from random import randrange
+
+parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parentdir)
+
+from pyocd.core.session import Session
+from pyocd.probe.cmsis_dap_probe import CMSISDAPProbe
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.interface.simulated_backend import (SimulatedCMSISDAP, SimulatedTarget)
+
+def measure(fn, size):
+    """! @brief Call fn and return the throughput in bytes per second."""
+    start = time()
+    fn()
+    return size / (time() - start)
+
+def speed_test(args):
+    simtarget = SimulatedTarget(ram_size=args.size, flash_size=args.size)
+    simtarget.load(simtarget.flash.start, bytearray(randrange(0, 256) for _ in range(args.size)))
+    interface = SimulatedCMSISDAP(target=simtarget, latency=args.latency / 1000.0,
+                    packet_size=args.packet_size, packet_count=args.packet_count,
+                    swd_timing=args.swd_timing)
+    probe = CMSISDAPProbe(DAPAccessCMSISDAP(None, interface=interface))
+
+    with Session(probe, no_config=True, target_override='cortex_m', frequency=args.frequency) as session:
+        target = session.target
+        link = probe._link
+        ram_start = simtarget.ram.start
+        rom_start = simtarget.flash.start
+        data = bytearray(randrange(0, 256) for _ in range(args.size))
+        words = args.size // 4
+
+        print("Packet size %d, packet count %d, latency %.3f ms, SWD timing %s at %d Hz" %
+            (args.packet_size, args.packet_count, args.latency, args.swd_timing, args.frequency))
+        format_str = "{:<24}{:>18}"
+        print(format_str.format("Test", "Speed"))
+
+        def report(name, fn):
+            link.get_transfer_statistics().reset()
+            speed = measure(fn, args.size)
+            print(format_str.format(name, "%.3f KB/s" % (speed / 1000.0)))
+
+        report("RAM write 8-bit", lambda: (target.write_memory_block8(ram_start, list(data)), target.flush()))
+        report("RAM read 8-bit", lambda: target.read_memory_block8(ram_start, args.size))
+        report("RAM write bytes", lambda: (target.write_memory_block32_bytes(ram_start, data), target.flush()))
+        report("RAM read bytes", lambda: target.read_memory_block32_bytes(ram_start, words))
+        report("ROM read bytes", lambda: target.read_memory_block32_bytes(rom_start, words))
+
+        print("\nTransfer statistics for last test:", link.get_transfer_statistics())
+        if target.read_memory_block32_bytes(ram_start, words) != data:
+            print("ERROR: RAM contents do not match written data")
+            return False
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory transfer speed test using a simulated CMSIS-DAP probe')
+    parser.add_argument('-s', '--size', type=int, default=64 * 1024,
+        help="Bytes per test (default 65536).")
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+        help="USB round trip latency in milliseconds (default 0).")
+    parser.add_argument('-p', '--packet-size', type=int, default=64,
+        help="Probe packet size (default 64).")
+    parser.add_argument('-c', '--packet-count', type=int, default=4,
+        help="Probe packet count (default 4).")
+    parser.add_argument('-w', '--swd-timing', action='store_true',
+        help="Model the time taken by SWD transfers.")
+    parser.add_argument('-f', '--frequency', type=int, default=4000000,
+        help="SWD clock frequency in Hz (default 4000000).")
+    parser.add_argument('-d', '--debug', action='store_true',
+        help="Enable debug logging.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    sys.exit(0 if speed_test(args) else 1)
+
+if __name__ == "__main__":
+    main()
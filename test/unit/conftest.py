@@ -18,10 +18,62 @@ import pytest
 import logging
 from .mockcore import MockCore
 
+from pyocd.core.session import Session
+from pyocd.probe.cmsis_dap_probe import CMSISDAPProbe
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.interface.simulated_backend import (
+    SimulatedCMSISDAP,
+    SimulatedTarget,
+    )
+
 @pytest.fixture(scope='function')
 def mockcore():
     return MockCore()
 
+@pytest.fixture(scope='function')
+def simtarget():
+    """! @brief Simulated target for the simulated_session fixture.
+    
+    A test module can override this fixture to use a subclass of SimulatedTarget.
+    """
+    return SimulatedTarget()
+
+@pytest.fixture(scope='function')
+def make_simulated_session():
+    """! @brief Factory for sessions with a simulated CMSIS-DAP probe and a Cortex-M target.
+    
+    The factory takes an optional SimulatedTarget or SimulatedCMSISDAP interface, plus user
+    options passed to Session in the same ways, and returns a session that has not been opened
+    yet. All of the sessions are closed when the test finishes.
+    """
+    sessions = []
+    
+    def make(simtarget=None, simif=None, options=None, **kwargs):
+        if simif is None:
+            if simtarget is None:
+                simtarget = SimulatedTarget()
+            simif = SimulatedCMSISDAP(target=simtarget)
+        probe = CMSISDAPProbe(DAPAccessCMSISDAP(None, interface=simif))
+        session = Session(probe, no_config=True, target_override='cortex_m', options=options,
+                            **kwargs)
+        sessions.append(session)
+        return session
+    
+    yield make
+    for session in sessions:
+        session.close()
+
+@pytest.fixture(scope='function')
+def simulated_session(request, simtarget, make_simulated_session):
+    """! @brief Open session for the simtarget fixture.
+    
+    User options can be set by indirect parametrization, for example
+    `@pytest.mark.parametrize('simulated_session', [{'memcache.write_back': True}], indirect=True)`.
+    """
+    session = make_simulated_session(simtarget, options=getattr(request, 'param', None))
+    session.open()
+    return session
+
 # Ignore semihosting test that currently crashes on Travis
 collect_ignore = [
     "test_semihosting.py",
@@ -99,12 +99,15 @@ class MockCore(CoreSightCoreComponent):
         elif transfer_size == 32:
             return 0x12345678
 
-    def read_memory_block8(self, addr, size):
+    def read_memory_bytes(self, addr, size):
         for r, m in self.regions:
             if r.contains_range(addr, length=size):
                 addr -= r.start
-                return list(m[addr:addr+size])
-        return [0x55] * size
+                return bytearray(m[addr:addr+size])
+        return bytearray([0x55] * size)
+
+    def read_memory_block8(self, addr, size):
+        return list(self.read_memory_bytes(addr, size))
 
     def read_memory_block32(self, addr, size):
         return conversion.byte_list_to_u32le_list(self.read_memory_block8(addr, size*4))
@@ -113,6 +116,9 @@ class MockCore(CoreSightCoreComponent):
         return True
 
     def write_memory_block8(self, addr, value):
+        return self.write_memory_bytes(addr, value)
+
+    def write_memory_bytes(self, addr, value):
         for r, m in self.regions:
             if r.contains_range(addr, length=len(value)):
                 addr -= r.start
@@ -0,0 +1,131 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from binascii import crc32
+
+from pyocd.core.memory_map import MemoryMap
+from pyocd.flash.flash import (Flash, FlashInfo, PageInfo, SectorInfo)
+from pyocd.flash.flash_builder import FlashBuilder
+
+SECTOR_SIZE = 0x400
+FLASH_SIZE = 0x4000
+
+class MockProbe(object):
+    unique_id = "0240:0000/abc"
+
+class MockBoard(object):
+    def __init__(self, target):
+        self.target = target
+
+class MockSession(object):
+    def __init__(self, cache_dir=None):
+        self.options = {'flash_crc_cache': cache_dir is not None, 'flash_crc_cache.dir': cache_dir}
+        self.probe = MockProbe()
+        self.board = None
+
+    def notify(self, event, source=None, data=None):
+        pass
+
+class MockTarget(object):
+    def __init__(self, session):
+        self.session = session
+        self.flash = None
+        self.memory_map = None
+        self.reset_count = 0
+        session.board = MockBoard(self)
+
+    def read_memory_bytes(self, addr, size):
+        return bytearray(self.flash.memory[addr:addr + size])
+
+    def reset_and_halt(self, reset_type=None):
+        self.reset_count += 1
+
+class MockFlash(object):
+    """! @brief Flash with 1 kB sectors and pages that supports the CRC analyzer."""
+    Operation = Flash.Operation
+
+    def __init__(self, target, region):
+        self.target = target
+        self.region = region
+        self.memory = bytearray([0xff]) * region.length
+        self.is_erase_all_supported = True
+        self.is_double_buffering_supported = False
+        self.crc_requests = []
+        self.programmed = []
+        self.cleanup_count = 0
+        target.flash = self
+        target.memory_map = MemoryMap(region)
+        region.flash = self
+
+    def get_sector_info(self, addr):
+        info = SectorInfo()
+        info.base_addr = addr - (addr % SECTOR_SIZE)
+        info.erase_weight = 0.01
+        info.size = SECTOR_SIZE
+        return info
+
+    def get_page_info(self, addr):
+        info = PageInfo()
+        info.base_addr = addr - (addr % SECTOR_SIZE)
+        info.program_weight = 0.01
+        info.size = SECTOR_SIZE
+        return info
+
+    def get_flash_builder(self):
+        return FlashBuilder(self)
+
+    def get_flash_info(self):
+        info = FlashInfo()
+        info.rom_start = self.region.start
+        info.erase_weight = 10.0
+        info.crc_supported = True
+        return info
+
+    def init(self, operation, address=None, clock=0, reset=True):
+        pass
+
+    def uninit(self):
+        pass
+
+    def cleanup(self):
+        self.cleanup_count += 1
+
+    def erase_all(self):
+        self.memory[:] = bytearray([0xff]) * len(self.memory)
+
+    def erase_sector(self, addr):
+        self.memory[addr:addr + SECTOR_SIZE] = bytearray([0xff]) * SECTOR_SIZE
+
+    def program_page(self, addr, data):
+        self.memory[addr:addr + len(data)] = bytearray(data)
+        self.programmed.append(addr)
+
+    def compute_crcs(self, sectors):
+        self.crc_requests.append(len(sectors))
+        return [crc32(self.memory[addr:addr + size]) & 0xFFFFFFFF for addr, size in sectors]
+
+def program(flash, data, addr=0, **kwargs):
+    """! @brief Program data with a FlashBuilder using sector erase."""
+    builder = FlashBuilder(flash)
+    builder.log_performance = False
+    builder.add_data(addr, list(data))
+    for previous_addr, previous_data in kwargs.pop('previous', []):
+        builder.add_previous_data(previous_addr, list(previous_data))
+    return builder.program(chip_erase="sector", smart_flash=True, **kwargs)
+
+def image(seed=0):
+    """! @brief Return an image that fills the mock flash."""
+    return bytearray((i * 7 + seed) & 0xff for i in range(FLASH_SIZE))
@@ -0,0 +1,93 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pytest
+
+from pyocd.core.memory_map import RamRegion
+from pyocd.probe.pydapaccess.interface.simulated_backend import (
+    SimulatedCMSISDAP,
+    SimulatedTarget,
+    )
+
+RAM_START = 0x20000000
+
+class FlakyTarget(SimulatedTarget):
+    """! @brief Simulated target that corrupts RAM reads above a clock frequency."""
+
+    def __init__(self):
+        super(FlakyTarget, self).__init__()
+        self.interface = None
+        self.max_frequency = None
+
+    def read(self, addr, size):
+        value = super(FlakyTarget, self).read(addr, size)
+        if (value is not None) and (self.ram.start <= addr < self.ram.start + len(self.ram.data)) \
+                and (self.interface.clock_frequency > self.max_frequency):
+            value ^= 1
+        return value
+
+@pytest.fixture(scope='function')
+def flaky_target():
+    target = FlakyTarget()
+    target.interface = SimulatedCMSISDAP(target=target)
+    target.max_frequency = 8000000
+    return target
+
+@pytest.fixture(scope='function')
+def cache_file(tmpdir):
+    return str(tmpdir.join("clock_tune.json"))
+
+@pytest.fixture(scope='function')
+def run_session(make_simulated_session, flaky_target, cache_file):
+    def run_session(use_ram=True):
+        session = make_simulated_session(simif=flaky_target.interface,
+                    options={'clock_tune': True, 'clock_tune.cache_file': cache_file})
+        if use_ram:
+            session.target.memory_map.add_region(RamRegion(start=RAM_START, length=0x1000))
+        with session:
+            pass
+        return flaky_target.interface.clock_frequency
+    return run_session
+
+class TestClockTuner:
+    def test_register_pattern(self, run_session, flaky_target, cache_file):
+        # Without RAM in the memory map, only registers are read, so RAM corruption isn't seen.
+        assert run_session(use_ram=False) == 24000000
+        with open(cache_file) as f:
+            assert list(json.load(f)['frequencies'].values()) == [24000000]
+
+    def test_ram_pattern(self, run_session, flaky_target):
+        flaky_target.write(RAM_START, 4, 0x12345678)
+        assert run_session() == 8000000
+        # The RAM used for the test pattern is restored.
+        assert flaky_target.read(RAM_START, 4) == 0x12345678
+
+    def test_cached_frequency(self, run_session, flaky_target):
+        assert run_session() == 8000000
+
+        # The cached frequency is used without searching again.
+        flaky_target.max_frequency = 50000000
+        assert run_session() == 8000000
+
+        # A cached frequency that fails is tuned again.
+        flaky_target.max_frequency = 4000000
+        assert run_session() == 4000000
+
+    def test_disabled(self, make_simulated_session, flaky_target):
+        with make_simulated_session(simif=flaky_target.interface):
+            pass
+        assert flaky_target.interface.clock_frequency == 1000000
@@ -17,6 +17,11 @@
 from pyocd.utility.conversion import (
     byte_list_to_u32le_list,
     u32le_list_to_byte_list,
+    bytes_to_u32le_list,
+    u32le_list_to_bytes,
+    u16le_list_to_bytes,
+    bytes_to_u32le_array,
+    bytes_to_u16le_array,
     u16le_list_to_byte_list,
     byte_list_to_u16le_list,
     u32_to_float32,
@@ -32,11 +37,13 @@ from pyocd.utility.conversion import (
     hex_decode,
     hex_encode,
 )
+from pyocd.utility import conversion
 from pyocd.utility.mask import align_up
 from pyocd.gdbserver.gdbserver import (
     escape,
     unescape,
 )
+import array
 import pytest
 import six
 
@@ -71,6 +78,40 @@ class TestConversionUtilities(object):
         assert byte_list_to_u32le_list(bytearray(b'abcd')) == [0x64636261]
         assert byte_list_to_u32le_list(bytearray(b'a')) == [0x00000061]
 
+    def test_bytes_to_u32le_list(self):
+        assert bytes_to_u32le_list(b'') == []
+        assert bytes_to_u32le_list(bytearray(range(8))) == [0x03020100, 0x07060504]
+        assert bytes_to_u32le_list(memoryview(b'abcdefgh')[4:]) == [0x68676665]
+
+    def test_u32le_list_to_bytes(self):
+        assert u32le_list_to_bytes([]) == bytearray()
+        assert u32le_list_to_bytes([0x03020100, 0x07060504]) == bytearray(range(8))
+
+    def test_bytes_to_u32le_array(self):
+        arr = bytes_to_u32le_array(bytearray(range(8)))
+        assert isinstance(arr, array.array)
+        assert arr.itemsize == 4
+        assert list(arr) == [0x03020100, 0x07060504]
+        assert list(bytes_to_u32le_array(memoryview(b'abcdefgh')[4:])) == [0x68676665]
+        with pytest.raises(ValueError):
+            bytes_to_u32le_array(b'abc')
+
+    def test_bytes_to_u16le_array(self):
+        arr = bytes_to_u16le_array(b'\x01\x02\x03\x04')
+        assert arr.itemsize == 2
+        assert list(arr) == [0x0201, 0x0403]
+
+    def test_typed_array_roundtrip(self):
+        data = bytearray(range(256)) * 4
+        assert u32le_list_to_bytes(bytes_to_u32le_array(data)) == data
+        assert u16le_list_to_bytes(bytes_to_u16le_array(data)) == data
+
+    def test_byte_list_to_u32le_list_buffer(self):
+        words = array.array('H')
+        words.frombytes(b'\x00\x01\x02\x03')
+        assert byte_list_to_u32le_list(words) == [0x03020100]
+        assert byte_list_to_u32le_list(memoryview(b'abcde')) == [0x64636261, 0x00000065]
+
     def test_u32leListToByteList(self):
         data = [
             0x03020100,
@@ -100,6 +141,33 @@ class TestConversionUtilities(object):
             0xCDAB,
         ]
 
+    def test_byte_list_to_u16le_list_odd_length(self):
+        with pytest.raises(ValueError):
+            byte_list_to_u16le_list([1, 2, 3])
+
+    def test_out_of_range_values_truncated(self):
+        assert u16le_list_to_byte_list([0x12345, -1]) == [0x45, 0x23, 0xff, 0xff]
+        assert u32le_list_to_byte_list([0x123456789, -2]) == [0x89, 0x67, 0x45, 0x23,
+                                                              0xfe, 0xff, 0xff, 0xff]
+        assert u32le_list_to_bytes([1 << 32]) == bytearray(4)
+
+    def test_numpy_unpack(self, monkeypatch):
+        pytest.importorskip('numpy')
+        data = bytearray(range(256)) * 64
+        expected = [
+            byte_list_to_u32le_list(data),
+            bytes_to_u32le_list(memoryview(data)),
+            byte_list_to_u16le_list(data),
+            ]
+        # Compare with the struct path.
+        monkeypatch.setattr(conversion, '_NUMPY_MIN_LENGTH', len(data) * 2)
+        assert expected == [
+            byte_list_to_u32le_list(data),
+            bytes_to_u32le_list(memoryview(data)),
+            byte_list_to_u16le_list(data),
+            ]
+        assert all(type(v) is int for v in expected[0])
+
     def test_u32BEToFloat32BE(self):
         assert u32_to_float32(0x012345678) == 5.690456613903524e-28
 
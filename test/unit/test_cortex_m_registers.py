@@ -0,0 +1,86 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.coresight.cortex_m import (CORE_REGISTER, CoreRegisterAccessPlan)
+
+@pytest.fixture(scope='function')
+def core(simulated_session):
+    return simulated_session.target.selected_core
+
+class TestCoreRegisterAccessPlan:
+    def test_cached(self):
+        plan = CoreRegisterAccessPlan.get(['r0', 'pc'])
+        assert CoreRegisterAccessPlan.get(['r0', 'pc']) is plan
+        assert plan.reg_list == [0, 15]
+
+    def test_selectors_are_unique(self):
+        plan = CoreRegisterAccessPlan.get(['xpsr', 'apsr', 'primask', 'control', 'd1', 's2'])
+        assert plan.selectors == [16, 20, 0x42, 0x43]
+        assert plan.uses_fpu
+
+    def test_unknown_register(self):
+        with pytest.raises(ValueError):
+            CoreRegisterAccessPlan.get([100])
+        with pytest.raises(KeyError):
+            CoreRegisterAccessPlan.get(['foo'])
+
+    def test_extract(self):
+        plan = CoreRegisterAccessPlan.get(['d1', 'basepri', 'r0'])
+        assert plan.extract([0x11111111, 0x22222222, 0x00003400, 7]) == [0x2222222211111111, 0x34, 7]
+
+    def test_merge(self):
+        plan = CoreRegisterAccessPlan.get(['primask', 'basepri', 'd0'])
+        assert plan.read_before_write == [20]
+        assert plan.merge([1, 0x20, 0x0000000200000001], {20: 0x04000000}) == \
+            [(20, 0x04002001), (0x40, 1), (0x41, 2)]
+
+    def test_merge_after_full_write(self):
+        plan = CoreRegisterAccessPlan.get(['xpsr', 'apsr'])
+        assert plan.read_before_write == []
+        assert plan.merge([0x01000003, 0xf0000000], {}) == [(16, 0xf1000003)]
+
+class TestCoreRegisters:
+    def test_read_write(self, core, simtarget):
+        regs = ['r0', 'r7', 'lr', 'msp']
+        values = [0x11, 0x77, 0xfffffff9, 0x20001000]
+        core.write_core_registers_raw(regs, values)
+        assert core.read_core_registers_raw(regs) == values
+        assert simtarget.core_registers[7] == 0x77
+
+    def test_doubles(self, core, simtarget):
+        core.write_core_registers_raw(['d2', 's6'], [0x123456789abcdef0, 0x55])
+        assert simtarget.core_registers[0x44] == 0x9abcdef0
+        assert simtarget.core_registers[0x45] == 0x12345678
+        assert core.read_core_registers_raw(['s4', 'd2', 'd3']) == \
+            [0x9abcdef0, 0x123456789abcdef0, 0x55]
+
+    def test_cfbp_subregisters(self, core, simtarget):
+        core.write_core_register_raw('cfbp', 0x02000000)
+        core.write_core_registers_raw(['primask', 'basepri'], [1, 0x40])
+        assert simtarget.core_registers[CORE_REGISTER['cfbp']] == 0x02004001
+        assert core.read_core_registers_raw(['control', 'basepri', 'primask']) == [2, 0x40, 1]
+
+    def test_single_flush(self, core):
+        regs = ['r%d' % i for i in range(13)] + ['sp', 'lr', 'pc', 'xpsr', 'd0', 'd1']
+        stats = core.session.probe._link.get_transfer_statistics()
+        core.read_core_registers_raw(regs)
+        stats.reset()
+        core.read_core_registers_raw(regs)
+        # 21 unique selectors in one packet pipeline, with no per-register DHCSR reads.
+        assert stats.packets_sent == stats.packets_received
+        assert stats.read_bytes == (21 + 1) * 4
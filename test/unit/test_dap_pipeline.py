@@ -0,0 +1,335 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import struct
+import threading
+from time import (sleep, time)
+import pytest
+
+from pyocd.probe.pydapaccess.dap_access_api import DAPAccessIntf
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import (
+    DAPAccessCMSISDAP,
+    _Command,
+    _Transfer,
+    READ,
+    WRITE,
+    AP_ACC,
+    DP_ACC,
+    )
+from pyocd.probe.pydapaccess.interface.interface import Interface
+from pyocd.probe.pydapaccess.cmsis_dap_core import (Command, DAPTransferResponse)
+
+REG = DAPAccessIntf.REG
+
+class FakeDAPInterface(Interface):
+    """! @brief Minimal CMSIS-DAP interface answering transfer commands from a register model.
+
+    Writes store the value for the register. Reads of AP registers return an incrementing
+    counter so the order of responses can be checked. A fault can be injected on the Nth
+    transfer command.
+    """
+
+    def __init__(self, packet_count=4, packet_size=64):
+        super(FakeDAPInterface, self).__init__()
+        self.packet_count = packet_count
+        self.packet_size = packet_size
+        self.regs = {}
+        self.counter = 0
+        self.fault_on_command = None
+        self.transfer_commands = 0
+        self.max_outstanding = 0
+        self._responses = collections.deque()
+        self._cond = threading.Condition()
+
+    def get_serial_number(self):
+        return "fake"
+
+    def set_packet_size(self, size):
+        pass
+
+    def write(self, data):
+        data = bytearray(data)
+        if data[0] == Command.DAP_INFO:
+            response = self._info(data[1])
+        elif data[0] == Command.DAP_TRANSFER:
+            response = self._transfer(data)
+        elif data[0] == Command.DAP_TRANSFER_BLOCK:
+            response = self._transfer_block(data)
+        else:
+            response = bytearray([data[0], 0])
+        with self._cond:
+            self._responses.append(response)
+            self.max_outstanding = max(self.max_outstanding, len(self._responses))
+            self._cond.notify()
+
+    def read(self, size=-1, timeout=-1):
+        with self._cond:
+            while not self._responses:
+                self._cond.wait()
+            return self._responses.popleft()
+
+    def _info(self, id_):
+        if id_ == DAPAccessIntf.ID.MAX_PACKET_COUNT.value:
+            return bytearray([Command.DAP_INFO, 1, self.packet_count])
+        elif id_ == DAPAccessIntf.ID.MAX_PACKET_SIZE.value:
+            return bytearray([Command.DAP_INFO, 2]) + struct.pack("<H", self.packet_size)
+        elif id_ == DAPAccessIntf.ID.CAPABILITIES.value:
+            return bytearray([Command.DAP_INFO, 1, 0])
+        return bytearray([Command.DAP_INFO, 0])
+
+    def _ack(self):
+        self.transfer_commands += 1
+        if self.fault_on_command == self.transfer_commands:
+            return DAPTransferResponse.ACK_FAULT
+        return DAPTransferResponse.ACK_OK
+
+    def _access(self, request, value=None):
+        key = request & 0x0d
+        if request & 0x02:
+            if request & 0x01:
+                self.counter += 1
+                return self.counter
+            return self.regs.get(key, 0)
+        self.regs[key] = value
+
+    def _transfer(self, data):
+        count = data[2]
+        ack = self._ack()
+        out = bytearray()
+        pos = 3
+        for _ in range(count):
+            request = data[pos]
+            pos += 1
+            if request & 0x02:
+                out += struct.pack("<I", self._access(request))
+            else:
+                self._access(request, struct.unpack_from("<I", data, pos)[0])
+                pos += 4
+        if ack != DAPTransferResponse.ACK_OK:
+            return bytearray([Command.DAP_TRANSFER, 0, ack])
+        return bytearray([Command.DAP_TRANSFER, count, ack]) + out
+
+    def _transfer_block(self, data):
+        count = data[2] | (data[3] << 8)
+        request = data[4]
+        ack = self._ack()
+        out = bytearray()
+        for i in range(count):
+            if request & 0x02:
+                out += struct.pack("<I", self._access(request))
+            else:
+                self._access(request, struct.unpack_from("<I", data, 5 + i * 4)[0])
+        if ack != DAPTransferResponse.ACK_OK:
+            return bytearray([Command.DAP_TRANSFER_BLOCK, 0, 0, ack])
+        return bytearray([Command.DAP_TRANSFER_BLOCK, count & 0xff, count >> 8, ack]) + out
+
+class DrainGatedInterface(FakeDAPInterface):
+    """! @brief Interface that holds back responses after a fault until the gate is opened.
+
+    The fault response is only returned once another command is in flight behind it, so the
+    completion thread has responses to discard. Those responses are then held until the gate is
+    set, which leaves time for the caller to try sending while the fault is being handled.
+    """
+
+    def __init__(self):
+        super(DrainGatedInterface, self).__init__()
+        self.gate = threading.Event()
+        self._faulted = False
+
+    @staticmethod
+    def _is_fault(response):
+        if response[0] == Command.DAP_TRANSFER:
+            return response[2] != DAPTransferResponse.ACK_OK
+        elif response[0] == Command.DAP_TRANSFER_BLOCK:
+            return response[3] != DAPTransferResponse.ACK_OK
+        return False
+
+    def read(self, size=-1, timeout=-1):
+        if self._faulted:
+            self.gate.wait()
+        with self._cond:
+            while not self._responses or (self._is_fault(self._responses[0])
+                    and len(self._responses) < 2):
+                self._cond.wait()
+            response = self._responses.popleft()
+        if self._is_fault(response):
+            self._faulted = True
+        return response
+
+class GatedInterface(FakeDAPInterface):
+    """! @brief Interface that holds back all responses until the gate is opened.
+
+    Records whether a command other than a transfer was written while transfer responses were
+    still unread.
+    """
+
+    def __init__(self):
+        super(GatedInterface, self).__init__()
+        self.gate = threading.Event()
+        self.interleaved = False
+
+    def write(self, data):
+        if data[0] not in (Command.DAP_TRANSFER, Command.DAP_TRANSFER_BLOCK):
+            with self._cond:
+                if self._responses:
+                    self.interleaved = True
+        super(GatedInterface, self).write(data)
+
+    def read(self, size=-1, timeout=-1):
+        self.gate.wait()
+        return super(GatedInterface, self).read(size, timeout)
+
+@pytest.fixture(scope='function')
+def fakeif():
+    return FakeDAPInterface()
+
+@pytest.fixture(scope='function')
+def link(fakeif):
+    daplink = DAPAccessCMSISDAP(None, interface=fakeif)
+    daplink.open()
+    daplink.set_deferred_transfer(True)
+    yield daplink
+    daplink.close()
+
+class TestPipeline:
+    def test_read_write_reg(self, link):
+        link.write_reg(REG.DP_0x8, 0x12345678)
+        assert link.read_reg(REG.DP_0x8) == 0x12345678
+
+    def test_block_read_order(self, link):
+        # 200 words spans multiple packets, all of which are queued before waiting.
+        result = link.reg_read_repeat(200, REG.AP_0xC)
+        assert result == list(range(1, 201))
+
+    def test_deferred_reads(self, link, fakeif):
+        callbacks = [link.read_reg(REG.AP_0xC, now=False) for _ in range(100)]
+        assert [cb() for cb in callbacks] == list(range(1, 101))
+        assert fakeif.max_outstanding <= fakeif.packet_count
+
+    def test_block_write(self, link, fakeif):
+        link.reg_write_repeat(100, REG.AP_0xC, list(range(100)))
+        link.flush()
+        # Key is the APnDP and A[3:2] bits of the request.
+        assert fakeif.regs[0x0d] == 99
+
+    def test_fault(self, link, fakeif):
+        fakeif.fault_on_command = fakeif.transfer_commands + 2
+        # The error is raised by whichever call first waits on the failed packet.
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            cb = link.reg_read_repeat(200, REG.AP_0xC, now=False)
+            cb()
+        # The link recovers for following transfers.
+        link.write_reg(REG.DP_0x8, 0xaa)
+        assert link.read_reg(REG.DP_0x8) == 0xaa
+
+    def test_send_while_draining_fault(self):
+        fakeif = DrainGatedInterface()
+        link = DAPAccessCMSISDAP(None, interface=fakeif)
+        link.open()
+        try:
+            link.set_deferred_transfer(True)
+            # Keep several packets in flight.
+            link._window = fakeif.packet_count
+            link._update_timing = lambda cmd: None
+            fakeif.fault_on_command = fakeif.transfer_commands + 1
+            # Two packets in flight, the first of which faults.
+            cb = link.reg_read_repeat(20, REG.AP_0xC, now=False)
+            link._send_packet()
+            start = time()
+            while not fakeif._faulted:
+                assert time() - start < 5
+                sleep(0.01)
+            # Send while the completion thread discards the response of the second packet.
+            timer = threading.Timer(0.2, fakeif.gate.set)
+            timer.start()
+            link.write_reg(REG.DP_0x8, 0x55)
+            with pytest.raises(DAPAccessIntf.TransferFaultError):
+                link._send_packet()
+            timer.join()
+            with pytest.raises(DAPAccessIntf.TransferFaultError):
+                cb()
+            # No response was left behind to be matched with a later command.
+            link.write_reg(REG.DP_0x8, 0xaa)
+            assert link.read_reg(REG.DP_0x8) == 0xaa
+            assert not fakeif._responses
+        finally:
+            link.close()
+
+    def test_direct_command_while_in_flight(self):
+        fakeif = GatedInterface()
+        fakeif.gate.set()
+        link = DAPAccessCMSISDAP(None, interface=fakeif)
+        link.open()
+        try:
+            link.set_deferred_transfer(True)
+            fakeif.gate.clear()
+            cb = link.reg_read_repeat(20, REG.AP_0xC, now=False)
+            link._send_packet()
+            timer = threading.Timer(0.1, fakeif.gate.set)
+            timer.start()
+            # The command waits for the transfers, so neither takes the other's response.
+            assert link.identify(DAPAccessIntf.ID.MAX_PACKET_SIZE) == fakeif.packet_size
+            timer.join()
+            assert not fakeif.interleaved
+            assert cb() == list(range(1, 21))
+        finally:
+            link.close()
+
+    def test_statistics(self, link):
+        stats = link.get_transfer_statistics()
+        stats.reset()
+        link.reg_read_repeat(64, REG.AP_0xC)
+        link.reg_write_repeat(16, REG.AP_0xC, [0] * 16)
+        link.flush()
+        assert stats.read_bytes == 256
+        assert stats.write_bytes == 64
+        assert stats.packets_sent == stats.packets_received
+        assert 1 <= stats.window <= 4
+
+class TestCommandCodec:
+    def test_mixed_transfer_encode(self):
+        cmd = _Command(64)
+        cmd.add(1, WRITE | DP_ACC | 0x8, struct.pack("<I", 0x11223344), 0)
+        cmd.add(2, READ | AP_ACC | 0xc, None, 0)
+        data = cmd.encode_data()
+        assert data[:10] == bytearray([Command.DAP_TRANSFER, 0, 3,
+                                        0x08, 0x44, 0x33, 0x22, 0x11,
+                                        0x0f, 0x0f])
+        response = bytearray([Command.DAP_TRANSFER, 3, DAPTransferResponse.ACK_OK]) \
+                    + struct.pack("<II", 1, 2)
+        assert cmd.decode_data(response).tobytes() == struct.pack("<II", 1, 2)
+
+    def test_block_encode_reuses_buffer(self):
+        cmd = _Command(64)
+        cmd.add(2, WRITE | AP_ACC | 0xc, struct.pack("<II", 5, 6), 0)
+        data = cmd.encode_data()
+        assert data[:13] == bytearray([Command.DAP_TRANSFER_BLOCK, 0, 2, 0, 0x0d]) \
+                            + struct.pack("<II", 5, 6)
+        cmd.reset()
+        cmd.add(3, READ | AP_ACC | 0xc, None, 0)
+        assert cmd.encode_data() is data
+        assert data[:5] == bytearray([Command.DAP_TRANSFER_BLOCK, 0, 3, 0, 0x0f])
+
+    def test_transfer_response_split(self):
+        transfer = _Transfer(None, 0, 3, READ | AP_ACC | 0xc, None, raw=True)
+        first = memoryview(struct.pack("<II", 0xaa, 0xbb))
+        assert transfer.add_response_data(first, 0) == 8
+        assert not transfer.is_complete
+        second = memoryview(struct.pack("<II", 0xcc, 0xdd))
+        assert transfer.add_response_data(second, 0) == 4
+        assert transfer.is_complete
+        assert transfer.get_result() == bytearray(struct.pack("<III", 0xaa, 0xbb, 0xcc))
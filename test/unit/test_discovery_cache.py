@@ -0,0 +1,103 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pytest
+
+from pyocd.coresight.ap import MEM_AP
+from pyocd.coresight.rom_table import CIDR0_OFFSET
+
+@pytest.fixture(scope='function')
+def block_reads(monkeypatch):
+    counter = {'reads': 0}
+    read_memory_block32 = MEM_AP._read_memory_block32
+
+    def counting_read_memory_block32(self, addr, size):
+        counter['reads'] += 1
+        return read_memory_block32(self, addr, size)
+
+    monkeypatch.setattr(MEM_AP, '_read_memory_block32', counting_read_memory_block32)
+    return counter
+
+@pytest.fixture(scope='function')
+def connect(make_simulated_session, simtarget):
+    def connect(cache_dir, enable=True):
+        """! @brief Open a session and return the discovered components and core type."""
+        options = {'discovery_cache': enable, 'discovery_cache.dir': cache_dir}
+        with make_simulated_session(simtarget, options=options) as session:
+            target = session.target
+            names = []
+            for ap in target.dp.aps.values():
+                if ap.has_rom_table:
+                    ap.rom_table.for_each(lambda c: names.append((c.address, c.name)))
+            return names, target.selected_core.core_type, session.probe.unique_id
+    return connect
+
+def cache_path(cache_dir, unique_id):
+    return os.path.join(cache_dir, unique_id + ".json")
+
+class TestDiscoveryCache:
+    def test_rebuild_from_cache(self, connect, tmpdir, block_reads):
+        cache_dir = str(tmpdir)
+        result = connect(cache_dir)
+        uncached_reads = block_reads['reads']
+        assert os.path.exists(cache_path(cache_dir, result[2]))
+
+        block_reads['reads'] = 0
+        assert connect(cache_dir) == result
+        # Only the CIDR used to validate the cache is read.
+        assert block_reads['reads'] == 1
+        assert uncached_reads > 1
+
+    def test_invalid_cidr(self, connect, tmpdir, block_reads):
+        cache_dir = str(tmpdir)
+        result = connect(cache_dir)
+        uncached_reads = block_reads['reads']
+
+        # Corrupt the cached CIDR of the ROM table.
+        path = cache_path(cache_dir, result[2])
+        with open(path) as f:
+            contents = json.load(f)
+        for name, value in contents['values'].items():
+            if isinstance(value, list) and len(value) > CIDR0_OFFSET:
+                value[CIDR0_OFFSET] = 0
+        with open(path, 'w') as f:
+            json.dump(contents, f)
+
+        block_reads['reads'] = 0
+        assert connect(cache_dir) == result
+        assert block_reads['reads'] == uncached_reads + 1
+
+    def test_key_mismatch(self, connect, tmpdir, block_reads):
+        cache_dir = str(tmpdir)
+        result = connect(cache_dir)
+        uncached_reads = block_reads['reads']
+
+        path = cache_path(cache_dir, result[2])
+        with open(path) as f:
+            contents = json.load(f)
+        contents['key'] = "dp=00000000"
+        with open(path, 'w') as f:
+            json.dump(contents, f)
+
+        block_reads['reads'] = 0
+        assert connect(cache_dir) == result
+        assert block_reads['reads'] == uncached_reads
+
+    def test_disabled(self, connect, tmpdir):
+        connect(str(tmpdir), enable=False)
+        assert tmpdir.listdir() == []
@@ -0,0 +1,120 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import pytest
+
+from pyocd.core.memory_map import FlashRegion
+from pyocd.flash.crc_cache import FlashCRCCache
+from pyocd.flash.flash_builder import FlashBuilder
+from .mockflash import (FLASH_SIZE, SECTOR_SIZE, MockFlash, MockSession, MockTarget, image, program)
+
+@pytest.fixture(scope='function')
+def region():
+    return FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE, name='flash')
+
+@pytest.fixture(scope='function')
+def flash(tmpdir, region):
+    return MockFlash(MockTarget(MockSession(str(tmpdir))), region)
+
+class TestFlashCRCCache:
+    def test_round_trip(self, tmpdir, region):
+        path = str(tmpdir.join("probe.json"))
+        cache = FlashCRCCache(path, region)
+        assert cache.get(0, 0x400) is None
+        cache.update([(0, 0x400, 0x1234), (0x400, 0x400, 0x5678)])
+        cache = FlashCRCCache(path, region)
+        assert cache.get(0x400, 0x400) == 0x5678
+        # An entry with a different page size doesn't match.
+        assert cache.get(0, 0x200) is None
+
+    def test_regions_are_separate(self, tmpdir, region):
+        path = str(tmpdir.join("probe.json"))
+        other = FlashRegion(start=0x10000000, length=0x1000, blocksize=0x400, name='other')
+        FlashCRCCache(path, region).update([(0, 0x400, 1)])
+        FlashCRCCache(path, other).update([(0x10000000, 0x400, 2)])
+        assert FlashCRCCache(path, region).get(0, 0x400) == 1
+        assert FlashCRCCache(path, other).get(0x10000000, 0x400) == 2
+
+    def test_erased_ranges(self, tmpdir, region):
+        path = str(tmpdir.join("probe.json"))
+        cache = FlashCRCCache(path, region)
+        cache.update([(0, 0x400, 1), (0x400, 0x400, 2), (0x800, 0x400, 3)])
+        cache.update([(0x400, 0x400, 4)], erased_ranges=[(0, 0x800)])
+        cache = FlashCRCCache(path, region)
+        assert [cache.get(a, 0x400) for a in (0, 0x400, 0x800)] == [None, 4, 3]
+
+    def test_invalidate(self, tmpdir, region):
+        path = str(tmpdir.join("probe.json"))
+        cache = FlashCRCCache(path, region)
+        cache.update([(0, 0x400, 1)])
+        cache.invalidate()
+        assert FlashCRCCache(path, region).get(0, 0x400) is None
+        # Unmodified pages are kept in memory and saved by the next update.
+        cache.update([(0x400, 0x400, 2)])
+        assert FlashCRCCache(path, region).get(0, 0x400) == 1
+
+    def test_invalid_file(self, tmpdir, region):
+        path = tmpdir.join("probe.json")
+        path.write("{not json")
+        assert FlashCRCCache(str(path), region).get(0, 0x400) is None
+        path.write(json.dumps({'version': 0, 'regions': {}}))
+        assert FlashCRCCache(str(path), region).get(0, 0x400) is None
+
+    def test_disabled(self, flash):
+        flash.target.session.options['flash_crc_cache'] = False
+        assert FlashCRCCache.for_flash(flash) is None
+
+    def test_file_name(self, flash, tmpdir):
+        assert FlashCRCCache.for_flash(flash).path == os.path.join(str(tmpdir), "0240_0000_abc.json")
+
+class TestFlashBuilderCRCCache:
+    def test_skip_unchanged(self, flash):
+        program(flash, image())
+        assert len(flash.programmed) == FLASH_SIZE // SECTOR_SIZE
+        flash.programmed = []
+        flash.crc_requests = []
+        perf = program(flash, image())
+        assert flash.programmed == []
+        # Only the sampled pages were CRCed on the target.
+        assert flash.crc_requests == [4]
+        assert perf.analyze_type == FlashBuilder.FLASH_ANALYSIS_CRC_CACHE
+
+    def test_changed_page(self, flash):
+        program(flash, image())
+        flash.programmed = []
+        data = image()
+        data[0x1804] ^= 0xff
+        program(flash, data)
+        assert flash.programmed == [0x1800]
+        assert flash.memory == data
+
+    def test_modified_flash(self, flash):
+        program(flash, image())
+        flash.programmed = []
+        # Change flash behind the cache's back. The first matching page is always sampled.
+        flash.memory[0x10] ^= 0xff
+        program(flash, image())
+        assert flash.programmed == [0]
+        assert flash.memory == image()
+
+    def test_partial_image(self, flash):
+        program(flash, image())
+        flash.programmed = []
+        program(flash, image(1)[0x800:0xc00], addr=0x800)
+        program(flash, image())
+        assert flash.programmed == [0x800, 0x800]
@@ -0,0 +1,85 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import pytest
+
+from pyocd.core.memory_map import FlashRegion
+from pyocd.flash.flash_builder import FlashBuilder
+from pyocd.flash.loader import FileProgrammer
+from .mockflash import (FLASH_SIZE, SECTOR_SIZE, MockFlash, MockSession, MockTarget, image, program)
+
+@pytest.fixture(scope='function')
+def flash():
+    region = FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE, name='flash')
+    flash = MockFlash(MockTarget(MockSession()), region)
+    program(flash, image())
+    flash.programmed = []
+    flash.crc_requests = []
+    return flash
+
+def patched_image(*addresses):
+    data = image()
+    for addr in addresses:
+        data[addr] ^= 0xff
+    return data
+
+class TestFlashBuilderDelta:
+    def test_changed_pages(self, flash):
+        data = patched_image(0x404, 0x2fff)
+        perf = program(flash, data, previous=[(0, image())])
+        assert flash.programmed == [0x400, 0x2c00]
+        assert flash.memory == data
+        # All unchanged pages are verified in one CRC run.
+        assert flash.crc_requests == [FLASH_SIZE // SECTOR_SIZE - 2]
+        assert perf.analyze_type == FlashBuilder.FLASH_ANALYSIS_DELTA
+
+    def test_stale_previous_image(self, flash):
+        # Flash doesn't hold the previous image, so the verify catches the difference.
+        flash.memory[0x1000] ^= 0xff
+        program(flash, image(), previous=[(0, image())])
+        assert flash.programmed == [0x1000]
+        assert flash.memory == image()
+
+    def test_split_previous_image(self, flash):
+        # The previous image is split into chunks at different points than the new one.
+        data = patched_image(0x3000)
+        previous = image()
+        program(flash, data, previous=[(0, previous[:0x123]), (0x123, previous[0x123:])])
+        assert flash.programmed == [0x3000]
+
+    def test_different_coverage(self, flash):
+        # A page written only partly by the previous image is treated as changed.
+        program(flash, image(), previous=[(0, image()[:0x3f00])])
+        assert flash.programmed == [0x3c00]
+
+    def test_without_smart_flash(self, flash):
+        builder = FlashBuilder(flash)
+        builder.log_performance = False
+        builder.add_data(0, list(image()))
+        builder.add_previous_data(0, list(image()))
+        builder.program(chip_erase="sector", smart_flash=False)
+        assert len(flash.programmed) == FLASH_SIZE // SECTOR_SIZE
+
+class TestFileProgrammerDelta:
+    def test_bin(self, flash):
+        data = patched_image(0x1234)
+        programmer = FileProgrammer(flash.target.session, progress=lambda x: None,
+                                    chip_erase="sector", smart_flash=True)
+        programmer.program(io.BytesIO(bytes(data)), file_format='bin', base_address=0,
+                            previous=io.BytesIO(bytes(image())))
+        assert flash.programmed == [0x1000]
+        assert flash.memory == data
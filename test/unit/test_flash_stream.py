@@ -0,0 +1,273 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import threading
+import pytest
+import six
+
+from pyocd.core.exceptions import FlashProgramFailure
+from pyocd.core.memory_map import (FlashRegion, MemoryMap)
+from pyocd.flash.loader import (BackgroundFlashLoader, FileProgrammer, FlashLoader,
+                                StreamingFlashLoader,
+                                iter_file_chunks, iter_hex_data, iter_hex_records)
+from .mockflash import (FLASH_SIZE, SECTOR_SIZE, MockFlash, MockSession, MockTarget, image)
+
+@pytest.fixture(scope='function')
+def flash():
+    region = FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE, name='flash')
+    return MockFlash(MockTarget(MockSession()), region)
+
+@pytest.fixture(scope='function')
+def split_flash(flash):
+    """! @brief The mock flash with its memory map split into two regions."""
+    first = FlashRegion(start=0, length=FLASH_SIZE // 2, blocksize=SECTOR_SIZE, name='first')
+    second = FlashRegion(start=FLASH_SIZE // 2, length=FLASH_SIZE // 2, blocksize=SECTOR_SIZE,
+                            name='second')
+    first.flash = second.flash = flash
+    flash.target.memory_map = MemoryMap(first, second)
+    return flash
+
+def hex_record(record_type, addr, data):
+    record = bytearray([len(data), (addr >> 8) & 0xff, addr & 0xff, record_type]) + data
+    record.append(-sum(record) & 0xff)
+    return ":" + "".join("%02X" % b for b in record)
+
+def make_hex(chunks):
+    """! @brief Return the text of a hex file with the chunks in the given order."""
+    lines = []
+    upper = None
+    for addr, data in chunks:
+        data = bytearray(data)
+        for offset in range(0, len(data), 16):
+            record_addr = addr + offset
+            if (record_addr >> 16) != upper:
+                upper = record_addr >> 16
+                lines.append(hex_record(0x04, 0, bytearray([upper >> 8, upper & 0xff])))
+            lines.append(hex_record(0x00, record_addr & 0xffff, data[offset:offset + 16]))
+    lines.append(hex_record(0x01, 0, bytearray()))
+    return "\n".join(lines) + "\n"
+
+class TestFileReaders:
+    def test_file_chunks(self, tmpdir):
+        data = bytes(bytearray(range(256)) * 1024)
+        path = tmpdir.join("image.bin")
+        path.write_binary(data)
+        with open(str(path), 'rb') as f:
+            chunks = list(iter_file_chunks(f, 0x100, 0x50000))
+        assert [len(c) for c in chunks] == [0x10000] * 3 + [0x10000 - 0x100]
+        assert b"".join(bytes(c) for c in chunks) == data[0x100:]
+        assert list(iter_file_chunks(io.BytesIO(data), 0x10, 0x20)) == [bytearray(data[0x10:0x30])]
+
+    def test_hex_records(self):
+        text = make_hex([(0x12340, bytearray(range(20)))])
+        records = list(iter_hex_records(io.StringIO(six.u(text))))
+        assert records == [(0x12340, bytearray(range(16))), (0x12350, bytearray(range(16, 20)))]
+        assert list(iter_hex_data(io.StringIO(six.u(text)))) == [(0x12340, bytearray(range(20)))]
+
+    def test_hex_bad_checksum(self):
+        with pytest.raises(ValueError):
+            list(iter_hex_records(io.StringIO(six.u(":0100000001FF\n"))))
+
+class TestStreamingFlashLoader:
+    def test_batches(self, flash):
+        progress = []
+        loader = StreamingFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800,
+                                        progress=progress.append, smart_flash=False)
+        data = image()
+        for offset in range(0, FLASH_SIZE, 0x300):
+            loader.add_data(offset, data[offset:offset + 0x300])
+            # The sector with the end of the data is never programmed early.
+            assert all(addr < (offset + 0x300) - ((offset + 0x300) % SECTOR_SIZE)
+                        for addr in flash.programmed)
+        loader.commit()
+        assert flash.memory == data
+        assert sorted(flash.programmed) == list(range(0, FLASH_SIZE, SECTOR_SIZE))
+        assert flash.cleanup_count == 1
+        assert flash.target.reset_count == 1
+        assert progress == sorted(progress)
+        assert progress[-1] == pytest.approx(1.0)
+
+    def test_out_of_order(self, flash):
+        loader = StreamingFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800)
+        loader.add_data(0, image()[:0xa00])
+        assert flash.programmed == [0, 0x400]
+        # The sector at 0x800 is still pending and can receive data.
+        loader.add_data(0xb00, image()[0xb00:0xc00])
+        loader.add_data(0xa00, image()[0xa00:0xb00])
+        with pytest.raises(ValueError):
+            loader.add_data(0x700, [0])
+        with pytest.raises(ValueError):
+            loader.add_data(0xaff, [0, 0])
+        loader.commit()
+        assert flash.memory[:0xc00] == image()[:0xc00]
+
+    def test_return_to_region(self, split_flash):
+        flash = split_flash
+        loader = StreamingFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800)
+        loader.add_data(0, image()[:0x900])
+        loader.add_data(0x2000, image()[0x2000:0x2100])
+        # The sectors of the first region were programmed when the data moved to the second.
+        with pytest.raises(ValueError):
+            loader.add_data(0xa00, [0])
+        loader.add_data(0x1000, image()[0x1000:0x1100])
+        loader.commit()
+        assert flash.programmed == [0, 0x400, 0x800, 0x2000, 0x1000]
+
+    def test_previous_data(self, flash):
+        loader = StreamingFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800,
+                                        smart_flash=True)
+        loader.add_data(0, image())
+        loader.commit()
+        flash.programmed = []
+        data = image()
+        data[0x404] ^= 0xff
+        data[0x2fff] ^= 0xff
+        loader.add_previous_data(0, image())
+        for offset in range(0, FLASH_SIZE, 0x300):
+            loader.add_data(offset, data[offset:offset + 0x300])
+        loader.commit()
+        assert flash.programmed == [0x400, 0x2c00]
+        assert flash.memory == data
+
+    def test_previous_data_after_programming(self, flash):
+        loader = StreamingFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800)
+        loader.add_data(0, image()[:0x900])
+        with pytest.raises(ValueError):
+            loader.add_previous_data(0x700, image()[0x700:0x800])
+        # Previous data for sectors still pending is accepted.
+        loader.add_previous_data(0x800, image()[0x800:0x1000])
+        loader.commit()
+
+class GatedFlash(MockFlash):
+    """! @brief Mock flash that records the programming thread and can block or fail."""
+    def __init__(self, target, region):
+        super(GatedFlash, self).__init__(target, region)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.fail_addr = None
+        self.threads = set()
+
+    def program_page(self, addr, data):
+        self.entered.set()
+        self.gate.wait()
+        self.threads.add(threading.current_thread())
+        if addr == self.fail_addr:
+            raise FlashProgramFailure("program failed", address=addr)
+        super(GatedFlash, self).program_page(addr, data)
+
+@pytest.fixture(scope='function')
+def gated_flash():
+    region = FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE, name='flash')
+    return GatedFlash(MockTarget(MockSession()), region)
+
+class TestBackgroundFlashLoader:
+    def test_background(self, gated_flash):
+        flash = gated_flash
+        progress = []
+        loader = BackgroundFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800,
+                                        progress=progress.append, smart_flash=True)
+        data = image()
+        # Adding data doesn't wait for programming.
+        flash.gate.clear()
+        for offset in range(0, 0x1800, 0x200):
+            loader.add_data(offset, data[offset:offset + 0x200])
+        assert flash.programmed == []
+        flash.gate.set()
+        for offset in range(0x1800, FLASH_SIZE, 0x200):
+            loader.add_data(offset, data[offset:offset + 0x200])
+        loader.commit()
+        assert flash.memory == data
+        assert sorted(flash.programmed) == list(range(0, FLASH_SIZE, SECTOR_SIZE))
+        assert threading.current_thread() not in flash.threads
+        assert flash.cleanup_count == 1
+        assert flash.target.reset_count == 1
+        assert progress == sorted(progress)
+        assert progress[-1] == pytest.approx(1.0)
+
+        # Unchanged sectors are skipped by smart flash.
+        flash.programmed = []
+        loader.add_data(0, data[:0x1000])
+        loader.commit()
+        assert flash.programmed == []
+
+    def test_error(self, gated_flash):
+        flash = gated_flash
+        flash.fail_addr = 0x400
+        loader = BackgroundFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800)
+        data = image()
+        with pytest.raises(FlashProgramFailure):
+            for offset in range(0, FLASH_SIZE, 0x200):
+                loader.add_data(offset, data[offset:offset + 0x200])
+            loader.commit()
+        assert 0x800 not in flash.programmed
+        assert flash.cleanup_count == 1
+
+        # The loader was reset and can be used again.
+        flash.fail_addr = None
+        loader.add_data(0, data[:0x800])
+        loader.commit()
+        assert flash.memory[:0x800] == data[:0x800]
+
+    def test_abort(self, gated_flash):
+        flash = gated_flash
+        loader = BackgroundFlashLoader(flash.target.session, FLASH_SIZE, batch_size=0x800)
+        flash.gate.clear()
+        loader.add_data(0, image()[:0x1e00])
+        flash.entered.wait(5)
+        flash.gate.set()
+        loader.abort()
+        # The batch being programmed completed, and the flash algo was cleaned up.
+        assert flash.memory[:0x1c00] == image()[:0x1c00]
+        assert all(addr < 0x1c00 for addr in flash.programmed)
+        assert flash.cleanup_count == 1
+        loader.commit()
+        assert flash.memory[0x1c00:] == bytearray([0xff]) * (FLASH_SIZE - 0x1c00)
+
+class TestFileProgrammerStream:
+    def programmer(self, flash, chip_erase="sector"):
+        return FileProgrammer(flash.target.session, progress=lambda x: None, chip_erase=chip_erase,
+                                smart_flash=True)
+
+    def test_bin_file(self, flash, tmpdir):
+        path = tmpdir.join("image.bin")
+        path.write_binary(b"hdr" + bytes(image()))
+        programmer = self.programmer(flash)
+        programmer.program(str(path), base_address=0, skip=3)
+        assert isinstance(programmer._loader, StreamingFlashLoader)
+        assert flash.memory == image()
+
+    def test_chip_erase_not_streamed(self, flash):
+        programmer = self.programmer(flash, chip_erase="chip")
+        programmer.program(io.BytesIO(bytes(image())), file_format='bin', base_address=0)
+        assert not isinstance(programmer._loader, StreamingFlashLoader)
+        assert flash.memory == image()
+
+    def test_hex(self, flash):
+        data = image()
+        programmer = self.programmer(flash)
+        programmer.program(io.StringIO(six.u(make_hex([(0, data)]))), file_format='hex')
+        assert isinstance(programmer._loader, StreamingFlashLoader)
+        assert flash.memory == data
+
+    def test_unordered_hex(self, flash):
+        data = image()
+        text = make_hex([(0x2000, data[0x2000:]), (0, data[:0x2000])])
+        programmer = self.programmer(flash)
+        programmer.program(io.StringIO(six.u(text)), file_format='hex')
+        assert type(programmer._loader) is FlashLoader
+        assert flash.memory == data
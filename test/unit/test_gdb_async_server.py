@@ -0,0 +1,182 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+from time import (sleep, time)
+import pytest
+import six
+
+from pyocd.core.target import Target
+from pyocd.gdbserver.framing import PacketFramer
+from pyocd.gdbserver.gdbserver import checksum
+
+pytestmark = pytest.mark.skipif(six.PY2, reason="asyncio requires Python 3")
+
+def make_packet(data):
+    return b'$' + data + b'#' + checksum(data)
+
+@pytest.fixture(scope='function')
+def make_session(make_simulated_session):
+    def make_session():
+        return make_simulated_session(gdbserver_port=0, semihost_console_type='console')
+    return make_session
+
+class GDBClient(object):
+    """! @brief Minimal gdb side of a connection."""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('localhost', port), timeout=5)
+        self.framer = PacketFramer()
+        self.items = []
+
+    def next_item(self):
+        while not self.items:
+            data = self.sock.recv(4096)
+            if not data:
+                return None
+            self.framer.feed(data)
+            self.items.extend(self.framer)
+        return self.items.pop(0)
+
+    def command(self, data):
+        """! @brief Send a packet and return the reply, after checking and acking them."""
+        self.sock.sendall(make_packet(data))
+        assert self.next_item() == (PacketFramer.ACK, None)
+        return self.reply()
+
+    def reply(self):
+        kind, packet = self.next_item()
+        assert kind == PacketFramer.PACKET
+        self.sock.sendall(b'+')
+        return packet[1:-3]
+
+    def close(self):
+        self.sock.close()
+
+@pytest.fixture(scope='function')
+def server(make_session):
+    # The server is stopped before the sessions are closed, since it depends on make_session.
+    from pyocd.gdbserver.async_server import AsyncGDBServer
+    server = AsyncGDBServer()
+    thread = []
+
+    def start(*new_sessions):
+        for session in new_sessions:
+            session.open()
+            server.add_session(session)
+        thread.append(threading.Thread(target=server.run))
+        thread[0].daemon = True
+        thread[0].start()
+        return [s.port for s in server.servers]
+
+    server.start = start
+    server.thread = thread
+    yield server
+    if thread:
+        server.stop()
+        thread[0].join(5)
+    server.close()
+
+class TestAsyncGDBServer:
+    def test_interrupt_and_detach(self, server, make_session):
+        port, = server.start(make_session())
+        gdb = GDBClient(port)
+        try:
+            assert gdb.command(b'?').startswith(b'T')
+            gdb.sock.sendall(make_packet(b'c'))
+            assert gdb.next_item() == (PacketFramer.ACK, None)
+            gdb.sock.sendall(b'\x03')
+            assert gdb.reply().startswith(b'T02')
+            assert gdb.command(b'D') == b'OK'
+            # The server closes the connection, possibly before reading the last ack.
+            try:
+                assert gdb.next_item() is None
+            except ConnectionResetError:
+                pass
+        finally:
+            gdb.close()
+        # The server stops when gdb has detached from every core.
+        server.thread[0].join(5)
+        assert not server.thread[0].is_alive()
+
+    def test_stop_reply_on_halt(self, server, make_session):
+        session = make_session()
+        port, = server.start(session)
+        gdb = GDBClient(port)
+        try:
+            core = session.target.selected_core
+            gdb.sock.sendall(make_packet(b'c'))
+            assert gdb.next_item() == (PacketFramer.ACK, None)
+            # Wait for the worker to resume the core.
+            start = time()
+            while core.get_state() != Target.TARGET_RUNNING:
+                assert time() - start < 5
+                sleep(0.01)
+            # The stop reply is sent without gdb asking.
+            core.halt()
+            assert gdb.reply().startswith(b'T')
+        finally:
+            gdb.close()
+
+    def test_no_ack_mode(self, server, make_session):
+        port, = server.start(make_session())
+        gdb = GDBClient(port)
+        try:
+            assert gdb.command(b'QStartNoAckMode') == b'OK'
+            gdb.sock.sendall(make_packet(b'?'))
+            assert gdb.reply().startswith(b'T')
+        finally:
+            gdb.close()
+
+    def test_many_sessions(self, server, make_session):
+        ports = server.start(make_session(), make_session(), make_session())
+        assert len(set(ports)) == 3
+        clients = [GDBClient(port) for port in ports]
+        try:
+            for gdb in clients:
+                assert gdb.command(b'?').startswith(b'T')
+        finally:
+            for gdb in clients:
+                gdb.close()
+
+    def test_second_connection_rejected(self, server, make_session):
+        port, = server.start(make_session())
+        gdb = GDBClient(port)
+        try:
+            assert gdb.command(b'?').startswith(b'T')
+            other = GDBClient(port)
+            try:
+                assert other.sock.recv(100) == b''
+            finally:
+                other.close()
+            assert gdb.command(b'?').startswith(b'T')
+        finally:
+            gdb.close()
+
+    def test_memory_write_clears_faults(self, server, make_session):
+        session = make_session()
+        port, = server.start(session)
+        gdb = GDBClient(port)
+        try:
+            # The first word past the end of the simulated target's RAM faults.
+            assert gdb.command(b'm20020000,10') == b'E01'
+            fault_map = session.get_memory_faults(session.target.selected_core)
+            assert list(fault_map) == [(0x20020000, 0x20020010)]
+            assert gdb.command(b'M20000000,4:01020304') == b'OK'
+            assert len(fault_map) == 0
+        finally:
+            gdb.close()
@@ -0,0 +1,103 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core.memory_map import FlashRegion
+from pyocd.gdbserver.crc import (MIN_ANALYZER_BLOCK_SIZE, check_flash_contents, gdb_crc32,
+                                split_for_analyzer)
+from .mockflash import (FLASH_SIZE, SECTOR_SIZE, MockFlash, MockSession, MockTarget, image)
+
+def reference_crc(data, crc=0xFFFFFFFF):
+    """! @brief Bitwise version of gdb's xcrc32()."""
+    for b in bytearray(data):
+        crc ^= b << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if (crc & 0x80000000) else (crc << 1)
+            crc &= 0xFFFFFFFF
+    return crc
+
+class CRCTarget(MockTarget):
+    """! @brief Mock target with the memory and register accesses used to run the analyzer."""
+    def __init__(self, session):
+        super(CRCTarget, self).__init__(session)
+        self.registers = {}
+        self.block_reads = []
+
+    def read_memory_block8(self, addr, size):
+        self.block_reads.append((addr, size))
+        return list(self.flash.memory[addr:addr + size])
+
+    def read_core_registers_raw(self, reg_list):
+        return [self.registers.get(r, 0) for r in reg_list]
+
+    def write_core_registers_raw(self, reg_list, data_list):
+        self.registers.update(zip(reg_list, data_list))
+
+@pytest.fixture(scope='function')
+def flash():
+    region = FlashRegion(start=0, length=FLASH_SIZE, blocksize=SECTOR_SIZE, name='flash')
+    flash = MockFlash(CRCTarget(MockSession()), region)
+    flash.memory[:] = image()
+    return flash
+
+class TestGdbCRC:
+    def test_crc(self):
+        assert gdb_crc32(b"123456789") == 0x0376E6E7
+        data = bytes(image())
+        assert gdb_crc32(data) == reference_crc(data)
+        assert gdb_crc32(data[100:], gdb_crc32(data[:100])) == reference_crc(data)
+        assert gdb_crc32(b"") == 0xFFFFFFFF
+
+    @pytest.mark.parametrize(("start", "end"), [
+        (0, 0x4000),
+        (0x123, 0x3456),
+        (0x08000010, 0x08012345),
+        (0x20000000, 0x20000080),
+        ])
+    def test_split(self, start, end):
+        blocks, host_ranges = split_for_analyzer(start, end)
+        pieces = sorted(blocks + host_ranges)
+        assert pieces[0][0] == start
+        assert sum(pieces[-1]) == end
+        assert all(sum(a) == b[0] for a, b in zip(pieces, pieces[1:]))
+        for addr, size in blocks:
+            assert (size & (size - 1)) == 0
+            assert size >= MIN_ANALYZER_BLOCK_SIZE
+            assert (addr % size) == 0
+            assert (addr // size) <= 0xFFFF
+
+class TestCheckFlashContents:
+    def test_match(self, flash):
+        flash.target.registers['pc'] = 0x1234
+        assert check_flash_contents(flash, 0x10, image()[0x10:0x3f00])
+        # Only the unaligned ends are read.
+        assert sum(size for _, size in flash.target.block_reads) < 2 * MIN_ANALYZER_BLOCK_SIZE
+        assert flash.crc_requests
+        assert flash.cleanup_count == 1
+        assert flash.target.registers['pc'] == 0x1234
+
+    def test_mismatch(self, flash):
+        expected = image()
+        flash.memory[0x2000] ^= 1
+        assert not check_flash_contents(flash, 0, expected)
+        assert check_flash_contents(flash, 0, expected[:0x2000])
+
+    def test_mismatch_at_end(self, flash):
+        expected = image()[:0x1010]
+        flash.memory[0x100f] ^= 1
+        assert not check_flash_contents(flash, 0, expected)
+        assert flash.crc_requests == []
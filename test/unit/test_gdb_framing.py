@@ -0,0 +1,154 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import pytest
+
+from pyocd.gdbserver.framing import PacketFramer
+from pyocd.gdbserver.gdbserver import (ConnectionClosedException, GDBServerPacketIOThread,
+    checksum, escape, unescape)
+
+def make_packet(data):
+    return b'$' + data + b'#' + checksum(data)
+
+def frame(chunks):
+    framer = PacketFramer()
+    items = []
+    for chunk in chunks:
+        framer.feed(chunk)
+        items.extend(framer)
+    return framer, items
+
+class SocketPairAdapter(object):
+    """! @brief Abstract socket for GDBServerPacketIOThread backed by one end of a socket pair."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.port = 0
+
+    def read(self):
+        return self.sock.recv(2048)
+
+    def write(self, data):
+        return self.sock.send(data)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+class TestPacketFramer:
+    def test_packets(self):
+        stream = make_packet(b"qSupported") + b"+" + make_packet(b"g")
+        _, items = frame([stream])
+        assert items == [
+            (PacketFramer.PACKET, make_packet(b"qSupported")),
+            (PacketFramer.ACK, None),
+            (PacketFramer.PACKET, make_packet(b"g")),
+            ]
+
+    def test_split_at_every_byte(self):
+        stream = b"-" + make_packet(b"m20000000,4") + b"\x03junk" + make_packet(b"c")
+        _, expected = frame([stream])
+        assert expected == [
+            (PacketFramer.NACK, None),
+            (PacketFramer.PACKET, make_packet(b"m20000000,4")),
+            (PacketFramer.INTERRUPT, None),
+            (PacketFramer.PACKET, make_packet(b"c")),
+            ]
+        framer, items = frame([stream[i:i + 1] for i in range(len(stream))])
+        assert items == expected
+        assert framer.buffered_count == 0
+
+    def test_incomplete_checksum(self):
+        framer, items = frame([b"$g#6"])
+        assert items == []
+        assert framer.buffered_count == 4
+        framer.feed(b"7")
+        assert list(framer) == [(PacketFramer.PACKET, b"$g#67")]
+
+    def test_large_packet(self):
+        # Escaped binary data never contains '#' or '$'.
+        data = b"vFlashWrite:0:" + bytes(bytearray(i % 0x23 for i in range(200000)))
+        packet = make_packet(data)
+        framer, items = frame([packet[i:i + 1000] for i in range(0, len(packet), 1000)] * 2)
+        assert items == [(PacketFramer.PACKET, packet)] * 2
+        assert framer.buffered_count == 0
+
+    def test_compaction(self):
+        framer = PacketFramer()
+        packet = make_packet(b"x" * 1000)
+        for i in range(100):
+            framer.feed(packet + b"$partial")
+            assert len(list(framer)) == 1
+            framer.feed(b"#00")
+            assert list(framer) == [(PacketFramer.PACKET, b"$partial#00")]
+        # Consumed data doesn't accumulate.
+        assert len(framer._buffer) < PacketFramer.COMPACT_THRESHOLD + len(packet) + 20
+
+class TestEscape:
+    def test_escape(self):
+        data = bytes(bytearray(range(256))) * 4
+        escaped = escape(data)
+        assert len(escaped) == len(data) + 16
+        assert not any(c in escaped for c in (b'#', b'$', b'*'))
+        assert bytearray(unescape(escaped)) == bytearray(data)
+        assert escape(b"a}b") == b"a}]b"
+
+class TestPacketIOThread:
+    def test_receive_and_ack(self):
+        gdb, server = socket.socketpair()
+        packet_io = GDBServerPacketIOThread(SocketPairAdapter(server))
+        try:
+            gdb.sendall(make_packet(b"qSupported") + make_packet(b"?"))
+            assert packet_io.receive() == make_packet(b"qSupported")
+            assert packet_io.receive() == make_packet(b"?")
+            assert gdb.recv(2) == b"++"
+
+            gdb.sendall(b"$bad#00")
+            assert gdb.recv(1) == b"-"
+
+            gdb.sendall(b"\x03")
+            assert packet_io.interrupt_event.wait(5)
+        finally:
+            packet_io.stop()
+            packet_io.join(5)
+            gdb.close()
+            server.close()
+        assert not packet_io.is_alive()
+
+    def test_nack_resends(self):
+        gdb, server = socket.socketpair()
+        packet_io = GDBServerPacketIOThread(SocketPairAdapter(server))
+        try:
+            packet_io.send(make_packet(b"OK"))
+            assert gdb.recv(100) == make_packet(b"OK")
+            gdb.sendall(b"-")
+            assert gdb.recv(100) == make_packet(b"OK")
+            gdb.sendall(b"+")
+        finally:
+            packet_io.stop()
+            packet_io.join(5)
+            gdb.close()
+            server.close()
+
+    def test_connection_closed(self):
+        gdb, server = socket.socketpair()
+        packet_io = GDBServerPacketIOThread(SocketPairAdapter(server))
+        gdb.close()
+        packet_io.join(5)
+        server.close()
+        assert not packet_io.is_alive()
+        with pytest.raises(ConnectionClosedException):
+            packet_io.receive()
@@ -0,0 +1,106 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from time import sleep
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.debug.halt_watcher import HaltWatcher
+
+class MockCore(object):
+    """! @brief Core that halts when told to, and records the timeout of each poll."""
+    def __init__(self):
+        self.halted = False
+        self.error = None
+        self.timeouts = []
+
+    def wait_for_halt(self, timeout):
+        self.timeouts.append(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.halted
+
+@pytest.fixture(scope='function')
+def watcher():
+    watcher = HaltWatcher()
+    yield watcher
+    watcher.stop()
+
+class TestHaltWatcher:
+    def test_halt(self, watcher):
+        core = MockCore()
+        watch = watcher.watch(core)
+        assert not watch.wait(0.05)
+        core.halted = True
+        assert watch.wait(5)
+        assert watch.event.is_set()
+        assert watch.error is None
+        # Polls of a core without offloaded polling only read the state once.
+        assert set(core.timeouts) == {0}
+
+    def test_shared_event(self, watcher):
+        cores = [MockCore(), MockCore()]
+        event = threading.Event()
+        watches = [watcher.watch(core, event) for core in cores]
+        cores[1].halted = True
+        assert event.wait(5)
+        assert watches[1].is_halted
+        assert not watches[0].is_halted
+        event.clear()
+        cores[0].halted = True
+        assert event.wait(5)
+        assert watches[0].is_halted
+
+    def test_backoff(self, watcher):
+        core = MockCore()
+        with watcher.watch(core):
+            sleep(0.5)
+            # Without backoff, there would be hundreds of polls.
+            assert len(core.timeouts) < 30
+            count = watcher.poll_count
+            sleep(0.3)
+            assert watcher.poll_count - count <= 0.3 / HaltWatcher.MAX_POLL_INTERVAL + 1
+
+            # A new watch polls right away.
+            other = MockCore()
+            other.halted = True
+            assert watcher.watch(other).wait(0.05)
+
+    def test_error(self, watcher):
+        core = MockCore()
+        core.error = exceptions.TransferError("poll failed")
+        watch = watcher.watch(core)
+        assert watch.wait(5)
+        assert watch.error is core.error
+
+    def test_cancel(self, watcher):
+        core = MockCore()
+        watch = watcher.watch(core)
+        watch.cancel()
+        sleep(0.05)
+        count = len(core.timeouts)
+        sleep(0.15)
+        assert len(core.timeouts) == count
+        assert not watch.is_halted
+
+class TestSessionHaltWatcher:
+    def test_probe_polling(self, simulated_session):
+        core = simulated_session.target.selected_core
+        assert core.ap.is_poll_memory_offloaded
+        core.halt()
+        with simulated_session.halt_watcher.watch(core) as watch:
+            assert watch.wait(5)
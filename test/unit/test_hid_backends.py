@@ -0,0 +1,55 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.probe.pydapaccess.interface.hidapi_backend import HidApiUSB
+from pyocd.probe.pydapaccess.interface.pywinusb_backend import PyWinUSB
+
+class RecordingDevice(object):
+    """! @brief Stands in for both the hidapi device and the pywinusb output report."""
+    def __init__(self):
+        self.reports = []
+
+    def write(self, report):
+        self.reports.append(bytes(report))
+
+    send = write
+
+def make_hidapi():
+    interface = HidApiUSB()
+    interface.device = RecordingDevice()
+    return interface, interface.device
+
+def make_pywinusb():
+    interface = PyWinUSB()
+    interface.report = RecordingDevice()
+    return interface, interface.report
+
+@pytest.mark.parametrize("factory", [make_hidapi, make_pywinusb])
+def test_write_reports(factory):
+    interface, device = factory()
+    interface.set_packet_size(8)
+    interface.write(bytearray(b"\x01\x02\x03\x04\x05"))
+    interface.write(memoryview(b"\x06\x07"))
+    interface.write(b"\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f")
+    interface.write(b"")
+    assert device.reports == [
+        b"\x00\x01\x02\x03\x04\x05\x00\x00\x00",
+        b"\x00\x06\x07\x00\x00\x00\x00\x00\x00",
+        b"\x00\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f",
+        b"\x00" * 9,
+        ]
@@ -0,0 +1,141 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ctypes
+import threading
+import pytest
+
+libusb1 = pytest.importorskip("usb.backend.libusb1")
+
+from pyocd.probe.pydapaccess.interface.libusb_async import AsyncEndpointReader
+
+class FakeFunction(object):
+    """! @brief Callable standing in for a ctypes function, which allows setting argtypes."""
+    def __init__(self, fn):
+        self.fn = fn
+        self.argtypes = None
+
+    def __call__(self, *args):
+        return self.fn(*args)
+
+class FakeLib(object):
+    """! @brief Models the libusb async transfer functions for a device that sends _packets_."""
+    def __init__(self, packets, fail_after=None):
+        self.packets = list(packets)
+        self.fail_after = fail_after
+        self.completed = 0
+        self.queued = []
+        self.cancelled = []
+        self.structs = []
+        self.lock = threading.Lock()
+        self.libusb_alloc_transfer = FakeFunction(self._alloc)
+        self.libusb_free_transfer = FakeFunction(lambda t: None)
+        self.libusb_submit_transfer = FakeFunction(self._submit)
+        self.libusb_cancel_transfer = FakeFunction(self._cancel)
+        self.libusb_handle_events_timeout = FakeFunction(self._handle_events)
+
+    def _alloc(self, iso_packets):
+        transfer = libusb1._libusb_transfer()
+        self.structs.append(transfer)
+        return ctypes.pointer(transfer)
+
+    def _submit(self, transfer_p):
+        with self.lock:
+            self.queued.append(transfer_p)
+        return 0
+
+    def _cancel(self, transfer_p):
+        with self.lock:
+            for t in self.queued:
+                if ctypes.addressof(t.contents) == ctypes.addressof(transfer_p.contents):
+                    self.queued.remove(t)
+                    t.contents.status = libusb1.LIBUSB_TRANSFER_CANCELLED
+                    self.cancelled.append(t)
+                    return 0
+        return -5 # LIBUSB_ERROR_NOT_FOUND
+
+    def _handle_events(self, ctx, timeout):
+        with self.lock:
+            cancelled, self.cancelled = list(self.cancelled), []
+            transfer_p = None
+            if self.queued and (self.packets or self.fail_after is not None):
+                transfer_p = self.queued.pop(0)
+        for t in cancelled:
+            t.contents.callback(t)
+        if transfer_p is None:
+            return 0
+        transfer = transfer_p.contents
+        if self.fail_after is not None and self.completed == self.fail_after:
+            transfer.status = libusb1.LIBUSB_TRANSFER_NO_DEVICE
+        else:
+            data = self.packets.pop(0)
+            ctypes.memmove(transfer.buffer, bytes(data), len(data))
+            transfer.actual_length = len(data)
+            transfer.status = libusb1.LIBUSB_TRANSFER_COMPLETED
+            self.completed += 1
+        transfer.callback(transfer_p)
+        return 0
+
+class FakeEndpoint(object):
+    bEndpointAddress = 0x81
+    bmAttributes = 0x02 # Bulk
+    wMaxPacketSize = 64
+
+class FakeHandle(object):
+    handle = None
+
+class FakeResourceManager(object):
+    def managed_open(self):
+        return FakeHandle()
+
+class FakeBackend(object):
+    ctx = None
+    def __init__(self, lib):
+        self.lib = lib
+
+class FakeDevice(object):
+    def __init__(self, lib):
+        self.backend = FakeBackend(lib)
+        self._ctx = FakeResourceManager()
+
+def wait_for_items(queue, count):
+    for _ in range(1000):
+        if len(queue) >= count:
+            return
+        threading.Event().wait(0.001)
+
+class TestAsyncEndpointReader:
+    def test_unsupported_backend(self):
+        assert not AsyncEndpointReader.is_supported(FakeDevice(FakeLib([])))
+
+    def test_read_in_order(self):
+        packets = [bytearray([i] * (i + 1)) for i in range(10)]
+        lib = FakeLib(packets)
+        reader = AsyncEndpointReader(FakeDevice(lib), FakeEndpoint(), 64, 3, "test")
+        reader.start()
+        wait_for_items(reader.queue, 10)
+        # All transfers stay queued after the data is received.
+        assert len(lib.queued) == 3
+        reader.stop()
+        assert list(reader.queue) == [bytearray([i] * (i + 1)) for i in range(10)] + [None]
+
+    def test_error_stops_reader(self):
+        lib = FakeLib([b'\x01', b'\x02'], fail_after=2)
+        reader = AsyncEndpointReader(FakeDevice(lib), FakeEndpoint(), 64, 2, "test")
+        reader.start()
+        wait_for_items(reader.queue, 3)
+        assert list(reader.queue) == [bytearray(b'\x01'), bytearray(b'\x02'), None]
+        reader.stop()
@@ -0,0 +1,102 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.coresight.ap import (MEM_AP_CSW, MEM_AP_DRW, MEM_AP_TAR, CSW_ADDRINC, CSW_SIZE8,
+                                CSW_SIZE32)
+
+RAM = 0x20000000
+
+@pytest.fixture(scope='function')
+def ap(simulated_session):
+    return simulated_session.target.dp.aps[0]
+
+@pytest.fixture(scope='function')
+def stats(simulated_session):
+    return simulated_session.probe._link.get_transfer_statistics()
+
+def count_transfers(ap, stats, fn):
+    ap.dp.flush()
+    stats.reset()
+    fn()
+    ap.dp.flush()
+    return stats.transfer_count
+
+class TestTARShadow:
+    def test_sequential_reads(self, ap, stats):
+        ap.read_memory(RAM)
+        # CSW, TAR, and SELECT are all unchanged, so only DRW is read.
+        assert count_transfers(ap, stats, lambda: ap.read_memory(RAM + 4)) == 1
+        assert count_transfers(ap, stats, lambda: ap.read_memory(RAM + 0x10)) == 2
+
+    def test_sequential_writes(self, ap, stats, simtarget):
+        ap.write_memory(RAM, 0x11111111)
+        assert count_transfers(ap, stats, lambda: ap.write_memory(RAM + 4, 0x22222222)) == 1
+        assert ap.read_memory_block32(RAM, 2) == [0x11111111, 0x22222222]
+
+    def test_transfer_size(self, ap, stats):
+        ap.write_memory_block32(RAM, [0x44332211])
+        ap.read_memory(RAM, transfer_size=8)
+        # The byte read incremented TAR by one.
+        assert count_transfers(ap, stats, lambda: ap.read_memory(RAM + 1, transfer_size=8)) == 1
+        assert ap.read_memory(RAM + 2, transfer_size=8) == 0x33
+        assert ap._cached_csw & 0x7 == CSW_SIZE8
+
+    def test_auto_increment_boundary(self, ap, stats):
+        page = ap.auto_increment_page_size
+        ap.read_memory(RAM + page - 4)
+        # TAR isn't trusted past the auto-increment boundary.
+        assert ap._cached_tar == -1
+        assert count_transfers(ap, stats, lambda: ap.read_memory(RAM + page)) == 2
+
+    def test_block_then_word(self, ap, stats):
+        ap.write_memory_block32(RAM, list(range(8)))
+        assert ap._cached_tar == RAM + 0x20
+        assert count_transfers(ap, stats, lambda: ap.read_memory(RAM + 0x20)) == 1
+        assert ap.read_memory(RAM + 0x1c) == 7
+
+    def test_fault_invalidates(self, ap):
+        ap.read_memory(RAM)
+        with pytest.raises(exceptions.TransferFaultError):
+            ap.read_memory(0x60000000)
+        assert ap._cached_tar == -1
+        assert ap._cached_csw == -1
+
+    def test_deferred_fault(self, ap):
+        ap.write_memory(RAM, 0x5555aaaa)
+        ap.write_memory(0x60000000, 0)
+        with pytest.raises(exceptions.TransferFaultError):
+            ap.dp.flush()
+        assert ap._cached_tar == -1
+        assert ap.read_memory(RAM) == 0x5555aaaa
+
+    def test_direct_register_access(self, ap):
+        ap.write_reg(MEM_AP_CSW, ap._csw | CSW_SIZE32)
+        ap.write_reg(MEM_AP_TAR, RAM + 8)
+        ap.write_reg(MEM_AP_DRW, 1)
+        assert ap._cached_tar == RAM + 12
+        # Without auto-increment TAR doesn't change.
+        ap.write_reg(MEM_AP_CSW, (ap._csw | CSW_SIZE32) & ~CSW_ADDRINC)
+        ap.write_reg(MEM_AP_DRW, 2)
+        ap.read_reg(MEM_AP_DRW)
+        assert ap._cached_tar == RAM + 12
+
+    def test_reset(self, ap, simulated_session):
+        ap.read_memory(RAM)
+        simulated_session.target.dp.reset()
+        assert ap._cached_tar == -1
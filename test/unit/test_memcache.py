@@ -46,6 +46,9 @@ class TestMemoryCache:
         assert memcache.read_memory_block8(0, 8) == [1, 2, 3, 4, 0xff, 0xff, 0xff, 0xff]
         assert memcache.read_memory_block8(4, 4) == [0xff] * 4
         mockcore.write_memory_block8(10, [50, 51])
+        # The whole line was cached by the first read, so the change isn't seen until invalidated.
+        assert memcache.read_memory_block8(6, 6) == [0xff] * 6
+        memcache.invalidate()
         assert memcache.read_memory_block8(6, 6) == [0xff, 0xff, 0xff, 0xff, 50, 51]
 
     def test_5(self, mockcore, memcache):
@@ -107,27 +110,27 @@ class TestMemoryCache:
     def test_16_no_mem_region(self, mockcore, memcache):
         assert memcache.read_memory_block8(0x30000000, 4) == [0x55] * 4
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x30000000, 0x30000004) == set()
+        assert len(memcache._lines) == 0
 
     def test_17_noncacheable_region_read(self, mockcore, memcache):
         mockcore.write_memory_block8(0x20000410, [90, 91, 92, 93])
         assert memcache.read_memory_block8(0x20000410, 4) == [90, 91, 92, 93]
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x20000410, 0x20000414) == set()
+        assert len(memcache._lines) == 0
 
     def test_18_noncacheable_region_write(self, mockcore, memcache):
         memcache.write_memory_block8(0x20000410, [1, 2, 3, 4])
         mockcore.write_memory_block8(0x20000410, [90, 91, 92, 93])
         assert memcache.read_memory_block8(0x20000410, 4) == [90, 91, 92, 93]
         # Make sure we didn't cache anything.
-        assert memcache._cache.overlap(0x20000410, 0x20000414) == set()
+        assert len(memcache._lines) == 0
 
     def test_19_write_into_cached(self, mockcore, memcache):
         mockcore.write_memory_block8(4, [1, 2, 3, 4, 5, 6, 7, 8])
         assert memcache.read_memory_block8(4, 8) == [1, 2, 3, 4, 5, 6, 7, 8]
         memcache.write_memory_block8(6, [128, 129, 130, 131])
         assert memcache.read_memory_block8(4, 8) == [1, 2, 128, 129, 130, 131, 7, 8]
-        assert len(list(memcache._cache.overlap(4, 12))[0].data) == 8
+        assert memcache._lines[0].data[4:12] == bytearray([1, 2, 128, 129, 130, 131, 7, 8])
 
     def test_20_empty_read(self, memcache):
         assert memcache.read_memory_block8(128, 0) == []
@@ -179,7 +182,156 @@ class TestMemoryCache:
         block = memcache.read_memory_block8(0x2000007e, 4)
         assert block == data[0x7e:0x82]
 
-     
+    def test_27_bytes(self, mockcore, memcache):
+        memcache.write_memory_bytes(1, memoryview(b'abcdef')[1:5])
+        assert memcache.read_memory_bytes(0, 6) == bytearray(b'\xffbcde\xff')
+        assert mockcore.read_memory_bytes(0, 6) == bytearray(b'\xffbcde\xff')
+        memcache.write_memory_block32_bytes(8, b'\x01\x02\x03\x04')
+        assert memcache.read_memory_block32(8, 1) == [0x04030201]
+        assert memcache.read_memory_block32_bytes(8, 1) == bytearray(b'\x01\x02\x03\x04')
+
+
+class RecordingContext(DebugContext):
+    """! @brief Debug context that records the memory accesses passed to the core."""
+    def __init__(self, core):
+        super(RecordingContext, self).__init__(core)
+        self.reads = []
+        self.writes = []
+
+    def read_memory_bytes(self, addr, size):
+        self.reads.append((addr, size))
+        return super(RecordingContext, self).read_memory_bytes(addr, size)
+
+    def write_memory_bytes(self, addr, data):
+        self.writes.append((addr, bytearray(data)))
+        return super(RecordingContext, self).write_memory_bytes(addr, data)
+
+@pytest.fixture(scope='function')
+def recorder(mockcore):
+    return RecordingContext(mockcore)
+
+class TestMemoryCacheLines:
+    def test_line_fill(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64)
+        assert memcache.read_memory_block8(0x20000070, 4) == [0] * 4
+        assert memcache.read_memory_block8(0x20000040, 64) == [0] * 64
+        assert recorder.reads == [(0x20000040, 64)]
+
+    def test_adjacent_misses_read_together(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64)
+        memcache.read_memory_block8(0x20000080, 4)
+        memcache.read_memory_block8(0x20000000, 0x100)
+        assert recorder.reads == [(0x20000080, 64), (0x20000000, 0x80), (0x200000c0, 64)]
+
+    def test_lru_eviction(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64, max_size=128)
+        memcache.read_memory_block8(0x20000000, 4)
+        memcache.read_memory_block8(0x20000040, 4)
+        memcache.read_memory_block8(0x20000000, 4)
+        memcache.read_memory_block8(0x20000080, 4)
+        assert list(memcache._lines.keys()) == [0x20000000, 0x20000080]
+        memcache.read_memory_block8(0x20000040, 4)
+        assert recorder.reads[-1] == (0x20000040, 64)
+
+    def test_region_policy(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64)
+        memcache.read_memory_block8(0, 4)
+        memcache.read_memory_block8(0x20000000, 4)
+        mockcore.run_token += 1
+        # Flash lines survive the target running but RAM lines do not.
+        memcache.read_memory_block8(0, 4)
+        memcache.read_memory_block8(0x20000000, 4)
+        assert recorder.reads == [(0, 64), (0x20000000, 64), (0x20000000, 64)]
+        memcache.invalidate_flash()
+        memcache.read_memory_block8(0, 4)
+        assert recorder.reads[-1] == (0, 64)
+
+    def test_regions_sharing_line(self, recorder, mockcore):
+        mockcore.memory_map.add_region(memory_map.RamRegion(start=0x30000000, length=0x10))
+        mockcore.memory_map.add_region(memory_map.RamRegion(start=0x30000010, length=0x10))
+        memcache = MemoryCache(recorder, mockcore, line_size=64)
+        assert memcache.read_memory_block8(0x30000000, 4) == [0x55] * 4
+        assert memcache.read_memory_block8(0x30000010, 4) == [0x55] * 4
+        # Each region has its own line, clipped to the region.
+        assert recorder.reads == [(0x30000000, 0x10), (0x30000010, 0x10)]
+        assert memcache.read_memory_block8(0x3000000c, 4) == [0x55] * 4
+        assert memcache.read_memory_block8(0x30000014, 4) == [0x55] * 4
+        assert len(recorder.reads) == 2
+
+    def test_device_region_not_cached(self, mockcore):
+        mockcore.memory_map.add_region(memory_map.DeviceRegion(start=0x40000000, length=0x1000))
+        memcache = MemoryCache(DebugContext(mockcore), mockcore)
+        assert memcache.read_memory_block8(0x40000000, 4) == [0x55] * 4
+        assert len(memcache._lines) == 0
+
+    def test_write_back(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64, write_back=True)
+        memcache.write_memory_block8(0x20000000, [1] * 64)
+        memcache.write_memory_block8(0x20000040, [2, 3])
+        memcache.write_memory_block8(0x20000010, [4])
+        # The fully written line is allocated without a read, the partial one is filled.
+        assert recorder.reads == [(0x20000040, 64)]
+        assert recorder.writes == []
+        assert mockcore.ram[0:2] == bytearray(2)
+        assert memcache.read_memory_block8(0x2000000f, 3) == [1, 4, 1]
+        memcache.flush()
+        assert recorder.writes == [(0x20000000, bytearray([1] * 16 + [4] + [1] * 47 + [2, 3]))]
+        memcache.flush()
+        assert len(recorder.writes) == 1
+
+    def test_write_back_before_uncached_write(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, write_back=True)
+        memcache.write_memory_block8(0x20000004, [7])
+        memcache.write_memory_block8(0x20000410, [8])
+        assert recorder.writes == [(0x20000004, bytearray([7])), (0x20000410, bytearray([8]))]
+
+    def test_write_back_eviction(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, line_size=64, max_size=64, write_back=True)
+        memcache.write_memory_block8(0x20000000, [5])
+        memcache.read_memory_block8(0x20000100, 4)
+        assert recorder.writes == [(0x20000000, bytearray([5]))]
+        assert mockcore.ram[0] == 5
+
+    def test_write_back_while_running(self, recorder, mockcore, monkeypatch):
+        memcache = MemoryCache(recorder, mockcore, write_back=True)
+        monkeypatch.setattr(mockcore, 'is_running', lambda: True)
+        memcache.write_memory(0x20000000, 0xdeadbeef)
+        memcache.read_memory(0x20000000)
+        assert mockcore.ram[0:4] == bytearray([0xef, 0xbe, 0xad, 0xde])
+
+    def test_write_back_before_run(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, write_back=True)
+        memcache.write_memory_block8(0x20000000, [9])
+        # The core ran without the cache being flushed, but the write still reaches the target.
+        mockcore.run_token += 1
+        memcache.read_memory_block8(0x20000000, 1)
+        assert recorder.writes == [(0x20000000, bytearray([9]))]
+        assert mockcore.ram[0] == 9
+
+    def test_flash_write_through(self, recorder, mockcore):
+        memcache = MemoryCache(recorder, mockcore, write_back=True)
+        memcache.write_memory_block8(8, [1, 2])
+        assert recorder.writes == [(8, bytearray([1, 2]))]
+
+    def test_invalid_line_size(self, mockcore):
+        with pytest.raises(ValueError):
+            MemoryCache(DebugContext(mockcore), mockcore, line_size=100)
+
+class TestCachingDebugContext:
+    @pytest.mark.parametrize('simulated_session',
+        [{'memcache.write_back': True, 'memcache.line_size': 64}], indirect=True)
+    def test_write_back_on_resume(self, simulated_session, simtarget):
+        target = simulated_session.target
+        context = target.get_target_context()
+        context.write_memory_block8(0x20000100, [1, 2, 3])
+        assert simtarget.ram.data[0x100:0x103] == bytearray(3)
+        target.resume()
+        assert simtarget.ram.data[0x100:0x103] == bytearray([1, 2, 3])
+        target.halt()
+        context.write_memory(0x20000200, 0x12345678)
+        context.flush()
+        assert context.read_memory(0x20000200) == 0x12345678
+        assert simtarget.ram.data[0x200:0x204] == bytearray([0x78, 0x56, 0x34, 0x12])
 
 # TODO test read32/16/8 with and without callbacks
 
@@ -0,0 +1,135 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.core.memory_interface import (MemoryFaultMap, MemoryInterface)
+
+## End of the simulated target's RAM.
+RAM_END = 0x20020000
+
+class FaultingMemory(MemoryInterface):
+    """! @brief Byte array memory with faulting words."""
+    def __init__(self, size, faulting_words):
+        self.memory = bytearray(i & 0xff for i in range(size))
+        self.faulting_words = faulting_words
+        self.reads = 0
+
+    def read_memory_bytes(self, addr, size):
+        self.reads += 1
+        for word in self.faulting_words:
+            if addr < word + 4 and word < addr + size:
+                raise exceptions.TransferFaultError(addr, size)
+        return self.memory[addr:addr + size]
+
+class TestMemoryFaultMap:
+    def test_merge(self):
+        faults = MemoryFaultMap()
+        faults.add(0x10, 0x20)
+        faults.add(0x40, 0x50)
+        faults.add(0x20, 0x28)
+        assert list(faults) == [(0x10, 0x28), (0x40, 0x50)]
+        faults.add(0x0, 0x44)
+        assert list(faults) == [(0x0, 0x50)]
+
+    def test_find(self):
+        faults = MemoryFaultMap()
+        faults.add(0x10, 0x20)
+        faults.add(0x40, 0x50)
+        assert faults.find(0x0, 0x10) == []
+        assert faults.find(0x18, 0x48) == [(0x18, 0x20), (0x40, 0x48)]
+        assert faults.find(0x20, 0x40) == []
+        faults.clear()
+        assert len(faults) == 0
+
+class TestReadMemoryTolerant:
+    def test_no_faults(self):
+        mem = FaultingMemory(0x100, [])
+        data, faults = mem.read_memory_tolerant(0x3, 0x20)
+        assert data == mem.memory[0x3:0x23]
+        assert faults == []
+        assert mem.reads == 1
+
+    def test_isolated_words(self):
+        mem = FaultingMemory(0x400, [0x104, 0x108, 0x3f0])
+        data, faults = mem.read_memory_tolerant(0x2, 0x3fc, fill=0xee)
+        assert faults == [(0x104, 0x10c), (0x3f0, 0x3f4)]
+        expected = bytearray(mem.memory[0x2:0x3fe])
+        expected[0x102:0x10a] = b'\xee' * 8
+        expected[0x3ee:0x3f2] = b'\xee' * 4
+        assert data == expected
+
+    def test_fault_map(self):
+        mem = FaultingMemory(0x400, [0x200])
+        fault_map = MemoryFaultMap()
+        mem.read_memory_tolerant(0x0, 0x400, fault_map)
+        assert list(fault_map) == [(0x200, 0x204)]
+        # Known faults are skipped without accessing memory.
+        mem.reads = 0
+        data, faults = mem.read_memory_tolerant(0x1f0, 0x20, fault_map)
+        assert faults == [(0x200, 0x204)]
+        assert mem.reads == 2
+        assert data[:0x10] == mem.memory[0x1f0:0x200]
+
+    def test_simulated_target(self, simulated_session):
+        target = simulated_session.target
+        target.write_memory_block32(RAM_END - 0x10, [1, 2, 3, 4])
+        fault_map = simulated_session.get_memory_faults(target)
+        data, faults = target.read_memory_tolerant(RAM_END - 0x10, 0x20, fault_map)
+        assert data[:0x10] == bytearray(b'\x01\0\0\0\x02\0\0\0\x03\0\0\0\x04\0\0\0')
+        assert faults == [(RAM_END, RAM_END + 0x10)]
+        # The target still works after the faults.
+        assert target.read32(RAM_END - 4) == 4
+
+        stats = simulated_session.probe._link.get_transfer_statistics()
+        stats.reset()
+        assert target.read_memory_tolerant(RAM_END, 0x10, fault_map)[1] == \
+                [(RAM_END, RAM_END + 0x10)]
+        assert stats.transfer_count == 0
+
+class TestSessionFaultMaps:
+    def test_per_interface(self, simulated_session):
+        core = simulated_session.target.selected_core
+        fault_map = simulated_session.get_memory_faults(core)
+        assert simulated_session.get_memory_faults(core) is fault_map
+        core.read_memory_tolerant(RAM_END, 0x10, fault_map)
+        # Faults found through the core don't affect reads through the AP.
+        assert len(simulated_session.get_memory_faults(core.ap)) == 0
+        assert len(fault_map) == 1
+
+    def test_cleared_on_reset(self, simulated_session):
+        fault_map = simulated_session.get_memory_faults(simulated_session.target)
+        simulated_session.target.read_memory_tolerant(RAM_END, 0x10, fault_map)
+        assert len(fault_map) == 1
+        simulated_session.target.reset_and_halt()
+        assert len(fault_map) == 0
+
+    def test_cleared_on_run(self, simulated_session):
+        core = simulated_session.target.selected_core
+        fault_map = simulated_session.get_memory_faults(core)
+        core.read_memory_tolerant(RAM_END, 0x10, fault_map)
+        core.resume()
+        assert len(fault_map) == 0
+        core.halt()
+
+    def test_clear_all(self, simulated_session):
+        core = simulated_session.target.selected_core
+        for memif in (core, core.ap):
+            memif.read_memory_tolerant(RAM_END, 0x10, simulated_session.get_memory_faults(memif))
+        simulated_session.clear_memory_faults()
+        assert len(simulated_session.get_memory_faults(core)) == 0
+        assert len(simulated_session.get_memory_faults(core.ap)) == 0
@@ -0,0 +1,98 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import pytest
+
+from pyocd.debug.elf.decoder import (FunctionInfo, LineInfo, SymbolInfo)
+from pyocd.debug.profiler import PCProfiler
+from pyocd.probe.pydapaccess.interface.simulated_backend import SimulatedTarget
+
+DWT_PCSR = 0xE000101C
+
+## Repeating sequence of PC values returned by DWT_PCSR.
+PC_SEQUENCE = [0x100, 0x104, 0x100, 0x200, 0xffffffff]
+
+class SamplingTarget(SimulatedTarget):
+    """! @brief Simulated target whose DWT_PCSR returns a repeating sequence."""
+
+    def __init__(self):
+        super(SamplingTarget, self).__init__()
+        self.pc_samples = itertools.cycle(PC_SEQUENCE)
+
+    def _read_ppb(self, addr):
+        if addr == DWT_PCSR:
+            return next(self.pc_samples)
+        return super(SamplingTarget, self)._read_ppb(addr)
+
+class MockDecoder(object):
+    """! @brief Stands in for both the ELF symbol decoder and DWARF address decoder."""
+
+    def get_function_for_address(self, addr):
+        if 0x100 <= addr < 0x200:
+            return FunctionInfo(name=b"main", subprogram=None, low_pc=0x100, high_pc=0x200)
+        return None
+
+    def get_symbol_for_address(self, addr):
+        if 0x200 <= addr < 0x300:
+            return SymbolInfo(name="memcpy", address=0x200, size=0x100, type='STT_FUNC')
+        return None
+
+    def get_line_for_address(self, addr):
+        if 0x100 <= addr < 0x200:
+            return LineInfo(cu=None, filename=b"main.c", dirname=b"src", line=10 + (addr - 0x100))
+        return None
+
+class MockElf(object):
+    def __init__(self):
+        self.address_decoder = MockDecoder()
+        self.symbol_decoder = self.address_decoder
+
+@pytest.fixture(scope='function')
+def simtarget():
+    return SamplingTarget()
+
+class TestPCProfiler:
+    def test_histogram(self, simulated_session):
+        profiler = PCProfiler(simulated_session.target.selected_core)
+        assert profiler.sample(count=500) == 400
+        assert profiler.histogram == {0x100: 200, 0x104: 100, 0x200: 100}
+        assert profiler.missed_count == 100
+        assert profiler.get_function_profile() == [("0x00000100", 200), ("0x00000104", 100),
+                                                    ("0x00000200", 100)]
+
+    def test_duration(self, simulated_session):
+        profiler = PCProfiler(simulated_session.target.selected_core)
+        assert profiler.sample(duration=0.05) > 0
+
+    def test_attribution(self, simulated_session):
+        profiler = PCProfiler(simulated_session.target.selected_core, MockElf())
+        profiler.sample(count=5)
+        assert profiler.get_function_profile() == [("main", 3), ("memcpy", 1)]
+        assert profiler.format_collapsed() == "main 3\nmemcpy 1\n"
+        assert profiler.format_collapsed(by_line=True).splitlines() == [
+            "main;src/main.c:10 2",
+            "main;src/main.c:14 1",
+            "memcpy 1",
+            ]
+
+    def test_flat(self, simulated_session):
+        profiler = PCProfiler(simulated_session.target.selected_core, MockElf())
+        profiler.sample(count=5)
+        lines = profiler.format_flat().splitlines()
+        assert lines[1].split() == ["3", "75.00", "main"]
+        assert lines[2].split() == ["1", "25.00", "memcpy"]
+        assert len(profiler.format_flat(limit=1).splitlines()) == 2
@@ -0,0 +1,127 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import pytest
+
+from pyocd.core.session import Session
+from pyocd.probe.aggregator import DebugProbeAggregator
+from pyocd.probe.cmsis_dap_probe import CMSISDAPProbe
+from pyocd.probe.remote_probe import (REMOTE_PROBES_ENV, RemoteProbe, parse_address)
+from pyocd.probe.remote_probe_server import RemoteProbeServer
+from pyocd.probe.shared_probe import (send_message, receive_message)
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.interface.simulated_backend import (
+    SimulatedCMSISDAP,
+    SimulatedTarget,
+    )
+
+ADDR = 0x20000000
+
+@pytest.fixture(scope='function')
+def server(monkeypatch):
+    probe = CMSISDAPProbe(DAPAccessCMSISDAP(None, interface=SimulatedCMSISDAP(target=SimulatedTarget())))
+    server = RemoteProbeServer(probe, port=0)
+    server.open()
+    server.start()
+    monkeypatch.setenv(REMOTE_PROBES_ENV, "localhost:%d" % server.port)
+    yield server
+    server.stop()
+
+@pytest.fixture(scope='function')
+def remote(server):
+    probe, = RemoteProbe.get_all_connected_probes()
+    return probe
+
+def count_requests(probe):
+    counter = {'requests': 0}
+    send_request = probe._send_request
+
+    def counting_send_request(request):
+        counter['requests'] += 1
+        send_request(request)
+
+    probe._send_request = counting_send_request
+    return counter
+
+class TestRemoteProbe:
+    def test_parse_address(self):
+        assert parse_address("host:1234") == ("host", 1234)
+        assert parse_address("host") == ("host", 5555)
+        with pytest.raises(ValueError):
+            parse_address("host:port")
+
+    def test_discovery(self, server, remote):
+        assert remote.unique_id == "%s@localhost:%d" % (server._probe.unique_id, server.port)
+        assert isinstance(DebugProbeAggregator.get_probe_with_id(remote.unique_id), RemoteProbe)
+
+    def test_block_read_is_one_request(self, remote):
+        data = list(range(0x800))
+        with Session(remote, no_config=True, target_override='cortex_m') as session:
+            target = session.target
+            target.write_memory_block32(ADDR, data)
+            counter = count_requests(remote)
+            # The block spans several auto-increment pages.
+            assert target.read_memory_block32(ADDR, len(data)) == data
+            assert counter['requests'] == 1
+
+    def test_pipelined_writes(self, remote):
+        data = list(range(256))
+        with Session(remote, no_config=True, target_override='cortex_m') as session:
+            target = session.target
+            remote.MAX_QUEUED_OPS = 8
+            counter = count_requests(remote)
+            for i, value in enumerate(data):
+                target.write32(ADDR + 4 * i, value)
+            assert counter['requests'] > remote.MAX_PIPELINED_REQUESTS
+            assert target.read_memory_block32(ADDR, len(data)) == data
+
+    def test_uncompressed(self, remote):
+        with Session(remote, no_config=True, target_override='cortex_m',
+                    options={'remote_probe.compression': False}) as session:
+            session.target.write_memory_block32(ADDR, [0] * 0x400)
+            assert not remote._compress
+            assert session.target.read_memory_block32(ADDR, 0x400) == [0] * 0x400
+
+    def test_compression(self):
+        sender, receiver = socket.socketpair()
+        try:
+            message = {'results': [{'bytes': "A" * 4096}]}
+            send_message(sender, message, compress=True)
+            assert receive_message(receiver) == message
+            send_message(sender, {'ops': []}, compress=True)
+            assert receive_message(receiver) == {'ops': []}
+        finally:
+            sender.close()
+            receiver.close()
+
+    def test_exclusive_open(self, server, remote):
+        other = RemoteProbe.get_probe_with_id(remote.unique_id)
+        remote.open()
+        try:
+            thread = threading.Thread(target=other.open)
+            thread.daemon = True
+            thread.start()
+            thread.join(0.3)
+            assert thread.is_alive()
+            # The server still answers info requests while the probe is in use.
+            assert len(RemoteProbe.get_all_connected_probes()) == 1
+        finally:
+            remote.close()
+        thread.join(5)
+        assert other.is_open
+        other.close()
@@ -0,0 +1,109 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.core.session import Session
+from pyocd.probe.aggregator import DebugProbeAggregator
+from pyocd.probe.cmsis_dap_probe import CMSISDAPProbe
+from pyocd.probe.shared_probe import (DAEMON_DIR_ENV, SharedProbe, decode_exception,
+    encode_exception)
+from pyocd.probe.shared_probe_server import SharedProbeServer
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.interface.simulated_backend import (
+    SimulatedCMSISDAP,
+    SimulatedTarget,
+    )
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+    reason="probe daemon requires Unix domain sockets")
+
+ADDR = 0x20000100
+
+@pytest.fixture(scope='function')
+def server(tmpdir, monkeypatch):
+    monkeypatch.setenv(DAEMON_DIR_ENV, str(tmpdir))
+    probe = CMSISDAPProbe(DAPAccessCMSISDAP(None, interface=SimulatedCMSISDAP(target=SimulatedTarget())))
+    server = SharedProbeServer(probe)
+    server.open()
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture(scope='function')
+def shared(server):
+    probe, = SharedProbe.get_all_connected_probes()
+    return probe
+
+def count_requests(probe):
+    counter = {'requests': 0}
+    send_request = probe._send_request
+
+    def counting_send_request(request):
+        counter['requests'] += 1
+        send_request(request)
+
+    probe._send_request = counting_send_request
+    return counter
+
+class TestSharedProbe:
+    def test_discovery(self, server, shared):
+        assert shared.unique_id == server._probe.unique_id
+        assert SharedProbe.get_probe_with_id(shared.unique_id) is not None
+        # The local probe owned by the daemon is hidden.
+        assert isinstance(DebugProbeAggregator.get_probe_with_id(shared.unique_id), SharedProbe)
+
+    def test_session(self, shared):
+        with Session(shared, no_config=True, target_override='cortex_m') as session:
+            target = session.target
+            target.write_memory_block32(ADDR, [1, 2, 3, 4])
+            assert target.read_memory_block32(ADDR, 4) == [1, 2, 3, 4]
+            assert list(target.read_memory_bytes(ADDR + 3, 3)) == [0, 2, 0]
+
+    def test_batching(self, shared):
+        with Session(shared, no_config=True, target_override='cortex_m') as session:
+            ap = session.target.selected_core.ap
+            counter = count_requests(shared)
+            ap.write_memory_block32(ADDR, list(range(8)))
+            results = [ap.read32(ADDR + 4 * i, now=False) for i in range(8)]
+            assert counter['requests'] == 0
+            assert [r() for r in results] == list(range(8))
+            assert counter['requests'] == 1
+
+    def test_fault(self, shared):
+        with Session(shared, no_config=True, target_override='cortex_m') as session:
+            with pytest.raises(exceptions.TransferFaultError):
+                session.target.read32(0x60000000)
+            # The probe is still usable after the fault.
+            session.target.write32(ADDR, 0x1234)
+            assert session.target.read32(ADDR) == 0x1234
+
+    def test_probe_stays_open(self, server, shared):
+        with Session(shared, no_config=True, target_override='cortex_m') as session:
+            session.target.write32(ADDR, 0xabcd)
+        assert server._probe.is_open
+        assert server._probe.wire_protocol is not None
+        # A second client sees the same target state.
+        with Session(shared, no_config=True, target_override='cortex_m') as session:
+            assert session.target.read32(ADDR) == 0xabcd
+
+    def test_exception_round_trip(self):
+        error = decode_exception(encode_exception(exceptions.TransferFaultError(0x100, 4)))
+        assert isinstance(error, exceptions.TransferFaultError)
+        assert (error.fault_address, error.fault_length) == (0x100, 4)
+        assert isinstance(decode_exception(encode_exception(KeyError('x'))), exceptions.ProbeError)
@@ -0,0 +1,217 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import subprocess
+import sys
+import pytest
+
+from pyocd.core.target import Target
+from pyocd.core import exceptions
+from pyocd.probe.pydapaccess.dap_access_api import DAPAccessIntf
+from pyocd.probe.pydapaccess.dap_access_cmsis_dap import DAPAccessCMSISDAP
+from pyocd.probe.pydapaccess.cmsis_dap_core import (Command, DAPTransferResponse)
+from pyocd.probe.pydapaccess.interface import INTERFACE
+from pyocd.probe.pydapaccess.interface.simulated_backend import (
+    SimulatedCMSISDAP,
+    SimulatedTarget,
+    )
+
+REG = DAPAccessIntf.REG
+
+RAM = 0x20000000
+
+@pytest.fixture(scope='function')
+def simif(simtarget):
+    return SimulatedCMSISDAP(target=simtarget)
+
+@pytest.fixture(scope='function')
+def link(simif):
+    daplink = DAPAccessCMSISDAP(None, interface=simif)
+    daplink.open()
+    daplink.connect()
+    daplink.set_deferred_transfer(True)
+    # Power up the debug domain and select AP#0 bank 0.
+    daplink.write_reg(REG.DP_0x8, 0)
+    daplink.write_reg(REG.DP_0x4, 0x50000000)
+    yield daplink
+    daplink.close()
+
+def write_mem(link, addr, words):
+    link.write_reg(REG.AP_0x0, 0x03000052)
+    link.write_reg(REG.AP_0x4, addr)
+    link.reg_write_repeat(len(words), REG.AP_0xC, words)
+    link.flush()
+
+def read_mem(link, addr, count):
+    link.write_reg(REG.AP_0x0, 0x03000052)
+    link.write_reg(REG.AP_0x4, addr)
+    return link.reg_read_repeat(count, REG.AP_0xC)
+
+class TestSimulatedProbe:
+    def test_registered(self):
+        assert INTERFACE['simulated'] is SimulatedCMSISDAP
+
+    def test_only_simulated_enumerated(self):
+        # Enumerating CMSIS-DAPv2 probes fails if it's attempted, so real probes can't be found.
+        code = ("from pyocd.probe.pydapaccess.interface.pyusb_v2_backend import PyUSBv2\n"
+                "PyUSBv2.get_all_connected_interfaces = None\n"
+                "from pyocd.probe.pydapaccess.dap_access_cmsis_dap import _get_interfaces\n"
+                "print([type(i).__name__ for i in _get_interfaces()])\n")
+        env = dict(os.environ, PYOCD_USB_BACKEND='simulated')
+        output = subprocess.check_output([sys.executable, "-c", code], env=env)
+        assert output.strip() == b"['SimulatedCMSISDAP']"
+
+    def test_info(self, simif):
+        simif.packet_size = 512
+        simif.packet_count = 8
+        daplink = DAPAccessCMSISDAP(None, interface=simif)
+        assert daplink.get_unique_id() == simif.serial_number
+        daplink.open()
+        try:
+            assert daplink.identify(DAPAccessIntf.ID.MAX_PACKET_SIZE) == 512
+            assert daplink.identify(DAPAccessIntf.ID.MAX_PACKET_COUNT) == 8
+            assert daplink.has_swo()
+        finally:
+            daplink.close()
+
+    def test_dp(self, link):
+        assert link.read_reg(REG.DP_0x0) == 0x2ba01477
+        # Power-up acknowledges are set.
+        assert (link.read_reg(REG.DP_0x4) & 0xa0000000) == 0xa0000000
+
+    def test_ram_block(self, link, simtarget):
+        words = list(range(1000))
+        write_mem(link, RAM + 0x800, words)
+        assert read_mem(link, RAM + 0x800, 1000) == words
+        assert struct.unpack_from("<I", simtarget.ram.data, 0x804)[0] == 1
+
+    def test_tar_wrap(self, link, simtarget):
+        # TAR auto-increment wraps within a 4 kB page.
+        write_mem(link, RAM + 0xffc, [0xaa, 0xbb])
+        assert struct.unpack_from("<I", simtarget.ram.data, 0xffc)[0] == 0xaa
+        assert struct.unpack_from("<I", simtarget.ram.data, 0)[0] == 0xbb
+
+    def test_flash_read_only(self, link, simtarget):
+        simtarget.load(0x100, bytearray(range(8)))
+        assert read_mem(link, 0x100, 2) == [0x03020100, 0x07060504]
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            write_mem(link, 0x100, [0])
+
+    def test_fault_is_sticky(self, link):
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            read_mem(link, 0x40000000, 4)
+        # AP accesses fault until the sticky error is cleared.
+        with pytest.raises(DAPAccessIntf.TransferFaultError):
+            read_mem(link, RAM, 1)
+        link.write_reg(REG.DP_0x0, 0x1e)
+        assert read_mem(link, RAM, 1) == [0]
+
+    def test_block_fault_count(self):
+        # A block read that runs off the end of RAM reports the completed transfers.
+        simif = SimulatedCMSISDAP(target=SimulatedTarget(ram_size=0x1ff8))
+        end = RAM + 0x1ff8
+        simif.dp.transfer(0x01, 0x03000052)
+        simif.dp.transfer(0x05, end - 8)
+        simif.write(bytearray(struct.pack("<BBHB", Command.DAP_TRANSFER_BLOCK, 0, 4, 0x0f)))
+        response = simif.read()
+        assert struct.unpack_from("<HB", response, 1) == (2, DAPTransferResponse.ACK_FAULT)
+
+    def test_value_match(self, simif):
+        simif.target.load(RAM, struct.pack("<I", 0x12345678))
+        simif.dp.transfer(0x01, 0x03000052)
+        simif.dp.transfer(0x05, RAM)
+        # Set the match mask, then read with value match against the masked value.
+        request = bytearray([Command.DAP_TRANSFER, 0, 2, 0x20]) + struct.pack("<I", 0xff) \
+                    + bytearray([0x1f]) + struct.pack("<I", 0x78)
+        simif.write(request)
+        assert simif.read() == bytearray([Command.DAP_TRANSFER, 2, DAPTransferResponse.ACK_OK])
+        simif.dp.transfer(0x05, RAM)
+        request[-4] = 0x77
+        simif.write(request)
+        assert simif.read()[1:] == bytearray([1, DAPTransferResponse.ACK_OK | 0x10])
+
+    def test_latency(self, simtarget):
+        simif = SimulatedCMSISDAP(target=simtarget, latency=0.05)
+        daplink = DAPAccessCMSISDAP(None, interface=simif)
+        daplink.open()
+        try:
+            daplink.connect()
+            stats = daplink.get_transfer_statistics()
+            stats.reset()
+            daplink.read_reg(REG.DP_0x0)
+            assert stats.round_trip_time >= 0.05
+        finally:
+            daplink.close()
+
+class TestSimulatedSession:
+    def test_connect(self, simulated_session):
+        target = simulated_session.target
+        assert target.get_state() == Target.TARGET_HALTED
+        assert target.selected_core.has_fpu
+
+    def test_core_registers(self, simulated_session):
+        target = simulated_session.target
+        target.write_core_register('r3', 0xdeadbeef)
+        assert target.read_core_register('r3') == 0xdeadbeef
+
+    def test_memory(self, simulated_session):
+        target = simulated_session.target
+        data = list(range(256)) * 8
+        target.write_memory_block8(RAM + 1, data)
+        assert target.read_memory_block8(RAM + 1, len(data)) == data
+        with pytest.raises(exceptions.TransferFaultError):
+            target.read32(0x40000000)
+        assert target.read32(RAM) == 0x02010000
+
+    def test_out_of_range_writes(self, simulated_session):
+        ap = simulated_session.target.dp.aps[0]
+        ap.write32(RAM, -1)
+        ap.write_memory_block32(RAM + 4, [(1 << 32) | 5, -2])
+        assert ap.read_memory_block32(RAM, 3) == [0xffffffff, 5, 0xfffffffe]
+
+    def test_write_buffer_reused(self, simulated_session):
+        target = simulated_session.target
+        data = bytearray(b'\x22' * 16)
+        target.write_memory_block32_bytes(RAM, data)
+        # The buffer can be changed before the write is flushed.
+        data[:] = b'\x33' * 16
+        data.extend(b'\x44' * 4)
+        target.flush()
+        assert target.read_memory_block32(RAM, 4) == [0x22222222] * 4
+
+    def test_reset_and_halt(self, simulated_session, simtarget):
+        simtarget.load(0, struct.pack("<II", RAM + 0x1000, 0x201))
+        target = simulated_session.target
+        target.resume()
+        assert target.get_state() == Target.TARGET_RUNNING
+        target.reset_and_halt()
+        assert target.get_state() == Target.TARGET_HALTED
+        assert target.read_core_register('pc') == 0x200
+        assert target.read_core_register('sp') == RAM + 0x1000
+
+    def test_swo(self, simulated_session):
+        target = simulated_session.target
+        probe = simulated_session.probe
+        probe.swo_start(1000000)
+        # Enable the ITM and write a byte to stimulus port 0.
+        target.write32(0xE0000E80, 1)
+        target.write32(0xE0000E00, 1)
+        target.write8(0xE0000000, 0x41)
+        target.flush()
+        assert probe.swo_read() == bytearray([0x01, 0x41])
+        probe.swo_stop()
@@ -0,0 +1,132 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import pytest
+
+from pyocd.core import exceptions
+from pyocd.utility.future import (TransferFuture, gather)
+
+RAM = 0x20000000
+
+class TestTransferFuture:
+    def test_lazy_resolve(self):
+        calls = []
+        future = TransferFuture(lambda: calls.append(1) or 5)
+        assert not future.done()
+        assert future.result() == 5
+        assert future() == 5
+        assert future.done()
+        assert calls == [1]
+
+    def test_exception(self):
+        def fail():
+            raise exceptions.TransferFaultError(0x100)
+        future = TransferFuture(fail)
+        assert isinstance(future.exception(), exceptions.TransferFaultError)
+        with pytest.raises(exceptions.TransferFaultError):
+            future.result()
+        with pytest.raises(exceptions.TransferFaultError):
+            future.then(lambda x: x + 1).result()
+
+    def test_then(self):
+        future = TransferFuture.from_result(2).then(lambda x: x * 3).then(lambda x: x + 1)
+        assert future.result() == 7
+
+    def test_cancel(self):
+        future = TransferFuture(lambda: 1)
+        assert future.cancel()
+        assert future.cancelled()
+        with pytest.raises(exceptions.TransferCancelledError):
+            future.result()
+        assert not TransferFuture.from_result(1).cancel()
+
+    def test_done_callback(self):
+        done = []
+        future = TransferFuture(lambda: 3)
+        future.add_done_callback(lambda f: done.append(f.result()))
+        assert done == []
+        future.result()
+        assert done == [3]
+        future.add_done_callback(lambda f: done.append(4))
+        assert done == [3, 4]
+
+    def test_call(self):
+        assert TransferFuture.call(lambda a, b: a + b, 1, 2).result() == 3
+        assert isinstance(TransferFuture.call(lambda: 1 // 0).exception(), ZeroDivisionError)
+
+    def test_gather(self):
+        assert gather(TransferFuture.from_result(1), TransferFuture(lambda: 2)).result() == [1, 2]
+
+    def test_await(self):
+        asyncio = pytest.importorskip('asyncio')
+        loop = asyncio.new_event_loop()
+        try:
+            result = loop.run_until_complete(gather(TransferFuture.from_result(1),
+                                                    TransferFuture(lambda: 2)))
+        finally:
+            loop.close()
+        assert result == [1, 2]
+
+    def test_await_doesnt_block_loop(self):
+        asyncio = pytest.importorskip('asyncio')
+        event = threading.Event()
+        loop = asyncio.new_event_loop()
+        try:
+            # The callback can only set the event if the loop runs while the future is resolved.
+            loop.call_later(0.05, event.set)
+            assert loop.run_until_complete(TransferFuture(lambda: event.wait(5)))
+        finally:
+            loop.close()
+
+    def test_not_iterable(self):
+        with pytest.raises(TypeError):
+            list(TransferFuture(lambda: 5))
+
+class TestAsyncReads:
+    def test_batched_reads(self, simulated_session):
+        target = simulated_session.target
+        target.write_memory_block32(RAM, list(range(100)))
+        stats = simulated_session.probe._link.get_transfer_statistics()
+        stats.reset()
+        futures = [target.read_memory_async(RAM + 4 * i) for i in range(100)]
+        assert gather(*futures).result() == list(range(100))
+        # Full packets are sent while reads are queued, and the rest with one flush.
+        assert stats.packets_sent <= 100 // 8
+
+    def test_block_reads(self, simulated_session):
+        target = simulated_session.target
+        target.write_memory_block32(RAM + 0x3f0, list(range(0x200)))
+        first = target.read_memory_block32_async(RAM + 0x3f0, 0x100)
+        second = target.read_memory_block32_async(RAM + 0x7f0, 0x100)
+        assert second.result() == list(range(0x100, 0x200))
+        assert first.result() == list(range(0x100))
+        assert target.read32(RAM + 0x3f4) == 1
+
+    def test_block_read_fault(self, simulated_session):
+        target = simulated_session.target
+        future = target.read_memory_block32_async(0x10000000, 4)
+        error = future.exception()
+        assert isinstance(error, exceptions.TransferFaultError)
+        assert error.fault_address == 0x10000000
+        assert target.read32(RAM) is not None
+
+    def test_ap_register(self, simulated_session):
+        ap = simulated_session.target.selected_core.ap
+        idr = ap.read_reg(0xfc)
+        assert ap.read_reg_async(0xfc).result() == idr
+        dp = simulated_session.target.dp
+        assert dp.read_dp_async(0).result() == dp.read_dp(0)
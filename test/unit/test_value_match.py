@@ -0,0 +1,69 @@
+# pyOCD debugger
+# Copyright (c) 2019 Arm Limited
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from pyocd.coresight import ap
+from pyocd.coresight.cortex_m import CortexM
+from pyocd.probe.debug_probe import DebugProbe
+from pyocd.probe.pydapaccess.cmsis_dap_core import DAPTransferResponse
+
+ADDR = 0x20000100
+
+@pytest.fixture(scope='function')
+def core(simulated_session):
+    return simulated_session.target.selected_core
+
+class TestValueMatch:
+    def test_mismatch_mask(self):
+        assert DAPTransferResponse.VALUE_MISMATCH_MASK == 0x10
+
+    def test_match(self, core):
+        core.write_memory(ADDR, 0x12345678)
+        stats = core.session.probe._link.get_transfer_statistics()
+        stats.reset()
+        assert core.ap.poll_memory(ADDR, 0xff00, 0x5600, 0.1)
+        # CSW and TAR writes are flushed, then the probe repeats the read in a single transfer.
+        assert stats.packets_sent == 2
+
+    def test_mismatch(self, core):
+        core.write_memory(ADDR, 0)
+        assert not core.ap.poll_memory(ADDR, 0xff, 0x1, 0.01)
+
+    def test_memory_access_after_poll(self, core):
+        core.write_memory_block32(ADDR, [1, 2, 3])
+        assert core.ap.poll_memory(ADDR + 4, 0xffffffff, 2, 0.1)
+        assert core.read_memory_block32(ADDR, 3) == [1, 2, 3]
+        assert core.read32(ADDR + 8) == 3
+
+    def test_software_poll(self, core):
+        core.write_memory(ADDR, 5)
+        core.ap.write_reg(ap.MEM_AP_CSW, (core.ap._csw & ~ap.CSW_ADDRINC) | ap.CSW_SIZE32)
+        core.ap.write_reg(ap.MEM_AP_TAR, ADDR)
+        # Invoke the generic polling loop used by probes without value match support.
+        drw = (core.ap.ap_num << ap.APSEL_SHIFT) | ap.MEM_AP_DRW
+        probe = core.session.probe
+        assert DebugProbe.poll_ap(probe, drw, 0xf, 5, 0.1)
+        assert not DebugProbe.poll_ap(probe, drw, 0xf, 6, 0.01)
+        core.ap.invalidate_cache()
+        assert core.read32(ADDR) == 5
+
+    def test_wait_for_halt(self, core):
+        core.halt()
+        assert core.wait_for_halt(0.1)
+        core.resume()
+        assert not core.wait_for_halt(0.01)
+        assert core.read_memory(CortexM.DHCSR) & CortexM.S_HALT == 0